@@ -2,11 +2,13 @@ import logging
 import os
 from datetime import datetime, timedelta
 from typing import List, Dict
-from email_receiver import get_gmail_service
 import configparser
 from playwright.sync_api import Playwright, sync_playwright
 import random
 from pdf_report_utils import extract_patient_id_from_pdf, save_pdf_to_db
+from gmail_client import message_headers, CNS_VS_NOTIFICATION, CNS_VS_NOTIFICATION_SUBJECT
+from cnsvs_session import CnsvsSessionPool, REPORTS_PORTAL
+from cnsvs_http import CnsvsReportFetcher, CnsvsHttpError, DOWNLOAD_METHOD
 
 # Robust logger setup
 log_path = os.path.join(os.path.dirname(__file__), '..', 'cns_vs_report_monitor.log')
@@ -35,7 +37,7 @@ os.makedirs(reports_dir, exist_ok=True)
 
 def subject_matches_cns_vs(subject: str) -> bool:
     """Return True if subject contains CNS VS report notification phrase (case-insensitive)."""
-    return 'cns vital signs online assessment notification' in subject.strip().lower()
+    return CNS_VS_NOTIFICATION_SUBJECT in subject.strip().lower()
 
 def stealth_fill(page, selector, value, min_delay=40, max_delay=120):
     """Fill input fields one character at a time to mimic human typing with random delays."""
@@ -44,30 +46,27 @@ def stealth_fill(page, selector, value, min_delay=40, max_delay=120):
         delay = random.randint(min_delay, max_delay)
         page.locator(selector).type(char, delay=delay)
 
-def login_and_download_report(email_data: Dict, username: str, password: str, report_days_back: int = 1) -> bool:
+def login_and_download_report(email_data: Dict, username: str, password: str, report_days_back: int = 1, session=None, on_report=None) -> bool:
     """
     Uses Playwright to log in to CNS VS and download the relevant report.
     Credentials are passed as parameters for modularity and security.
     Selects the report date as 'report_days_back' days before today.
     Skips download if no report is found for the date.
+    Pass a CnsvsSession to reuse one logged-in browser across notifications.
+    on_report(report_path, patient_id) is called for the downloaded report.
     """
+    if session is None:
+        with sync_playwright() as playwright, CnsvsSessionPool(playwright) as pool:
+            return login_and_download_report(email_data, username, password, report_days_back,
+                                             session=pool.session(username, password), on_report=on_report)
     # Calculate target date
     target_date = datetime.now() - timedelta(days=report_days_back)
     # Month dropdown is zero-based: 0=Jan, 1=Feb, ..., 3=Apr, ..., 11=Dec
     month_str = str(target_date.month - 1)
     day_str = str(target_date.day)
     logger.info(f"[DATE DEBUG] Calculated target_date: {target_date.strftime('%Y-%m-%d')}, month_str: {month_str}, day_str: {day_str}, report_days_back: {report_days_back}")
-    def run(playwright: Playwright) -> bool:
-        browser = playwright.chromium.launch(headless=False)
-        context = browser.new_context()
-        page = context.new_page()
-        page.goto("https://www.cnsvs.com/")
-        page.get_by_text("Sign In").click()
-        page.get_by_text("View Reports and Manage").click()
-        # Stealth fill for login
-        stealth_fill(page, "#input_user", username)
-        stealth_fill(page, "#input_passwd", password)
-        page.get_by_role("button", name="Login").click()
+    with session.page() as page:
+        session.open_portal(page, REPORTS_PORTAL)
         page.get_by_role("button", name="View Reports").click()
         # Wait for the month dropdown option to be attached (present in DOM, not necessarily visible)
         page.wait_for_selector("#reports_first_date_Month_ID option", state="attached")
@@ -89,8 +88,6 @@ def login_and_download_report(email_data: Dict, username: str, password: str, re
             cell = page.get_by_role("cell", name="LucidCognitiveTesting@gmail.")
             if not cell.is_visible():
                 logger.info(f"No report found for date {target_date.strftime('%Y-%m-%d')}. Skipping download.")
-                context.close()
-                browser.close()
                 return False
             with page.expect_download() as download_info:
                 cell.click()
@@ -107,60 +104,112 @@ def login_and_download_report(email_data: Dict, username: str, password: str, re
             if patient_id:
                 email_id = email_data.get('id', 'unknown')
                 save_pdf_to_db(report_path, patient_id, email_id)
+                if on_report is not None:
+                    on_report(report_path, patient_id)
             else:
                 logger.warning(f"Could not extract patient ID from {report_path}, not saving to DB.")
         except Exception as e:
             logger.warning(f"No report cell found or download failed: {e}. Skipping download.")
-            context.close()
-            browser.close()
             return False
-        context.close()
-        browser.close()
-        return True
-    with sync_playwright() as playwright:
-        return run(playwright)
+    return True
 
-def monitor_cns_vs_notifications(max_results: int = 10) -> List[Dict]:
-    """Monitor Gmail for CNS VS report notifications and trigger download."""
-    service = get_gmail_service()
-    results = service.users().messages().list(userId='me', labelIds=['UNREAD'], maxResults=max_results).execute()
-    messages = results.get('messages', [])
-    matched_emails = []
+def monitor_cns_vs_notifications(max_results: int = 10, scan=None, on_report=None) -> List[Dict]:
+    """
+    Monitor Gmail for CNS VS report notifications and trigger download.
+    Reports are fetched over HTTP in one pass for all notifications (cnsvs_http). The
+    Playwright flow is used when the HTTP listing fails, or for every run with [cnsvs]
+    download_method = browser.
+    Args:
+        max_results (int): Messages to scan when no shared scan is given.
+        scan (InboxScan, optional): The orchestrator cycle's shared inbox scan.
+        on_report (callable, optional): on_report(report_path, patient_id) for each report
+            downloaded and stored (the job queue uses it to queue the import).
+    """
+    if scan is None:
+        from gmail_client import InboxScan
+        own_scan = InboxScan(max_results=max_results)
+        try:
+            return monitor_cns_vs_notifications(scan=own_scan, on_report=on_report)
+        finally:
+            own_scan.flush()
+
+    notifications = scan.messages_for(CNS_VS_NOTIFICATION)
+    if not notifications:
+        logger.info("Processed 0 CNS VS notifications.")
+        return []
     username = config.get('cnsvs', 'username', fallback=None)
     password = config.get('cnsvs', 'password', fallback=None)
     report_days_back = config.getint('cnsvs', 'report_days_back', fallback=1)
-    for msg in messages:
-        msg_data = service.users().messages().get(userId='me', id=msg['id'], format='full').execute()
-        payload = msg_data.get('payload', {})
-        headers = payload.get('headers', [])
-        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '')
-        from_ = next((h['value'] for h in headers if h['name'] == 'From'), '')
-        date_ = next((h['value'] for h in headers if h['name'] == 'Date'), '')
-        snippet = msg_data.get('snippet', '')
-        logger.info(f"Checking email subject: {subject}")
-        if subject_matches_cns_vs(subject):
-            email_data = {
-                'subject': subject,
-                'from': from_,
-                'date': date_,
-                'snippet': snippet,
-                'id': msg['id']
-            }
-            logger.info(f"CNS VS notification found: {email_data}")
-            if login_and_download_report(email_data, username, password, report_days_back):
-                matched_emails.append(email_data)
-            # Mark as read
-            try:
-                service.users().messages().modify(
-                    userId='me',
-                    id=msg['id'],
-                    body={'removeLabelIds': ['UNREAD']}
-                ).execute()
-                logger.info(f"Marked CNS VS email {msg['id']} as read.")
-            except Exception as e:
-                logger.error(f"Failed to mark CNS VS email {msg['id']} as read: {e}")
-        else:
-            logger.info(f"Skipping non-CNS VS email: {subject}")
+    if DOWNLOAD_METHOD == 'http':
+        matched = _download_reports_over_http(scan, notifications, username, password, report_days_back, on_report)
+        if matched is not None:
+            return matched
+    # One browser and one login shared by every notification in this run
+    with sync_playwright() as playwright, CnsvsSessionPool(playwright) as pool:
+        session = pool.session(username, password)
+        return _download_notified_reports(scan, notifications, session, username, password, report_days_back, on_report)
+
+def _email_data(msg_data):
+    headers = message_headers(msg_data)
+    return {
+        'subject': headers.get('Subject', ''),
+        'from': headers.get('From', ''),
+        'date': headers.get('Date', ''),
+        'snippet': msg_data.get('snippet', ''),
+        'id': msg_data['id']
+    }
+
+def _download_reports_over_http(scan, notifications, username, password, report_days_back, on_report=None):
+    """
+    Download every pending report dated within the last max(report_days_back,
+    report_lookback_days) days in one HTTP pass, whichever notifications they belong to.
+
+    The lookback can download a report before its notification is read, so a listing whose
+    reports are all already in cnsvs_downloads handles the notifications too. They stay
+    pending, for the next run over HTTP, while nothing is listed yet or a download failed;
+    the browser flow would download (and queue) the already stored reports a second time.
+    Returns:
+        list of dict: The notifications handled (possibly none), or None if the listing
+        failed and the browser flow should be used instead.
+    """
+    lookback_days = config.getint('cnsvs', 'report_lookback_days', fallback=7)
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=max(report_days_back, lookback_days))
+    emails = [_email_data(msg_data) for msg_data in notifications]
+    fetcher = CnsvsReportFetcher.from_config(username, password, reports_dir=reports_dir)
+    try:
+        downloaded = fetcher.fetch_pending(start_date, end_date, email_id=','.join(e['id'] for e in emails))
+    except CnsvsHttpError as e:
+        logger.warning(f"HTTP report download unavailable ({e}); falling back to the browser.")
+        return None
+    finally:
+        fetcher.close()
+    logger.info(f"Downloaded {len(downloaded)} CNS VS report(s) over HTTP for {len(emails)} notification(s).")
+    if on_report is not None:
+        for report in downloaded:
+            if report['patient_id']:
+                on_report(report['path'], report['patient_id'])
+    if fetcher.failed:
+        logger.warning(f"{len(fetcher.failed)} CNS VS report download(s) failed over HTTP; "
+                       f"{len(emails)} notification(s) left pending for the next run.")
+        return []
+    if not fetcher.listed:
+        logger.info(f"No CNS VS report listed yet; {len(emails)} notification(s) left pending.")
+        return []
+    for email_data in emails:
+        scan.mark_handled(email_data['id'])
+    logger.info(f"Processed {len(emails)} CNS VS notifications.")
+    return emails
+
+def _download_notified_reports(scan, notifications, session, username, password, report_days_back, on_report=None):
+    matched_emails = []
+    for msg_data in notifications:
+        email_data = _email_data(msg_data)
+        logger.info(f"CNS VS notification found: {email_data}")
+        if login_and_download_report(email_data, username, password, report_days_back, session=session, on_report=on_report):
+            matched_emails.append(email_data)
+        # Mark as handled (applied in one batch by the scan)
+        scan.mark_handled(msg_data['id'])
     logger.info(f"Processed {len(matched_emails)} CNS VS notifications.")
     return matched_emails
 
@@ -0,0 +1,332 @@
+"""
+Direct HTTP access to CNS VS report downloads, without a browser.
+
+CnsvsReportFetcher logs in once with `requests`, sharing cookies with the Playwright
+sessions through the same storage_state file (see cnsvs_session), then:
+- lists every report in a date range from the report listing page;
+- downloads each report not yet fetched, recording its CNS VS report id in the
+  cnsvs_downloads table of cns_vs_reports.db so later runs skip it.
+
+The login form is found by its #input_user/#input_passwd fields, and the listing is read
+from the table rows that link to a report, so no form field or column names are hard-coded.
+Anything unexpected (login rejected, listing not recognised) raises CnsvsHttpError, on which
+cns_vs_report_monitor falls back to the Playwright flow.
+
+The listing URL and its query parameters (reports_first_date, reports_last_date,
+report_type) follow the browser flow's form field names, and tests/mock_cnsvs.py accepts the
+same names. Listed reports are filtered by date here as well, so a portal that ignores the
+parameters only costs a longer listing; a portal whose listing is not recognised raises
+CnsvsHttpError, which sends the run to the browser flow.
+
+Configuration (config.ini, [cnsvs]): username, password, reports_url, download_method
+(http, the default, or browser to skip the HTTP path).
+"""
+import os
+import re
+import json
+import logging
+from datetime import datetime, date
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse, parse_qs
+
+import requests
+
+from cnsvs_session import config, storage_state_path, STORAGE_STATE_DIR
+from sqlite_profile import connect
+
+logger = logging.getLogger('cns_vs_monitor')
+
+REPORTS_URL = config.get('cnsvs', 'reports_url', fallback='https://sync.cnsvs.com/sync.php?menu=reports')
+DOWNLOAD_METHOD = config.get('cnsvs', 'download_method', fallback='http')
+DATE_PATTERN = re.compile(r'\b(\d{4}-\d{2}-\d{2})\b')
+
+
+class CnsvsHttpError(Exception):
+    """The HTTP path could not log in or read the report listing."""
+
+
+class _PageParser(HTMLParser):
+    """Collects forms (action, method, inputs) and table rows (cell text, links) from a page."""
+
+    def __init__(self):
+        super().__init__()
+        self.forms = []
+        self.rows = []
+        self._form = None
+        self._row = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'form':
+            self._form = {'action': attrs.get('action', ''), 'method': attrs.get('method', 'get').lower(), 'inputs': []}
+            self.forms.append(self._form)
+        elif tag == 'input' and self._form is not None:
+            self._form['inputs'].append(attrs)
+        elif tag == 'tr':
+            self._row = {'text': [], 'links': []}
+            self.rows.append(self._row)
+        elif tag == 'a' and self._row is not None and attrs.get('href'):
+            self._row['links'].append(attrs['href'])
+
+    def handle_endtag(self, tag):
+        if tag == 'form':
+            self._form = None
+        elif tag == 'tr':
+            self._row = None
+
+    def handle_data(self, data):
+        if self._row is not None and data.strip():
+            self._row['text'].append(data.strip())
+
+
+def _parse(html):
+    parser = _PageParser()
+    parser.feed(html)
+    return parser
+
+
+def _login_form(page):
+    for form in page.forms:
+        if any(field.get('id') == 'input_user' for field in form['inputs']):
+            return form
+    return None
+
+
+def parse_report_listing(html, base_url):
+    """
+    Reports on a listing page.
+    Returns:
+        list of dict: report_id, url, date (YYYY-MM-DD or None) and text (the row's cell text).
+    """
+    reports = []
+    for row in _parse(html).rows:
+        for href in row['links']:
+            url = urljoin(base_url, href)
+            query = parse_qs(urlparse(url).query)
+            report_id = (query.get('report_id') or query.get('id') or [None])[0]
+            if report_id is None and not urlparse(url).path.lower().endswith('.pdf'):
+                continue
+            text = ' '.join(row['text'])
+            found = DATE_PATTERN.search(text)
+            reports.append({
+                'report_id': report_id or os.path.basename(urlparse(url).path),
+                'url': url,
+                'date': found.group(1) if found else None,
+                'text': text,
+            })
+            break
+    return reports
+
+
+class CnsvsReportFetcher:
+    """
+    Lists and downloads CNS VS reports over plain HTTP with one login.
+
+    Args:
+        username, password (str): CNS VS credentials.
+        reports_url (str): Report listing page (point at a stub server for testing).
+        state_path (str): storage_state file shared with the Playwright sessions; None disables it.
+        reports_dir (str): Where downloaded PDFs are written.
+        db_path (str): SQLite database holding cns_vs_reports and cnsvs_downloads.
+        http (requests.Session, optional): Session to use instead of a new one.
+        timeout (float): Seconds per HTTP request.
+    """
+
+    def __init__(self, username, password, reports_url=REPORTS_URL, state_path=None,
+                 reports_dir='reports', db_path='cns_vs_reports.db', http=None, timeout=30):
+        self.username = username
+        self.password = password
+        self.reports_url = reports_url
+        self.state_path = state_path
+        self.reports_dir = reports_dir
+        self.db_path = db_path
+        self.timeout = timeout
+        self.http = http or requests.Session()
+        self.login_count = 0
+        self.listed = []  # Reports in range listed by the last fetch_pending()
+        self.failed = []  # Reports whose download failed in the last fetch_pending()
+        self._load_cookies()
+
+    @classmethod
+    def from_config(cls, username=None, password=None, **kwargs):
+        username = username or config.get('cnsvs', 'username', fallback=None)
+        password = password or config.get('cnsvs', 'password', fallback=None)
+        kwargs.setdefault('state_path', storage_state_path(username, STORAGE_STATE_DIR))
+        return cls(username, password, **kwargs)
+
+    def _load_cookies(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            for cookie in state.get('cookies', []):
+                self.http.cookies.set(cookie['name'], cookie['value'],
+                                      domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+        except Exception as e:
+            logger.warning(f"Could not load CNS VS cookies from {self.state_path}: {e}")
+
+    def _save_cookies(self):
+        """Write the cookies back in storage_state format, so the browser fallback reuses the login too."""
+        if not self.state_path:
+            return
+        try:
+            state = {'cookies': [], 'origins': []}
+            if os.path.exists(self.state_path):
+                with open(self.state_path) as f:
+                    state = json.load(f)
+            kept = {(c['name'], c.get('domain', ''), c.get('path', '/')): c for c in state.get('cookies', [])}
+            for cookie in self.http.cookies:
+                kept[(cookie.name, cookie.domain, cookie.path)] = {
+                    'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain, 'path': cookie.path,
+                    'expires': cookie.expires if cookie.expires is not None else -1,
+                    'httpOnly': False, 'secure': bool(cookie.secure), 'sameSite': 'Lax',
+                }
+            state['cookies'] = list(kept.values())
+            os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+            with open(self.state_path, 'w') as f:
+                json.dump(state, f)
+        except Exception as e:
+            logger.warning(f"Could not save CNS VS cookies to {self.state_path}: {e}")
+
+    def _get(self, url, **kwargs):
+        response = self.http.get(url, timeout=self.timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def _login(self, response):
+        form = _login_form(_parse(response.text))
+        data = {field['name']: field.get('value', '') for field in form['inputs'] if field.get('name')}
+        for field in form['inputs']:
+            if field.get('id') == 'input_user':
+                data[field['name']] = self.username
+            elif field.get('id') == 'input_passwd':
+                data[field['name']] = self.password
+        action = urljoin(response.url, form['action'])
+        response = self.http.post(action, data=data, timeout=self.timeout)
+        if response.status_code >= 400 or _login_form(_parse(response.text)):
+            raise CnsvsHttpError(f"CNS VS login rejected for {self.username} (HTTP {response.status_code})")
+        self.login_count += 1
+        logger.info(f"Logged in to CNS VS over HTTP as {self.username}.")
+        self._save_cookies()
+        return response
+
+    def list_reports(self, start_date, end_date):
+        """
+        Every report dated start_date..end_date (inclusive), logging in only if asked to.
+        Returns:
+            list of dict: As parse_report_listing.
+        """
+        params = {'reports_first_date': _iso(start_date), 'reports_last_date': _iso(end_date),
+                  'report_type': 'clinical'}
+        try:
+            response = self._get(self.reports_url, params=params)
+            if _login_form(_parse(response.text)):
+                self._login(response)
+                response = self._get(self.reports_url, params=params)
+        except requests.RequestException as e:
+            raise CnsvsHttpError(f"CNS VS report listing failed: {e}") from e
+        page = _parse(response.text)
+        if _login_form(page) or not page.rows:
+            raise CnsvsHttpError("CNS VS report listing page not recognised")
+        reports = [r for r in parse_report_listing(response.text, response.url)
+                   if r['date'] is None or _iso(start_date) <= r['date'] <= _iso(end_date)]
+        logger.info(f"CNS VS lists {len(reports)} report(s) for {_iso(start_date)}..{_iso(end_date)}.")
+        return reports
+
+    def download(self, report):
+        """Stream one report to reports_dir. Returns the file path."""
+        os.makedirs(self.reports_dir, exist_ok=True)
+        safe_id = re.sub(r'[^A-Za-z0-9_.-]', '_', str(report['report_id']))
+        path = os.path.join(self.reports_dir, f"CNSVS_Report_{safe_id}.pdf")
+        with self.http.get(report['url'], stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            chunks = response.iter_content(chunk_size=64 * 1024)
+            first = next(chunks, b'')
+            if not first.startswith(b'%PDF'):
+                raise CnsvsHttpError(f"Report {report['report_id']} did not download as a PDF")
+            tmp_path = path + '.part'
+            with open(tmp_path, 'wb') as f:
+                f.write(first)
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        return path
+
+    def _downloads_db(self):
+        conn = connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cnsvs_downloads (
+                report_id TEXT PRIMARY KEY,
+                report_date TEXT,
+                filename TEXT,
+                patient_id TEXT,
+                downloaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        return conn
+
+    def downloaded_ids(self, report_ids):
+        conn = self._downloads_db()
+        try:
+            ids = list(report_ids)
+            found = set()
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT report_id FROM cnsvs_downloads WHERE report_id IN ({','.join('?' * len(chunk))})", chunk)
+                found.update(row[0] for row in rows)
+            return found
+        finally:
+            conn.close()
+
+    def fetch_pending(self, start_date, end_date, email_id=''):
+        """
+        Download every report in the date range that has not been downloaded before,
+        storing each one with save_pdf_to_db.
+        Args:
+            start_date, end_date (date): Inclusive range of report dates.
+            email_id (str): Notification id(s) recorded with the stored PDFs.
+        Returns:
+            list of dict: The reports downloaded, each with 'path' and 'patient_id' added.
+            Every listed report is left in self.listed, those whose download failed in self.failed.
+        """
+        from pdf_report_utils import extract_patient_id_from_pdf, save_pdf_to_db
+        self.listed, self.failed = [], []
+        reports = self.listed = self.list_reports(start_date, end_date)
+        done = self.downloaded_ids(r['report_id'] for r in reports)
+        pending = [r for r in reports if r['report_id'] not in done]
+        logger.info(f"{len(pending)} CNS VS report(s) pending download ({len(done)} already downloaded).")
+        downloaded = []
+        for report in pending:
+            try:
+                path = self.download(report)
+            except Exception as e:
+                logger.error(f"Download of CNS VS report {report['report_id']} failed: {e}")
+                self.failed.append(report)
+                continue
+            patient_id = extract_patient_id_from_pdf(path)
+            if patient_id:
+                save_pdf_to_db(path, patient_id, email_id, db_path=self.db_path)
+            else:
+                logger.warning(f"Could not extract patient ID from {path}, not saving to DB.")
+            conn = self._downloads_db()
+            try:
+                conn.execute(
+                    'INSERT OR REPLACE INTO cnsvs_downloads (report_id, report_date, filename, patient_id) VALUES (?, ?, ?, ?)',
+                    (report['report_id'], report['date'], os.path.basename(path), patient_id))
+                conn.commit()
+            finally:
+                conn.close()
+            logger.info(f"Downloaded CNS VS report {report['report_id']} ({report['date']}) to {path}")
+            downloaded.append(dict(report, path=path, patient_id=patient_id))
+        return downloaded
+
+    def close(self):
+        self.http.close()
+
+
+def _iso(value):
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d')
+    return str(value)
@@ -0,0 +1,369 @@
+"""
+Reusable, logged-in Playwright sessions for the CNS VS web portal.
+
+CnsvsSessionPool launches one Chromium per run and keeps one browser context per CNS VS
+account (CnsvsSession). A session:
+- restores the account's cookies from its storage_state file, so a still-valid login is
+  reused across runs and the login form is only filled in when the site asks for it;
+- saves storage_state again after every login;
+- hands out pages with page(), reusing idle pages instead of opening new ones, with at
+  most max_pages pages leased at a time.
+
+AsyncCnsvsSessionPool/AsyncCnsvsSession are the playwright.async_api versions, used to run
+several patients' requests concurrently (max_pages at a time) on one login.
+
+    with sync_playwright() as playwright, CnsvsSessionPool(playwright) as pool:
+        session = pool.session()
+        with session.page() as page:
+            session.open_portal(page, REMOTE_TEST_PORTAL)
+            ...
+
+Configuration (config.ini, [cnsvs]): username, password, base_url, storage_state_dir.
+"""
+import os
+import re
+import asyncio
+import random
+import logging
+import threading
+import configparser
+from contextlib import contextmanager, asynccontextmanager
+
+logger = logging.getLogger('lucid_request')
+
+config = configparser.ConfigParser()
+config.read(os.path.join(os.path.dirname(__file__), '..', 'config.ini'))
+
+CNSVS_BASE_URL = config.get('cnsvs', 'base_url', fallback='https://www.cnsvs.com/')
+STORAGE_STATE_DIR = config.get('cnsvs', 'storage_state_dir', fallback=os.path.join('credentials', 'cnsvs_state'))
+DEFAULT_MAX_PAGES = 2
+
+# Links on the Sign In page leading to each part of the portal
+REMOTE_TEST_PORTAL = "Generate Remote Test Code"
+REPORTS_PORTAL = "View Reports and Manage"
+
+
+def storage_state_path(username, state_dir=STORAGE_STATE_DIR):
+    """Per-account storage_state file."""
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', username or 'default')
+    return os.path.join(state_dir, f"{safe_name}.json")
+
+
+class CnsvsSession:
+    """
+    One CNS VS account's browser context, logged in at most once per run.
+
+    Args:
+        browser: Playwright Browser.
+        username, password (str): CNS VS credentials.
+        max_pages (int): Pages that may be leased at the same time.
+        base_url (str): Portal home page.
+        state_path (str): storage_state file; None disables persistence.
+        pace (callable): Called between UI steps (e.g. request_cns_test.stealth_delay).
+        typing_delay (tuple): (min, max) milliseconds between typed characters.
+    """
+
+    def __init__(self, browser, username, password, max_pages=DEFAULT_MAX_PAGES, base_url=CNSVS_BASE_URL,
+                 state_path=None, pace=None, typing_delay=(40, 120)):
+        self.username = username
+        self.password = password
+        self.base_url = base_url
+        self.state_path = state_path
+        self.pace = pace or (lambda: None)
+        self.typing_delay = typing_delay
+        self.max_pages = max_pages
+        self.login_count = 0
+        self._slots = threading.BoundedSemaphore(max_pages)
+        self._idle_pages = []
+        if state_path and os.path.exists(state_path):
+            logger.info(f"Restoring CNS VS session for {username} from {state_path}")
+            self.context = browser.new_context(storage_state=state_path)
+        else:
+            self.context = browser.new_context()
+
+    @contextmanager
+    def page(self):
+        """Lease a page, reusing an idle one when possible."""
+        if not self._slots.acquire(blocking=False):
+            raise RuntimeError(f"All {self.max_pages} CNS VS pages for {self.username} are in use")
+        page = None
+        try:
+            while self._idle_pages and page is None:
+                candidate = self._idle_pages.pop()
+                page = None if candidate.is_closed() else candidate
+            if page is None:
+                page = self.context.new_page()
+            yield page
+        finally:
+            if page is not None and not page.is_closed():
+                self._idle_pages.append(page)
+            self._slots.release()
+
+    def _type(self, page, selector, value):
+        field = page.locator(selector)
+        field.click()
+        field.fill("")
+        field.press_sequentially(value, delay=random.randint(*self.typing_delay))
+        self.pace()
+
+    def needs_login(self, page):
+        return page.locator("#input_user").count() > 0 and page.locator("#input_user").is_visible()
+
+    def login(self, page):
+        """Fill in the login form shown on page and persist the new cookies."""
+        self._type(page, "#input_user", self.username)
+        self._type(page, "#input_passwd", self.password)
+        page.get_by_role("button", name="Login").click()
+        page.wait_for_load_state()
+        self.login_count += 1
+        logger.info(f"Logged in to CNS VS as {self.username}.")
+        self.pace()
+        self.save_state()
+
+    def open_portal(self, page, portal_link):
+        """Navigate to a portal section (REMOTE_TEST_PORTAL, REPORTS_PORTAL), logging in only if asked to."""
+        page.goto(self.base_url)
+        self.pace()
+        page.get_by_text("Sign In").click()
+        self.pace()
+        page.get_by_text(portal_link).click()
+        page.wait_for_load_state()
+        self.pace()
+        if self.needs_login(page):
+            self.login(page)
+        else:
+            logger.info(f"Reusing CNS VS login for {self.username}.")
+        return page
+
+    def save_state(self):
+        if not self.state_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+            self.context.storage_state(path=self.state_path)
+        except Exception as e:
+            logger.warning(f"Could not save CNS VS session state to {self.state_path}: {e}")
+
+    def close(self):
+        if self.login_count:
+            self.save_state()
+        self._idle_pages = []
+        self.context.close()
+
+
+class CnsvsSessionPool:
+    """
+    One Chromium shared by one CnsvsSession per CNS VS account.
+
+    Args:
+        playwright: Playwright instance (sync API).
+        headless (bool): Launch Chromium headless.
+        max_pages (int): Pages per account that may be leased at the same time.
+        base_url (str): Portal home page (point at a mock site for testing).
+        state_dir (str): Directory of per-account storage_state files; None disables persistence.
+        pace (callable): Called between UI steps.
+    """
+
+    def __init__(self, playwright, headless=False, max_pages=DEFAULT_MAX_PAGES, base_url=CNSVS_BASE_URL,
+                 state_dir=STORAGE_STATE_DIR, pace=None):
+        self.playwright = playwright
+        self.headless = headless
+        self.max_pages = max_pages
+        self.base_url = base_url
+        self.state_dir = state_dir
+        self.pace = pace
+        self._browser = None
+        self._sessions = {}
+
+    @property
+    def browser(self):
+        if self._browser is None:
+            self._browser = self.playwright.chromium.launch(headless=self.headless)
+        return self._browser
+
+    def session(self, username=None, password=None):
+        """The session for an account (default: the configured CNS VS account)."""
+        username = username or config.get('cnsvs', 'username', fallback=None)
+        password = password or config.get('cnsvs', 'password', fallback=None)
+        if username not in self._sessions:
+            state_path = storage_state_path(username, self.state_dir) if self.state_dir else None
+            self._sessions[username] = CnsvsSession(self.browser, username, password, max_pages=self.max_pages,
+                                                    base_url=self.base_url, state_path=state_path, pace=self.pace)
+        return self._sessions[username]
+
+    def close(self):
+        for session in self._sessions.values():
+            try:
+                session.close()
+            except Exception as e:
+                logger.warning(f"Error closing CNS VS session for {session.username}: {e}")
+        self._sessions = {}
+        if self._browser is not None:
+            self._browser.close()
+            self._browser = None
+        logger.info("Browser session closed.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class AsyncCnsvsSession:
+    """
+    playwright.async_api counterpart of CnsvsSession.
+
+    Up to max_pages tasks use the account concurrently; page() waits for a free slot.
+    Concurrent tasks that all land on the login form log in only once.
+    """
+
+    def __init__(self, context, username, password, max_pages=DEFAULT_MAX_PAGES, base_url=CNSVS_BASE_URL,
+                 state_path=None, pace=None, typing_delay=(40, 120)):
+        self.context = context
+        self.username = username
+        self.password = password
+        self.base_url = base_url
+        self.state_path = state_path
+        self.pace = pace
+        self.typing_delay = typing_delay
+        self.max_pages = max_pages
+        self.login_count = 0
+        self._slots = asyncio.Semaphore(max_pages)
+        self._login_lock = asyncio.Lock()
+        self._idle_pages = []
+
+    @classmethod
+    async def create(cls, browser, username, password, state_path=None, **kwargs):
+        if state_path and os.path.exists(state_path):
+            logger.info(f"Restoring CNS VS session for {username} from {state_path}")
+            context = await browser.new_context(storage_state=state_path)
+        else:
+            context = await browser.new_context()
+        return cls(context, username, password, state_path=state_path, **kwargs)
+
+    async def _pace(self):
+        if self.pace is not None:
+            await self.pace()
+
+    @asynccontextmanager
+    async def page(self):
+        """Lease a page, waiting while max_pages are in use."""
+        async with self._slots:
+            page = None
+            while self._idle_pages and page is None:
+                candidate = self._idle_pages.pop()
+                page = None if candidate.is_closed() else candidate
+            if page is None:
+                page = await self.context.new_page()
+            try:
+                yield page
+            finally:
+                if not page.is_closed():
+                    self._idle_pages.append(page)
+
+    async def _type(self, page, selector, value):
+        field = page.locator(selector)
+        await field.click()
+        await field.fill("")
+        await field.press_sequentially(value, delay=random.randint(*self.typing_delay))
+        await self._pace()
+
+    async def needs_login(self, page):
+        field = page.locator("#input_user")
+        return await field.count() > 0 and await field.is_visible()
+
+    async def login(self, page):
+        await self._type(page, "#input_user", self.username)
+        await self._type(page, "#input_passwd", self.password)
+        await page.get_by_role("button", name="Login").click()
+        await page.wait_for_load_state()
+        self.login_count += 1
+        logger.info(f"Logged in to CNS VS as {self.username}.")
+        await self._pace()
+        await self.save_state()
+
+    async def open_portal(self, page, portal_link):
+        """Navigate to a portal section, logging in only if asked to (once across concurrent tasks)."""
+        logins_before = self.login_count
+        await page.goto(self.base_url)
+        await self._pace()
+        await page.get_by_text("Sign In").click()
+        await self._pace()
+        await page.get_by_text(portal_link).click()
+        await page.wait_for_load_state()
+        await self._pace()
+        if await self.needs_login(page):
+            async with self._login_lock:
+                if self.login_count != logins_before:
+                    # Another task logged in while this page loaded; its cookies apply here too
+                    await page.reload()
+                if await self.needs_login(page):
+                    await self.login(page)
+        return page
+
+    async def save_state(self):
+        if not self.state_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+            await self.context.storage_state(path=self.state_path)
+        except Exception as e:
+            logger.warning(f"Could not save CNS VS session state to {self.state_path}: {e}")
+
+    async def close(self):
+        if self.login_count:
+            await self.save_state()
+        self._idle_pages = []
+        await self.context.close()
+
+
+class AsyncCnsvsSessionPool:
+    """
+    playwright.async_api counterpart of CnsvsSessionPool.
+
+        async with async_playwright() as playwright:
+            async with AsyncCnsvsSessionPool(playwright, max_pages=4) as pool:
+                session = await pool.session()
+    """
+
+    def __init__(self, playwright, headless=False, max_pages=DEFAULT_MAX_PAGES, base_url=CNSVS_BASE_URL,
+                 state_dir=STORAGE_STATE_DIR, pace=None):
+        self.playwright = playwright
+        self.headless = headless
+        self.max_pages = max_pages
+        self.base_url = base_url
+        self.state_dir = state_dir
+        self.pace = pace
+        self._browser = None
+        self._sessions = {}
+
+    async def session(self, username=None, password=None):
+        username = username or config.get('cnsvs', 'username', fallback=None)
+        password = password or config.get('cnsvs', 'password', fallback=None)
+        if username not in self._sessions:
+            if self._browser is None:
+                self._browser = await self.playwright.chromium.launch(headless=self.headless)
+            state_path = storage_state_path(username, self.state_dir) if self.state_dir else None
+            self._sessions[username] = await AsyncCnsvsSession.create(
+                self._browser, username, password, state_path=state_path, max_pages=self.max_pages,
+                base_url=self.base_url, pace=self.pace)
+        return self._sessions[username]
+
+    async def close(self):
+        for session in self._sessions.values():
+            try:
+                await session.close()
+            except Exception as e:
+                logger.warning(f"Error closing CNS VS session for {session.username}: {e}")
+        self._sessions = {}
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        logger.info("Browser session closed.")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -11,6 +11,8 @@ LOG_PATH = os.path.join(os.path.dirname(__file__), '..', 'lucid_orchestrator.log
 ORCHESTRATOR_MODULE = 'orchestrator'
 ORCHESTRATOR_FUNC = 'main'
 DEFAULT_INTERVAL_MINUTES = 10
+# Set LUCID_JOB_WORKERS=1 when the stages run as pipeline_jobs.py workers instead of the cycle;
+# the scheduled cycle then runs only reminders and resend links (see orchestrator.main)
 
 # --- FLASK APP SETUP ---
 app = Flask(__name__)
@@ -19,15 +21,29 @@ app.secret_key = os.urandom(16)
 # --- SCHEDULER SETUP ---
 scheduler = BackgroundScheduler()
 scheduler_lock = threading.Lock()  # Prevent race conditions
+run_lock = threading.Lock()  # One orchestrator cycle at a time (scheduled or Run Now)
 
 # --- ORCHESTRATOR RUNNER ---
 def run_orchestrator():
+    if not run_lock.acquire(blocking=False):
+        logging.warning("Orchestrator cycle already running; skipping this run.")
+        return False
     try:
         import importlib
         orchestrator = importlib.import_module(ORCHESTRATOR_MODULE)
         getattr(orchestrator, ORCHESTRATOR_FUNC)()
     except Exception as e:
         logging.exception(f"Dashboard failed to run orchestrator: {e}")
+    finally:
+        run_lock.release()
+    return True
+
+def queue_polls_now():
+    """With pipeline_jobs workers running, Run Now just makes the polling stages due immediately."""
+    from job_queue import JobQueue
+    queue = JobQueue()
+    for job_type in ('intake', 'download_report'):
+        queue.wake(job_type, lock_key='gmail')
 
 # --- SCHEDULER JOB MANAGEMENT ---
 def start_scheduler_job(interval_minutes):
@@ -79,8 +95,15 @@ def dashboard():
     if request.method == 'POST':
         action = request.form.get('action')
         if action == 'run_now':
-            threading.Thread(target=run_orchestrator).start()
-            flash('Orchestrator started manually.', 'info')
+            import importlib
+            if importlib.import_module(ORCHESTRATOR_MODULE).job_workers_enabled():
+                queue_polls_now()
+                flash('Intake and report polling queued for the pipeline workers.', 'info')
+            elif run_lock.locked():
+                flash('Orchestrator is already running.', 'warning')
+            else:
+                threading.Thread(target=run_orchestrator).start()
+                flash('Orchestrator started manually.', 'info')
         elif action == 'pause':
             pause_scheduler_job()
             flash('Scheduler paused.', 'warning')
@@ -1,30 +1,38 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Float
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Float, Index, Text, insert, select, text
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.schema import CreateIndex, CreateTable
 import os
 from datetime import datetime
+from sqlite_profile import install_pragmas
+from migrations import apply_migrations
 
 # Use unencrypted SQLite for development
 DB_FILENAME = 'lucid_data.db'
 DATABASE_URL = f'sqlite:///{DB_FILENAME}'
+# How SQLAlchemy stores DateTime values in SQLite, for migrations writing rows directly
+SQLITE_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
 
 engine = create_engine(
     DATABASE_URL,
     echo=False,
     connect_args={'check_same_thread': False}
 )
+# WAL + tuned pragmas on every pooled connection (see sqlite_profile.py)
+install_pragmas(engine)
 Base = declarative_base()
 
 class Referral(Base):
     __tablename__ = 'referrals'
+    __table_args__ = (Index('ix_referrals_status_updated', 'status', 'status_updated_at'),)
     id = Column(Integer, primary_key=True)
     email = Column(String, nullable=False)
     mobile = Column(String)
     dob = Column(String)
-    id_number = Column(String)
+    id_number = Column(String, index=True)
     raw_subject = Column(String)
     raw_body = Column(String)
     referral_received_time = Column(DateTime)
-    test_request_time = Column(DateTime)
+    test_request_time = Column(DateTime, index=True)
     referrer = Column(String)
     referrer_email = Column(String)
     referral_confirmed_time = Column(DateTime)
@@ -37,18 +45,22 @@ class Referral(Base):
     report_processed = Column(Boolean, default=False)
     report_sent_date = Column(DateTime)
     test_resent = Column(Boolean, default=False)
-    test_resent_time = Column(DateTime, nullable=True)
+    test_resent_time = Column(DateTime, nullable=True, index=True)
+    # Pipeline state, changed only through referral_status.transition()
+    status = Column(String, nullable=False, default='received')
+    status_updated_at = Column(DateTime, default=datetime.now)
 
 class TestSession(Base):
     __tablename__ = 'test_sessions'
     id = Column(Integer, primary_key=True)
-    referral_id = Column(Integer, nullable=True)
+    referral_id = Column(Integer, nullable=True, index=True)
     session_date = Column(DateTime, default=datetime.utcnow)
     status = Column(String, default='pending')
 
 # --- Cognitive Score Model ---
 class CognitiveScore(Base):
     __tablename__ = 'cognitive_scores'
+    __table_args__ = (Index('ix_cognitive_scores_session_domain', 'session_id', 'domain'),)
     id = Column(Integer, primary_key=True)
     session_id = Column(Integer, nullable=False)
     domain = Column(String, nullable=False)
@@ -60,6 +72,7 @@ class CognitiveScore(Base):
 # --- Subtest Result Model ---
 class SubtestResult(Base):
     __tablename__ = 'subtest_results'
+    __table_args__ = (Index('ix_subtest_results_session_subtest_metric', 'session_id', 'subtest_name', 'metric'),)
     id = Column(Integer, primary_key=True)
     session_id = Column(Integer, nullable=False)
     subtest_name = Column(String, nullable=False)
@@ -72,6 +85,7 @@ class SubtestResult(Base):
 # --- ASRS Response Model ---
 class ASRSResponse(Base):
     __tablename__ = 'asrs_responses'
+    __table_args__ = (Index('ix_asrs_responses_session_question', 'session_id', 'question_number'),)
     id = Column(Integer, primary_key=True)
     session_id = Column(Integer, nullable=False)
     question_number = Column(Integer, nullable=False)
@@ -82,7 +96,7 @@ class ASRSResponse(Base):
 class DSMDiagnosis(Base):
     __tablename__ = 'dsm_diagnoses'
     id = Column(Integer, primary_key=True)
-    session_id = Column(Integer, nullable=False)
+    session_id = Column(Integer, nullable=False, index=True)
     diagnosis = Column(String, nullable=False)
     code = Column(String, nullable=True)
     severity = Column(String, nullable=True)
@@ -92,7 +106,7 @@ class DSMDiagnosis(Base):
 class DSMCriteriaMet(Base):
     __tablename__ = 'dsm_criteria_met'
     id = Column(Integer, primary_key=True)
-    session_id = Column(Integer, nullable=False)
+    session_id = Column(Integer, nullable=False, index=True)
     dsm_criterion = Column(String, nullable=False)
     dsm_category = Column(String, nullable=False)
     is_met = Column(Boolean, nullable=False)
@@ -101,7 +115,7 @@ class DSMCriteriaMet(Base):
 class EpworthResponse(Base):
     __tablename__ = 'epworth_responses'
     id = Column(Integer, primary_key=True)
-    session_id = Column(Integer, nullable=False)
+    session_id = Column(Integer, nullable=False, index=True)
     situation = Column(String, nullable=False)
     score = Column(Integer, nullable=False)
 
@@ -109,13 +123,14 @@ class EpworthResponse(Base):
 class EpworthSummary(Base):
     __tablename__ = 'epworth_summary'
     id = Column(Integer, primary_key=True)
-    session_id = Column(Integer, nullable=False)
+    session_id = Column(Integer, nullable=False, index=True)
     total_score = Column(Integer, nullable=False)
     interpretation = Column(String, nullable=True)
 
 # --- NPQ Domain Score Model ---
 class NPQDomainScore(Base):
     __tablename__ = 'npq_domain_scores'
+    __table_args__ = (Index('ix_npq_domain_scores_session_domain', 'session_id', 'domain'),)
     id = Column(Integer, primary_key=True)
     session_id = Column(Integer, nullable=False)
     domain = Column(String, nullable=False)
@@ -125,6 +140,7 @@ class NPQDomainScore(Base):
 # --- NPQ Response Model ---
 class NPQResponse(Base):
     __tablename__ = 'npq_responses'
+    __table_args__ = (Index('ix_npq_responses_session_domain', 'session_id', 'domain'),)
     id = Column(Integer, primary_key=True)
     session_id = Column(Integer, nullable=False)
     domain = Column(String, nullable=False)
@@ -133,7 +149,124 @@ class NPQResponse(Base):
     score = Column(Integer, nullable=False)
     severity = Column(String, nullable=False)
 
+# --- Gmail incremental sync state (see gmail_sync.py) ---
+class GmailSyncState(Base):
+    __tablename__ = 'gmail_sync_state'
+    mailbox = Column(String, primary_key=True)
+    history_id = Column(String)
+    updated_at = Column(DateTime)
+
+class GmailMessage(Base):
+    __tablename__ = 'gmail_messages'
+    __table_args__ = (Index('ix_gmail_messages_status_first_seen', 'status', 'first_seen_at'),)
+    id = Column(Integer, primary_key=True)  # Arrival order
+    message_id = Column(String, nullable=False, unique=True)
+    category = Column(String)
+    status = Column(String, nullable=False, default='pending')  # pending, processed, failed
+    fetch_attempts = Column(Integer, default=0)
+    first_seen_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime)
+
+# --- Reminder schedule (see reminders.py) ---
+class Reminder(Base):
+    __tablename__ = 'reminders'
+    # Partial index: the due-reminder query only ever reads unsent rows
+    __table_args__ = (Index('ix_reminders_unsent_due', 'due_at', sqlite_where=text('sent_at IS NULL')),)
+    id = Column(Integer, primary_key=True)
+    referral_id = Column(Integer, nullable=False, index=True)
+    step = Column(Integer, nullable=False)  # Index into reminders.REMINDER_STEPS
+    due_at = Column(DateTime, nullable=False)
+    sent_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.now)
+
+# --- Durable job queue (see job_queue.py) ---
+class Job(Base):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        Index('ix_jobs_type_status_run_at', 'job_type', 'status', 'run_at'),
+        Index('ix_jobs_lock_key_status', 'lock_key', 'status'),
+        Index('ix_jobs_type_dedupe_key', 'job_type', 'dedupe_key'),
+    )
+    id = Column(Integer, primary_key=True)
+    job_type = Column(String, nullable=False)  # intake, request_test, download_report, import_report, render_report, deliver
+    payload = Column(Text)  # JSON
+    referral_id = Column(Integer, index=True)
+    lock_key = Column(String)  # At most one leased job per key (e.g. referral:12, gmail) at a time
+    dedupe_key = Column(String)
+    status = Column(String, nullable=False, default='queued')  # queued, leased, done, dead
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, nullable=False)
+    lease_owner = Column(String)
+    lease_token = Column(String)
+    lease_expires_at = Column(DateTime)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now)
+
+def _create_declared_indexes(conn):
+    """Create any index declared on the models that an older database file is missing."""
+    for table in Base.metadata.sorted_tables:
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table.name})")}
+        for index in table.indexes:
+            # Columns added by a later migration get their index once they exist
+            if not {column.name for column in index.columns} <= columns:
+                continue
+            conn.execute(str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect)))
+
+def _add_referral_status(conn):
+    """Add referrals.status/status_updated_at and derive them from the legacy columns."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(referrals)")}
+    if 'status' not in columns:
+        conn.execute("ALTER TABLE referrals ADD COLUMN status VARCHAR NOT NULL DEFAULT 'received'")
+    if 'status_updated_at' not in columns:
+        conn.execute("ALTER TABLE referrals ADD COLUMN status_updated_at DATETIME")
+    conn.execute(
+        "UPDATE referrals SET status = CASE"
+        " WHEN report_sent_date IS NOT NULL THEN 'report_sent'"
+        " WHEN report_processed = 1 THEN 'report_processed'"
+        " WHEN test_completed = 1 THEN 'test_completed'"
+        " WHEN test_request_time IS NOT NULL THEN 'test_requested'"
+        " ELSE 'received' END,"
+        " status_updated_at = COALESCE(status_updated_at, report_sent_date, test_resent_time,"
+        " test_request_time, referral_received_time)"
+    )
+    _create_declared_indexes(conn)
+
+def _schedule_pending_reminders(conn):
+    """Schedule the not-yet-due reminders of tests requested before the reminders table existed."""
+    from reminders import reminder_due_times
+    conn.execute(str(CreateTable(Reminder.__table__, if_not_exists=True).compile(dialect=engine.dialect)))
+    _create_declared_indexes(conn)
+    now = datetime.now()
+    rows = []
+    for referral_id, requested_at in conn.execute(
+            "SELECT id, COALESCE(test_resent_time, test_request_time) FROM referrals"
+            " WHERE status = 'test_requested' AND test_request_time IS NOT NULL"):
+        requested_at = datetime.fromisoformat(requested_at)
+        rows.extend((referral_id, step, due_at.strftime(SQLITE_DATETIME_FORMAT), now.strftime(SQLITE_DATETIME_FORMAT))
+                    for step, due_at in reminder_due_times(requested_at) if due_at > now)
+    conn.executemany("INSERT INTO reminders (referral_id, step, due_at, created_at) VALUES (?, ?, ?, ?)", rows)
+
+# Versioned schema changes for lucid_data.db, applied in order (see migrations.py)
+SCHEMA_MIGRATIONS = [
+    (1, 'session_id, referral_id and id_number lookup indexes', _create_declared_indexes),
+    (2, 'referral status column and status index', _add_referral_status),
+    (3, 'referrals.test_request_time index for the daily safety limits', _create_declared_indexes),
+    (4, 'reminders table scheduled from pending test requests', _schedule_pending_reminders),
+    (5, 'referrals.test_resent_time index for resends in the daily limits', _create_declared_indexes),
+]
+
+def migrate_schema():
+    """Apply pending SCHEMA_MIGRATIONS to the database behind the engine."""
+    raw = engine.raw_connection()
+    try:
+        return apply_migrations(raw.driver_connection, SCHEMA_MIGRATIONS)
+    finally:
+        raw.close()
+
 Base.metadata.create_all(engine)
+migrate_schema()
 Session = sessionmaker(bind=engine)
 
 def save_referral(parsed, subject, body, referrer=None, referrer_email=None, referral_received_time=None, referral_confirmed_time=None):
@@ -152,6 +285,7 @@ def save_referral(parsed, subject, body, referrer=None, referrer_email=None, ref
         )
         session.add(referral)
         session.commit()
+        return referral.id
 
 def create_test_session(referral_id=None, session_date=None, status="pending"):
     """
@@ -185,6 +319,128 @@ def safe_float(val):
     except (ValueError, TypeError):
         return None
 
+# --- Row builders shared by the insert_* functions and import_parsed_report ---
+def _clean_score(val):
+    # Only convert NA/empty to None, else pass as string or number as-is
+    if val is None:
+        return None
+    if isinstance(val, str) and val.strip().upper() in ("NA", "N/A", "--", ""):
+        return None
+    return val
+
+def _cognitive_score_rows(session_id, scores):
+    return [
+        {
+            'session_id': session_id,
+            'domain': score['domain'],
+            'patient_score': _clean_score(score.get('patient_score')),
+            'standard_score': _clean_score(score.get('standard_score')),
+            'percentile': _clean_score(score.get('percentile')),
+            'validity_index': score.get('validity_index'),
+        }
+        for score in scores
+    ]
+
+def _subtest_result_rows(session_id, subtests):
+    return [
+        {
+            'session_id': session_id,
+            'subtest_name': s['subtest_name'],
+            'metric': s['metric'],
+            'score': s.get('score'),
+            'standard_score': s.get('standard_score'),
+            'percentile': s.get('percentile'),
+            'validity_flag': s.get('validity_flag', True),
+        }
+        for s in subtests
+    ]
+
+def _asrs_response_rows(session_id, responses):
+    return [
+        {
+            'session_id': session_id,
+            'question_number': resp['question_number'],
+            'part': resp.get('part'),
+            'response': resp['response'],
+        }
+        for resp in responses
+    ]
+
+def _dsm_diagnosis_rows(session_id, diagnoses):
+    return [
+        {
+            'session_id': session_id,
+            'diagnosis': diag['diagnosis'],
+            'code': diag.get('code'),
+            'severity': diag.get('severity'),
+            'notes': diag.get('notes'),
+        }
+        for diag in diagnoses
+    ]
+
+def _dsm_criteria_rows(session_id, criteria_data):
+    return [
+        {
+            'session_id': session_id,
+            'dsm_criterion': item['dsm_criterion'],
+            'dsm_category': item['dsm_category'],
+            'is_met': bool(item['is_met']),
+        }
+        for item in criteria_data
+    ]
+
+def _epworth_response_rows(session_id, responses):
+    return [
+        {
+            'session_id': session_id,
+            'situation': resp['situation'],
+            'score': resp['score'],
+        }
+        for resp in responses
+    ]
+
+def _epworth_summary_rows(session_id, summary):
+    return [{
+        'session_id': session_id,
+        'total_score': summary['total_score'],
+        'interpretation': summary.get('interpretation'),
+    }]
+
+def _npq_domain_score_rows(session_id, scores):
+    return [
+        {
+            'session_id': session_id,
+            'domain': score['domain'],
+            'score': score['score'],
+            'severity': score['severity'],
+        }
+        for score in scores
+    ]
+
+def _npq_response_rows(session_id, responses):
+    return [
+        {
+            'session_id': session_id,
+            'domain': resp['domain'],
+            'question_number': resp['question_number'],
+            'question_text': resp['question_text'],
+            'score': resp['score'],
+            'severity': resp['severity'],
+        }
+        for resp in responses
+    ]
+
+def _bulk_insert(conn, model, rows):
+    """executemany-style Core insert of row dicts; returns the row count."""
+    if rows:
+        conn.execute(insert(model.__table__), rows)
+    return len(rows)
+
+def _insert_rows(model, rows):
+    """Insert row dicts for one table in their own transaction."""
+    with engine.begin() as conn:
+        return _bulk_insert(conn, model, rows)
+
 # --- Insert Cognitive Scores (with sanitization) ---
 def insert_cognitive_scores(session_id, scores):
     """
@@ -195,28 +451,7 @@ def insert_cognitive_scores(session_id, scores):
     Returns:
         int: Number of records inserted.
     """
-    with Session() as session:
-        def clean(val):
-            # Only convert NA/empty to None, else pass as string or number as-is
-            if val is None:
-                return None
-            if isinstance(val, str) and val.strip().upper() in ("NA", "N/A", "--", ""):
-                return None
-            return val
-        records = [
-            CognitiveScore(
-                session_id=session_id,
-                domain=score['domain'],
-                patient_score=clean(score.get('patient_score')),
-                standard_score=clean(score.get('standard_score')),
-                percentile=clean(score.get('percentile')),
-                validity_index=score.get('validity_index'),
-            )
-            for score in scores
-        ]
-        session.add_all(records)
-        session.commit()
-        return len(records)
+    return _insert_rows(CognitiveScore, _cognitive_score_rows(session_id, scores))
 
 # --- Insert Subtest Results ---
 def insert_subtest_results(session_id, subtests):
@@ -228,22 +463,7 @@ def insert_subtest_results(session_id, subtests):
     Returns:
         int: Number of records inserted.
     """
-    with Session() as session:
-        records = [
-            SubtestResult(
-                session_id=session_id,
-                subtest_name=s['subtest_name'],
-                metric=s['metric'],
-                score=s.get('score'),
-                standard_score=s.get('standard_score'),
-                percentile=s.get('percentile'),
-                validity_flag=s.get('validity_flag', True),
-            )
-            for s in subtests
-        ]
-        session.add_all(records)
-        session.commit()
-        return len(records)
+    return _insert_rows(SubtestResult, _subtest_result_rows(session_id, subtests))
 
 # --- Insert ASRS Responses ---
 def insert_asrs_responses(session_id, responses):
@@ -255,19 +475,7 @@ def insert_asrs_responses(session_id, responses):
     Returns:
         int: Number of records inserted.
     """
-    with Session() as session:
-        records = [
-            ASRSResponse(
-                session_id=session_id,
-                question_number=resp['question_number'],
-                part=resp.get('part'),
-                response=resp['response'],
-            )
-            for resp in responses
-        ]
-        session.add_all(records)
-        session.commit()
-        return len(records)
+    return _insert_rows(ASRSResponse, _asrs_response_rows(session_id, responses))
 
 # --- Insert DSM Diagnoses ---
 def insert_dsm_diagnosis(session_id, diagnoses):
@@ -279,20 +487,7 @@ def insert_dsm_diagnosis(session_id, diagnoses):
     Returns:
         int: Number of records inserted.
     """
-    with Session() as session:
-        records = [
-            DSMDiagnosis(
-                session_id=session_id,
-                diagnosis=diag['diagnosis'],
-                code=diag.get('code'),
-                severity=diag.get('severity'),
-                notes=diag.get('notes'),
-            )
-            for diag in diagnoses
-        ]
-        session.add_all(records)
-        session.commit()
-        return len(records)
+    return _insert_rows(DSMDiagnosis, _dsm_diagnosis_rows(session_id, diagnoses))
 
 # --- Insert DSM Criteria Met ---
 def insert_dsm_criteria_met(session_id, criteria_data):
@@ -304,19 +499,7 @@ def insert_dsm_criteria_met(session_id, criteria_data):
     Returns:
         int: Number of records inserted.
     """
-    with Session() as session:
-        records = [
-            DSMCriteriaMet(
-                session_id=session_id,
-                dsm_criterion=item['dsm_criterion'],
-                dsm_category=item['dsm_category'],
-                is_met=bool(item['is_met']),
-            )
-            for item in criteria_data
-        ]
-        session.add_all(records)
-        session.commit()
-        return len(records)
+    return _insert_rows(DSMCriteriaMet, _dsm_criteria_rows(session_id, criteria_data))
 
 # --- Insert Epworth Responses ---
 def insert_epworth_responses(session_id, responses):
@@ -328,18 +511,7 @@ def insert_epworth_responses(session_id, responses):
     Returns:
         int: Number of records inserted.
     """
-    with Session() as session:
-        records = [
-            EpworthResponse(
-                session_id=session_id,
-                situation=resp['situation'],
-                score=resp['score'],
-            )
-            for resp in responses
-        ]
-        session.add_all(records)
-        session.commit()
-        return len(records)
+    return _insert_rows(EpworthResponse, _epworth_response_rows(session_id, responses))
 
 # --- Insert Epworth Summary ---
 def insert_epworth_summary(session_id, summary):
@@ -351,15 +523,7 @@ def insert_epworth_summary(session_id, summary):
     Returns:
         int: 1 if inserted successfully.
     """
-    with Session() as session:
-        record = EpworthSummary(
-            session_id=session_id,
-            total_score=summary['total_score'],
-            interpretation=summary.get('interpretation'),
-        )
-        session.add(record)
-        session.commit()
-        return 1
+    return _insert_rows(EpworthSummary, _epworth_summary_rows(session_id, summary))
 
 # --- Insert NPQ Domain Scores ---
 def insert_npq_domain_scores(session_id, scores):
@@ -371,19 +535,7 @@ def insert_npq_domain_scores(session_id, scores):
     Returns:
         int: Number of records inserted.
     """
-    with Session() as session:
-        records = [
-            NPQDomainScore(
-                session_id=session_id,
-                domain=score['domain'],
-                score=score['score'],
-                severity=score['severity'],
-            )
-            for score in scores
-        ]
-        session.add_all(records)
-        session.commit()
-        return len(records)
+    return _insert_rows(NPQDomainScore, _npq_domain_score_rows(session_id, scores))
 
 # --- Insert NPQ Responses ---
 def insert_npq_responses(session_id, responses):
@@ -395,18 +547,72 @@ def insert_npq_responses(session_id, responses):
     Returns:
         int: Number of records inserted.
     """
-    with Session() as session:
-        records = [
-            NPQResponse(
-                session_id=session_id,
-                domain=resp['domain'],
-                question_number=resp['question_number'],
-                question_text=resp['question_text'],
-                score=resp['score'],
-                severity=resp['severity'],
-            )
-            for resp in responses
-        ]
-        session.add_all(records)
-        session.commit()
-        return len(records)
+    return _insert_rows(NPQResponse, _npq_response_rows(session_id, responses))
+
+# --- Bulk import of a whole parsed report ---
+def _referral_id_for_patient(conn, patient_info):
+    """Find the referral for a parsed patient, creating an auto-imported one if none exists."""
+    referral_id = patient_info.get('referral_id')
+    if referral_id:
+        return referral_id
+    referral_id = conn.execute(
+        select(Referral.id).where(Referral.id_number == str(patient_info.get('patient_id'))).limit(1)
+    ).scalar()
+    if referral_id:
+        return referral_id
+    result = conn.execute(insert(Referral.__table__).values(
+        email=patient_info.get('email', ''),
+        mobile=patient_info.get('mobile', ''),
+        dob=patient_info.get('dob', ''),
+        id_number=str(patient_info.get('patient_id', '')),
+        raw_subject='[Auto-imported]',
+        raw_body='',
+        referral_received_time=datetime.now(),
+    ))
+    return result.inserted_primary_key[0]
+
+def _write_parsed_report(conn, payload):
+    referral_id = _referral_id_for_patient(conn, payload['patient'])
+    session_id = conn.execute(insert(TestSession.__table__).values(
+        referral_id=referral_id,
+        session_date=payload.get('session_date') or datetime.utcnow(),
+        status=payload.get('status', 'parsed'),
+    )).inserted_primary_key[0]
+    _bulk_insert(conn, CognitiveScore, _cognitive_score_rows(session_id, payload.get('cognitive_scores', [])))
+    _bulk_insert(conn, EpworthResponse, _epworth_response_rows(session_id, payload.get('epworth_responses', [])))
+    if payload.get('epworth_summary') is not None:
+        _bulk_insert(conn, EpworthSummary, _epworth_summary_rows(session_id, payload['epworth_summary']))
+    _bulk_insert(conn, SubtestResult, _subtest_result_rows(session_id, payload.get('subtests', [])))
+    _bulk_insert(conn, ASRSResponse, _asrs_response_rows(session_id, payload.get('asrs_responses', [])))
+    _bulk_insert(conn, NPQResponse, _npq_response_rows(session_id, payload.get('npq_responses', [])))
+    _bulk_insert(conn, NPQDomainScore, _npq_domain_score_rows(session_id, payload.get('npq_domain_scores', [])))
+    if payload.get('dsm_diagnoses'):
+        _bulk_insert(conn, DSMDiagnosis, _dsm_diagnosis_rows(session_id, payload['dsm_diagnoses']))
+        _bulk_insert(conn, DSMCriteriaMet, _dsm_criteria_rows(session_id, payload.get('dsm_criteria', [])))
+    return session_id
+
+def import_parsed_report(session_payload):
+    """
+    Write a parsed report - its test session and every child row - in a single transaction.
+    Either everything is committed or nothing is, so a failed import never leaves a half-filled session.
+    Args:
+        session_payload (dict): As returned by cognitive_importer.parse_pdf_report. Keys:
+            patient (dict: patient_id, optional referral_id/email/mobile/dob), session_date,
+            cognitive_scores, epworth_responses, epworth_summary, subtests, asrs_responses,
+            npq_responses, npq_domain_scores, dsm_diagnoses, dsm_criteria
+            (lists of dicts in the shape the matching insert_* function takes).
+    Returns:
+        int: The ID of the new session.
+    """
+    with engine.begin() as conn:
+        return _write_parsed_report(conn, session_payload)
+
+def import_parsed_reports(session_payloads):
+    """
+    Write many parsed reports in one transaction (for batch backfills).
+    If any report fails the whole batch is rolled back.
+    Returns:
+        list of int: The new session IDs, in payload order.
+    """
+    with engine.begin() as conn:
+        return [_write_parsed_report(conn, payload) for payload in session_payloads]
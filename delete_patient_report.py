@@ -1,13 +1,12 @@
-import sqlite3
 import sys
-
-DB_PATH = 'cns_vs_reports.db'
+from pdf_report_utils import DB_PATH, open_reports_db, delete_unreferenced_blobs
 
 def delete_reports_for_patient(patient_id, db_path=DB_PATH):
-    conn = sqlite3.connect(db_path)
+    conn, store = open_reports_db(db_path)
     cursor = conn.cursor()
     cursor.execute('DELETE FROM cns_vs_reports WHERE patient_id = ?', (patient_id,))
     deleted = cursor.rowcount
+    delete_unreferenced_blobs(conn, store)
     conn.commit()
     conn.close()
     print(f"Deleted {deleted} report(s) for patient_id {patient_id}.")
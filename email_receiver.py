@@ -9,6 +9,7 @@ from google.auth.transport.requests import Request
 import re
 import base64
 from datetime import datetime
+from gmail_client import get_email_body, message_headers, RESEND_KEYWORDS, REFERRAL, RESEND_REQUEST
 
 # Robust logger setup
 log_path = os.path.join(os.path.dirname(__file__), '..', 'lucid_email_receiver.log')
@@ -64,23 +65,6 @@ def parse_email_body(body: str) -> dict:
     result['id_number'] = id_match.group(0) if id_match else None
     return result
 
-def get_email_body(msg_data):
-    """Extract and decode the plain text body from Gmail API message data."""
-    payload = msg_data.get('payload', {})
-    parts = payload.get('parts', [])
-    body = ''
-    # Try to find the plain text part
-    for part in parts:
-        if part.get('mimeType') == 'text/plain':
-            body_data = part['body'].get('data', '')
-            if body_data:
-                body = base64.urlsafe_b64decode(body_data).decode('utf-8', errors='replace')
-                break
-    if not body and 'body' in payload and 'data' in payload['body']:
-        # Fallback: single-part message
-        body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8', errors='replace')
-    return body
-
 def subject_matches(subject: str) -> bool:
     """Check if the subject contains 'Referral' or 'Cognitive Testing' (case-insensitive)."""
     keywords = ['referral', 'cognitive testing']
@@ -104,27 +88,42 @@ def send_reply_email(service, original_msg, reply_to):
     except Exception as e:
         logger.error(f"Failed to send reply email: {e}")
 
-def list_unread_emails_gmail_api(max_results: int = 10) -> List[Dict]:
-    """Fetch unread emails from Gmail API, mark them as read, parse body, filter by subject."""
-    service = get_gmail_service()
-    results = service.users().messages().list(userId='me', labelIds=['INBOX', 'UNREAD'], maxResults=max_results).execute()
-    messages = results.get('messages', [])
+def _run_scan(consumer, scan, max_results):
+    """Run consumer(scan) on the given shared scan, or on a private one flushed afterwards."""
+    if scan is not None:
+        return consumer(scan)
+    from gmail_client import InboxScan
+    own_scan = InboxScan(max_results=max_results)
+    try:
+        return consumer(own_scan)
+    finally:
+        own_scan.flush()
+
+def list_unread_emails_gmail_api(max_results: int = 10, scan=None) -> List[Dict]:
+    """
+    Parse unread inbox emails classified as referrals and mark them as handled.
+    Args:
+        max_results (int): Messages to scan when no shared scan is given.
+        scan (InboxScan, optional): The orchestrator cycle's shared inbox scan.
+    Returns:
+        list of dict: parsed, subject, body, referrer_email, referral_received_time.
+    """
+    return _run_scan(_collect_referrals, scan, max_results)
+
+def _collect_referrals(scan) -> List[Dict]:
+    messages = scan.messages_for(REFERRAL)
     processed_emails = []
 
     if not messages:
         logger.info("No unread messages found in Gmail API.")
 
-    for msg in messages:
-        msg_data = service.users().messages().get(userId='me', id=msg['id'], format='full').execute()
-        payload = msg_data.get('payload', {})
-        headers = payload.get('headers', [])
-        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '')
-        from_ = next((h['value'] for h in headers if h['name'] == 'From'), '')
-        date_ = next((h['value'] for h in headers if h['name'] == 'Date'), '')
-        snippet = msg_data.get('snippet', '')
+    for msg_data in messages:
+        headers = message_headers(msg_data)
+        subject = headers.get('Subject', '')
+        from_ = headers.get('From', '')
         body = get_email_body(msg_data)
         parsed = parse_email_body(body)
-        logger.info(f"Parsed email ID {msg['id']} from {from_}: {parsed}")
+        logger.info(f"Parsed email ID {msg_data['id']} from {from_}: {parsed}")
 
         # Collect data instead of saving
         referral_data = {
@@ -137,56 +136,38 @@ def list_unread_emails_gmail_api(max_results: int = 10) -> List[Dict]:
         }
         processed_emails.append(referral_data)
 
-        # Mark as read after successful parsing
-        service.users().messages().modify(
-            userId='me',
-            id=msg['id'],
-            body={'removeLabelIds': ['UNREAD']}
-        ).execute()
-        logger.info(f"Marked email {msg['id']} as read.")
+        # Mark as handled after successful parsing (applied in one batch by the scan)
+        scan.mark_handled(msg_data['id'])
 
     logger.info(f"Processed {len(processed_emails)} relevant unread emails from Gmail API.")
     return processed_emails
 
-def list_resend_link_requests(max_results: int = 10):
+def list_resend_link_requests(max_results: int = 10, scan=None):
     """
     Fetch unread emails from Gmail API that are likely 'link expired' or 'resend link' requests.
+    Args:
+        max_results (int): Messages to scan when no shared scan is given.
+        scan (InboxScan, optional): The orchestrator cycle's shared inbox scan.
     Returns a list of dicts: [{'email': ..., 'id_number': ...}, ...]
     """
-    service = get_gmail_service()
-    results = service.users().messages().list(userId='me', labelIds=['INBOX', 'UNREAD'], maxResults=max_results).execute()
-    messages = results.get('messages', [])
+    return _run_scan(_collect_resend_requests, scan, max_results)
+
+def _collect_resend_requests(scan):
     resend_requests = []
-    KEYWORDS = [
-        'link expired', 'resend link', 'test expired', 'need new link', 'cannot access test',
-        'link not working', 'test link expired', 'send new link'
-    ]
-    for msg in messages:
-        msg_data = service.users().messages().get(userId='me', id=msg['id']).execute()
-        payload = msg_data.get('payload', {})
-        headers = payload.get('headers', [])
-        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '')
-        from_ = next((h['value'] for h in headers if h['name'] == 'From'), '')
-        body = get_email_body(msg_data)
-        # Check for resend keywords in subject or body
-        text = f"{subject}\n{body}".lower()
-        if any(keyword in text for keyword in KEYWORDS):
-            parsed = parse_email_body(body)
-            # At minimum, try to get email or id_number
-            patient_id = {}
-            if parsed.get('email'):
-                patient_id['email'] = parsed['email']
-            if parsed.get('id_number'):
-                patient_id['id_number'] = parsed['id_number']
-            if patient_id:
-                resend_requests.append(patient_id)
-                logger.info(f"Detected resend link request: {patient_id} from {from_}")
-        # Mark as read
-        service.users().messages().modify(
-            userId='me',
-            id=msg['id'],
-            body={'removeLabelIds': ['UNREAD']}
-        ).execute()
-        logger.info(f"Marked email {msg['id']} as read (resend link request).")
+    # The scan classified these by RESEND_KEYWORDS in subject or body
+    for msg_data in scan.messages_for(RESEND_REQUEST):
+        from_ = message_headers(msg_data).get('From', '')
+        parsed = parse_email_body(get_email_body(msg_data))
+        # At minimum, try to get email or id_number
+        patient_id = {}
+        if parsed.get('email'):
+            patient_id['email'] = parsed['email']
+        if parsed.get('id_number'):
+            patient_id['id_number'] = parsed['id_number']
+        if patient_id:
+            resend_requests.append(patient_id)
+            logger.info(f"Detected resend link request: {patient_id} from {from_}")
+        # Mark as handled
+        scan.mark_handled(msg_data['id'])
     logger.info(f"Fetched {len(resend_requests)} resend link requests from Gmail API.")
     return resend_requests
@@ -0,0 +1,287 @@
+"""
+Shared Gmail API client for the email-driven pipeline stages.
+
+- GmailClient wraps a Gmail service with batched calls: message gets go through
+  new_batch_http_request (up to GET_BATCH_SIZE per HTTP round trip), label changes through
+  messages.batchModify, and every call asks for a fields= partial response.
+- InboxScan lists and fetches the unread messages once per orchestrator cycle and classifies
+  each one as a referral, resend-link request or CNS VS notification. Intake, resend-link
+  detection and the CNS VS report monitor each read their category from the same scan, mark
+  the messages they handled, and the scan clears UNREAD on all of them with one batchModify.
+  gmail_sync.GmailSync is the incremental (historyId based) variant.
+
+Point the client at a local fake Gmail server (for development) with:
+    LUCID_GMAIL_API_ROOT=http://127.0.0.1:8085/
+"""
+import os
+import json
+import base64
+import logging
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger('lucid_email_receiver')
+
+GET_BATCH_SIZE = 50        # Gmail recommends no more than 50 requests per batch
+MODIFY_BATCH_SIZE = 1000   # batchModify limit
+LIST_PAGE_SIZE = 500       # messages.list maxResults limit
+
+LIST_FIELDS = 'messages/id,nextPageToken'
+HISTORY_FIELDS = 'history/messagesAdded/message(id,labelIds),historyId,nextPageToken'
+MESSAGE_FIELDS = 'id,threadId,labelIds,snippet,payload(mimeType,headers,body/data,parts(mimeType,body/data))'
+
+GMAIL_API_ROOT_ENV = 'LUCID_GMAIL_API_ROOT'
+
+# Message categories; every scanned message gets exactly one
+REFERRAL = 'referral'
+RESEND_REQUEST = 'resend_request'
+CNS_VS_NOTIFICATION = 'cns_vs_notification'
+OTHER = 'other'
+
+CNS_VS_NOTIFICATION_SUBJECT = 'cns vital signs online assessment notification'
+RESEND_KEYWORDS = [
+    'link expired', 'resend link', 'test expired', 'need new link', 'cannot access test',
+    'link not working', 'test link expired', 'send new link'
+]
+# Labels of mail we never act on (our own replies, drafts, junk)
+IGNORED_LABELS = {'SENT', 'DRAFT', 'SPAM', 'TRASH'}
+
+
+def build_service_for_root(root_url, http=None):
+    """
+    Build a Gmail service from the bundled discovery document with its root URL
+    (including the batch endpoint) replaced, e.g. by a local fake Gmail server.
+    """
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.discovery_cache import get_static_doc
+    import httplib2
+    document = json.loads(get_static_doc('gmail', 'v1'))
+    document['rootUrl'] = root_url if root_url.endswith('/') else root_url + '/'
+    return build_from_document(document, http=http or httplib2.Http())
+
+
+def message_headers(msg_data: Dict) -> Dict[str, str]:
+    """Subject/From/Date (and any other headers) of a message, keyed by header name."""
+    headers = msg_data.get('payload', {}).get('headers', [])
+    return {h['name']: h['value'] for h in headers}
+
+
+def get_email_body(msg_data):
+    """Extract and decode the plain text body from Gmail API message data."""
+    payload = msg_data.get('payload', {})
+    parts = payload.get('parts', [])
+    body = ''
+    # Try to find the plain text part
+    for part in parts:
+        if part.get('mimeType') == 'text/plain':
+            body_data = part['body'].get('data', '')
+            if body_data:
+                body = base64.urlsafe_b64decode(body_data).decode('utf-8', errors='replace')
+                break
+    if not body and 'body' in payload and 'data' in payload['body']:
+        # Fallback: single-part message
+        body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8', errors='replace')
+    return body
+
+
+def classify_message(msg_data: Dict) -> str:
+    """
+    Assign a fetched message to the one pipeline stage that handles it.
+
+    CNS VS notifications are matched on subject wherever they are filed; resend-link requests
+    on keywords in an inbox message's subject or body; any other inbox message is a potential
+    referral. Everything else is OTHER.
+    """
+    labels = set(msg_data.get('labelIds', ['INBOX']))
+    if labels & IGNORED_LABELS:
+        return OTHER
+    subject = message_headers(msg_data).get('Subject', '')
+    if CNS_VS_NOTIFICATION_SUBJECT in subject.strip().lower():
+        return CNS_VS_NOTIFICATION
+    if 'INBOX' not in labels:
+        return OTHER
+    text = f"{subject}\n{get_email_body(msg_data)}".lower()
+    if any(keyword in text for keyword in RESEND_KEYWORDS):
+        return RESEND_REQUEST
+    return REFERRAL
+
+
+class GmailClient:
+    """Batched, partial-response access to one Gmail mailbox."""
+
+    def __init__(self, service=None, user_id='me'):
+        self._service = service
+        self.user_id = user_id
+        self.http_calls = 0  # Round trips made, for logging
+
+    @property
+    def service(self):
+        if self._service is None:
+            root_url = os.environ.get(GMAIL_API_ROOT_ENV)
+            if root_url:
+                self._service = build_service_for_root(root_url)
+            else:
+                from email_receiver import get_gmail_service
+                self._service = get_gmail_service()
+        return self._service
+
+    def _messages(self):
+        return self.service.users().messages()
+
+    def list_message_ids(self, label_ids: List[str], max_results: int = 10, query: Optional[str] = None) -> List[str]:
+        """IDs of messages carrying all of label_ids, newest first, up to max_results."""
+        ids = []
+        page_token = None
+        while len(ids) < max_results:
+            kwargs = {'userId': self.user_id, 'labelIds': label_ids,
+                      'maxResults': min(LIST_PAGE_SIZE, max_results - len(ids)), 'fields': LIST_FIELDS}
+            if query:
+                kwargs['q'] = query
+            if page_token:
+                kwargs['pageToken'] = page_token
+            results = self._messages().list(**kwargs).execute()
+            self.http_calls += 1
+            ids.extend(msg['id'] for msg in results.get('messages', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        return ids[:max_results]
+
+    def get_history_id(self) -> str:
+        """The mailbox's current historyId."""
+        profile = self.service.users().getProfile(userId=self.user_id, fields='historyId').execute()
+        self.http_calls += 1
+        return profile['historyId']
+
+    def list_added_message_ids(self, start_history_id: str):
+        """
+        Messages added to the mailbox since start_history_id, via users.history.list.
+
+        Returns:
+            tuple: (message IDs in arrival order, latest historyId). Raises HttpError 404
+            when start_history_id is too old for Gmail to answer.
+        """
+        ids = []
+        history_id = start_history_id
+        page_token = None
+        while True:
+            kwargs = {'userId': self.user_id, 'startHistoryId': start_history_id, 'historyTypes': ['messageAdded'],
+                      'maxResults': LIST_PAGE_SIZE, 'fields': HISTORY_FIELDS}
+            if page_token:
+                kwargs['pageToken'] = page_token
+            results = self.service.users().history().list(**kwargs).execute()
+            self.http_calls += 1
+            for record in results.get('history', []):
+                for added in record.get('messagesAdded', []):
+                    message = added['message']
+                    if not set(message.get('labelIds', [])) & IGNORED_LABELS:
+                        ids.append(message['id'])
+            history_id = results.get('historyId', history_id)
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        return list(dict.fromkeys(ids)), history_id
+
+    def get_messages(self, message_ids: Iterable[str], fields: str = MESSAGE_FIELDS) -> Dict[str, Dict]:
+        """
+        Fetch full messages in batched requests.
+
+        Args:
+            message_ids: Gmail message IDs.
+            fields (str): Partial-response field mask.
+        Returns:
+            dict: message ID -> message resource. Messages that failed to fetch are
+            logged and left out.
+        """
+        message_ids = list(dict.fromkeys(message_ids))
+        fetched = {}
+        failed = []
+
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                logger.error(f"Failed to fetch Gmail message {request_id}: {exception}")
+                failed.append(request_id)
+            else:
+                fetched[request_id] = response
+
+        for start in range(0, len(message_ids), GET_BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=on_response)
+            for message_id in message_ids[start:start + GET_BATCH_SIZE]:
+                batch.add(self._messages().get(userId=self.user_id, id=message_id, format='full', fields=fields),
+                          request_id=message_id)
+            batch.execute()
+            self.http_calls += 1
+        if failed:
+            logger.warning(f"{len(failed)} of {len(message_ids)} Gmail messages could not be fetched")
+        return {message_id: fetched[message_id] for message_id in message_ids if message_id in fetched}
+
+    def modify_labels(self, message_ids: Iterable[str], add: Optional[List[str]] = None, remove: Optional[List[str]] = None) -> int:
+        """Add/remove labels on many messages with batchModify. Returns the number of messages modified."""
+        message_ids = list(dict.fromkeys(message_ids))
+        body = {}
+        if add:
+            body['addLabelIds'] = add
+        if remove:
+            body['removeLabelIds'] = remove
+        for start in range(0, len(message_ids), MODIFY_BATCH_SIZE):
+            chunk = message_ids[start:start + MODIFY_BATCH_SIZE]
+            self._messages().batchModify(userId=self.user_id, body=dict(body, ids=chunk)).execute()
+            self.http_calls += 1
+        return len(message_ids)
+
+    def mark_read(self, message_ids: Iterable[str]) -> int:
+        return self.modify_labels(message_ids, remove=['UNREAD'])
+
+
+class InboxScan:
+    """
+    One scan of the unread messages, shared by every email consumer in an orchestrator cycle.
+
+    Messages are listed, fetched and classified on first access. Consumers read their category
+    with messages_for() and call mark_handled() for the messages they dealt with; flush() then
+    clears UNREAD on all of them in one batchModify.
+    """
+
+    def __init__(self, client: Optional[GmailClient] = None, max_results: int = 10, label_ids=('UNREAD',)):
+        self.client = client or GmailClient()
+        self.max_results = max_results
+        self.label_ids = list(label_ids)
+        self._messages = None
+        self.categories = {}  # message ID -> category
+        self._handled = []
+
+    def _load_messages(self) -> List[Dict]:
+        message_ids = self.client.list_message_ids(self.label_ids, self.max_results)
+        fetched = self.client.get_messages(message_ids)
+        return [fetched[message_id] for message_id in message_ids if message_id in fetched]
+
+    @property
+    def messages(self) -> List[Dict]:
+        """Fetched message resources."""
+        if self._messages is None:
+            self._messages = self._load_messages()
+            for msg in self._messages:
+                if msg['id'] not in self.categories:
+                    self.categories[msg['id']] = classify_message(msg)
+            logger.info(f"Inbox scan: {len(self._messages)} message(s) in {self.client.http_calls} Gmail API call(s)")
+        return self._messages
+
+    def messages_for(self, category: str) -> List[Dict]:
+        """The scanned messages of one category (REFERRAL, RESEND_REQUEST, CNS_VS_NOTIFICATION)."""
+        return [msg for msg in self.messages if self.categories[msg['id']] == category]
+
+    def mark_handled(self, message_id: str):
+        if message_id not in self._handled:
+            self._handled.append(message_id)
+
+    def flush(self) -> int:
+        """Clear UNREAD on every message handled during the cycle. Returns the count."""
+        pending, self._handled = self._handled, []
+        if not pending:
+            return 0
+        try:
+            count = self.client.mark_read(pending)
+            logger.info(f"Marked {count} email(s) as read.")
+            return count
+        except Exception as e:
+            logger.error(f"Failed to mark {len(pending)} email(s) as read: {e}")
+            return 0
@@ -0,0 +1,125 @@
+"""
+Incremental Gmail sync for the orchestrator's email stages.
+
+Instead of polling the UNREAD label, GmailSync keeps the mailbox's last Gmail historyId in
+lucid_data.db (gmail_sync_state) and asks users.history.list only for the messages added
+since then. Every new message is recorded in gmail_messages as pending; it is fetched,
+classified once (referral, resend request, CNS VS notification) and stays pending until the
+consuming stage marks it handled, so a disabled or failing stage never loses mail and a
+message is never processed twice. All pending messages are served in one cycle, so a backlog
+drains at a cost proportional to new mail rather than inbox size.
+
+The first sync, or one whose stored historyId has expired (HTTP 404), seeds the pending set
+from the currently unread messages and starts from the mailbox's current historyId.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from db import Session, GmailSyncState, GmailMessage
+from gmail_client import GmailClient, InboxScan, classify_message, OTHER
+
+logger = logging.getLogger('lucid_email_receiver')
+
+# Upper bound on messages served (and fetched) per cycle
+MAX_PENDING_PER_CYCLE = 500
+# Give up on a message that could not be fetched this many times (e.g. deleted)
+MAX_FETCH_ATTEMPTS = 3
+
+
+def _http_status(error):
+    resp = getattr(error, 'resp', None)
+    return getattr(resp, 'status', None)
+
+
+class GmailSync(InboxScan):
+    """
+    InboxScan backed by Gmail history deltas and the gmail_messages table.
+
+    Args:
+        client (GmailClient, optional): Defaults to the production Gmail client.
+        max_results (int): Pending messages served per cycle.
+        mark_read (bool): Also clear UNREAD on handled messages, for people reading the inbox.
+    """
+
+    def __init__(self, client: Optional[GmailClient] = None, max_results: int = MAX_PENDING_PER_CYCLE, mark_read: bool = True):
+        super().__init__(client, max_results=max_results)
+        self.mark_read = mark_read
+        self.new_message_count = 0
+
+    def _seed_from_unread(self):
+        """Full resync: take the current historyId first so nothing arriving meanwhile is missed."""
+        history_id = self.client.get_history_id()
+        return self.client.list_message_ids(['UNREAD'], max_results=self.max_results), history_id
+
+    def _delta(self, state):
+        if state is None or not state.history_id:
+            logger.info("Gmail sync: no stored historyId, seeding from unread messages")
+            return self._seed_from_unread()
+        try:
+            return self.client.list_added_message_ids(state.history_id)
+        except Exception as e:
+            if _http_status(e) != 404:
+                raise
+            logger.warning(f"Gmail sync: historyId {state.history_id} expired, resyncing from unread messages")
+            return self._seed_from_unread()
+
+    def _load_messages(self) -> List[Dict]:
+        now = datetime.utcnow()
+        with Session() as session:
+            state = session.get(GmailSyncState, self.client.user_id)
+            new_ids, history_id = self._delta(state)
+            known = set()
+            for start in range(0, len(new_ids), 500):
+                chunk = new_ids[start:start + 500]
+                known.update(row[0] for row in session.query(GmailMessage.message_id).filter(GmailMessage.message_id.in_(chunk)))
+            fresh = [message_id for message_id in new_ids if message_id not in known]
+            session.add_all(GmailMessage(message_id=message_id, status='pending', fetch_attempts=0, first_seen_at=now)
+                            for message_id in fresh)
+            if state is None:
+                state = GmailSyncState(mailbox=self.client.user_id)
+                session.add(state)
+            state.history_id = str(history_id)
+            state.updated_at = now
+            session.commit()
+            self.new_message_count = len(fresh)
+
+            pending = session.query(GmailMessage).filter(GmailMessage.status == 'pending') \
+                .order_by(GmailMessage.id).limit(self.max_results).all()
+            fetched = self.client.get_messages([row.message_id for row in pending])
+            messages = []
+            for row in pending:
+                msg = fetched.get(row.message_id)
+                if msg is None:
+                    row.fetch_attempts = (row.fetch_attempts or 0) + 1
+                    if row.fetch_attempts >= MAX_FETCH_ATTEMPTS:
+                        logger.warning(f"Gmail sync: giving up on message {row.message_id} after {row.fetch_attempts} failed fetches")
+                        row.status = 'failed'
+                    continue
+                if row.category is None:
+                    # Classified once, on first fetch; later cycles reuse the stored category
+                    row.category = classify_message(msg)
+                self.categories[row.message_id] = row.category
+                if row.category == OTHER:
+                    row.status = 'processed'
+                    row.processed_at = now
+                    continue
+                messages.append(msg)
+            session.commit()
+        logger.info(f"Gmail sync: {len(fresh)} new message(s), serving {len(messages)} pending, historyId {history_id}")
+        return messages
+
+    def flush(self) -> int:
+        """Record handled messages as processed (and optionally mark them read). Returns the count."""
+        handled = list(self._handled)
+        if handled:
+            with Session() as session:
+                session.query(GmailMessage).filter(GmailMessage.message_id.in_(handled)).update(
+                    {GmailMessage.status: 'processed', GmailMessage.processed_at: datetime.utcnow()},
+                    synchronize_session=False)
+                session.commit()
+        if self.mark_read:
+            super().flush()
+        else:
+            self._handled = []
+        return len(handled)
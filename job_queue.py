@@ -0,0 +1,286 @@
+"""
+Durable SQLite job queue for the LUCID pipeline stages.
+
+Jobs live in lucid_data.db (db.Job). Each pipeline stage has a job type (JOB_TYPES) and
+its own Worker, so a slow stage (e.g. Playwright test requests) never holds up the others,
+and a stage can run as many worker processes as it needs.
+
+- enqueue() adds a job, optionally with a dedupe_key so the same work is never queued twice.
+- lease() claims the oldest due job of a type in one UPDATE statement, so two workers can
+  never claim the same job. A job whose lock_key already has a leased job (of any type) is
+  skipped; a job for a referral is keyed referral:<id>, so no two workers work on the same
+  referral at once. Leases expire, so the jobs of a crashed worker are picked up again.
+- complete() finishes a job; fail() requeues it with exponential backoff until
+  max_attempts, after which it is marked dead. A handler raising RetryLater is requeued
+  without using up an attempt (e.g. a daily limit was reached).
+
+    queue = JobQueue()
+    queue.enqueue('request_test', {'referral_id': 12}, referral_id=12)
+    Worker(queue, 'request_test', handler).run()
+"""
+import json
+import os
+import socket
+import time
+import uuid
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.orm import aliased
+
+from db import Session, Job
+
+logger = logging.getLogger('lucid_jobs')
+
+JOB_TYPES = ('intake', 'request_test', 'download_report', 'import_report', 'render_report', 'deliver')
+
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+# Statuses of a job that is still to be done
+OPEN_STATUSES = ('queued', 'leased')
+
+
+class RetryLater(Exception):
+    """Raised by a handler to requeue its job after `delay` seconds without using an attempt."""
+
+    def __init__(self, delay, reason=''):
+        super().__init__(reason or f"retry in {delay}s")
+        self.delay = delay
+
+
+def backoff_seconds(attempts, base=BACKOFF_BASE_SECONDS, cap=BACKOFF_MAX_SECONDS):
+    """Delay before retry number `attempts` (1-based): base, 2*base, 4*base, ... up to cap."""
+    return min(cap, base * 2 ** max(attempts - 1, 0))
+
+
+def _job_dict(job):
+    return {
+        'id': job.id,
+        'job_type': job.job_type,
+        'payload': json.loads(job.payload) if job.payload else {},
+        'referral_id': job.referral_id,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'lock_key': job.lock_key,
+        'lease_token': job.lease_token,
+    }
+
+
+class JobQueue:
+    """
+    Args:
+        session_factory: SQLAlchemy sessionmaker; defaults to lucid_data.db's Session.
+        clock (callable): Returns the current datetime (for tests).
+    """
+
+    def __init__(self, session_factory=None, clock=datetime.now):
+        self.Session = session_factory or Session
+        self.clock = clock
+
+    def enqueue(self, job_type, payload=None, referral_id=None, dedupe_key=None, delay=0,
+                max_attempts=DEFAULT_MAX_ATTEMPTS, lock_key=None):
+        """
+        Add a job.
+        Args:
+            job_type (str): One of JOB_TYPES.
+            payload (dict): JSON-serialisable arguments for the handler.
+            referral_id (int): Referral the job works on, if any.
+            dedupe_key (str): If an open job of this type has the same key, it is reused.
+            delay (float): Seconds before the job becomes due.
+            lock_key (str): Jobs sharing a key never run at the same time; defaults to
+                referral:<referral_id> for referral jobs.
+        Returns:
+            int: The job ID (the existing one when deduplicated).
+        """
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"Unknown job type: {job_type}")
+        if lock_key is None and referral_id is not None:
+            lock_key = f"referral:{referral_id}"
+        now = self.clock()
+        with self.Session() as session:
+            if dedupe_key is not None:
+                existing = session.execute(
+                    select(Job.id).where(Job.job_type == job_type, Job.dedupe_key == dedupe_key,
+                                         Job.status.in_(OPEN_STATUSES))
+                ).scalar()
+                if existing is not None:
+                    return existing
+            job = Job(job_type=job_type, payload=json.dumps(payload or {}), referral_id=referral_id,
+                      lock_key=lock_key, dedupe_key=dedupe_key, status='queued', attempts=0, max_attempts=max_attempts,
+                      run_at=now + timedelta(seconds=delay), created_at=now, updated_at=now)
+            session.add(job)
+            session.commit()
+            logger.info(f"Queued {job_type} job {job.id} (referral {referral_id}).")
+            return job.id
+
+    def wake(self, job_type, dedupe_key='poll', lock_key=None):
+        """Make the open job with dedupe_key due now (queuing one if there is none)."""
+        now = self.clock()
+        with self.Session() as session:
+            session.execute(
+                update(Job).where(Job.job_type == job_type, Job.dedupe_key == dedupe_key, Job.status == 'queued',
+                                  Job.run_at > now)
+                .values(run_at=now, updated_at=now).execution_options(synchronize_session=False))
+            session.commit()
+        return self.enqueue(job_type, dedupe_key=dedupe_key, max_attempts=1, lock_key=lock_key)
+
+    def lease(self, job_type, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Claim the oldest due job of job_type.
+        Returns:
+            dict: id, job_type, payload, referral_id, attempts, max_attempts, lease_token;
+            None if no job is due.
+        """
+        while True:
+            now = self.clock()
+            token = uuid.uuid4().hex
+            busy = aliased(Job)
+            busy_keys = select(busy.lock_key).where(
+                busy.status == 'leased', busy.lease_expires_at >= now, busy.lock_key.isnot(None))
+            candidate = (
+                select(Job.id)
+                .where(Job.job_type == job_type,
+                       or_(and_(Job.status == 'queued', Job.run_at <= now),
+                           and_(Job.status == 'leased', Job.lease_expires_at < now)),
+                       or_(Job.lock_key.is_(None), Job.lock_key.notin_(busy_keys)))
+                .order_by(Job.run_at, Job.id)
+                .limit(1)
+                .scalar_subquery()
+            )
+            with self.Session() as session:
+                claimed = session.execute(
+                    update(Job).where(Job.id == candidate).values(
+                        status='leased', lease_owner=worker_id, lease_token=token,
+                        lease_expires_at=now + timedelta(seconds=lease_seconds),
+                        attempts=Job.attempts + 1, updated_at=now)
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                session.commit()
+                if not claimed:
+                    return None
+                job = session.execute(select(Job).where(Job.lease_token == token)).scalar_one()
+                if job.attempts <= job.max_attempts:
+                    return _job_dict(job)
+                # Lease expired on the final attempt (worker crashed or hung)
+                job.status = 'dead'
+                job.last_error = job.last_error or 'lease expired on final attempt'
+                job.updated_at = now
+                session.commit()
+                logger.error(f"{job.job_type} job {job.id} is dead after {job.max_attempts} attempts.")
+
+    def _finish(self, job, **values):
+        with self.Session() as session:
+            updated = session.execute(
+                update(Job).where(Job.id == job['id'], Job.lease_token == job['lease_token'], Job.status == 'leased')
+                .values(lease_token=None, lease_owner=None, lease_expires_at=None, updated_at=self.clock(), **values)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            session.commit()
+        if not updated:
+            logger.warning(f"Job {job['id']} lease was lost before it finished; leaving it to its new owner.")
+        return bool(updated)
+
+    def complete(self, job):
+        return self._finish(job, status='done', last_error=None)
+
+    def fail(self, job, error):
+        """Requeue with backoff, or mark dead after max_attempts."""
+        if job['attempts'] >= job['max_attempts']:
+            logger.error(f"{job['job_type']} job {job['id']} failed for the last time: {error}")
+            return self._finish(job, status='dead', last_error=str(error))
+        delay = backoff_seconds(job['attempts'])
+        logger.warning(f"{job['job_type']} job {job['id']} failed (attempt {job['attempts']}), retrying in {delay}s: {error}")
+        return self._finish(job, status='queued', last_error=str(error),
+                            run_at=self.clock() + timedelta(seconds=delay))
+
+    def retry_later(self, job, delay, reason=''):
+        """Requeue without counting this attempt."""
+        return self._finish(job, status='queued', last_error=reason or None, attempts=Job.attempts - 1,
+                            run_at=self.clock() + timedelta(seconds=delay))
+
+    def counts(self):
+        """{job_type: {status: count}} for the dashboard."""
+        from sqlalchemy import func
+        with self.Session() as session:
+            rows = session.execute(
+                select(Job.job_type, Job.status, func.count(Job.id)).group_by(Job.job_type, Job.status)).all()
+        result = {}
+        for job_type, status, count in rows:
+            result.setdefault(job_type, {})[status] = count
+        return result
+
+
+class Worker:
+    """
+    Runs one job type's handler over the queue.
+
+    Args:
+        queue (JobQueue): The queue.
+        job_type (str): Job type this worker takes.
+        handler (callable): handler(payload, job, queue); raise to retry, RetryLater to defer.
+        worker_id (str): Lease owner name; defaults to host:pid:type.
+        lease_seconds (int): How long a job may run before another worker may take it over.
+        poll_interval (float): Seconds to sleep when no job is due.
+        poll_every (float): For polling stages (intake, download_report): keep a 'poll' job
+            queued every this many seconds. None for stages fed by upstream jobs.
+        poll_lock_key (str): lock_key of the poll jobs.
+    """
+
+    def __init__(self, queue, job_type, handler, worker_id=None, lease_seconds=DEFAULT_LEASE_SECONDS,
+                 poll_interval=1.0, poll_every=None, poll_lock_key=None):
+        self.queue = queue
+        self.job_type = job_type
+        self.handler = handler
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{job_type}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.poll_every = poll_every
+        self.poll_lock_key = poll_lock_key
+
+    def run_once(self):
+        """Process one due job. Returns True if a job was leased."""
+        if self.poll_every is not None:
+            # Schedules the next poll once the previous one has finished
+            self.queue.enqueue(self.job_type, dedupe_key='poll', delay=self.poll_every, max_attempts=1,
+                               lock_key=self.poll_lock_key)
+        job = self.queue.lease(self.job_type, self.worker_id, self.lease_seconds)
+        if job is None:
+            return False
+        start = time.perf_counter()
+        try:
+            self.handler(job['payload'], job, self.queue)
+        except RetryLater as e:
+            self.queue.retry_later(job, e.delay, str(e))
+            return True
+        except Exception as e:
+            logger.exception(f"{self.job_type} job {job['id']} raised: {e}")
+            self.queue.fail(job, f"{type(e).__name__}: {e}")
+            return True
+        self.queue.complete(job)
+        logger.info(f"{self.job_type} job {job['id']} done in {time.perf_counter() - start:.2f}s.")
+        return True
+
+    def run(self, stop=None, max_jobs=None):
+        """
+        Work until stop() returns True (or max_jobs jobs were processed).
+        Args:
+            stop (callable): Checked between jobs.
+            max_jobs (int): Stop after this many jobs.
+        """
+        logger.info(f"Worker {self.worker_id} started.")
+        if self.poll_every is not None:
+            self.queue.enqueue(self.job_type, dedupe_key='poll', max_attempts=1, lock_key=self.poll_lock_key)
+        processed = 0
+        while not (stop and stop()) and (max_jobs is None or processed < max_jobs):
+            try:
+                if self.run_once():
+                    processed += 1
+                    continue
+            except Exception as e:
+                logger.exception(f"Worker {self.worker_id} error: {e}")
+            time.sleep(self.poll_interval)
+        logger.info(f"Worker {self.worker_id} stopped after {processed} job(s).")
+        return processed
@@ -0,0 +1,289 @@
+"""
+Versioned schema migrations for the SQLite databases.
+
+The schema version of each database file is kept in PRAGMA user_version. A migration
+is a (version, description, upgrade) tuple where upgrade(conn) receives a raw sqlite3
+connection; apply_migrations runs every migration newer than the file's version, in
+order, bumping user_version after each one.
+
+- lucid_data.db: db.py applies its SCHEMA_MIGRATIONS at import time. Its indexes are
+  declared on the models, so the migration just creates any declared index an older
+  database file is missing.
+- cognitive_analysis.db: the analytics database has no models, so its indexes are
+  listed here as SQL.
+
+check_query_plans runs EXPLAIN QUERY PLAN over the hot lookup queries and reports
+whether each one is served by an index rather than a full table scan:
+
+    python migrations.py [path/to/cognitive_analysis.db] [--check]
+"""
+import logging
+import sys
+
+from sqlite_profile import connect
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_DB_PATH = 'report_refactor/cognitive_analysis.db'
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn, migrations):
+    """
+    Apply every migration newer than the database's user_version.
+
+    Args:
+        conn: sqlite3 connection (writable).
+        migrations (list): (version, description, upgrade) tuples, versions ascending.
+    Returns:
+        list: versions applied, empty if the database was already current.
+    """
+    current = get_schema_version(conn)
+    applied = []
+    for version, description, upgrade in migrations:
+        if version <= current:
+            continue
+        logger.info(f"Applying schema migration {version}: {description}")
+        upgrade(conn)
+        conn.execute(f"PRAGMA user_version = {int(version)}")
+        conn.commit()
+        applied.append(version)
+    return applied
+
+
+def _existing_tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def _index_creator(indexes):
+    """Build an upgrade step creating (name, table, columns) indexes on the tables that exist."""
+    def upgrade(conn):
+        tables = _existing_tables(conn)
+        for name, table, columns in indexes:
+            if table not in tables:
+                logger.debug(f"Skipping index {name}: table {table} does not exist")
+                continue
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+    return upgrade
+
+
+# --- cognitive_analysis.db ---
+
+ANALYSIS_INDEXES = [
+    ('ix_cognitive_scores_patient_domain', 'cognitive_scores', ['patient_id', 'domain']),
+    ('ix_subtest_results_patient_subtest_metric', 'subtest_results', ['patient_id', 'subtest_name', 'metric']),
+    ('ix_asrs_responses_patient_question', 'asrs_responses', ['patient_id', 'question_number']),
+    ('ix_dass21_scores_patient', 'dass21_scores', ['patient_id']),
+    ('ix_dass21_responses_patient', 'dass21_responses', ['patient_id']),
+    ('ix_epworth_scores_patient', 'epworth_scores', ['patient_id']),
+    ('ix_npq_scores_patient_domain', 'npq_scores', ['patient_id', 'domain']),
+    ('ix_npq_questions_patient_domain', 'npq_questions', ['patient_id', 'domain']),
+    ('ix_dsm_criteria_met_patient', 'dsm_criteria_met', ['patient_id']),
+    ('ix_test_log_patient', 'test_log', ['patient_id']),
+]
+
+POPULATION_STATS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS population_patients (
+        patient_id TEXT PRIMARY KEY,
+        refreshed_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS population_scores (
+        test_key TEXT NOT NULL,
+        patient_id TEXT NOT NULL,
+        speed_score REAL,
+        error_score REAL,
+        PRIMARY KEY (test_key, patient_id)
+    );
+    CREATE TABLE IF NOT EXISTS population_stats (
+        test_key TEXT PRIMARY KEY,
+        stats_version INTEGER NOT NULL,
+        n INTEGER,
+        speed_median REAL,
+        error_median REAL,
+        speed_min REAL,
+        speed_max REAL,
+        error_min REAL,
+        error_max REAL,
+        regression TEXT,
+        density TEXT,
+        refreshed_at TEXT
+    );
+"""
+
+def _create_population_stats_tables(conn):
+    conn.executescript(POPULATION_STATS_SCHEMA)
+
+# Per-patient report tables, as the renderer (report_refactor/data_access.py) reads them
+ANALYSIS_REPORT_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS patients (
+        patient_id INTEGER PRIMARY KEY,
+        test_date TEXT,
+        age INTEGER,
+        language TEXT
+    );
+    CREATE TABLE IF NOT EXISTS cognitive_scores (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id INTEGER,
+        domain TEXT,
+        patient_score TEXT,
+        standard_score INTEGER,
+        percentile INTEGER,
+        validity_index TEXT
+    );
+    CREATE TABLE IF NOT EXISTS subtest_results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id INTEGER,
+        subtest_name TEXT,
+        metric TEXT,
+        score REAL,
+        standard_score INTEGER,
+        percentile INTEGER,
+        validity_flag TEXT
+    );
+    CREATE TABLE IF NOT EXISTS asrs_responses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id INTEGER,
+        question_number INTEGER,
+        part TEXT,
+        response TEXT
+    );
+    CREATE TABLE IF NOT EXISTS dass21_scores (
+        patient_id INTEGER,
+        question_number INTEGER,
+        response_score INTEGER,
+        response_text TEXT,
+        depression INTEGER,
+        anxiety INTEGER,
+        stress INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS dass21_responses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id INTEGER,
+        question_number INTEGER,
+        response_score INTEGER,
+        response_text TEXT
+    );
+    CREATE TABLE IF NOT EXISTS epworth_scores (
+        patient_id INTEGER,
+        question_number INTEGER,
+        situation TEXT,
+        score INTEGER,
+        description TEXT
+    );
+    CREATE TABLE IF NOT EXISTS epworth_total (
+        patient_id INTEGER PRIMARY KEY,
+        total_score INTEGER,
+        interpretation TEXT
+    );
+    CREATE TABLE IF NOT EXISTS npq_scores (
+        patient_id INTEGER,
+        domain TEXT,
+        score INTEGER,
+        severity TEXT,
+        description TEXT
+    );
+    CREATE TABLE IF NOT EXISTS npq_questions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id INTEGER,
+        domain TEXT,
+        question_number INTEGER,
+        question_text TEXT,
+        score INTEGER,
+        severity TEXT
+    );
+    CREATE TABLE IF NOT EXISTS asrs_dsm_diagnosis (
+        patient_id TEXT PRIMARY KEY,
+        inattentive_criteria_met INTEGER,
+        hyperactive_criteria_met INTEGER,
+        diagnosis TEXT
+    );
+    CREATE TABLE IF NOT EXISTS dsm_criteria_met (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id TEXT,
+        dsm_criterion TEXT,
+        dsm_category TEXT,
+        is_met INTEGER
+    );
+"""
+
+def create_analysis_tables(conn):
+    """Create any missing report table of cognitive_analysis.db, with its lookup indexes."""
+    conn.executescript(ANALYSIS_REPORT_SCHEMA)
+    _index_creator(ANALYSIS_INDEXES)(conn)
+
+ANALYSIS_MIGRATIONS = [
+    (1, 'patient_id lookup indexes', _index_creator(ANALYSIS_INDEXES)),
+    (2, 'population statistics store for speed-accuracy charts', _create_population_stats_tables),
+]
+
+# Hot per-patient queries issued by data_access and report_generator
+ANALYSIS_HOT_QUERIES = {
+    'cognitive_scores by patient': "SELECT * FROM cognitive_scores WHERE patient_id = ?",
+    'subtest_results by patient': "SELECT * FROM subtest_results WHERE patient_id = ?",
+    'subtest metric lookup': "SELECT score FROM subtest_results WHERE patient_id = ? AND subtest_name LIKE ? AND metric LIKE ?",
+    'asrs_responses by patient': "SELECT * FROM asrs_responses WHERE patient_id = ?",
+    'dass21_scores by patient': "SELECT * FROM dass21_scores WHERE patient_id = ?",
+    'dass21_responses by patient': "SELECT * FROM dass21_responses WHERE patient_id = ?",
+    'epworth_scores by patient': "SELECT * FROM epworth_scores WHERE patient_id = ?",
+    'npq_scores by patient': "SELECT * FROM npq_scores WHERE patient_id = ?",
+    'npq_questions by patient': "SELECT * FROM npq_questions WHERE patient_id = ?",
+    'dsm_criteria_met by patient': "SELECT * FROM dsm_criteria_met WHERE patient_id = ?",
+}
+
+
+def migrate_analysis_db(db_path=ANALYSIS_DB_PATH):
+    """Bring cognitive_analysis.db up to the latest schema version."""
+    conn = connect(db_path)
+    try:
+        return apply_migrations(conn, ANALYSIS_MIGRATIONS)
+    finally:
+        conn.close()
+
+
+# --- Query plan check ---
+
+def check_query_plans(conn, queries):
+    """
+    Run EXPLAIN QUERY PLAN for each query.
+
+    Args:
+        conn: sqlite3 connection.
+        queries (dict): name -> SQL with ? placeholders.
+    Returns:
+        dict: name -> (uses_index, plan text). Queries on missing tables are left out.
+    """
+    tables = _existing_tables(conn)
+    results = {}
+    for name, sql in queries.items():
+        table = sql.split(' FROM ', 1)[1].split()[0]
+        if table not in tables:
+            continue
+        params = (None,) * sql.count('?')
+        plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        uses_index = all('USING' in step and 'INDEX' in step for step in plan if step.startswith(('SCAN', 'SEARCH')))
+        results[name] = (uses_index, '; '.join(plan))
+    return results
+
+
+def main(argv):
+    db_path = next((arg for arg in argv if not arg.startswith('--')), ANALYSIS_DB_PATH)
+    applied = migrate_analysis_db(db_path)
+    print(f"{db_path}: applied migrations {applied}" if applied else f"{db_path}: schema already current")
+    if '--check' in argv:
+        conn = connect(db_path, read_only=True)
+        try:
+            results = check_query_plans(conn, ANALYSIS_HOT_QUERIES)
+        finally:
+            conn.close()
+        for name, (uses_index, plan) in results.items():
+            print(f"{'✅' if uses_index else '❌'} {name}: {plan}")
+        return 0 if all(uses_index for uses_index, _ in results.values()) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main(sys.argv[1:]))
@@ -15,6 +15,11 @@ LUCID Orchestrator Script (Polling Model)
 #   ORCH_STAGE_REMINDERS=0        # Disable Reminders: Nagging for Incomplete Tests
 #   ORCH_STAGE_RESEND_LINKS=0     # Disable Resend Link Requests
 # All are enabled by default (set to 1 or unset)
+#
+# ORCH_TEST_REQUEST_CONCURRENCY=3  # Patients whose CNS VS test requests run at once
+# LUCID_JOB_WORKERS=1              # Intake, test requests, report monitoring, processing and
+#                                  # delivery run as pipeline_jobs.py workers; the cycle then
+#                                  # runs only reminders and resend links
 """
 import logging
 import sys
@@ -23,6 +28,8 @@ from datetime import datetime, timedelta
 
 # Import necessary DB components
 from db import Session, Referral, save_referral
+from referral_status import (RECEIVED, TEST_REQUESTED, OPEN_TEST_STATUSES, transition, next_batch,
+                             mark_test_completed)
 
 # TODO: Import other modules as needed
 # from email_receiver import ... # Moved import inside function to avoid circular dependency if email_receiver imports orchestrator components later
@@ -35,6 +42,10 @@ def is_stage_enabled(env_var, default=True):
         return default
     return val.strip() not in ('0', 'false', 'False', '')
 
+def job_workers_enabled():
+    """True when the pipeline_jobs.py workers own the queued stages (LUCID_JOB_WORKERS=1)."""
+    return is_stage_enabled('LUCID_JOB_WORKERS', default=False)
+
 # Logging setup
 log_path = os.path.join(os.path.dirname(__file__), '..', 'lucid_orchestrator.log')
 logger = logging.getLogger('lucid_orchestrator')
@@ -50,20 +61,30 @@ console_handler.setFormatter(formatter)
 logger.addHandler(console_handler)
 logger.info('Orchestrator started.')
 
+# Safety limits on CNS VS test requests (see enforce_safety_limits)
+MAX_REQUESTS_PER_PATIENT_PER_DAY = 1
+MAX_TOTAL_REQUESTS_PER_DAY = 20
+DEFAULT_TEST_REQUEST_CONCURRENCY = 3
+
 # --- Pipeline Stage Functions ---
-def process_new_referrals():
-    """Intake: Detect new referrals via email, validate, and save to DB."""
+def process_new_referrals(scan=None):
+    """
+    Intake: Detect new referrals via email, validate, and save to DB.
+    Returns:
+        list of int: IDs of the referrals saved.
+    """
     logger.info("[STAGE] Processing new referrals...")
     saved_count = 0
+    saved_ids = []
     try:
         # Import the function that now returns data
         from email_receiver import list_unread_emails_gmail_api
         # Get the list of potential referrals
-        potential_referrals = list_unread_emails_gmail_api(max_results=10) # Fetch data
+        potential_referrals = list_unread_emails_gmail_api(max_results=10, scan=scan) # Fetch data
         logger.info(f"Fetched {len(potential_referrals)} potential referral email(s).")
 
         if not potential_referrals:
-            return
+            return saved_ids
 
         # Process each potential referral
         # Use a single session for this batch to be efficient
@@ -97,7 +118,7 @@ def process_new_referrals():
                 # If validation passes, save the referral
                 try:
                     # Call the save function from db module
-                    save_referral(
+                    referral_id = save_referral(
                         parsed=parsed,
                         subject=subject,
                         body=body,
@@ -109,6 +130,7 @@ def process_new_referrals():
                         # referral_confirmed_time=data.get('referral_confirmed_time')
                     )
                     saved_count += 1
+                    saved_ids.append(referral_id)
                     logger.info(f"Successfully saved referral for patient email: {patient_email}")
                 except Exception as db_err:
                     # Log error but continue processing other referrals
@@ -120,54 +142,235 @@ def process_new_referrals():
     except Exception as e:
         # Catch errors during email fetching or general processing
         logger.exception(f"Error in 'process_new_referrals' stage: {e}")
+    return saved_ids
+
+
+def _day_bounds(now=None):
+    today = (now or datetime.now()).date()
+    start = datetime.combine(today, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+def _requested_today(now=None, referral=Referral):
+    """
+    Filter for referrals whose test was requested or whose link was resent today (ranges on the
+    indexed test_request_time and test_resent_time), so resends count toward the daily limits.
+    A resend needs a request at least 7 days old, so no referral matches both ranges.
+    """
+    from sqlalchemy import and_, or_
+    start, end = _day_bounds(now)
+    return or_(and_(referral.test_request_time >= start, referral.test_request_time < end),
+               and_(referral.test_resent_time >= start, referral.test_resent_time < end))
+
+def select_requestable_referrals(session, now=None):
+    """
+    Pending referrals that can be requested now without breaking the daily limits
+    enforced by enforce_safety_limits.
+    Args:
+        session: SQLAlchemy session.
+        now (datetime, optional): Defaults to datetime.now().
+    Returns:
+        list of Referral: At most the remaining global budget for today, and at most
+        MAX_REQUESTS_PER_PATIENT_PER_DAY per id_number including today's earlier requests.
+    """
+    from sqlalchemy import func
+    requested_today = _requested_today(now)
+    total_today = session.query(func.count(Referral.id)).filter(requested_today).scalar() or 0
+    budget = MAX_TOTAL_REQUESTS_PER_DAY - total_today
+    if budget <= 0:
+        logger.warning(f"Daily test request limit reached ({total_today}/{MAX_TOTAL_REQUESTS_PER_DAY}); no requests this cycle.")
+        return []
+    per_patient = dict(
+        session.query(Referral.id_number, func.count(Referral.id))
+        .filter(requested_today)
+        .group_by(Referral.id_number)
+        .all()
+    )
+    selected = []
+    # Oldest received referrals first, read in pages rather than loading the whole history
+    for referral in next_batch(session, RECEIVED).yield_per(100):
+        key = referral.id_number
+        if per_patient.get(key, 0) >= MAX_REQUESTS_PER_PATIENT_PER_DAY:
+            logger.info(f"Patient {key} already at daily request limit; deferring.")
+            continue
+        per_patient[key] = per_patient.get(key, 0) + 1
+        selected.append(referral)
+        if len(selected) >= budget:
+            break
+    return selected
+
+def within_daily_limits(session, referral, now=None):
+    """True if one more test request for this referral stays within today's limits."""
+    from sqlalchemy import func
+    requested_today = _requested_today(now)
+    total_today = session.query(func.count(Referral.id)).filter(requested_today).scalar() or 0
+    if total_today >= MAX_TOTAL_REQUESTS_PER_DAY:
+        return False
+    patient_today = session.query(func.count(Referral.id)).filter(
+        requested_today, Referral.id_number == referral.id_number).scalar() or 0
+    return patient_today < MAX_REQUESTS_PER_PATIENT_PER_DAY
+
+def reserve_test_request(referral_id, now=None):
+    """
+    Claim one of today's test requests for a received referral before its browser starts.
+
+    One conditional UPDATE stamps the referral's test_request_time only while today's counts
+    are below MAX_TOTAL_REQUESTS_PER_DAY and MAX_REQUESTS_PER_PATIENT_PER_DAY. SQLite runs the
+    statement under its write lock, so concurrent request_test workers can never both pass
+    the limits, and the claim counts toward them at once. The referral stays received until
+    the request succeeds; release_test_request() gives the claim back if it fails.
+    Returns:
+        bool: True if claimed; False if today's limits are reached or the referral is no
+        longer received (or was already claimed today).
+    """
+    from sqlalchemy import update, select, func, or_
+    from sqlalchemy.orm import aliased
+    now = now or datetime.now()
+    start, end = _day_bounds(now)
+    with Session() as session:
+        referral = session.get(Referral, referral_id)
+        if referral is None or referral.status != RECEIVED:
+            return False
+        requested = aliased(Referral)
+        today = _requested_today(now, requested)
+        total_today = select(func.count(requested.id)).where(today).scalar_subquery()
+        patient_today = select(func.count(requested.id)).where(
+            today, requested.id_number == referral.id_number).scalar_subquery()
+        claimed = session.execute(
+            update(Referral).where(
+                Referral.id == referral_id,
+                Referral.status == RECEIVED,
+                or_(Referral.test_request_time.is_(None), Referral.test_request_time < start),
+                total_today < MAX_TOTAL_REQUESTS_PER_DAY,
+                patient_today < MAX_REQUESTS_PER_PATIENT_PER_DAY)
+            .values(test_request_time=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        session.commit()
+    return bool(claimed)
 
+def release_test_request(referral_id):
+    """Give back a reserve_test_request() claim whose request failed (the referral is still received)."""
+    from sqlalchemy import update
+    with Session() as session:
+        session.execute(
+            update(Referral).where(Referral.id == referral_id, Referral.status == RECEIVED)
+            .values(test_request_time=None)
+            .execution_options(synchronize_session=False))
+        session.commit()
 
-def request_tests_for_pending_patients(headless=True):
-    """Trigger Playwright automation for pending test requests."""
+def request_test_for_referral(referral_id, headless=True):
+    """
+    Request the CNS VS test for one referral (job queue request_test stage).
+    Today's request is reserved with reserve_test_request() before the browser starts.
+    Returns:
+        bool: True if requested (or already requested), False if the request failed.
+        None if today's safety limits do not allow it yet.
+    """
+    import asyncio
+    with Session() as session:
+        referral = session.get(Referral, referral_id)
+        if referral is None or referral.status != RECEIVED:
+            return True
+        patient = {
+            'referral_id': referral.id,
+            'subject': referral.id_number or str(referral.id),
+            'dob_year': str(referral.dob).split("-")[0] if referral.dob else "2000",
+            'email': referral.email,
+        }
+    if not reserve_test_request(referral_id):
+        return None
+    return asyncio.run(_request_tests_async([patient], headless, 1))[0]
+
+def request_tests_for_pending_patients(headless=True, concurrency=None):
+    """
+    Trigger Playwright automation for pending test requests.
+
+    Requests run concurrently (ORCH_TEST_REQUEST_CONCURRENCY patients at a time) on one
+    browser and one CNS VS login, each patient keeping its own stealth pacing. Only
+    referrals within today's safety limits are requested.
+    """
     logger.info("[STAGE] Requesting tests for pending patients...")
-    from db import Session, Referral
-    from datetime import datetime
-    from playwright.sync_api import sync_playwright
+    import asyncio
+    if concurrency is None:
+        concurrency = int(os.environ.get('ORCH_TEST_REQUEST_CONCURRENCY', DEFAULT_TEST_REQUEST_CONCURRENCY))
     try:
         with Session() as session:
-            pending_patients = session.query(Referral).filter(
-                Referral.test_request_time == None
-            ).all()
+            pending_patients = select_requestable_referrals(session)
             logger.info(f"Found {len(pending_patients)} patient(s) needing test requests.")
             if not pending_patients:
                 return
-            with sync_playwright() as playwright:
-                for patient in pending_patients:
-                    try:
-                        logger.info(f"Requesting test for patient: {patient.id_number}, email: {patient.email}, dob: {patient.dob}")
-                        # Extract year from dob (fallback to '2000' if missing)
-                        dob_year = str(patient.dob).split("-")[0] if patient.dob else "2000"
-                        from request_cns_test import request_cns_remote_test
-                        request_cns_remote_test(
-                            playwright,
-                            subject=patient.id_number or str(patient.id),
-                            dob_year=dob_year,
-                            email=patient.email,
-                            headless=headless
-                        )
-                        patient.test_request_time = datetime.now()
-                        session.commit()
-                        logger.info(f"Test requested for patient {patient.id_number}.")
-                    except Exception as e:
-                        logger.exception(f"Error requesting test for patient {patient.id_number}: {e}")
+            patients = [
+                {
+                    'referral_id': patient.id,
+                    'subject': patient.id_number or str(patient.id),
+                    # Extract year from dob (fallback to '2000' if missing)
+                    'dob_year': str(patient.dob).split("-")[0] if patient.dob else "2000",
+                    'email': patient.email,
+                }
+                for patient in pending_patients
+            ]
+        # Each request is reserved against today's limits before the browser starts
+        patients = [patient for patient in patients if reserve_test_request(patient['referral_id'])]
+        if not patients:
+            return
+        results = asyncio.run(_request_tests_async(patients, headless, concurrency))
+        logger.info(f"Requested {sum(results)} of {len(patients)} test(s) with concurrency {concurrency}.")
     except Exception as e:
         logger.exception(f"Error in test request stage: {e}")
 
-def process_new_reports():
+async def _request_tests_async(patients, headless, concurrency):
+    from playwright.async_api import async_playwright
+    from request_cns_test import request_tests_concurrently, async_stealth_delay
+    from cnsvs_session import AsyncCnsvsSessionPool
+
+    unrecorded = {patient['referral_id'] for patient in patients}
+
+    def record_result(patient, requested):
+        unrecorded.discard(patient['referral_id'])
+        if not requested:
+            release_test_request(patient['referral_id'])
+            logger.warning(f"Test request failed for patient {patient['subject']}; will retry next cycle.")
+            return
+        try:
+            with Session() as session:
+                referral = session.get(Referral, patient['referral_id'])
+                transition(referral, TEST_REQUESTED)
+                session.commit()
+            logger.info(f"Test requested for patient {patient['subject']}.")
+        except Exception as e:
+            logger.exception(f"Error recording test request for patient {patient['subject']}: {e}")
+
+    try:
+        async with async_playwright() as playwright:
+            async with AsyncCnsvsSessionPool(playwright, headless=headless, max_pages=concurrency,
+                                             pace=async_stealth_delay) as pool:
+                cnsvs = await pool.session()
+                return await request_tests_concurrently(cnsvs, patients, concurrency, on_result=record_result)
+    finally:
+        # The browser or login failed before these patients were tried
+        for referral_id in unrecorded:
+            release_test_request(referral_id)
+
+def process_new_reports(scan=None):
     """Monitor for and process new report notification emails."""
     logger.info("[STAGE] Monitoring for new CNS VS report notifications...")
     try:
         from cns_vs_report_monitor import monitor_cns_vs_notifications
-        matched = monitor_cns_vs_notifications(max_results=10)
+        matched = monitor_cns_vs_notifications(max_results=10, scan=scan, on_report=record_test_completed)
         logger.info(f"Processed {len(matched)} CNS VS report notification(s).")
     except Exception as e:
         logger.exception(f"Error processing new CNS VS reports: {e}")
 
+def record_test_completed(report_path, patient_id):
+    """on_report callback: the patient's requested test is complete once their report is stored."""
+    try:
+        with Session() as session:
+            if mark_test_completed(session, patient_id):
+                session.commit()
+                logger.info(f"Test completed for patient {patient_id} ({report_path}).")
+    except Exception as e:
+        logger.exception(f"Error recording completed test for patient {patient_id}: {e}")
+
 def reformat_and_save_reports():
     """Reformat downloaded reports and save to DB (template)."""
     logger.info("[STAGE] Reformatting and saving reports (TEMPLATE ONLY)...")
@@ -186,120 +389,106 @@ def send_reports_to_referrers():
     # Example logic:
     # from db import Session, Referral
     # with Session() as session:
-    #     reports_to_send = session.query(Referral).filter(
-    #         Referral.report_processed == True,
-    #         Referral.report_sent_date == None
-    #     ).all()
-    #     for referral in reports_to_send:
+    #     for referral in next_batch(session, REPORT_PROCESSED, limit=50):
     #         # send_email_with_attachment(referral.referrer_email, ...)
-    #         referral.report_sent_date = datetime.now()
+    #         transition(referral, REPORT_SENT)
     #         session.commit()
     #         logger.info(f"Report sent to {referral.referrer_email}")
     logger.info("[TEMPLATE] Report delivery logic will be implemented after report formatting is finalized.")
     pass
 
 def send_reminders():
-    """Send reminders for incomplete tests with escalating urgency and expiry notifications."""
+    """Send the reminders that are due for incomplete tests (scheduled when each test is requested)."""
     logger.info("[STAGE] Sending reminders for incomplete tests...")
-    from db import Session, Referral
-    from datetime import datetime, timedelta
-    # Reminder schedule in days/hours
-    REMINDER_STEPS = [
-        (7, "Must complete test within 7 days. Please use your link to begin your cognitive assessment."),
-        (3, "Reminder: You have 3 days left to complete your cognitive assessment. Please use your link."),
-        (1, "Urgent: You have 1 day left to complete your cognitive assessment. Please use your link."),
-        (0.5, "Final reminder: You have 12 hours left to complete your cognitive assessment. Please use your link."),
-        (1/24, "Final reminder: You have 1 hour left to complete your cognitive assessment. Please use your link."),
-        (0, "Your test link has expired. Please contact your referrer if you still wish to complete the assessment.")
-    ]
+    from reminders import send_due_reminders
     try:
-        with Session() as session:
-            now = datetime.now()
-            referrals = session.query(Referral).filter(
-                Referral.test_request_time != None,
-                Referral.test_completed == False
-            ).all()
-            logger.info(f"Found {len(referrals)} patient(s) with pending tests for reminders.")
-            for patient in referrals:
-                if not patient.test_request_time:
-                    continue
-                delta = (now - patient.test_request_time).total_seconds() / 86400  # days since request
-                reminder_text = None
-                for days, text in REMINDER_STEPS:
-                    if delta >= days:
-                        reminder_text = text
-                        break
-                if reminder_text:
-                    # Placeholder for actual email/SMS logic
-                    logger.info(f"Would send reminder to {patient.email} (test requested {patient.test_request_time}): {reminder_text}")
-                    # TODO: Integrate with actual reminder sending function (email/SMS)
+        sent = send_due_reminders()
+        logger.info(f"Sent {sent} due reminder(s).")
     except Exception as e:
         logger.exception(f"Error in reminder stage: {e}")
 
-def enforce_safety_limits():
-    """Enforce safety limits on requests per day, per patient."""
+def enforce_safety_limits(now=None):
+    """
+    Check today's test requests against the safety limits.
+
+    One GROUP BY ... HAVING query finds patients over their daily limit and one COUNT the
+    global total, both over today's requests and resends (see _requested_today), so the cost
+    depends on today's requests rather than on the referral history.
+    Returns:
+        dict: total (int), over_patient_limit ({id_number: count}) and
+        total_limit_reached (bool, True when no further request may be made today).
+    """
     logger.info("[STAGE] Enforcing safety limits...")
-    from db import Session, Referral
-    from datetime import datetime, timedelta
-    # Example limits (configurable)
-    MAX_REQUESTS_PER_PATIENT_PER_DAY = 1
-    MAX_TOTAL_REQUESTS_PER_DAY = 20
+    from sqlalchemy import func
+    result = {'total': 0, 'over_patient_limit': {}, 'total_limit_reached': False}
     try:
         with Session() as session:
-            today = datetime.now().date()
-            # Check per-patient limit
-            patients = session.query(Referral.id_number).distinct().all()
-            for (id_number,) in patients:
-                count = session.query(Referral).filter(
-                    Referral.id_number == id_number,
-                    Referral.test_request_time != None,
-                    Referral.test_request_time >= datetime.combine(today, datetime.min.time()),
-                    Referral.test_request_time < datetime.combine(today + timedelta(days=1), datetime.min.time())
-                ).count()
-                if count > MAX_REQUESTS_PER_PATIENT_PER_DAY:
-                    logger.warning(f"Patient {id_number} exceeded daily request limit: {count}")
-            # Check global daily limit
-            total_today = session.query(Referral).filter(
-                Referral.test_request_time != None,
-                Referral.test_request_time >= datetime.combine(today, datetime.min.time()),
-                Referral.test_request_time < datetime.combine(today + timedelta(days=1), datetime.min.time())
-            ).count()
-            if total_today > MAX_TOTAL_REQUESTS_PER_DAY:
-                logger.warning(f"Total requests today exceeded daily limit: {total_today}")
+            requested_today = _requested_today(now)
+            count = func.count(Referral.id)
+            result['over_patient_limit'] = dict(
+                session.query(Referral.id_number, count)
+                .filter(requested_today)
+                .group_by(Referral.id_number)
+                .having(count > MAX_REQUESTS_PER_PATIENT_PER_DAY)
+                .all()
+            )
+            result['total'] = session.query(count).filter(requested_today).scalar() or 0
+        for id_number, patient_count in result['over_patient_limit'].items():
+            logger.warning(f"Patient {id_number} exceeded daily request limit: {patient_count}")
+        if result['total'] > MAX_TOTAL_REQUESTS_PER_DAY:
+            logger.warning(f"Total requests today exceeded daily limit: {result['total']}")
+        result['total_limit_reached'] = result['total'] >= MAX_TOTAL_REQUESTS_PER_DAY
     except Exception as e:
         logger.exception(f"Error in safety limits enforcement: {e}")
+    return result
 
-def process_resend_link_requests():
-    """Detects and processes 'resend link' requests for expired test links."""
+def process_resend_link_requests(scan=None):
+    """
+    Detects and processes 'resend link' requests for expired test links.
+    Every resend of the cycle goes through one CnsvsSessionPool, opened on the first eligible request.
+    """
     logger.info("[STAGE] Processing resend test link requests...")
+    from contextlib import ExitStack
     from db import Session, Referral
     from datetime import datetime, timedelta
     try:
         # TODO: Replace with actual email parsing logic for 'resend link' requests
         from email_receiver import list_resend_link_requests
-        resend_requests = list_resend_link_requests(max_results=10)
-        with Session() as session:
+        resend_requests = list_resend_link_requests(max_results=10, scan=scan)
+        with Session() as session, ExitStack() as browser:
+            playwright = cnsvs = None
             for req in resend_requests:
                 # req should contain a patient identifier (email or id_number)
                 patient = session.query(Referral).filter(
                     (Referral.email == req['email']) | (Referral.id_number == req['id_number']),
-                    Referral.test_completed == False
+                    Referral.status.in_(OPEN_TEST_STATUSES)
                 ).first()
                 if not patient:
                     logger.info(f"No matching patient found for resend request: {req}")
                     continue
-                if patient.test_request_time and (datetime.now() - patient.test_request_time).days >= 7:
+                if patient.status == TEST_REQUESTED and (datetime.now() - patient.test_request_time).days >= 7:
+                    if not within_daily_limits(session, patient):
+                        logger.info(f"Daily request limit reached; resend for patient {patient.id_number} deferred.")
+                        continue
                     # Trigger new test order
-                    from request_cns_test import request_cns_remote_test
-                    request_cns_remote_test(
-                        None,  # playwright instance if needed
+                    from request_cns_test import request_cns_remote_test, stealth_delay
+                    if cnsvs is None:
+                        from playwright.sync_api import sync_playwright
+                        from cnsvs_session import CnsvsSessionPool
+                        playwright = browser.enter_context(sync_playwright())
+                        pool = browser.enter_context(CnsvsSessionPool(playwright, headless=True, pace=stealth_delay))
+                        cnsvs = pool.session()
+                    requested = request_cns_remote_test(
+                        playwright,
                         subject=patient.id_number or str(patient.id),
                         dob_year=str(patient.dob).split("-")[0] if patient.dob else "2000",
                         email=patient.email,
-                        headless=True
+                        session=cnsvs
                     )
-                    patient.test_resent = True
-                    patient.test_resent_time = datetime.now()
+                    if not requested:
+                        logger.warning(f"Test resend failed for patient {patient.id_number}; not recorded as resent.")
+                        continue
+                    transition(patient, TEST_REQUESTED)  # Resend: records test_resent/test_resent_time
                     session.commit()
                     logger.info(f"Test resent for patient {patient.id_number} at {patient.test_resent_time}")
                 else:
@@ -307,40 +496,59 @@ def process_resend_link_requests():
     except Exception as e:
         logger.exception(f"Error processing resend link requests: {e}")
 
+def run_pipeline_stages(scan):
+    """The stages that pipeline_jobs.py workers take over when LUCID_JOB_WORKERS=1."""
+    if is_stage_enabled('ORCH_STAGE_INTAKE'):
+        process_new_referrals(scan)
+    else:
+        logger.info('[SKIP] Intake: Process New Referrals')
+    # Checked before any browser is started; the request stage also skips patients at their limit
+    limits = enforce_safety_limits()
+    if not is_stage_enabled('ORCH_STAGE_TEST_REQUEST'):
+        logger.info('[SKIP] Test Request: Initiate CNS Test')
+    elif limits['total_limit_reached']:
+        logger.warning('[SKIP] Test Request: daily request limit reached')
+    else:
+        request_tests_for_pending_patients()
+    if is_stage_enabled('ORCH_STAGE_REPORT_MONITOR'):
+        process_new_reports(scan)
+    else:
+        logger.info('[SKIP] Report Monitoring: Detect Test Completion')
+    if is_stage_enabled('ORCH_STAGE_REPORT_PROCESS'):
+        reformat_and_save_reports()
+    else:
+        logger.info('[SKIP] Report Processing: Reformat and Save')
+    if is_stage_enabled('ORCH_STAGE_REPORT_DELIVERY'):
+        send_reports_to_referrers()
+    else:
+        logger.info('[SKIP] Report Delivery: Email to Referrer')
+
 def main():
     logger.info("--- LUCID Orchestration Cycle Start ---")
+    # One incremental Gmail sync per cycle, shared by intake, report monitor and resend links;
+    # nothing is fetched unless an email stage reads it
+    from gmail_sync import GmailSync
+    scan = GmailSync()
     try:
-        if is_stage_enabled('ORCH_STAGE_INTAKE'):
-            process_new_referrals()
-        else:
-            logger.info('[SKIP] Intake: Process New Referrals')
-        if is_stage_enabled('ORCH_STAGE_TEST_REQUEST'):
-            request_tests_for_pending_patients()
-        else:
-            logger.info('[SKIP] Test Request: Initiate CNS Test')
-        if is_stage_enabled('ORCH_STAGE_REPORT_MONITOR'):
-            process_new_reports()
-        else:
-            logger.info('[SKIP] Report Monitoring: Detect Test Completion')
-        if is_stage_enabled('ORCH_STAGE_REPORT_PROCESS'):
-            reformat_and_save_reports()
-        else:
-            logger.info('[SKIP] Report Processing: Reformat and Save')
-        if is_stage_enabled('ORCH_STAGE_REPORT_DELIVERY'):
-            send_reports_to_referrers()
+        if job_workers_enabled():
+            # Running these here as well would let the cycle and a worker pick the same
+            # referral outside the job queue's referral locks
+            logger.info('[SKIP] Intake, Test Request, Report Monitoring, Processing and Delivery: run by pipeline_jobs workers')
         else:
-            logger.info('[SKIP] Report Delivery: Email to Referrer')
+            run_pipeline_stages(scan)
         if is_stage_enabled('ORCH_STAGE_REMINDERS'):
             send_reminders()
         else:
             logger.info('[SKIP] Reminders: Nagging for Incomplete Tests')
         if is_stage_enabled('ORCH_STAGE_RESEND_LINKS'):
-            process_resend_link_requests()
+            process_resend_link_requests(scan)
         else:
             logger.info('[SKIP] Resend Link Requests')
-        enforce_safety_limits()  # Always enforce safety limits
+        enforce_safety_limits()  # Always enforce safety limits (logs any breach from this cycle)
     except Exception as e:
         logger.exception(f"Orchestration error: {e}")
+    finally:
+        scan.flush()  # Record handled emails as processed and mark them read in one batchModify
     logger.info("--- LUCID Orchestration Cycle End ---\n")
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+"""
+Content-addressed file store for downloaded CNS VS report PDFs.
+
+Each PDF is stored once, under the SHA-256 of its content:
+
+    <root>/ab/ab12...ef.pdf       (or .pdf.zst when stored compressed)
+
+put() hashes the file while copying it into a temporary file in the store and then
+renames it into place, so the source is read once and a half-written blob is never
+visible. A file whose hash is already stored is not written again.
+
+Compression uses zstandard when it is installed and LUCID_PDF_STORE_COMPRESSION=zstd;
+blobs are read back whichever way they were written. CNS VS PDFs are already
+deflate-compressed, so the default is to store them as they are.
+
+Environment:
+    LUCID_PDF_STORE_DIR          store root (default: pdf_store next to cns_vs_reports.db)
+    LUCID_PDF_STORE_COMPRESSION  zstd or none (default none)
+"""
+import os
+import hashlib
+import logging
+import tempfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+COMPRESSION = os.environ.get('LUCID_PDF_STORE_COMPRESSION', 'none')
+PLAIN_SUFFIX = '.pdf'
+ZSTD_SUFFIX = '.pdf.zst'
+
+
+def default_store_dir(db_path):
+    return os.environ.get('LUCID_PDF_STORE_DIR') or \
+        os.path.join(os.path.dirname(os.path.abspath(db_path)), 'pdf_store')
+
+
+def hash_file(path):
+    """(sha256 hex digest, size in bytes) of a file, read in chunks."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class PdfBlobStore:
+    """
+    Args:
+        root (str): Store directory (created if missing).
+        compression (str): 'zstd' or 'none'; zstd falls back to none if zstandard is missing.
+    """
+
+    def __init__(self, root, compression=COMPRESSION):
+        if compression == 'zstd' and zstandard is None:
+            logger.warning("zstandard is not installed; storing PDFs uncompressed.")
+            compression = 'none'
+        self.root = root
+        self.compression = compression
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, sha256, suffix):
+        return os.path.join(self.root, sha256[:2], sha256 + suffix)
+
+    def path_for(self, sha256):
+        """Path of the stored blob, or None if it is not in the store."""
+        for suffix in (PLAIN_SUFFIX, ZSTD_SUFFIX):
+            path = self._path(sha256, suffix)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def __contains__(self, sha256):
+        return self.path_for(sha256) is not None
+
+    def put(self, path):
+        """
+        Copy a file into the store.
+        Returns:
+            tuple: (sha256, size, created), created False when the content was already stored.
+        """
+        with open(path, 'rb') as src:
+            return self._put_stream(src)
+
+    def put_bytes(self, data):
+        """put() for content already in memory (e.g. legacy BLOB rows)."""
+        import io
+        return self._put_stream(io.BytesIO(data))
+
+    def _put_stream(self, src):
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw:
+                out = zstandard.ZstdCompressor().stream_writer(raw) if self.compression == 'zstd' else raw
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    out.write(chunk)
+                if out is not raw:
+                    out.flush(zstandard.FLUSH_FRAME)
+            sha256 = digest.hexdigest()
+            if sha256 in self:
+                os.remove(tmp_path)
+                return sha256, size, False
+            target = self._path(sha256, ZSTD_SUFFIX if self.compression == 'zstd' else PLAIN_SUFFIX)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_path, target)
+            return sha256, size, True
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def open(self, sha256):
+        """Binary file object reading the original PDF bytes."""
+        path = self.path_for(sha256)
+        if path is None:
+            raise KeyError(sha256)
+        if path.endswith(ZSTD_SUFFIX):
+            if zstandard is None:
+                raise RuntimeError(f"{path} is zstd-compressed but zstandard is not installed")
+            return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return open(path, 'rb')
+
+    def read_bytes(self, sha256):
+        with self.open(sha256) as f:
+            return f.read()
+
+    def delete(self, sha256):
+        path = self.path_for(sha256)
+        if path is not None:
+            os.remove(path)
+        return path is not None
@@ -0,0 +1,98 @@
+"""
+Header-only reader for CNS VS report PDFs.
+
+read_report_header() extracts the text one page at a time and stops at the first page
+containing "Patient ID:" (the first page of every CNS VS report), so identifying a report
+costs one page of text extraction instead of the whole document. Patient ID, test date,
+age and language are parsed from that page together.
+
+PyMuPDF (fitz) is used when it is installed, as it extracts a page's text many times
+faster than PyPDF2; PyPDF2 is the fallback.
+"""
+import re
+import logging
+from typing import NamedTuple, Optional
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+logger = logging.getLogger(__name__)
+
+PATIENT_ID_PATTERN = re.compile(r"Patient\s*ID\s*[:：]\s*(\d+)", re.IGNORECASE)
+# Full date and time when present, otherwise the first token (as in parsing_helpers.parse_basic_info)
+TEST_DATE_PATTERNS = (
+    re.compile(r"Test\s*Date\s*[:：]\s*([\w\s,:/\\-]+\d{2}:\d{2}:\d{2})", re.IGNORECASE),
+    re.compile(r"Test\s*Date\s*[:：]\s*([\w:/\\-]+)", re.IGNORECASE),
+)
+AGE_PATTERN = re.compile(r"\bAge\s*[:：]\s*(\d+)", re.IGNORECASE)
+LANGUAGE_PATTERN = re.compile(r"Language\s*[:：][ \t]*(\S[^\n]*)", re.IGNORECASE)
+
+
+class ReportHeader(NamedTuple):
+    patient_id: str
+    test_date: Optional[str]
+    age: Optional[int]
+    language: Optional[str]
+
+
+def parse_header_text(text: str) -> Optional[ReportHeader]:
+    """ReportHeader from a page's text, or None if it has no patient ID."""
+    match = PATIENT_ID_PATTERN.search(text)
+    if not match:
+        return None
+    test_date = None
+    for pattern in TEST_DATE_PATTERNS:
+        found = pattern.search(text)
+        if found:
+            test_date = found.group(1).strip()
+            break
+    age = AGE_PATTERN.search(text)
+    language = LANGUAGE_PATTERN.search(text)
+    return ReportHeader(
+        patient_id=match.group(1),
+        test_date=test_date,
+        age=int(age.group(1)) if age else None,
+        language=language.group(1).strip() if language else None,
+    )
+
+
+def _page_texts_fitz(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            yield page.get_text()
+
+
+def _page_texts_pypdf2(pdf_path):
+    import PyPDF2
+    with open(pdf_path, "rb") as f:
+        for page in PyPDF2.PdfReader(f).pages:
+            yield page.extract_text() or ""
+
+
+def page_texts(pdf_path, backend=None):
+    """Yield the text of each page in turn (backend: 'fitz', 'pypdf2' or None for the fastest available)."""
+    backend = backend or ('fitz' if fitz is not None else 'pypdf2')
+    if backend == 'fitz':
+        return _page_texts_fitz(pdf_path)
+    return _page_texts_pypdf2(pdf_path)
+
+
+def read_report_header(pdf_path: str, backend: Optional[str] = None) -> Optional[ReportHeader]:
+    """
+    Read the report header, stopping at the first page with a patient ID.
+    Returns:
+        ReportHeader, or None if no page has a patient ID.
+    """
+    pages = page_texts(pdf_path, backend)
+    try:
+        for page_num, text in enumerate(pages):
+            header = parse_header_text(text)
+            if header is not None:
+                logger.debug(f"Report header of {pdf_path} found on page {page_num + 1}: {header}")
+                return header
+    finally:
+        pages.close()  # Closes the document without reading the remaining pages
+    logger.debug(f"No patient ID found in {pdf_path}")
+    return None
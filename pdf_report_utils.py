@@ -1,57 +1,134 @@
-import re
 import os
-import sqlite3
 import logging
 from typing import Optional
-import PyPDF2
+from sqlite_profile import connect
+from migrations import apply_migrations
+from pdf_blob_store import PdfBlobStore, default_store_dir, hash_file
+from pdf_header import read_report_header
 
 def extract_patient_id_from_pdf(pdf_path: str) -> Optional[str]:
     """Extracts the patient ID from a CNSVS PDF report. Returns the patient ID as a string, or None if not found."""
     try:
-        with open(pdf_path, "rb") as f:
-            reader = PyPDF2.PdfReader(f)
-            text = ""
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text
-        # Log the first 500 characters for debugging
-        logging.warning(f"[PDF DEBUG] Extracted text (first 500 chars):\n{text[:500]}")
-        # More robust regex: allow for any whitespace and possible line breaks
-        match = re.search(r"Patient\s*ID\s*[:：]\s*(\d+)", text, re.IGNORECASE | re.MULTILINE)
-        if match:
-            return match.group(1)
-        else:
-            return None
+        header = read_report_header(pdf_path)
+        return header.patient_id if header else None
     except Exception as e:
         logging.error(f"Error extracting patient ID from {pdf_path}: {e}")
         return None
 
-def save_pdf_to_db(pdf_path: str, patient_id: str, email_id: str, db_path: str = 'cns_vs_reports.db') -> bool:
-    """Stores the PDF and metadata in the database. Returns True if successful."""
-    try:
-        with open(pdf_path, 'rb') as f:
-            pdf_blob = f.read()
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cns_vs_reports (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                patient_id TEXT,
-                email_id TEXT,
-                filename TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                pdf_data BLOB
-            )
-        ''')
-        cursor.execute(
-            'INSERT INTO cns_vs_reports (patient_id, email_id, filename, pdf_data) VALUES (?, ?, ?, ?)',
-            (patient_id, email_id, os.path.basename(pdf_path), pdf_blob)
+DB_PATH = 'cns_vs_reports.db'
+
+
+def _create_report_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cns_vs_reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id TEXT,
+            email_id TEXT,
+            filename TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            pdf_data BLOB
         )
-        conn.commit()
+    ''')
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(cns_vs_reports)")}
+    if 'sha256' not in columns:
+        conn.execute("ALTER TABLE cns_vs_reports ADD COLUMN sha256 TEXT")
+    conn.execute("CREATE TABLE IF NOT EXISTS report_blobs (sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_cns_vs_reports_patient_id ON cns_vs_reports (patient_id)")
+
+
+def _blob_mover(store):
+    """Build the upgrade step moving legacy pdf_data BLOBs into the store, one row at a time."""
+    def upgrade(conn):
+        moved = 0
+        last_id = 0
+        while True:
+            row = conn.execute(
+                "SELECT id, pdf_data FROM cns_vs_reports WHERE id > ? AND pdf_data IS NOT NULL ORDER BY id LIMIT 1",
+                (last_id,)).fetchone()
+            if row is None:
+                break
+            last_id, data = row
+            sha256, size, _ = store.put_bytes(data)
+            conn.execute("INSERT OR IGNORE INTO report_blobs (sha256, size) VALUES (?, ?)", (sha256, size))
+            if conn.execute("SELECT 1 FROM cns_vs_reports WHERE sha256 = ?", (sha256,)).fetchone():
+                conn.execute("DELETE FROM cns_vs_reports WHERE id = ?", (last_id,))  # Duplicate upload
+            else:
+                conn.execute("UPDATE cns_vs_reports SET sha256 = ?, pdf_data = NULL WHERE id = ?", (sha256, last_id))
+            moved += 1
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_cns_vs_reports_sha256 ON cns_vs_reports (sha256)")
+        if moved:
+            logging.info(f"Moved {moved} stored PDF(s) into {store.root}; VACUUM the database to reclaim the space.")
+    return upgrade
+
+
+def reports_migrations(store):
+    """Versioned schema changes for cns_vs_reports.db (see migrations.py)."""
+    return [
+        (1, 'report_blobs table, cns_vs_reports.sha256 and patient_id index', _create_report_tables),
+        (2, 'move pdf_data BLOBs into the content-addressed store', _blob_mover(store)),
+    ]
+
+
+def open_reports_db(db_path: str = DB_PATH, store_dir: Optional[str] = None):
+    """
+    Connect to cns_vs_reports.db with its schema migrations applied.
+    Returns:
+        tuple: (sqlite3 connection, PdfBlobStore)
+    """
+    store = PdfBlobStore(store_dir or default_store_dir(db_path))
+    conn = connect(db_path)
+    try:
+        apply_migrations(conn, reports_migrations(store))
+    except Exception:
         conn.close()
-        logging.info(f"Stored PDF {pdf_path} for patient {patient_id} in DB.")
+        raise
+    return conn, store
+
+
+def is_pdf_stored(pdf_path: str, db_path: str = DB_PATH, store_dir: Optional[str] = None) -> bool:
+    """True if a report with the same content is already recorded (no PDF parsing needed)."""
+    sha256, _ = hash_file(pdf_path)
+    conn, _ = open_reports_db(db_path, store_dir)
+    try:
+        return conn.execute("SELECT 1 FROM cns_vs_reports WHERE sha256 = ?", (sha256,)).fetchone() is not None
+    finally:
+        conn.close()
+
+
+def save_pdf_to_db(pdf_path: str, patient_id: str, email_id: str, db_path: str = DB_PATH,
+                   store_dir: Optional[str] = None) -> bool:
+    """
+    Stores the PDF in the content-addressed store and records its metadata in the database.
+    A PDF whose content is already stored is not recorded again. Returns True if successful.
+    """
+    try:
+        conn, store = open_reports_db(db_path, store_dir)
+        try:
+            sha256, size, _ = store.put(pdf_path)
+            conn.execute("INSERT OR IGNORE INTO report_blobs (sha256, size) VALUES (?, ?)", (sha256, size))
+            inserted = conn.execute(
+                'INSERT OR IGNORE INTO cns_vs_reports (patient_id, email_id, filename, sha256) VALUES (?, ?, ?, ?)',
+                (patient_id, email_id, os.path.basename(pdf_path), sha256)
+            ).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        if inserted:
+            logging.info(f"Stored PDF {pdf_path} for patient {patient_id} ({sha256[:12]}).")
+        else:
+            logging.info(f"PDF {pdf_path} is already stored ({sha256[:12]}); not recorded again.")
         return True
     except Exception as e:
         logging.error(f"Error saving PDF {pdf_path} to DB: {e}")
         return False
+
+
+def delete_unreferenced_blobs(conn, store):
+    """Remove stored PDFs no cns_vs_reports row refers to any more (the caller commits)."""
+    orphans = [row[0] for row in conn.execute(
+        "SELECT sha256 FROM report_blobs WHERE sha256 NOT IN"
+        " (SELECT sha256 FROM cns_vs_reports WHERE sha256 IS NOT NULL)")]
+    for sha256 in orphans:
+        store.delete(sha256)
+        conn.execute("DELETE FROM report_blobs WHERE sha256 = ?", (sha256,))
+    return len(orphans)
@@ -0,0 +1,196 @@
+"""
+LUCID pipeline as job-queue workers (see job_queue.py), one worker per stage.
+
+    intake          polls Gmail (GmailSync) and saves new referrals  -> request_test per referral
+    request_test    requests the CNS VS test, within the daily limits
+    download_report polls for CNS VS notifications, downloads reports -> import_report per PDF
+    import_report   parses the PDF into lucid_data.db and REPORT_DB  -> render_report
+    render_report   renders the patient's report PDF                 -> deliver
+    deliver         sends the report to the referrer
+
+Each stage runs in its own process, so a slow stage only delays its own jobs and a new
+report moves through import, render and delivery within seconds of being downloaded.
+intake and download_report share the 'gmail' lock key, so the two Gmail syncs never
+overlap. Reminders and resend-link requests still run in the orchestrator cycle; set
+LUCID_JOB_WORKERS=1 for it (and the dashboard) so the cycle skips the stages run here.
+
+    python pipeline_jobs.py               # one process per stage
+    python pipeline_jobs.py request_test  # a single stage (run more for more throughput)
+
+Environment:
+    LUCID_JOB_WORKERS           set to 1 wherever the orchestrator cycle runs alongside the workers
+    LUCID_INTAKE_POLL_SECONDS   (default 60)
+    LUCID_REPORT_POLL_SECONDS   (default 120)
+    LUCID_REPORT_DB             cognitive_analysis.db that import_report writes and render_report reads
+    LUCID_REPORT_OUTPUT_DIR     where rendered reports are written
+"""
+import os
+import sys
+import logging
+import multiprocessing
+from datetime import datetime, timedelta
+
+from job_queue import JobQueue, Worker, RetryLater, JOB_TYPES
+
+logger = logging.getLogger('lucid_jobs')
+
+REPORT_REFACTOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'report_refactor')
+INTAKE_POLL_SECONDS = int(os.environ.get('LUCID_INTAKE_POLL_SECONDS', 60))
+REPORT_POLL_SECONDS = int(os.environ.get('LUCID_REPORT_POLL_SECONDS', 120))
+REPORT_DB = os.environ.get('LUCID_REPORT_DB', os.path.join(REPORT_REFACTOR_DIR, 'cognitive_analysis.db'))
+REPORT_OUTPUT_DIR = os.environ.get('LUCID_REPORT_OUTPUT_DIR', 'generated_reports')
+GMAIL_LOCK = 'gmail'
+
+
+def _referral_for_patient(patient_id):
+    from db import Session, Referral
+    with Session() as session:
+        referral = session.query(Referral).filter(Referral.id_number == str(patient_id)) \
+            .order_by(Referral.id.desc()).first()
+        return referral.id if referral else None
+
+
+def _seconds_until_tomorrow(now=None):
+    now = now or datetime.now()
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return int((tomorrow - now).total_seconds()) + 1
+
+
+def handle_intake(payload, job, queue):
+    from gmail_sync import GmailSync
+    from orchestrator import process_new_referrals
+    scan = GmailSync()
+    try:
+        referral_ids = process_new_referrals(scan)
+    finally:
+        scan.flush()
+    for referral_id in referral_ids:
+        queue.enqueue('request_test', {'referral_id': referral_id}, referral_id=referral_id,
+                      dedupe_key=f"referral:{referral_id}")
+
+
+def handle_request_test(payload, job, queue):
+    from orchestrator import request_test_for_referral
+    requested = request_test_for_referral(payload['referral_id'])
+    if requested is None:
+        raise RetryLater(_seconds_until_tomorrow(), 'daily test request limit reached')
+    if not requested:
+        raise RuntimeError(f"CNS VS test request failed for referral {payload['referral_id']}")
+
+
+def handle_download_report(payload, job, queue):
+    from gmail_sync import GmailSync
+    from cns_vs_report_monitor import monitor_cns_vs_notifications
+    from orchestrator import record_test_completed
+
+    def queue_import(report_path, patient_id):
+        record_test_completed(report_path, patient_id)
+        queue.enqueue('import_report', {'pdf_path': report_path, 'patient_id': patient_id},
+                      referral_id=_referral_for_patient(patient_id), dedupe_key=report_path)
+
+    scan = GmailSync()
+    try:
+        monitor_cns_vs_notifications(scan=scan, on_report=queue_import)
+    finally:
+        scan.flush()
+
+
+def handle_import_report(payload, job, queue):
+    from report_refactor.cognitive_importer import parse_pdf_report, write_parsed_report, write_analysis_report
+    from report_refactor.population_stats import refresh_population_stats
+    parsed = parse_pdf_report(payload['pdf_path'])
+    if parsed is None:
+        raise ValueError(f"No report data could be parsed from {payload['pdf_path']}")
+    write_parsed_report(parsed)
+    # The renderer reads the per-patient tables of REPORT_DB, not lucid_data.db
+    patient_id = write_analysis_report(parsed, REPORT_DB)
+    refresh_population_stats(REPORT_DB, patient_ids=[patient_id])
+    _mark_report_processed(job['referral_id'])
+    queue.enqueue('render_report', {'patient_id': payload['patient_id']}, referral_id=job['referral_id'],
+                  dedupe_key=f"patient:{payload['patient_id']}")
+
+
+def _mark_report_processed(referral_id):
+    from db import Session, Referral
+    from referral_status import TEST_COMPLETED, REPORT_PROCESSED, transition
+    if referral_id is None:
+        return
+    with Session() as session:
+        referral = session.get(Referral, referral_id)
+        if referral is not None and referral.status == TEST_COMPLETED:
+            transition(referral, REPORT_PROCESSED)
+            session.commit()
+
+
+def handle_render_report(payload, job, queue):
+    # generate_report and its helpers use flat imports from the report_refactor directory
+    if REPORT_REFACTOR_DIR not in sys.path:
+        sys.path.insert(0, REPORT_REFACTOR_DIR)
+    from generate_report import generate_reports
+    manifest = generate_reports([payload['patient_id']], output_dir=REPORT_OUTPUT_DIR, db_path=REPORT_DB)
+    entry = manifest['reports'][0] if manifest.get('reports') else {}
+    if not entry.get('output_path'):
+        raise RuntimeError(f"Report for patient {payload['patient_id']} was not rendered: {entry.get('error')}")
+    queue.enqueue('deliver', {'patient_id': payload['patient_id'], 'report_path': entry['output_path']},
+                  referral_id=job['referral_id'], dedupe_key=entry['output_path'])
+
+
+def handle_deliver(payload, job, queue):
+    from db import Session, Referral
+    with Session() as session:
+        referral = session.get(Referral, job['referral_id']) if job['referral_id'] else None
+        if referral is None:
+            logger.warning(f"No referral found for patient {payload['patient_id']}; report {payload['report_path']} not delivered.")
+            return
+        # Template, as in orchestrator.send_reports_to_referrers: fill in when report delivery is finalised
+        logger.info(f"[TEMPLATE] Would send {payload['report_path']} to {referral.referrer_email}")
+
+
+HANDLERS = {
+    'intake': handle_intake,
+    'request_test': handle_request_test,
+    'download_report': handle_download_report,
+    'import_report': handle_import_report,
+    'render_report': handle_render_report,
+    'deliver': handle_deliver,
+}
+
+POLLING = {
+    'intake': INTAKE_POLL_SECONDS,
+    'download_report': REPORT_POLL_SECONDS,
+}
+
+
+def make_worker(job_type, queue=None):
+    """Worker for one stage, with the stage's poll schedule and lease time."""
+    return Worker(queue or JobQueue(), job_type, HANDLERS[job_type],
+                  poll_every=POLLING.get(job_type),
+                  poll_lock_key=GMAIL_LOCK if job_type in POLLING else None)
+
+
+def run_worker(job_type):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+    make_worker(job_type).run()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    job_types = argv or list(JOB_TYPES)
+    unknown = [job_type for job_type in job_types if job_type not in HANDLERS]
+    if unknown:
+        print(f"Unknown stage(s): {', '.join(unknown)}. Stages: {', '.join(JOB_TYPES)}")
+        return 2
+    if len(job_types) == 1:
+        run_worker(job_types[0])
+        return 0
+    processes = [multiprocessing.Process(target=run_worker, args=(job_type,), name=f"lucid-{job_type}")
+                 for job_type in job_types]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,16 @@
 import os
 import logging
-from pdf_report_utils import extract_patient_id_from_pdf, save_pdf_to_db
+from pdf_report_utils import extract_patient_id_from_pdf, save_pdf_to_db, is_pdf_stored
 
 def process_reports_in_folder(reports_dir, db_path='cns_vs_reports.db'):
     logging.basicConfig(level=logging.INFO)
     for filename in os.listdir(reports_dir):
         if filename.lower().endswith('.pdf'):
             pdf_path = os.path.join(reports_dir, filename)
+            # Re-runs only hash the files already stored
+            if is_pdf_stored(pdf_path, db_path):
+                logging.info(f"{filename} already stored, skipping.")
+                continue
             patient_id = extract_patient_id_from_pdf(pdf_path)
             if not patient_id:
                 logging.warning(f"Could not extract patient ID from {filename}, skipping.")
@@ -1,10 +1,10 @@
-import sqlite3
 import sys
+from sqlite_profile import connect
 
 DB_PATH = 'cns_vs_reports.db'
 
 def query_reports_for_patient(patient_id, db_path=DB_PATH):
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path, read_only=True)
     cursor = conn.cursor()
     cursor.execute('SELECT id, patient_id, email_id, filename, created_at FROM cns_vs_reports WHERE patient_id = ?', (patient_id,))
     rows = cursor.fetchall()
@@ -0,0 +1,116 @@
+"""
+Referral pipeline state machine.
+
+Each referral has one status (db.Referral.status, indexed with status_updated_at):
+
+    received -> test_requested -> test_completed -> report_processed -> report_sent
+
+test_requested -> test_requested is a resend of the test link. transition() is the only
+place a status changes: it rejects illegal moves and keeps the legacy timestamp/boolean
+columns (test_request_time, test_completed, report_processed, ...) in step, so readers
+of those columns keep working. Entering test_requested schedules the patient's reminders
+(reminders.py) and leaving it cancels the unsent ones. Stages select their work with next_batch(), i.e.
+WHERE status = ? ORDER BY status_updated_at LIMIT ?, so a cycle only touches the
+referrals that have work to do.
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy.orm import object_session
+
+from db import Referral
+from reminders import schedule_reminders, cancel_reminders
+
+logger = logging.getLogger(__name__)
+
+RECEIVED = 'received'
+TEST_REQUESTED = 'test_requested'
+TEST_COMPLETED = 'test_completed'
+REPORT_PROCESSED = 'report_processed'
+REPORT_SENT = 'report_sent'
+
+STATUSES = (RECEIVED, TEST_REQUESTED, TEST_COMPLETED, REPORT_PROCESSED, REPORT_SENT)
+
+# Legal moves: {from_status: {to_status, ...}}
+TRANSITIONS = {
+    RECEIVED: {TEST_REQUESTED},
+    TEST_REQUESTED: {TEST_REQUESTED, TEST_COMPLETED},
+    TEST_COMPLETED: {REPORT_PROCESSED},
+    REPORT_PROCESSED: {REPORT_SENT},
+    REPORT_SENT: set(),
+}
+
+# Statuses of a referral whose test is still to be done
+OPEN_TEST_STATUSES = (RECEIVED, TEST_REQUESTED)
+
+
+class InvalidTransition(ValueError):
+    """Raised when a referral is moved to a status not reachable from its current one."""
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status or RECEIVED, set())
+
+
+def transition(referral, to_status, now=None):
+    """
+    Move a referral to to_status (the caller commits).
+    The referral's reminders are rescheduled in its session when it enters test_requested.
+    Args:
+        referral (Referral): Loaded in the caller's session.
+        to_status (str): One of STATUSES.
+        now (datetime, optional): Defaults to datetime.now().
+    Raises:
+        InvalidTransition: If the move is not in TRANSITIONS.
+    """
+    from_status = referral.status or RECEIVED
+    if not can_transition(from_status, to_status):
+        raise InvalidTransition(f"Referral {referral.id}: cannot move from {from_status} to {to_status}")
+    now = now or datetime.now()
+    if to_status == TEST_REQUESTED:
+        if from_status == TEST_REQUESTED:
+            referral.test_resent = True
+            referral.test_resent_time = now
+        else:
+            referral.test_request_time = now
+    elif to_status == TEST_COMPLETED:
+        referral.test_completed = True
+    elif to_status == REPORT_PROCESSED:
+        referral.report_processed = True
+        referral.report_unprocessed = False
+    elif to_status == REPORT_SENT:
+        referral.report_sent_date = now
+    referral.status = to_status
+    referral.status_updated_at = now
+    session = object_session(referral)
+    if session is not None and referral.id is not None:
+        if to_status == TEST_REQUESTED:
+            schedule_reminders(session, referral.id, now)
+        elif from_status == TEST_REQUESTED:
+            cancel_reminders(session, referral.id)
+    return referral
+
+
+def next_batch(session, status, limit=None):
+    """Query for referrals in status, oldest change first, at most limit of them."""
+    query = session.query(Referral).filter(Referral.status == status) \
+        .order_by(Referral.status_updated_at, Referral.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def mark_test_completed(session, patient_id, now=None):
+    """
+    Move the patient's latest requested referral to test_completed when their report arrives.
+    Returns:
+        Referral: The referral moved, or None if the patient has no test awaiting completion.
+    """
+    referral = session.query(Referral).filter(Referral.id_number == str(patient_id),
+                                              Referral.status == TEST_REQUESTED) \
+        .order_by(Referral.id.desc()).first()
+    if referral is None:
+        logger.info(f"No requested test found for patient {patient_id}; status unchanged.")
+        return None
+    return transition(referral, TEST_COMPLETED, now)
+
@@ -0,0 +1,104 @@
+"""
+Reminder schedule for patients with a requested CNS VS test.
+
+When a referral moves to test_requested (referral_status.transition), one db.Reminder row
+per REMINDER_STEPS entry is written with its precomputed due_at. A resend replaces the
+unsent rows with a fresh schedule, and leaving test_requested deletes them. Each cycle,
+send_due_reminders() reads only the due rows through the partial index on due_at
+WHERE sent_at IS NULL, claims them with one UPDATE (so a reminder is never sent twice,
+even by overlapping runs), and sends the latest due step per patient.
+
+This module only imports db inside functions, since db's schema migrations use
+REMINDER_STEPS to schedule reminders for tests requested before the table existed.
+"""
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger('lucid_orchestrator')
+
+# Test links expire this many days after the request
+TEST_LINK_VALID_DAYS = 7
+
+# (days left before the link expires, message), in sending order
+REMINDER_STEPS = [
+    (7, "Must complete test within 7 days. Please use your link to begin your cognitive assessment."),
+    (3, "Reminder: You have 3 days left to complete your cognitive assessment. Please use your link."),
+    (1, "Urgent: You have 1 day left to complete your cognitive assessment. Please use your link."),
+    (0.5, "Final reminder: You have 12 hours left to complete your cognitive assessment. Please use your link."),
+    (1/24, "Final reminder: You have 1 hour left to complete your cognitive assessment. Please use your link."),
+    (0, "Your test link has expired. Please contact your referrer if you still wish to complete the assessment."),
+]
+
+DEFAULT_BATCH_SIZE = 100
+
+
+def reminder_due_times(requested_at):
+    """[(step, due_at)] for a test requested at requested_at."""
+    return [(step, requested_at + timedelta(days=TEST_LINK_VALID_DAYS - days_left))
+            for step, (days_left, _) in enumerate(REMINDER_STEPS)]
+
+
+def cancel_reminders(session, referral_id):
+    """Delete the referral's unsent reminders (the caller commits)."""
+    from db import Reminder
+    return session.query(Reminder).filter(Reminder.referral_id == referral_id, Reminder.sent_at == None) \
+        .delete(synchronize_session=False)
+
+
+def schedule_reminders(session, referral_id, requested_at):
+    """Replace the referral's unsent reminders with a schedule starting at requested_at."""
+    from db import Reminder
+    cancel_reminders(session, referral_id)
+    session.add_all(Reminder(referral_id=referral_id, step=step, due_at=due_at)
+                    for step, due_at in reminder_due_times(requested_at))
+
+
+def send_reminder(referral, text):
+    # Placeholder for actual email/SMS logic
+    logger.info(f"Would send reminder to {referral.email} (test requested {referral.test_request_time}): {text}")
+    # TODO: Integrate with actual reminder sending function (email/SMS)
+
+
+def send_due_reminders(now=None, limit=DEFAULT_BATCH_SIZE, send=send_reminder):
+    """
+    Send the reminders due by now, at most limit per batch until none are due.
+    When a patient has several steps due at once (e.g. after downtime) only the latest is
+    sent; the earlier ones are marked sent with it.
+    Returns:
+        int: Number of reminders sent.
+    """
+    from db import Session, Reminder, Referral
+    from sqlalchemy import update
+    now = now or datetime.now()
+    sent = 0
+    while True:
+        with Session() as session:
+            due = session.query(Reminder.id, Reminder.referral_id, Reminder.step) \
+                .filter(Reminder.sent_at == None, Reminder.due_at <= now) \
+                .order_by(Reminder.due_at).limit(limit).all()
+            if not due:
+                return sent
+            # Claim the batch; rows another run claimed first are dropped
+            ids = [row.id for row in due]
+            session.execute(update(Reminder).where(Reminder.id.in_(ids), Reminder.sent_at == None)
+                            .values(sent_at=now).execution_options(synchronize_session=False))
+            session.commit()
+            claimed = {reminder_id for (reminder_id,) in session.query(Reminder.id).filter(
+                Reminder.id.in_(ids), Reminder.sent_at == now)}
+            latest = {}
+            for row in due:
+                if row.id in claimed:
+                    latest[row.referral_id] = max(latest.get(row.referral_id, -1), row.step)
+            referrals = {referral.id: referral for referral in
+                         session.query(Referral).filter(Referral.id.in_(latest))}
+            for referral_id, step in latest.items():
+                referral = referrals.get(referral_id)
+                if referral is None:
+                    continue
+                try:
+                    send(referral, REMINDER_STEPS[step][1])
+                    sent += 1
+                except Exception as e:
+                    logger.exception(f"Error sending reminder to {referral.email}: {e}")
+        if len(due) < limit:
+            return sent
@@ -1,16 +1,129 @@
 from pathlib import Path
-import sqlite3
-from cognitive_importer import create_db, import_pdf_to_db
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from .cognitive_importer import DB_PATH, create_db, parse_pdf_file, write_parsed_report, write_analysis_report
+from .population_stats import refresh_population_stats
+from db import import_parsed_reports
 
-def batch_process_pdfs(folder="tests", reset_db=False):
+def patient_already_imported(patient_id):
+    """Return True if a test session already exists for the patient ID."""
+    from db import Session, Referral, TestSession
+    with Session() as session:
+        found = session.query(TestSession.id).join(
+            Referral, TestSession.referral_id == Referral.id
+        ).filter(Referral.id_number == str(patient_id)).first()
+        return found is not None
+
+# Set in each pool worker by _init_worker: a queue the worker announces every PDF on before parsing it.
+_started = None
+
+def _init_worker(started):
+    global _started
+    _started = started
+
+def _parse_announced(pdf_path, use_artifacts):
+    """Pool task: record that this worker picked up pdf_path, then parse it."""
+    _started.put(pdf_path)
+    return parse_pdf_file(pdf_path, use_artifacts)
+
+def parse_in_pool(pdf_paths, workers, use_artifacts=None):
+    """
+    Parse PDFs in a process pool and yield (pdf_path, payload, error, parse_seconds) as each finishes.
+
+    A PDF that kills its worker process (e.g. a segfault inside MuPDF) breaks the whole pool.
+    Workers announce each file before parsing it, so only the files that were actually running
+    at that moment are retried one per single-worker pool to pin the crash on the culprit; the
+    files that never started go to a fresh pool of `workers` processes.
+    """
+    remaining = [str(pdf) for pdf in pdf_paths]
+    while remaining:
+        started = multiprocessing.SimpleQueue()
+        finished = set()
+        broken = False
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(started,)) as pool:
+            futures = {pool.submit(_parse_announced, pdf, use_artifacts): pdf for pdf in remaining}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    broken = True
+                    continue
+                finished.add(futures[future])
+                yield result
+        if not broken:
+            return
+        running = set()
+        while not started.empty():
+            running.add(started.get())
+        running -= finished
+        if not running:
+            # The pool died before any worker picked up a file; isolate everything rather than loop.
+            running = set(remaining) - finished
+        for pdf in (pdf for pdf in remaining if pdf in running):
+            start = time.perf_counter()
+            try:
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    yield pool.submit(parse_pdf_file, pdf, use_artifacts).result()
+            except BrokenProcessPool:
+                yield pdf, None, "worker process crashed while parsing", time.perf_counter() - start
+        remaining = [pdf for pdf in remaining if pdf not in finished and pdf not in running]
+
+def parse_in_process(pdf_paths, use_artifacts=None):
+    """Serial counterpart of parse_in_pool, used when workers == 1."""
+    for pdf in pdf_paths:
+        yield parse_pdf_file(str(pdf), use_artifacts)
+
+def write_payloads(pending):
+    """
+    Commit a group of (name, payload) pairs in one transaction.
+
+    If the group fails it is rolled back as a whole and each report is retried in its
+    own transaction, so one bad report does not fail the others.
+    Returns:
+        tuple: (list of names written, list of (name, error) failures)
+    """
+    if len(pending) > 1:
+        try:
+            import_parsed_reports([payload for _, payload in pending])
+            return [name for name, _ in pending], []
+        except Exception as e:
+            print(f"⚠️  Group write of {len(pending)} reports failed ({e}), retrying one by one")
+    written, failures = [], []
+    for name, payload in pending:
+        try:
+            write_parsed_report(payload)
+            written.append(name)
+        except Exception as e:
+            failures.append((name, f"write failed: {e}"))
+    return written, failures
+
+def batch_process_pdfs(folder="tests", reset_db=False, workers=1, commit_every=1, reparse=False, analysis_db=None):
     """
     Process all PDFs in the specified folder and import them to the database.
-    
+
+    PDFs are parsed by parse_pdf_file, in a pool of `workers` processes when workers > 1.
+    Workers only return plain parsed payloads; this process is the single writer that
+    commits them to the database, `commit_every` reports per transaction.
+    PDFs parsed before (same content, same parser version) are loaded from the parse
+    artifact store instead, so a --reset rebuild only parses new or changed PDFs.
+    Written reports are also copied to the report tables of cognitive_analysis.db, and the
+    population statistics are refreshed for the new patients once the batch is done.
+
     Args:
         folder (str): Folder containing PDFs to process
         reset_db (bool): Whether to reset the database before importing
+        workers (int): Number of parser processes (1 parses in this process)
+        commit_every (int): Number of reports written per transaction
+        reparse (bool): Parse every PDF even if a stored parse exists
+        analysis_db (str): cognitive_analysis.db to update (default: the one next to this script)
+
+    Returns:
+        dict: Summary with success/failed/skipped counts, failures and timings.
     """
     base_dir = Path(__file__).parent
+    analysis_db = str(analysis_db or base_dir / DB_PATH)
     pdf_dir = base_dir / folder
     pdf_files = list(pdf_dir.glob("*.pdf"))
 
@@ -19,39 +132,70 @@ def batch_process_pdfs(folder="tests", reset_db=False):
         return
 
     print(f"Found {len(pdf_files)} PDF files to process")
-    
+
     # Create or reset database
     create_db(reset=reset_db)
-    
+
     # Track success/failure counts
     success = 0
-    failed = 0
+    failed = []
     skipped = 0
-    
-    # Process each PDF
+    parse_seconds = 0.0
+    write_seconds = 0.0
+    batch_start = time.perf_counter()
+
+    # Check if patient already exists before spending any parsing time on it
+    to_parse = []
     for pdf in pdf_files:
-        try:
-            print(f"\nProcessing {pdf.name}...")
-            
-            # Check if patient already exists
-            patient_id = pdf.stem.split('-')[0]  # Extract patient ID from filename
-            with sqlite3.connect("cognitive_analysis.db") as conn:
-                cur = conn.cursor()
-                cur.execute("SELECT 1 FROM patients WHERE patient_id = ?", (patient_id,))
-                if cur.fetchone():
-                    print(f"⏭️  Patient ID {patient_id} already exists, skipping...")
-                    skipped += 1
-                    continue
-            
-            # Import the PDF
-            import_pdf_to_db(str(pdf))
-            print(f"✅ Successfully processed {pdf.name}")
-            success += 1
-            
-        except Exception as e:
-            print(f"❌ Failed to process {pdf.name}: {str(e)}")
-            failed += 1
+        patient_id = pdf.stem.split('-')[0]  # Extract patient ID from filename
+        if not reset_db and patient_already_imported(patient_id):
+            print(f"⏭️  Patient ID {patient_id} already exists, skipping...")
+            skipped += 1
             continue
+        to_parse.append(pdf)
+
+    use_artifacts = False if reparse else None
+    if workers > 1:
+        print(f"Parsing {len(to_parse)} PDFs with {workers} worker processes")
+        results = parse_in_pool(to_parse, workers, use_artifacts)
+    else:
+        results = parse_in_process(to_parse, use_artifacts)
+
+    # Single writer: commit payloads in groups of commit_every as their parses finish
+    pending = []
+    imported_patients = []
+    for position, (pdf_path, payload, error, elapsed) in enumerate(results, 1):
+        name = Path(pdf_path).name
+        parse_seconds += elapsed
+        if payload is None:
+            print(f"❌ Failed to process {name}: {error}")
+            failed.append((name, error))
+        else:
+            pending.append((name, payload))
+        if pending and (len(pending) >= commit_every or position == len(to_parse)):
+            write_start = time.perf_counter()
+            written, write_failures = write_payloads(pending)
+            payloads = dict(pending)
+            for name in written:
+                try:
+                    imported_patients.append(write_analysis_report(payloads[name], analysis_db))
+                except Exception as e:
+                    print(f"⚠️  {name} was not copied to {analysis_db}: {e}")
+            write_seconds += time.perf_counter() - write_start
+            for name in written:
+                print(f"✅ Successfully processed {name}")
+            for name, write_error in write_failures:
+                print(f"❌ Failed to write {name} to the database: {write_error}")
+            success += len(written)
+            failed.extend(write_failures)
+            pending = []
+
+    if imported_patients:
+        # Incremental: only the imported patients are rescored before the statistics are re-aggregated
+        refresh_population_stats(analysis_db, patient_ids=imported_patients)
+
+    wall_seconds = time.perf_counter() - batch_start
+    parsed_count = success + len(failed)
 
     # Print summary
     print("\n" + "="*50)
@@ -59,23 +203,53 @@ def batch_process_pdfs(folder="tests", reset_db=False):
     print("="*50)
     print(f"Total files found: {len(pdf_files)}")
     print(f"Successfully processed: {success}")
-    print(f"Failed: {failed}")
+    print(f"Failed: {len(failed)}")
+    for name, error in failed:
+        print(f"  - {name}: {error}")
     print(f"Skipped (already exists): {skipped}")
+    print(f"Workers: {workers}, reports per transaction: {commit_every}")
+    print(f"Wall time: {wall_seconds:.1f}s")
+    if parsed_count:
+        print(f"Parse time: {parse_seconds:.1f}s total, {parse_seconds / parsed_count:.2f}s per PDF")
+    print(f"Write time: {write_seconds:.1f}s")
     print("="*50)
 
+    return {
+        'found': len(pdf_files),
+        'success': success,
+        'failed': failed,
+        'skipped': skipped,
+        'wall_seconds': wall_seconds,
+        'parse_seconds': parse_seconds,
+        'write_seconds': write_seconds,
+    }
+
 if __name__ == "__main__":
     import sys
     reset = "--reset" in sys.argv
+    reparse = "--reparse" in sys.argv
     folder = "tests"  # default folder
-    
-    # Check for custom folder argument
-    for arg in sys.argv[1:]:
-        if not arg.startswith("--"):
+    options = {"--workers": 1, "--commit-every": 1}
+
+    # Check for --workers N / --commit-every N and a custom folder argument
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in options and i + 1 < len(args):
+            options[arg] = int(args[i + 1])
+            i += 2
+            continue
+        if arg.split("=", 1)[0] in options:
+            key, value = arg.split("=", 1)
+            options[key] = int(value)
+        elif not arg.startswith("--") and folder == "tests":
             folder = arg
-            break
-    
+        i += 1
+
     print(f"Starting batch import from folder: {folder}")
     if reset:
         print("Warning: Database will be reset before import")
-        
-    batch_process_pdfs(folder, reset_db=reset)
+
+    batch_process_pdfs(folder, reset_db=reset, workers=options["--workers"], commit_every=options["--commit-every"],
+                       reparse=reparse)
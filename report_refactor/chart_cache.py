@@ -0,0 +1,233 @@
+"""
+Content-addressed cache for rendered report charts.
+
+A chart is identified by a SHA-256 of its name, its input spec (scores, invalid domains,
+population statistics, ...) and the chart style version, so an identical chart spec
+returns the stored PNG bytes without touching matplotlib. Entries are kept in a
+size-bounded in-memory LRU, backed by a size-bounded on-disk LRU shared between
+processes and report runs.
+
+Usage:
+    @cached_chart("radar", parts=2)
+    def draw_radar_chart(scores, invalid_domains): ...
+
+Configuration (environment):
+  LUCID_CHART_CACHE_DIR      on-disk cache directory (default data/analysis_output/chart_cache)
+  LUCID_CHART_CACHE_MAX_MB   on-disk size bound (default 200)
+  LUCID_CHART_CACHE          set to 0 to disable caching
+"""
+import os
+import json
+import time
+import hashlib
+import inspect
+import logging
+import functools
+from io import BytesIO
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the drawing code of a cached chart changes, so stale images are not reused
+CHART_STYLE_VERSION = 1
+
+CHART_CACHE_DIR = os.environ.get('LUCID_CHART_CACHE_DIR', os.path.join('data', 'analysis_output', 'chart_cache'))
+CHART_CACHE_MAX_BYTES = int(float(os.environ.get('LUCID_CHART_CACHE_MAX_MB', 200)) * 1024 * 1024)
+MEMORY_CACHE_MAX_BYTES = 64 * 1024 * 1024
+CHART_CACHE_ENABLED = os.environ.get('LUCID_CHART_CACHE', '1') != '0'
+
+
+def _style_fingerprint():
+    try:
+        import matplotlib
+        return [CHART_STYLE_VERSION, matplotlib.__version__]
+    except ImportError:
+        return [CHART_STYLE_VERSION]
+
+
+class ChartCache:
+    """In-memory plus on-disk LRU of chart PNG bytes, keyed by content hash."""
+
+    def __init__(self, cache_dir=CHART_CACHE_DIR, max_bytes=CHART_CACHE_MAX_BYTES,
+                 memory_max_bytes=MEMORY_CACHE_MAX_BYTES, enabled=CHART_CACHE_ENABLED):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_max_bytes = memory_max_bytes
+        self.enabled = enabled
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None  # Measured lazily on first write
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    # --- Keys ---
+
+    def key(self, name, spec, part=0):
+        """SHA-256 hex digest identifying one image of a chart."""
+        payload = json.dumps([name, part, _style_fingerprint(), spec], sort_keys=True, default=repr)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.png")
+
+    # --- Lookup and storage ---
+
+    def get(self, key):
+        """PNG bytes for a key, or None. Counts as a hit or miss."""
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.counters["memory_hits"] += 1
+            return data
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # Mark as recently used for disk eviction
+        except OSError:
+            self.counters["misses"] += 1
+            return None
+        self.counters["disk_hits"] += 1
+        self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        """Store PNG bytes in memory and on disk, evicting least recently used entries."""
+        self._remember(key, data)
+        self.counters["stores"] += 1
+        path = self._path(key)
+        try:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_bytes:
+                self.prune()
+        except OSError as e:
+            logger.warning(f"Could not write chart cache entry {path}: {e}")
+
+    def _remember(self, key, data):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_max_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _disk_entries(self):
+        """(path, size, mtime) for every cached file."""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for root, _, files in os.walk(self.cache_dir):
+            for filename in files:
+                if filename.endswith('.png'):
+                    path = os.path.join(root, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def prune(self):
+        """Delete least recently used files until the disk cache fits in max_bytes."""
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.counters["evictions"] += 1
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+    # --- Rendering ---
+
+    def render(self, name, spec, draw, parts=1):
+        """
+        Return the chart's image buffer(s), drawing it only on a cache miss.
+
+        Args:
+            name (str): Chart name, part of the key.
+            spec: JSON-serialisable chart inputs.
+            draw (callable): Renders the chart; returns a BytesIO, or a tuple of `parts`
+                BytesIO objects. A None result is returned as-is and not cached.
+            parts (int): Number of images the chart produces.
+        Returns:
+            BytesIO, or a tuple of BytesIO when parts > 1.
+        """
+        if not self.enabled:
+            return draw()
+        keys = [self.key(name, spec, part) for part in range(parts)]
+        cached = []
+        for key in keys:
+            data = self.get(key)
+            if data is None:
+                break
+            cached.append(data)
+        if len(cached) == parts:
+            buffers = tuple(BytesIO(data) for data in cached)
+            return buffers if parts > 1 else buffers[0]
+
+        start = time.perf_counter()
+        result = draw()
+        logger.debug(f"Rendered chart {name} in {time.perf_counter() - start:.2f}s")
+        buffers = result if parts > 1 else (result,)
+        if result is None or any(buffer is None for buffer in buffers):
+            return result
+        for key, buffer in zip(keys, buffers):
+            self.put(key, buffer.getvalue())
+            buffer.seek(0)
+        return result
+
+    def stats(self):
+        """Hit/miss counters plus the overall hit rate."""
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        lookups = hits + self.counters["misses"]
+        return dict(self.counters, hit_rate=round(hits / lookups, 3) if lookups else None)
+
+
+_default_cache = None
+
+
+def default_cache():
+    """The per-process chart cache used by @cached_chart."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ChartCache()
+    return _default_cache
+
+
+def cached_chart(name, spec=None, parts=1):
+    """
+    Decorator caching a chart function's image output by content hash.
+
+    Args:
+        name (str): Chart name.
+        spec (callable): Builds the cache spec from the call arguments. Defaults to the
+            bound arguments themselves.
+        parts (int): Number of image buffers the function returns.
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if spec is not None:
+                chart_spec = spec(*args, **kwargs)
+            else:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                chart_spec = dict(bound.arguments)
+            return default_cache().render(name, chart_spec, lambda: fn(*args, **kwargs), parts=parts)
+        return wrapper
+    return decorator
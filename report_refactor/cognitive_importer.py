@@ -34,31 +34,42 @@ from .parsing_helpers import (
     parse_all_cognitive_subtests_from_pdf,
     extract_npq_domain_scores_from_pdf, safe_float
 )
-from db import (
-    create_test_session, insert_cognitive_scores, insert_subtest_results, insert_asrs_responses,
-    insert_dsm_diagnosis, insert_epworth_responses, insert_npq_domain_scores, insert_npq_responses,
-    insert_dsm_criteria_met, insert_epworth_summary
-)
+from .parsed_report import ParsedReport, open_report
+from .parse_artifacts import cached_parse
+from .line_classifier import ClassifiedText
+from db import import_parsed_report
 
 DB_PATH = "cognitive_analysis.db"
 
+def create_db(reset=False):
+    """
+    Ensure the report tables exist in the unified database.
+    With reset=True all imported report data (test sessions and their child rows) is dropped
+    first; referrals are kept.
+    """
+    from db import Base, engine, Referral
+    if reset:
+        report_tables = [t for t in Base.metadata.sorted_tables if t.name != Referral.__tablename__]
+        Base.metadata.drop_all(engine, tables=report_tables)
+        logger.warning("Dropped all imported report data (referrals kept).")
+    Base.metadata.create_all(engine)
+
 # ... rest of the file unchanged ...
 
 def extract_npq_text(pdf_path):
-    import pdfplumber
     lines = []
     npq_page_found = False
     
-    with pdfplumber.open(pdf_path) as pdf:
+    with open_report(pdf_path) as report:
         # First identify which page contains the NPQ section
-        for i in range(len(pdf.pages)):
-            text = pdf.pages[i].extract_text()
+        for i in range(report.page_count):
+            text = report.text(i)
             if text and ("NeuroPsych Questionnaire" in text or "Domain Score Severity" in text):
                 npq_page_found = True
                 logger.debug(f"Found NPQ on page {i+1}")
                 # Once we find the NPQ section, extract from this page and a few pages after
-                for j in range(i, min(i+5, len(pdf.pages))):
-                    page_text = pdf.pages[j].extract_text()
+                for j in range(i, min(i+5, report.page_count)):
+                    page_text = report.text(j)
                     if page_text:
                         # Check if we've reached the end of NPQ section
                         if j > i and "NeuroPsych Questionnaire" not in page_text and "Domain Score" not in page_text:
@@ -79,9 +90,9 @@ def extract_npq_text(pdf_path):
                 
     if not npq_page_found:
         # Fallback to scanning a broader range of pages
-        with pdfplumber.open(pdf_path) as pdf:
-            for i in range(5, min(13, len(pdf.pages))):  # Pages 6-13 (0-indexed)
-                text = pdf.pages[i].extract_text()
+        with open_report(pdf_path) as report:
+            for i in range(5, min(13, report.page_count)):  # Pages 6-13 (0-indexed)
+                text = report.text(i)
                 if text:
                     logger.debug(f"Fallback: Checking page {i+1} for NPQ content")
                     if "NeuroPsych Questionnaire" in text or "Domain Score Severity" in text:
@@ -109,22 +120,59 @@ def parse_all_subtests(pdf_path, patient_id, debug=False):
 def import_pdf_to_db(pdf_path):
     """
     Parses a cognitive report PDF using parsing_helpers and imports the data into the unified SQLAlchemy database.
+    The PDF is opened once as a ParsedReport and shared by every parsing stage.
     Returns True on success, False on failure.
     """
     logger.info(f"Attempting to import PDF data for: {pdf_path}")
+    payload = parse_pdf_report(pdf_path)
+    if payload is None:
+        return False
+    write_parsed_report(payload)
+    return True
+
+def parse_pdf_report(pdf_path, use_artifacts=None):
+    """
+    Parse every section of a cognitive report PDF without touching the database.
+
+    A PDF path is looked up in the parse artifact store first (see parse_artifacts.py), so
+    a PDF whose content was already parsed by this parser version is not opened again.
+
+    Args:
+        pdf_path (str | ParsedReport): Path to the PDF, or an already opened report.
+        use_artifacts (bool): False to always parse the PDF (None follows LUCID_PARSE_ARTIFACTS).
+    Returns:
+        dict: Plain (picklable) payload with the patient info, session date and one list
+              of row dicts per child table, ready for write_parsed_report.
+              None if the PDF has no text or no patient ID.
+    """
+    if isinstance(pdf_path, ParsedReport):
+        return _parse_report(pdf_path)
+    payload = cached_parse(pdf_path, 'report', _parse_pdf, use_artifacts=use_artifacts)
+    if payload is not None:
+        payload['pdf_path'] = pdf_path  # The artifact may have been parsed from another copy
+    return payload
+
+def _parse_pdf(pdf_path):
+    with open_report(pdf_path) as report:
+        return _parse_report(report)
+
+def _parse_report(report):
+    pdf_path = report.pdf_path
 
     # --- Stage 1: Extract text blocks ---
-    lines = extract_text_blocks(pdf_path)
+    lines = extract_text_blocks(report)
     if not lines:
         logger.error(f"Could not extract any text blocks from {pdf_path}.")
-        return False
+        return None
     raw_text = "\n".join(lines)
+    # Every line is classified once; the text parsers below read the tagged lines
+    text = ClassifiedText(raw_text)
     
     # --- Stage 2: Parse Patient Info ---
-    patient_info_tuple = parse_basic_info(raw_text)
+    patient_info_tuple = parse_basic_info(text)
     if not patient_info_tuple or not patient_info_tuple[0]:
         logger.error(f"Essential patient information (ID) could not be parsed from {pdf_path}.")
-        return False
+        return None
     patient_id, test_date, age, language = patient_info_tuple
     patient_info = {
         'patient_id': patient_id,
@@ -133,29 +181,6 @@ def import_pdf_to_db(pdf_path):
         'language': language
     }
 
-    # --- Stage 3: Referral/Session Setup (unchanged) ---
-    referral_id = patient_info.get('referral_id')
-    if not referral_id:
-        from db import Session, Referral
-        with Session() as session:
-            referral = session.query(Referral).filter_by(id_number=patient_info.get('patient_id')).first()
-            if referral:
-                referral_id = referral.id
-            else:
-                from datetime import datetime
-                from db import save_referral
-                referral_id = save_referral(
-                    {'email': patient_info.get('email', ''),
-                     'mobile': patient_info.get('mobile', ''),
-                     'dob': patient_info.get('dob', ''),
-                     'id_number': patient_info.get('patient_id', '')},
-                    subject='[Auto-imported]',
-                    body='',
-                    referrer=None,
-                    referrer_email=None,
-                    referral_received_time=datetime.now(),
-                    referral_confirmed_time=None
-                )
     session_date = patient_info.get('test_date')
     from datetime import datetime
     if isinstance(session_date, str):
@@ -168,11 +193,10 @@ def import_pdf_to_db(pdf_path):
                 session_date = datetime.now()
     elif session_date is None:
         session_date = datetime.now()
-    session_id = create_test_session(referral_id, session_date, status="parsed")
 
-    # --- Stage 4: Parse and Insert Data ---
+    # --- Stage 3: Parse Data ---
     # Cognitive Scores
-    raw_score_tuples = parse_cognitive_scores(raw_text, patient_id)
+    raw_score_tuples = parse_cognitive_scores(text, patient_id)
     # Convert tuples to dicts, sanitize only numeric fields
     raw_score_dicts = [
         {
@@ -184,21 +208,17 @@ def import_pdf_to_db(pdf_path):
         }
         for t in raw_score_tuples
     ]
-    insert_cognitive_scores(session_id, raw_score_dicts)
 
     # Epworth
-    epworth_total, epworth_responses = parse_epworth(raw_text, patient_id)
+    epworth_total, epworth_responses = parse_epworth(text, patient_id)
     # Convert tuples to dicts for DB insert
     epworth_response_dicts = [
         {'situation': t[2], 'score': t[3]} for t in epworth_responses
     ]
-    insert_epworth_responses(session_id, epworth_response_dicts)
-    if epworth_total is not None:
-        insert_epworth_summary(session_id, epworth_total)
 
     # Subtests
     logger.info(f"Parsing cognitive subtests from PDF: {pdf_path}")
-    subtest_tuples = parse_all_subtests(pdf_path, patient_id)
+    subtest_tuples = parse_all_subtests(report, patient_id)
     subtest_dicts = [
         {
             'subtest_name': t[1],
@@ -210,10 +230,9 @@ def import_pdf_to_db(pdf_path):
         }
         for t in subtest_tuples
     ]
-    insert_subtest_results(session_id, subtest_dicts)
 
     # ASRS
-    asrs_tuples = parse_asrs_with_bounding_boxes(pdf_path, patient_id)
+    asrs_tuples = parse_asrs_with_bounding_boxes(report, patient_id)
     asrs_dicts = [
         {
             'question_number': t[1],
@@ -222,14 +241,13 @@ def import_pdf_to_db(pdf_path):
         }
         for t in asrs_tuples
     ]
-    insert_asrs_responses(session_id, asrs_dicts)
 
     # NPQ
-    npq_pages = find_npq_pages(pdf_path)
+    npq_pages = find_npq_pages(report)
     npq_questions = []
     npq_domain_scores = []
     if npq_pages:
-        npq_questions = extract_npq_questions_pymupdf(pdf_path, npq_pages)
+        npq_questions = extract_npq_questions_pymupdf(report, npq_pages)
         npq_questions = [
             {
                 'question_number': t[0],
@@ -240,13 +258,13 @@ def import_pdf_to_db(pdf_path):
             }
             for t in npq_questions
         ]
-        npq_domain_scores = extract_npq_domain_scores_from_pdf(pdf_path, npq_pages)
+        npq_domain_scores = extract_npq_domain_scores_from_pdf(report, npq_pages)
         npq_domain_scores = [
             {'domain': t[0], 'score': t[1], 'severity': t[2]}
             for t in npq_domain_scores
         ]
     else:
-        npq_section_text = '\n'.join([lines[i] for i in npq_pages]) if npq_pages else raw_text
+        npq_section_text = '\n'.join([lines[i] for i in npq_pages]) if npq_pages else text
         npq_questions = parse_npq_questions_from_text(npq_section_text)
         npq_questions = [
             {
@@ -258,8 +276,6 @@ def import_pdf_to_db(pdf_path):
             }
             for t in npq_questions
         ]
-    insert_npq_responses(session_id, npq_questions)
-    insert_npq_domain_scores(session_id, npq_domain_scores)
 
     # DSM Diagnosis
     dsm = extract_dsm_diagnosis(asrs_dicts, patient_id)
@@ -279,8 +295,8 @@ def import_pdf_to_db(pdf_path):
     else:
         logger.error(f"DSM diagnosis is unexpected type: {type(dsm)} value: {dsm}")
         dsm = []
+    criteria_data = []
     if dsm:
-        insert_dsm_diagnosis(session_id, dsm)
         # Robust conversion for dsm_criteria_data
         criteria_data = dsm[0].get('dsm_criteria_data', [])
         if criteria_data and isinstance(criteria_data, list):
@@ -293,21 +309,132 @@ def import_pdf_to_db(pdf_path):
                     }
                     for t in criteria_data
                 ]
-        insert_dsm_criteria_met(session_id, criteria_data)
 
+    return {
+        'pdf_path': pdf_path,
+        'patient': patient_info,
+        'session_date': session_date,
+        'cognitive_scores': raw_score_dicts,
+        'epworth_responses': epworth_response_dicts,
+        'epworth_summary': epworth_total,
+        'subtests': subtest_dicts,
+        'asrs_responses': asrs_dicts,
+        'npq_responses': npq_questions,
+        'npq_domain_scores': npq_domain_scores,
+        'dsm_diagnoses': dsm,
+        'dsm_criteria': criteria_data,
+    }
+
+def write_parsed_report(payload):
+    """
+    Write a payload from parse_pdf_report to the unified SQLAlchemy database.
+    The session row and all child rows are committed in a single transaction.
+    Returns the new test session ID.
+    """
+    session_id = import_parsed_report(payload)
     logger.info(f"Successfully imported all available data for session ID: {session_id}")
-    return True
+    return session_id
+
+# Report tables replaced for a patient by write_analysis_report (dass21_* are not parsed from the PDF)
+ANALYSIS_PATIENT_TABLES = ['patients', 'cognitive_scores', 'subtest_results', 'asrs_responses', 'epworth_scores',
+                           'epworth_total', 'npq_scores', 'npq_questions', 'asrs_dsm_diagnosis', 'dsm_criteria_met']
+
+def write_analysis_report(payload, db_path=DB_PATH):
+    """
+    Write a payload from parse_pdf_report to the per-patient tables of cognitive_analysis.db,
+    which the report renderer (data_access.PatientDataLoader) and population_stats read.
+    The patient's previous rows are replaced in a single transaction.
+    Returns the patient ID.
+    """
+    from sqlite_profile import connect as connect_db
+    from migrations import ANALYSIS_MIGRATIONS, apply_migrations, create_analysis_tables
+
+    patient = payload['patient']
+    patient_id = patient['patient_id']
+    conn = connect_db(db_path)
+    try:
+        create_analysis_tables(conn)
+        apply_migrations(conn, ANALYSIS_MIGRATIONS)
+        with conn:
+            for table in ANALYSIS_PATIENT_TABLES:
+                conn.execute(f"DELETE FROM {table} WHERE patient_id = ?", (patient_id,))
+            conn.execute("INSERT INTO patients (patient_id, test_date, age, language) VALUES (?, ?, ?, ?)",
+                         (patient_id, patient.get('test_date'), patient.get('age'), patient.get('language')))
+            conn.executemany(
+                "INSERT INTO cognitive_scores (patient_id, domain, patient_score, standard_score, percentile, validity_index) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(patient_id, row['domain'], row['patient_score'], row['standard_score'], row['percentile'],
+                  row['validity_index']) for row in payload.get('cognitive_scores', [])])
+            conn.executemany(
+                "INSERT INTO subtest_results (patient_id, subtest_name, metric, score, standard_score, percentile, validity_flag) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(patient_id, row['subtest_name'], row['metric'], row['score'], row['standard_score'],
+                  row['percentile'], row['validity_flag']) for row in payload.get('subtests', [])])
+            conn.executemany(
+                "INSERT INTO asrs_responses (patient_id, question_number, part, response) VALUES (?, ?, ?, ?)",
+                [(patient_id, row['question_number'], row['part'], row['response'])
+                 for row in payload.get('asrs_responses', [])])
+            conn.executemany(
+                "INSERT INTO epworth_scores (patient_id, question_number, situation, score, description) VALUES (?, ?, ?, ?, ?)",
+                [(patient_id, number, row['situation'], row['score'], None)
+                 for number, row in enumerate(payload.get('epworth_responses', []), start=1)])
+            summary = payload.get('epworth_summary')
+            if summary and summary.get('total_score') is not None:
+                conn.execute("INSERT INTO epworth_total (patient_id, total_score, interpretation) VALUES (?, ?, ?)",
+                             (patient_id, summary['total_score'], summary.get('interpretation')))
+            conn.executemany(
+                "INSERT INTO npq_scores (patient_id, domain, score, severity, description) VALUES (?, ?, ?, ?, ?)",
+                [(patient_id, row['domain'], row['score'], row['severity'], "")
+                 for row in payload.get('npq_domain_scores', [])])
+            conn.executemany(
+                "INSERT INTO npq_questions (patient_id, domain, question_number, question_text, score, severity) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(patient_id, row['domain'], row['question_number'], row['question_text'], row['score'], row['severity'])
+                 for row in payload.get('npq_responses', [])])
+            for diagnosis in payload.get('dsm_diagnoses', [])[:1]:
+                conn.execute(
+                    "INSERT INTO asrs_dsm_diagnosis (patient_id, inattentive_criteria_met, hyperactive_criteria_met, diagnosis) "
+                    "VALUES (?, ?, ?, ?)",
+                    (str(patient_id), diagnosis.get('inattentive_criteria_met'),
+                     diagnosis.get('hyperactive_criteria_met'), diagnosis.get('diagnosis')))
+            conn.executemany(
+                "INSERT INTO dsm_criteria_met (patient_id, dsm_criterion, dsm_category, is_met) VALUES (?, ?, ?, ?)",
+                [(str(patient_id), row['dsm_criterion'], row['dsm_category'], row['is_met'])
+                 for row in payload.get('dsm_criteria', []) if isinstance(row, dict)])
+    finally:
+        conn.close()
+    logger.info(f"Wrote report tables for patient {patient_id} to {db_path}")
+    return patient_id
+
+def parse_pdf_file(pdf_path, use_artifacts=None):
+    """
+    Process-pool entry point for batch imports: parse one PDF in isolation
+    (or load its stored parse, see parse_pdf_report).
+
+    Never raises, so one malformed PDF cannot fail the batch.
+    Returns:
+        tuple: (pdf_path, payload or None, error message or None, parse seconds)
+    """
+    import time
+    start = time.perf_counter()
+    try:
+        payload = parse_pdf_report(pdf_path, use_artifacts=use_artifacts)
+        error = None if payload is not None else "no text or patient ID could be parsed"
+    except Exception as e:
+        logger.exception(f"Worker failed to parse {pdf_path}")
+        payload, error = None, f"{type(e).__name__}: {e}"
+    return pdf_path, payload, error, time.perf_counter() - start
 
 # ... rest of the file unchanged ...
 
 def extract_subtest_section(pdf_path):
     """Extract subtest scores section using pdfplumber"""
     try:
-        with pdfplumber.open(pdf_path) as pdf:
+        with open_report(pdf_path) as report:
             all_text = []
             logger.debug("\nDEBUG: === Raw PDF Tables by Page ===")
-            for page_num, page in enumerate(pdf.pages[:3], 1):
-                tables = page.extract_tables()
+            for page_num in range(1, min(3, report.page_count) + 1):
+                tables = report.tables(page_num - 1)
 
                 for table_num, table in enumerate(tables, 1):
                     logger.debug(f"\n=== Page {page_num}, Table {table_num} ===")
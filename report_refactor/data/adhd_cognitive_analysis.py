@@ -31,6 +31,8 @@ import argparse
 script_dir = Path(__file__).parent
 parent_dir = script_dir.parent
 sys.path.append(str(parent_dir))
+sys.path.append(str(parent_dir.parent))  # repository root, for sqlite_profile
+from sqlite_profile import connect as connect_db
 
 # Import ASRS-DSM mapping for analysis
 try:
@@ -95,7 +97,7 @@ class ADHDCognitiveAnalysis:
     def connect_to_db(self):
         """Connect to the SQLite database."""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = connect_db(self.db_path, read_only=True)
             print(f"Connected to database: {self.db_path}")
             return True
         except sqlite3.Error as e:
@@ -36,6 +36,8 @@ import logging
 script_dir = Path(__file__).parent
 parent_dir = script_dir.parent
 sys.path.append(str(parent_dir))
+sys.path.append(str(parent_dir.parent))  # repository root, for sqlite_profile
+from sqlite_profile import connect as connect_db
 
 # Try to import the adhd_cognitive_analysis script if it exists
 try:
@@ -131,7 +133,7 @@ class MasterCognitiveAnalysis:
     def connect_to_db(self):
         """Connect to the SQLite database."""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = connect_db(self.db_path, read_only=True)
             logger.info(f"Connected to database: {self.db_path}")
             return True
         except sqlite3.Error as e:
@@ -13,6 +13,10 @@ from datetime import datetime
 from pathlib import Path
 import logging
 
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))  # repository root
+from sqlite_profile import connect as connect_db
+from migrations import ANALYSIS_MIGRATIONS, apply_migrations
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -75,11 +79,12 @@ class ASRStoDSMProcessor:
     def connect_to_db(self):
         """Connect to the SQLite database."""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = connect_db(self.db_path)
             self.cursor = self.conn.cursor()
             logging.info(f"Connected to database: {self.db_path}")
             if not self.create_tables():
                 return False
+            apply_migrations(self.conn, ANALYSIS_MIGRATIONS)
             return True
         except sqlite3.Error as e:
             logging.error(f"Error connecting to database: {e}")
@@ -29,6 +29,8 @@ import argparse
 script_dir = Path(__file__).parent
 parent_dir = script_dir.parent
 sys.path.append(str(parent_dir))
+sys.path.append(str(parent_dir.parent))  # repository root, for sqlite_profile
+from sqlite_profile import connect as connect_db
 
 # Define paths
 DB_PATH = os.path.join(script_dir, "cognitive_analysis.db")
@@ -72,7 +74,7 @@ class ReactionTimeAnalysis:
     def connect_to_db(self):
         """Connect to the SQLite database."""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = connect_db(self.db_path, read_only=True)
             print(f"Connected to database: {self.db_path}")
             return True
         except sqlite3.Error as e:
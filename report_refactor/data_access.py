@@ -1,7 +1,13 @@
+import sys
 import sqlite3
 import logging
+from pathlib import Path
 import pandas as pd
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+
+# Shared SQLite connection profile lives in the repository root
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from sqlite_profile import connect as connect_db
 
 # Set up logging
 logging.basicConfig(
@@ -16,26 +22,142 @@ def debug_log(message):
     logging.debug(message)
     print(message)
 
+# Report sections and the table each is read from; every table is keyed by patient_id
+PATIENT_SECTIONS = {
+    "patient": "patients",
+    "cognitive_scores": "cognitive_scores",
+    "subtests": "subtest_results",
+    "asrs": "asrs_responses",
+    "dass_summary": "dass21_scores",
+    "dass_items": "dass21_responses",
+    "epworth": "epworth_scores",
+    "npq_scores": "npq_scores",
+    "npq_questions": "npq_questions",
+}
+
+# check_data_completeness flag -> section it is computed from
+COMPLETENESS_SECTIONS = {
+    "patient_info": "patient",
+    "cognitive_scores": "cognitive_scores",
+    "subtests": "subtests",
+    "asrs": "asrs",
+    "dass": "dass_summary",
+    "epworth": "epworth",
+    "npq": "npq_scores",
+}
+
+# Keep IN (...) lists under SQLite's bound-parameter limit
+MAX_IN_PARAMS = 500
+
+def empty_patient_data():
+    """The fetch_all_patient_data result for a patient with no rows."""
+    return {section: ([] if section != "patient" else None) for section in PATIENT_SECTIONS}
+
+def data_completeness(data):
+    """Completeness flags (see check_data_completeness) for an already fetched patient data dict."""
+    return {flag: bool(data.get(section)) for flag, section in COMPLETENESS_SECTIONS.items()}
+
+def has_patient_data(data):
+    """True if the patient row exists and there are cognitive scores or subtest results."""
+    return data.get("patient") is not None and bool(data.get("cognitive_scores") or data.get("subtests"))
+
+class PatientDataLoader:
+    """
+    Loads every report section for one or many patients over a single read-only connection.
+
+    Each section is fetched with one batched `WHERE patient_id IN (...)` query for all
+    requested patients, rather than one connection and query per getter per patient.
+    Rows come back as namedtuple records (row.percentile, row.validity_index, ...), so
+    fields can be read by name while existing index-based access keeps working.
+
+    Usage:
+        with PatientDataLoader(db_path) as loader:
+            all_data = loader.fetch(patient_ids)
+            completeness = data_completeness(all_data[patient_id])
+    """
+
+    def __init__(self, db_path="cognitive_analysis.db"):
+        self.db_path = db_path
+        self._conn = None
+        self._record_types = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = connect_db(self.db_path, read_only=True)
+            self._conn.row_factory = self._make_record
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _make_record(self, cursor, row):
+        """sqlite3 row factory building one namedtuple type per distinct column set."""
+        columns = tuple(column[0] for column in cursor.description)
+        record_type = self._record_types.get(columns)
+        if record_type is None:
+            record_type = namedtuple("Record", columns, rename=True)
+            self._record_types[columns] = record_type
+        return record_type(*row)
+
+    def _fetch_table(self, table, patient_ids):
+        """All rows of `table` for the given patients, in insertion order."""
+        rows = []
+        for start in range(0, len(patient_ids), MAX_IN_PARAMS):
+            chunk = patient_ids[start:start + MAX_IN_PARAMS]
+            placeholders = ", ".join("?" * len(chunk))
+            rows.extend(self.conn.execute(
+                f"SELECT * FROM {table} WHERE patient_id IN ({placeholders}) ORDER BY rowid", chunk
+            ).fetchall())
+        return rows
+
+    def fetch(self, patient_ids):
+        """
+        Fetch all report sections for the given patients.
+
+        Args:
+            patient_ids (iterable): Patient IDs (int or str).
+        Returns:
+            dict: patient_id (as passed in) -> data dict shaped like fetch_all_patient_data.
+        """
+        patient_ids = list(dict.fromkeys(patient_ids))
+        results = {patient_id: empty_patient_data() for patient_id in patient_ids}
+        if not patient_ids:
+            return results
+        by_key = {str(patient_id): patient_id for patient_id in patient_ids}
+        keys = list(by_key)
+        for section, table in PATIENT_SECTIONS.items():
+            try:
+                rows = self._fetch_table(table, keys)
+            except sqlite3.Error as e:
+                debug_log(f"[ERROR] Error fetching {section} from {table}: {e}")
+                continue
+            for row in rows:
+                data = results[by_key[str(row.patient_id)]]
+                if section == "patient":
+                    data["patient"] = row
+                else:
+                    data[section].append(row)
+        return results
+
+    def fetch_one(self, patient_id):
+        """Fetch all report sections for a single patient."""
+        return self.fetch([patient_id])[patient_id]
+
 def patient_exists_in_db(patient_id, db_path="cognitive_analysis.db"):
     """Check if the patient has valid data in the database."""
     try:
-        conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-        
-        # Check if patient exists in the patients table
-        patient = cur.execute("SELECT * FROM patients WHERE patient_id = ?", (patient_id,)).fetchone()
-        
-        # Check if cognitive scores exist for the patient
-        scores = cur.execute("SELECT COUNT(*) FROM cognitive_scores WHERE patient_id = ?", (patient_id,)).fetchone()
-        
-        # Check if subtest results exist for the patient
-        subtests = cur.execute("SELECT COUNT(*) FROM subtest_results WHERE patient_id = ?", (patient_id,)).fetchone()
-        
-        conn.close()
-        
-        # Return True if the patient exists and has at least some data
-        return (patient is not None) and (scores[0] > 0 or subtests[0] > 0)
-    
+        with PatientDataLoader(db_path) as loader:
+            return has_patient_data(loader.fetch_one(patient_id))
     except Exception as e:
         debug_log(f"[ERROR] Error checking if patient exists: {e}")
         return False
@@ -45,59 +167,17 @@ def check_data_completeness(patient_id, db_path="cognitive_analysis.db"):
     Check if all required data components are available for the patient.
     Returns a dictionary with status of each component.
     """
-    result = {
-        "patient_info": False,
-        "cognitive_scores": False,
-        "subtests": False,
-        "asrs": False,
-        "dass": False,
-        "epworth": False,
-        "npq": False
-    }
-    
     try:
-        conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-        
-        # Check patient info
-        patient = cur.execute("SELECT * FROM patients WHERE patient_id = ?", (patient_id,)).fetchone()
-        result["patient_info"] = patient is not None
-        
-        # Check cognitive scores
-        scores = cur.execute("SELECT COUNT(*) FROM cognitive_scores WHERE patient_id = ?", (patient_id,)).fetchone()
-        result["cognitive_scores"] = scores[0] > 0
-        
-        # Check subtests
-        subtests = cur.execute("SELECT COUNT(*) FROM subtest_results WHERE patient_id = ?", (patient_id,)).fetchone()
-        result["subtests"] = subtests[0] > 0
-        
-        # Check ASRS
-        asrs = cur.execute("SELECT COUNT(*) FROM asrs_responses WHERE patient_id = ?", (patient_id,)).fetchone()
-        result["asrs"] = asrs[0] > 0
-        
-        # Check DASS
-        dass = cur.execute("SELECT COUNT(*) FROM dass21_scores WHERE patient_id = ?", (patient_id,)).fetchone()
-        result["dass"] = dass[0] > 0
-        
-        # Check Epworth
-        epworth = cur.execute("SELECT COUNT(*) FROM epworth_scores WHERE patient_id = ?", (patient_id,)).fetchone()
-        result["epworth"] = epworth[0] > 0
-        
-        # Check NPQ
-        npq = cur.execute("SELECT COUNT(*) FROM npq_scores WHERE patient_id = ?", (patient_id,)).fetchone()
-        result["npq"] = npq[0] > 0
-        
-        conn.close()
-        
+        with PatientDataLoader(db_path) as loader:
+            return data_completeness(loader.fetch_one(patient_id))
     except Exception as e:
         debug_log(f"[ERROR] Error checking data completeness: {e}")
-    
-    return result
+        return {flag: False for flag in COMPLETENESS_SECTIONS}
 
 def get_patient_data(patient_id, db_path="cognitive_analysis.db"):
     """Get patient basic information"""
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect_db(db_path, read_only=True)
         cur = conn.cursor()
         patient = cur.execute("SELECT * FROM patients WHERE patient_id = ?", (patient_id,)).fetchone()
         conn.close()
@@ -109,7 +189,7 @@ def get_patient_data(patient_id, db_path="cognitive_analysis.db"):
 def get_cognitive_scores(patient_id, db_path="cognitive_analysis.db"):
     """Get cognitive scores for a patient"""
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect_db(db_path, read_only=True)
         cur = conn.cursor()
         scores = cur.execute("SELECT * FROM cognitive_scores WHERE patient_id = ?", (patient_id,)).fetchall()
         conn.close()
@@ -121,7 +201,7 @@ def get_cognitive_scores(patient_id, db_path="cognitive_analysis.db"):
 def get_subtest_results(patient_id, db_path="cognitive_analysis.db"):
     """Get subtest results for a patient"""
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect_db(db_path, read_only=True)
         cur = conn.cursor()
         subtests = cur.execute("SELECT * FROM subtest_results WHERE patient_id = ?", (patient_id,)).fetchall()
         conn.close()
@@ -133,7 +213,7 @@ def get_subtest_results(patient_id, db_path="cognitive_analysis.db"):
 def get_asrs_responses(patient_id, db_path="cognitive_analysis.db"):
     """Get ASRS responses for a patient"""
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect_db(db_path, read_only=True)
         cur = conn.cursor()
         asrs = cur.execute("SELECT * FROM asrs_responses WHERE patient_id = ?", (patient_id,)).fetchall()
         conn.close()
@@ -145,7 +225,7 @@ def get_asrs_responses(patient_id, db_path="cognitive_analysis.db"):
 def get_dass_data(patient_id, db_path="cognitive_analysis.db"):
     """Get DASS scores and responses for a patient"""
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect_db(db_path, read_only=True)
         cur = conn.cursor()
         summary = cur.execute("SELECT * FROM dass21_scores WHERE patient_id = ?", (patient_id,)).fetchall()
         items = cur.execute("SELECT * FROM dass21_responses WHERE patient_id = ?", (patient_id,)).fetchall()
@@ -158,7 +238,7 @@ def get_dass_data(patient_id, db_path="cognitive_analysis.db"):
 def get_epworth_scores(patient_id, db_path="cognitive_analysis.db"):
     """Get Epworth scores for a patient"""
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect_db(db_path, read_only=True)
         cur = conn.cursor()
         epworth = cur.execute("SELECT * FROM epworth_scores WHERE patient_id = ?", (patient_id,)).fetchall()
         conn.close()
@@ -170,7 +250,7 @@ def get_epworth_scores(patient_id, db_path="cognitive_analysis.db"):
 def get_npq_data(patient_id, db_path="cognitive_analysis.db"):
     """Get NPQ scores and questions for a patient"""
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect_db(db_path, read_only=True)
         cur = conn.cursor()
         scores = cur.execute("SELECT * FROM npq_scores WHERE patient_id = ?", (patient_id,)).fetchall()
         questions = cur.execute("SELECT * FROM npq_questions WHERE patient_id = ?", (patient_id,)).fetchall()
@@ -191,7 +271,7 @@ def get_domain_scores_for_radar(patient_id, db_path="cognitive_analysis.db"):
     
     try:
         # Connect to the database
-        conn = sqlite3.connect(db_path)
+        conn = connect_db(db_path, read_only=True)
         cursor = conn.cursor()
         
         # Query to get standard scores for each domain
@@ -293,43 +373,16 @@ def fetch_all_patient_data(patient_id, db_path="cognitive_analysis.db"):
     Returns a dictionary with all patient data.
     """
     try:
-        # Get individual data components
-        patient = get_patient_data(patient_id, db_path)
-        cognitive_scores = get_cognitive_scores(patient_id, db_path)
-        subtests = get_subtest_results(patient_id, db_path)
-        asrs = get_asrs_responses(patient_id, db_path)
-        dass_data = get_dass_data(patient_id, db_path)
-        epworth = get_epworth_scores(patient_id, db_path)
-        npq_data = get_npq_data(patient_id, db_path)
-        
+        with PatientDataLoader(db_path) as loader:
+            data = loader.fetch_one(patient_id)
+
         # Debug output for cognitive scores
         debug_log("\n=== COGNITIVE SCORES FROM DATABASE ===")
-        for i, score in enumerate(cognitive_scores):
+        for i, score in enumerate(data["cognitive_scores"]):
             debug_log(f"  Score {i+1}: {score}")
         debug_log("=====================================\n")
-        
-        # Combine all data
-        return {
-            "patient": patient,
-            "cognitive_scores": cognitive_scores,
-            "subtests": subtests,
-            "asrs": asrs,
-            "dass_summary": dass_data["summary"],
-            "dass_items": dass_data["items"],
-            "epworth": epworth,
-            "npq_scores": npq_data["scores"],
-            "npq_questions": npq_data["questions"]
-        }
+
+        return data
     except Exception as e:
         debug_log(f"[ERROR] Error fetching all patient data: {e}")
-        return {
-            "patient": None,
-            "cognitive_scores": [],
-            "subtests": [],
-            "asrs": [],
-            "dass_summary": [],
-            "dass_items": [],
-            "epworth": [],
-            "npq_scores": [],
-            "npq_questions": []
-        }
+        return empty_patient_data()
@@ -1,27 +1,206 @@
 import sys
 import os
-from cognitive_importer import import_pdf_to_db, parse_basic_info, extract_text_blocks
-from report_generator import create_fancy_report
-from data_access import patient_exists_in_db, fetch_all_patient_data, check_data_completeness, debug_log
+import json
+import time
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from data_access import PatientDataLoader, data_completeness, has_patient_data, debug_log
+from population_stats import refresh_population_stats
+from chart_cache import default_cache
 
 #Use is as follows python generate_report.py path/to/yourfile.pdf --import
 #This will import the pdf to the database and generate a report
+#
+#Batch mode regenerates reports for patients already in the database:
+#python generate_report.py --patients ids.txt --workers 4 [--output-dir generated_reports]
 
 DB_PATH = "cognitive_analysis.db"
+DEFAULT_OUTPUT_DIR = "generated_reports"
+MANIFEST_NAME = "manifest.json"
+
+# Per-process state for batch workers, set up once by init_report_worker
+_worker = {}
 
 
 def extract_patient_id_from_pdf(pdf_path):
-    lines = extract_text_blocks(pdf_path)  # direct function call
-    text = "\n".join(lines)
-    patient_id, *_ = parse_basic_info(text)
-    return patient_id
+    """Patient ID from the report header; only the pages up to the first "Patient ID:" are read."""
+    from pdf_header import read_report_header
+    header = read_report_header(pdf_path)
+    if header is None:
+        raise ValueError(f"No patient ID found in {pdf_path}")
+    return int(header.patient_id)
+
+
+def read_patient_ids(path):
+    """Read patient IDs from a text file: one per line, blank lines and # comments ignored."""
+    patient_ids = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            patient_id = line.split("#", 1)[0].strip()
+            if patient_id:
+                patient_ids.append(patient_id)
+    return list(dict.fromkeys(patient_ids))
+
+
+def init_report_worker(db_path):
+    """
+    Pool initializer: import the plotting/reportlab stack and open the data loader once
+    per worker process instead of once per report.
+    """
+    from report_generator import create_fancy_report
+    _worker["render"] = create_fancy_report
+    _worker["loader"] = PatientDataLoader(db_path)
+
+
+def render_patient_reports(patient_ids, output_dir):
+    """
+    Worker task: render reports for a chunk of patients.
+
+    The chunk's data is fetched with one batched PatientDataLoader query, and a failing
+    patient does not stop the rest of the chunk.
+    Returns:
+        list: one manifest entry dict per patient.
+    """
+    fetch_start = time.perf_counter()
+    try:
+        all_data = _worker["loader"].fetch(patient_ids)
+        fetch_error = None
+    except Exception as e:
+        all_data, fetch_error = {}, f"data fetch failed: {e}"
+    fetch_seconds = (time.perf_counter() - fetch_start) / max(len(patient_ids), 1)
+
+    entries = []
+    chart_counters = default_cache().counters
+    for patient_id in patient_ids:
+        start = time.perf_counter()
+        counters_before = dict(chart_counters)
+        entry = {"patient_id": patient_id, "output_path": None, "error": fetch_error, "pid": os.getpid()}
+        data = all_data.get(patient_id)
+        if data is not None and not data["patient"]:
+            entry["error"] = "no patient data in database"
+        elif data is not None:
+            output_path = os.path.join(output_dir, f"{patient_id}_report.pdf")
+            try:
+                _worker["render"](data, output_path)
+                entry["output_path"] = output_path
+            except Exception as e:
+                entry["error"] = f"{type(e).__name__}: {e}"
+        entry["seconds"] = round(fetch_seconds + time.perf_counter() - start, 3)
+        entry["chart_cache"] = {name: chart_counters[name] - counters_before[name] for name in chart_counters}
+        entries.append(entry)
+    return entries
+
+
+def generate_reports(patient_ids, output_dir=DEFAULT_OUTPUT_DIR, workers=1, db_path=DB_PATH, chunk_size=None):
+    """
+    Generate reports for many patients already in the database.
+
+    Patients are split into chunks and fanned out over a pool of `workers` processes (or
+    rendered in this process when workers == 1). Reports are written to output_dir along
+    with a manifest.json of per-patient timings and failures.
+
+    Args:
+        patient_ids (list): Patient IDs to render.
+        output_dir (str): Directory for the PDFs and the manifest.
+        workers (int): Number of worker processes.
+        db_path (str): cognitive_analysis.db path.
+        chunk_size (int): Patients per worker task; defaults to about 4 tasks per worker.
+    Returns:
+        dict: The manifest.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    db_path = os.path.abspath(db_path)
+    if chunk_size is None:
+        chunk_size = max(1, min(25, -(-len(patient_ids) // (workers * 4))))
+    chunks = [patient_ids[i:i + chunk_size] for i in range(0, len(patient_ids), chunk_size)]
+
+    started_at = datetime.now().isoformat(timespec="seconds")
+    batch_start = time.perf_counter()
+    entries = []
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_report_worker, initargs=(db_path,)) as pool:
+            futures = {pool.submit(render_patient_reports, chunk, output_dir): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                try:
+                    entries.extend(future.result())
+                except BrokenProcessPool as e:
+                    entries.extend({"patient_id": patient_id, "output_path": None, "error": f"worker process crashed: {e}",
+                                    "pid": None, "seconds": None} for patient_id in futures[future])
+                print(f"[INFO] {len(entries)}/{len(patient_ids)} reports done")
+    else:
+        init_report_worker(db_path)
+        try:
+            for chunk in chunks:
+                entries.extend(render_patient_reports(chunk, output_dir))
+                print(f"[INFO] {len(entries)}/{len(patient_ids)} reports done")
+        finally:
+            _worker["loader"].close()
+
+    order = {patient_id: i for i, patient_id in enumerate(patient_ids)}
+    entries.sort(key=lambda entry: order[entry["patient_id"]])
+    failures = [entry for entry in entries if entry["error"]]
+    chart_cache = {}
+    for entry in entries:
+        for name, count in entry.get("chart_cache", {}).items():
+            chart_cache[name] = chart_cache.get(name, 0) + count
+    manifest = {
+        "started_at": started_at,
+        "wall_seconds": round(time.perf_counter() - batch_start, 3),
+        "workers": workers,
+        "db_path": db_path,
+        "total": len(patient_ids),
+        "succeeded": len(entries) - len(failures),
+        "failed": len(failures),
+        "chart_cache": chart_cache,
+        "reports": entries,
+        "failures": [{"patient_id": entry["patient_id"], "error": entry["error"]} for entry in failures],
+    }
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def batch_main(args):
+    """Handle --patients ids.txt [--workers N] [--output-dir DIR]."""
+    options = {"--patients": None, "--workers": "1", "--output-dir": DEFAULT_OUTPUT_DIR}
+    i = 0
+    while i < len(args):
+        key, _, value = args[i].partition("=")
+        if key in options and not value and i + 1 < len(args):
+            value = args[i + 1]
+            i += 1
+        if key in options and value:
+            options[key] = value
+        i += 1
+    if not options["--patients"]:
+        print("Usage: python generate_report.py --patients ids.txt [--workers N] [--output-dir DIR]")
+        sys.exit(1)
+
+    patient_ids = read_patient_ids(options["--patients"])
+    workers = int(options["--workers"])
+    print(f"[INFO] Generating {len(patient_ids)} reports with {workers} worker(s) into {options['--output-dir']}")
+    manifest = generate_reports(patient_ids, options["--output-dir"], workers=workers)
+    print(f"[INFO] {manifest['succeeded']} succeeded, {manifest['failed']} failed in {manifest['wall_seconds']:.1f}s")
+    for failure in manifest["failures"]:
+        print(f"[ERROR] Patient {failure['patient_id']}: {failure['error']}")
+    print(f"[INFO] Manifest written to {os.path.join(options['--output-dir'], MANIFEST_NAME)}")
+    return manifest
 
 
 def main():
+    if any(arg.partition("=")[0] == "--patients" for arg in sys.argv[1:]):
+        manifest = batch_main(sys.argv[1:])
+        sys.exit(1 if manifest["failed"] else 0)
+
     if len(sys.argv) < 2:
         print("Usage: python generate_report.py path/to/file.pdf [--import]")
+        print("       python generate_report.py --patients ids.txt [--workers N] [--output-dir DIR]")
         sys.exit(1)
 
+    from cognitive_importer import import_pdf_to_db
+    from report_generator import create_fancy_report
+
     pdf_path = sys.argv[1]
     force_import = "--import" in sys.argv
 
@@ -29,36 +208,42 @@ def main():
     patient_id = extract_patient_id_from_pdf(pdf_path)
     print(f"[INFO] Processing data for patient ID: {patient_id}")
     
-    # Check if the patient data needs to be imported
-    if force_import or not patient_exists_in_db(patient_id, DB_PATH):
-        print(f"[INFO] Patient {patient_id} data not found in database or force import requested. Importing from PDF...")
-        debug_log(f"Triggering import for patient {patient_id}. Force Import: {force_import}, Patient Exists: {patient_exists_in_db(patient_id, DB_PATH)}")
-        import_pdf_to_db(pdf_path)
-        print(f"[INFO] Import complete for patient {patient_id}")
-    else:
-        print(f"[INFO] Using existing database data for patient {patient_id}")
-        debug_log(f"Skipping import for patient {patient_id}. Force Import: {force_import}, Patient Exists: True")
+    with PatientDataLoader(DB_PATH) as loader:
+        # One fetch answers both "does the patient exist" and "is the data complete"
+        data = loader.fetch_one(patient_id)
+        patient_exists = has_patient_data(data)
 
-    # Check data completeness
-    completeness = check_data_completeness(patient_id, DB_PATH)
-    debug_log(f"Data completeness for patient {patient_id}: {completeness}")
-    
-    # Check if we need to re-import due to missing essential data
-    needs_reimport = not completeness["patient_info"] or not completeness["cognitive_scores"]
-    if needs_reimport:
-        if not force_import:
-            print(f"[WARN] Essential data missing (Patient Info: {completeness['patient_info']}, Cognitive Scores: {completeness['cognitive_scores']}). Re-importing from PDF...")
-            debug_log(f"Triggering re-import due to missing essential data for patient {patient_id}.")
+        # Check if the patient data needs to be imported
+        if force_import or not patient_exists:
+            print(f"[INFO] Patient {patient_id} data not found in database or force import requested. Importing from PDF...")
+            debug_log(f"Triggering import for patient {patient_id}. Force Import: {force_import}, Patient Exists: {patient_exists}")
             import_pdf_to_db(pdf_path)
-            print(f"[INFO] Re-import complete for patient {patient_id}")
+            print(f"[INFO] Import complete for patient {patient_id}")
+            refresh_population_stats(DB_PATH, patient_ids=[patient_id])
+            data = loader.fetch_one(patient_id)
         else:
-            debug_log(f"Essential data missing but force_import was already true, skipping redundant re-import check for patient {patient_id}.")
-    else:
-        debug_log(f"Essential data present, no re-import needed for patient {patient_id}.")
+            print(f"[INFO] Using existing database data for patient {patient_id}")
+            debug_log(f"Skipping import for patient {patient_id}. Force Import: {force_import}, Patient Exists: True")
+
+        # Check data completeness
+        completeness = data_completeness(data)
+        debug_log(f"Data completeness for patient {patient_id}: {completeness}")
+
+        # Check if we need to re-import due to missing essential data
+        needs_reimport = not completeness["patient_info"] or not completeness["cognitive_scores"]
+        if needs_reimport:
+            if not force_import:
+                print(f"[WARN] Essential data missing (Patient Info: {completeness['patient_info']}, Cognitive Scores: {completeness['cognitive_scores']}). Re-importing from PDF...")
+                debug_log(f"Triggering re-import due to missing essential data for patient {patient_id}.")
+                import_pdf_to_db(pdf_path)
+                print(f"[INFO] Re-import complete for patient {patient_id}")
+                refresh_population_stats(DB_PATH, patient_ids=[patient_id])
+                data = loader.fetch_one(patient_id)
+            else:
+                debug_log(f"Essential data missing but force_import was already true, skipping redundant re-import check for patient {patient_id}.")
+        else:
+            debug_log(f"Essential data present, no re-import needed for patient {patient_id}.")
 
-    # Now fetch the data (which should be in the database) and generate the report
-    data = fetch_all_patient_data(patient_id, DB_PATH)
-    
     # Verify that we have the necessary data before proceeding
     if not data["patient"]:
         print(f"[ERROR] No patient data found for ID {patient_id} after import attempt. Check the PDF and database.")
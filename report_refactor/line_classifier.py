@@ -0,0 +1,131 @@
+"""
+Single-pass line classifier shared by the text parsers in parsing_helpers.
+
+LINE_PATTERN is one compiled alternation with a named group per line kind. A report's
+text is scanned with it once (ClassifiedText), and every match is tagged with the kind
+whose group matched. The section parsers then read the tagged lines of the kinds they
+need instead of each rescanning the whole text with its own regexes:
+
+    text = ClassifiedText(raw_text)
+    parse_basic_info(text); parse_cognitive_scores(text, patient_id); parse_epworth(text, patient_id)
+
+PyMuPDF puts the cells of a table row on consecutive lines of one text block, so row
+kinds (score and Epworth rows) span those lines, as the parsers' original per-section
+regexes did. Single lines, such as the NPQ lines read block by block, are classified
+with classify_line(); NPQ domain headers are exact lines and are found by dict lookup.
+
+Every alternative is anchored at a line start, so the regex engine tries the alternation
+once per line rather than at every character, and lines not starting with a digit skip
+the digit-led kinds after one lookahead. Where two kinds could match the same line, the
+earlier kind in LINE_KINDS wins.
+"""
+import re
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional
+
+# NPQ question section headers, as printed, -> domain name stored in the database
+NPQ_DOMAIN_HEADERS = {
+    "Attention Questions": "Attention",
+    "Impulsive Questions": "Impulsive",
+    "Learning Questions": "Learning",
+    "Memory Questions": "Memory",
+    "Anxiety Questions": "Anxiety",
+    "Panic Questions": "Panic",
+    "Agoraphobia Questions": "Agoraphobia",
+    "Obsessions & Compulsions Questions": "Obsessions & Compulsions",
+    "Social Anxiety Questions": "Social Anxiety",
+    "Depression Questions": "Depression",
+    "Mood Stability Questions": "Mood Stability",
+    "Mania Questions": "Mania",
+    "Aggression Questions": "Aggression",
+    "Psychotic Questions": "Psychotic",
+    "Somatic Questions": "Somatic",
+    "Fatigue Questions": "Fatigue",
+    "Sleep Questions": "Sleep",
+    "Suicide Questions": "Suicide",
+    "Pain Questions": "Pain",
+    "Substance Abuse Questions": "Substance Abuse",
+    "PTSD Questions": "PTSD",
+    "Bipolar Questions": "Bipolar",
+    "Autism Questions": "Autism",
+    "Asperger's Questions": "Asperger's",
+    "ADHD Questions": "ADHD",
+    "MCI Questions": "MCI",
+    "Concussion Questions": "Concussion",
+    "Anxiety/Depression Questions": "Anxiety/Depression",
+}
+
+NPQ_DOMAIN_HEADER = 'npq_domain_header'
+
+# (kind, pattern) in matching order; group names are unique across kinds.
+# The patterns are those of the parsers that consume each kind, anchored at a line start.
+LINE_KINDS = [
+    # Report header fields (repeated on every page); full date and time, else its first token
+    ('patient_id', r"Patient ID:\s*(?P<pid>\d+)"),
+    ('test_date', r"Test Date:\s*(?:(?P<date>[\w\s,:/\\-]+\d{2}:\d{2}:\d{2})|(?P<date_token>[\w:/\\-]+))"),
+    ('age', r"Age:\s*(?P<years>\d+)"),
+    ('language', r"Language:\s*(?P<lang>.+)"),
+    # Domain score row: "Composite Memory\n102\n110\n75\nYes\nX"
+    ('score_row', r"(?P<sc_domain>.*?)\s+(?:NA\s+)?(?P<sc_patient>\d+|NA)\s+(?P<sc_standard>\d+)"
+                  r"\s+(?P<sc_percentile>\d+)\s+(?P<sc_valid>Yes|No)\s*X?$"),
+    # Epworth item: "3\nSitting inactive in a public place\n 2 - Moderate chance of dozing"
+    ('epworth_row', r"\s*(?P<ep_num>[1-8])\s+(?P<ep_situation>.+?)\s+(?P<ep_score>\d)\s*-\s*(?P<ep_desc>.+)$"),
+    # NPQ question on a single line (text fallback): "1. Trouble concentrating 2 Severe"
+    ('npq_text_question', r"[^\S\n]*(?P<tq_num>\d{1,2})(?:[).]|[^\S\n])+(?P<tq_text>.+?)[^\S\n]+(?P<tq_score>\d)"
+                          r"[^\S\n]+(?P<tq_severity>(?i:Mild|Moderate|Severe|None))\b.*$"),
+    # NPQ question number alone on its line, then the "score - severity" line after its text
+    ('npq_question_number', r"(?P<qnum>\d{1,2})$"),
+    ('npq_severity', r"\s*(?P<sev_score>\d)\s*-\s*(?P<sev_text>.*)$"),
+]
+# Kinds whose lines start with a digit; a lookahead skips them all on any other line
+DIGIT_KINDS = {'epworth_row', 'npq_text_question', 'npq_question_number', 'npq_severity'}
+
+
+def _alternation(kinds):
+    return "|".join(f"(?P<{kind}>{pattern})" for kind, pattern in kinds)
+
+
+LINE_PATTERN = re.compile(
+    r"^(?:" + _alternation(k for k in LINE_KINDS if k[0] not in DIGIT_KINDS)
+    + r"|(?=\s*\d)(?:" + _alternation(k for k in LINE_KINDS if k[0] in DIGIT_KINDS) + r"))",
+    re.MULTILINE)
+
+
+class TaggedLine(NamedTuple):
+    start: int  # Offset in the text
+    kind: str
+    text: str
+    match: Optional[re.Match]  # None for NPQ domain headers
+
+
+def classify_line(line: str):
+    """(kind, match) of a single stripped line; kind is None for lines of no known kind."""
+    if line in NPQ_DOMAIN_HEADERS:
+        return NPQ_DOMAIN_HEADER, None
+    match = LINE_PATTERN.fullmatch(line)
+    if match is None:
+        return None, None
+    return match.lastgroup, match
+
+
+class ClassifiedText:
+    """A text scanned once by LINE_PATTERN; by_kind lists the tagged lines of each kind in order."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.by_kind: Dict[str, List[TaggedLine]] = defaultdict(list)
+        for match in LINE_PATTERN.finditer(text):
+            kind = match.lastgroup
+            self.by_kind[kind].append(TaggedLine(match.start(), kind, match.group(0), match))
+
+    def lines(self, kind: str) -> List[TaggedLine]:
+        return self.by_kind.get(kind, [])
+
+    def first(self, kind: str) -> Optional[TaggedLine]:
+        tagged = self.lines(kind)
+        return tagged[0] if tagged else None
+
+
+def classified(text) -> ClassifiedText:
+    """A ClassifiedText for either raw text or an already classified text."""
+    return text if isinstance(text, ClassifiedText) else ClassifiedText(text)
@@ -0,0 +1,171 @@
+"""
+Persistent store for the structured output of parsing a CNS VS report PDF.
+
+A parse is stored once per PDF content and parser, keyed by the SHA-256 of the PDF and the
+parser's version:
+
+    <root>/ab/ab12...ef.report-v1.json.zst   (or .json.gz when zstandard is not installed)
+
+Re-importing an unchanged PDF (generate_report.py --import, batch_import.py --reset, a
+retried import_report job) then loads the artifact instead of parsing the PDF again. Bump
+the parser's entry in PARSER_VERSIONS whenever a change to it alters its output, so stale
+artifacts are ignored; they can be removed with prune().
+
+Artifacts are JSON with datetimes tagged as {"$datetime": iso}; writes go to a temporary
+file that is renamed into place, so a half-written artifact is never read.
+
+Environment:
+    LUCID_PARSE_ARTIFACT_DIR  store root (default: parse_artifacts next to this module)
+    LUCID_PARSE_ARTIFACTS     set to 0 to always parse the PDF
+"""
+import os
+import sys
+import gzip
+import json
+import logging
+import tempfile
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# The content hash is shared with the PDF blob store in the repository root; the path is
+# added for scripts run from report_refactor (pdf_cognitive_parser, generate_report)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_blob_store import hash_file
+
+logger = logging.getLogger(__name__)
+
+# Output version of each parser; bump when a parser change alters what it returns.
+# tests/test_parse_artifacts.py pins a fingerprint of each parser's output on the sample
+# PDF per version, so an output change without a bump fails there.
+PARSER_VERSIONS = {
+    'report': 1,                # cognitive_importer.parse_pdf_report
+    'pdf_cognitive_parser': 1,  # pdf_cognitive_parser.parse_text_file
+}
+
+DEFAULT_ROOT = os.environ.get('LUCID_PARSE_ARTIFACT_DIR') or \
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parse_artifacts')
+ENABLED = os.environ.get('LUCID_PARSE_ARTIFACTS', '1') != '0'
+ZSTD_SUFFIX = '.json.zst'
+GZIP_SUFFIX = '.json.gz'
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'$datetime': value.isoformat()}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _decode(obj):
+    if len(obj) == 1 and '$datetime' in obj:
+        return datetime.fromisoformat(obj['$datetime'])
+    return obj
+
+
+def dumps(payload):
+    data = json.dumps(payload, default=_encode, separators=(',', ':')).encode('utf-8')
+    if zstandard is not None:
+        return zstandard.ZstdCompressor().compress(data), ZSTD_SUFFIX
+    return gzip.compress(data), GZIP_SUFFIX
+
+
+def loads(blob, suffix):
+    if suffix == ZSTD_SUFFIX:
+        if zstandard is None:
+            raise RuntimeError("artifact is zstd-compressed but zstandard is not installed")
+        data = zstandard.ZstdDecompressor().decompress(blob)
+    else:
+        data = gzip.decompress(blob)
+    return json.loads(data, object_hook=_decode)
+
+
+class ParseArtifactStore:
+    """
+    Args:
+        root (str): Store directory, created on first write (default DEFAULT_ROOT).
+        versions (dict): Parser name -> output version (default PARSER_VERSIONS).
+    """
+
+    def __init__(self, root=None, versions=None):
+        self.root = root or DEFAULT_ROOT
+        self.versions = versions or PARSER_VERSIONS
+
+    def _path(self, sha256, parser, suffix):
+        return os.path.join(self.root, sha256[:2], f"{sha256}.{parser}-v{self.versions[parser]}{suffix}")
+
+    def path_for(self, sha256, parser):
+        """Path of the current artifact, or None if this PDF has not been parsed by this parser version."""
+        for suffix in (ZSTD_SUFFIX, GZIP_SUFFIX):
+            path = self._path(sha256, parser, suffix)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def get(self, sha256, parser):
+        """The stored parse, or None (also when the artifact cannot be read)."""
+        path = self.path_for(sha256, parser)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return loads(f.read(), ZSTD_SUFFIX if path.endswith(ZSTD_SUFFIX) else GZIP_SUFFIX)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable parse artifact {path}: {e}")
+            return None
+
+    def put(self, sha256, parser, payload):
+        """Store a parse; returns the artifact path."""
+        blob, suffix = dumps(payload)
+        target = self._path(sha256, parser, suffix)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return target
+
+    def prune(self):
+        """Delete artifacts written by older parser versions; returns how many were removed."""
+        current = {f"{parser}-v{version}" for parser, version in self.versions.items()}
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith('.tmp'):
+                    continue
+                parser_version = name.split('.')[1] if name.count('.') >= 2 else None
+                if parser_version not in current:
+                    os.remove(os.path.join(dirpath, name))
+                    removed += 1
+        return removed
+
+
+def cached_parse(pdf_path, parser, parse, store=None, use_artifacts=None):
+    """
+    parse(pdf_path) through the store: the stored result when this PDF content was already
+    parsed by the current version of parser, otherwise parse() and store its result.
+    None results (unparseable PDFs) are not stored. use_artifacts=None follows
+    LUCID_PARSE_ARTIFACTS; False always parses the PDF.
+    """
+    if not (ENABLED if use_artifacts is None else use_artifacts):
+        return parse(pdf_path)
+    store = store or ParseArtifactStore()
+    sha256, _ = hash_file(pdf_path)
+    payload = store.get(sha256, parser)
+    if payload is not None:
+        logger.info(f"Loaded {parser} parse of {pdf_path} from artifact {sha256[:12]}")
+        return payload
+    payload = parse(pdf_path)
+    if payload is not None:
+        try:
+            store.put(sha256, parser, payload)
+        except OSError as e:
+            logger.warning(f"Could not store parse artifact for {pdf_path}: {e}")
+    return payload
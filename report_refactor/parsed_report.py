@@ -0,0 +1,153 @@
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+import pdfplumber
+
+from .table_backends import get_table_backend
+from .report_layouts import identify_layout
+
+logger = logging.getLogger(__name__)
+
+
+class ParsedReport:
+    """
+    A CNS VS report PDF opened once and shared by every parsing stage.
+
+    The fitz and pdfplumber documents are opened lazily (at most once each) and
+    per-page results - text blocks, span dicts, pdfplumber text and tables - are
+    memoized, so the pdfminer layout analysis for a page runs a single time no
+    matter how many parsers look at it.
+
+    layout is the report's LayoutPlan when it matches a known template (see
+    report_layouts), which the parsers use to read only each section's pages.
+
+    Usage:
+        with ParsedReport(pdf_path) as report:
+            lines = extract_text_blocks(report)
+            asrs = parse_asrs_with_bounding_boxes(report, patient_id)
+    """
+
+    def __init__(self, pdf_path: str, table_backend: Optional[str] = None, use_layouts: bool = True):
+        self.pdf_path = str(pdf_path)
+        self.table_backend = table_backend
+        self.use_layouts = use_layouts
+        self._layout = None
+        self._layout_identified = False
+        self._doc = None
+        self._plumber = None
+        self._blocks: Dict[int, List[tuple]] = {}
+        self._dicts: Dict[int, Dict[str, Any]] = {}
+        self._words: Dict[int, List[tuple]] = {}
+        self._texts: Dict[Tuple[int, tuple], str] = {}
+        self._tables: Dict[Tuple[int, str], List[list]] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __repr__(self):
+        return f"ParsedReport({self.pdf_path!r})"
+
+    # --- Underlying documents ---
+
+    @property
+    def doc(self):
+        """The PyMuPDF document, opened on first access."""
+        if self._doc is None:
+            self._doc = fitz.open(self.pdf_path)
+        return self._doc
+
+    @property
+    def plumber(self):
+        """The pdfplumber document, opened on first access."""
+        if self._plumber is None:
+            self._plumber = pdfplumber.open(self.pdf_path)
+        return self._plumber
+
+    @property
+    def page_count(self) -> int:
+        return len(self.doc)
+
+    @property
+    def layout(self):
+        """LayoutPlan of a known report template, or None (identified on first access)."""
+        if not self._layout_identified:
+            self._layout = identify_layout(self) if self.use_layouts else None
+            self._layout_identified = True
+        return self._layout
+
+    def close(self):
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+        if self._plumber is not None:
+            self._plumber.close()
+            self._plumber = None
+
+    # --- Memoized per-page extraction ---
+
+    def blocks(self, page_idx: int) -> List[tuple]:
+        """fitz page.get_text("blocks") for a page. Callers must not mutate the result."""
+        if page_idx not in self._blocks:
+            self._blocks[page_idx] = self.doc[page_idx].get_text("blocks")
+        return self._blocks[page_idx]
+
+    def words(self, page_idx: int) -> List[tuple]:
+        """fitz page.get_text("words") (x0, y0, x1, y1, word, ...) for a page."""
+        if page_idx not in self._words:
+            self._words[page_idx] = self.doc[page_idx].get_text("words")
+        return self._words[page_idx]
+
+    def text_dict(self, page_idx: int) -> Dict[str, Any]:
+        """fitz page.get_text("dict") (blocks/lines/spans) for a page."""
+        if page_idx not in self._dicts:
+            self._dicts[page_idx] = self.doc[page_idx].get_text("dict")
+        return self._dicts[page_idx]
+
+    def text(self, page_idx: int, **kwargs) -> str:
+        """pdfplumber page.extract_text(**kwargs) for a page ('' when the page has no text)."""
+        key = (page_idx, tuple(sorted(kwargs.items())))
+        if key not in self._texts:
+            self._texts[key] = self.plumber.pages[page_idx].extract_text(**kwargs) or ""
+        return self._texts[key]
+
+    def tables(self, page_idx: int, backend: Optional[str] = None) -> List[list]:
+        """
+        Tables on a page, in pdfplumber's extract_tables() shape (see table_backends).
+        backend overrides the report's table_backend, which defaults to LUCID_TABLE_BACKEND.
+        """
+        table_backend = get_table_backend(backend or self.table_backend)
+        key = (page_idx, table_backend.name)
+        if key not in self._tables:
+            self._tables[key] = table_backend.extract_tables(self, page_idx)
+        return self._tables[key]
+
+
+@contextmanager
+def open_report(source):
+    """
+    Yield a ParsedReport for either a PDF path or an existing ParsedReport.
+
+    A report passed in is shared and left open for the caller; a path is opened
+    here and closed when the block exits.
+    """
+    if isinstance(source, ParsedReport):
+        yield source
+    else:
+        report = ParsedReport(source)
+        try:
+            yield report
+        finally:
+            report.close()
+
+
+def report_path(source) -> Optional[str]:
+    """Return the file path behind a PDF path or ParsedReport."""
+    if isinstance(source, ParsedReport):
+        return source.pdf_path
+    return str(source) if source is not None else None
@@ -7,11 +7,35 @@ import re
 import os
 import csv
 import pdfplumber
+import numpy as np
 import logging
 from typing import List, Tuple, Dict, Any, Optional
 
 # Use explicit relative import for DSM logic
 from .asrs_dsm_mapper import RESPONSE_SCORES, LOWER_THRESHOLD_QUESTIONS, is_met, DSM5_ASRS_MAPPING
+# Every PDF-reading helper accepts either a path or a shared ParsedReport
+from .parsed_report import ParsedReport, open_report, report_path
+# Known report templates are parsed from their planned pages only (see report_layouts)
+from .report_layouts import clip_blocks
+# Text parsers read the lines tagged by one shared classification pass (see line_classifier)
+from .line_classifier import classified, classify_line, NPQ_DOMAIN_HEADER, NPQ_DOMAIN_HEADERS
+
+# Table backend per report section (see table_backends); None uses the report's backend,
+# which defaults to LUCID_TABLE_BACKEND
+SECTION_TABLE_BACKENDS = {
+    'subtests': os.environ.get('LUCID_TABLE_BACKEND_SUBTESTS'),
+    'npq_domains': os.environ.get('LUCID_TABLE_BACKEND_NPQ_DOMAINS'),
+}
+
+def planned_section(report, section):
+    """
+    (pages, clip) of a section in the report's known layout, or (None, None) when the
+    layout is unknown and the section has to be found by scanning the document.
+    """
+    plan = report.layout
+    if plan is None or plan.pages(section) is None:
+        return None, None
+    return plan.pages(section), plan.clip(section)
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -20,18 +44,17 @@ logger = logging.getLogger(__name__)
 
 # --- Core Extraction Logic ---
 
-def extract_text_blocks(pdf_path: str) -> List[str]:
+def extract_text_blocks(pdf_path) -> List[str]:
     lines = []
     try:
-        doc = fitz.open(pdf_path)
-        for page_num, page in enumerate(doc):
-            # Extract text blocks with layout information
-            blocks = page.get_text("blocks")
-            for b in blocks:
-                # b contains (x0, y0, x1, y1, "text", block_no, block_type)
-                # We just want the text for now
-                lines.append(b[4].strip()) # Get the text content (index 4) and strip whitespace
-        doc.close()
+        with open_report(pdf_path) as report:
+            for page_num in range(report.page_count):
+                # Extract text blocks with layout information
+                blocks = report.blocks(page_num)
+                for b in blocks:
+                    # b contains (x0, y0, x1, y1, "text", block_no, block_type)
+                    # We just want the text for now
+                    lines.append(b[4].strip()) # Get the text content (index 4) and strip whitespace
     except Exception as e:
         logger.error(f"Error extracting text blocks from {pdf_path}: {e}")
         lines = []
@@ -45,36 +68,50 @@ def extract_text_blocks(pdf_path: str) -> List[str]:
     return lines # No need for 'or []' if initialized as [] and handled in except
 
 def parse_basic_info(text):
-    patient_id = int(re.search(r"Patient ID:\s*(\d+)", text).group(1))
+    """
+    (patient_id, test_date, age, language) from the report header.
+    text may be raw text or a ClassifiedText.
+    """
+    text = classified(text)
+
+    def field(kind, group, pattern):
+        for tagged in text.lines(kind):
+            if tagged.match.group(group) is not None:
+                return tagged.match.group(group)
+        # Not tagged (e.g. not at a line start): search the whole text
+        found = re.search(pattern, text.text)
+        return found.group(1) if found else None
+
+    patient_id = int(field('patient_id', 'pid', r"Patient ID:\s*(\d+)"))
     
     # Extract test date with a more comprehensive pattern to capture the full date
-    test_date = re.search(r"Test Date:\s*([\w\s,:/\\-]+\d{2}:\d{2}:\d{2})", text)
+    test_date = field('test_date', 'date', r"Test Date:\s*([\w\s,:/\\-]+\d{2}:\d{2}:\d{2})")
     if test_date:
-        test_date = test_date.group(1).strip()
+        test_date = test_date.strip()
     else:
         # Fallback to the original pattern if the full date isn't found
-        test_date = re.search(r"Test Date:\s*([\w:/\\-]+)", text).group(1).strip()
+        test_date = field('test_date', 'date_token', r"Test Date:\s*([\w:/\\-]+)").strip()
     
     # Extract age
-    age = int(re.search(r"Age:\s*(\d+)", text).group(1))
+    age = int(field('age', 'years', r"Age:\s*(\d+)"))
     
-    language = re.search(r"Language:\s*(.+)", text).group(1).strip()
+    language = field('language', 'lang', r"Language:\s*(.+)").strip()
     
     # Return in the correct order: patient_id, test_date, age, language
     return patient_id, test_date, age, language
 
 def parse_cognitive_scores(text, patient_id):
+    """Domain score rows ("Composite Memory 102 110 75 Yes"); text may be raw text or a ClassifiedText."""
     scores = []
-    # Adjusted regex to handle 'NA' and the specific Neurocognition Index format
-    score_pattern = re.compile(r'^(.*?)\s+(?:NA\s+)?(\d+|NA)\s+(\d+)\s+(\d+)\s+(Yes|No)\s*X?$', re.MULTILINE)
     
-    for match in score_pattern.finditer(text):
-        logger.debug("Matched groups: %s", match.groups())
-        domain = match.group(1).strip()
-        patient_score = match.group(2)
-        standard_score = match.group(3)
-        percentile = match.group(4)
-        validity_index = match.group(5)
+    for tagged in classified(text).lines('score_row'):
+        match = tagged.match
+        logger.debug("Matched score row: %s", tagged.text)
+        domain = match.group('sc_domain').strip()
+        patient_score = match.group('sc_patient')
+        standard_score = match.group('sc_standard')
+        percentile = match.group('sc_percentile')
+        validity_index = match.group('sc_valid')
 
         scores.append((
             patient_id, 
@@ -88,69 +125,106 @@ def parse_cognitive_scores(text, patient_id):
     return scores
 
 
-def parse_asrs_with_bounding_boxes(pdf_path, patient_id):
-    # import fitz # Already imported at top
-    # import os # Already imported at top
-    # import csv # Already imported at top
+ASRS_BOXES_PATH = os.path.join(os.path.dirname(__file__), "bounding_boxes.csv")
+ASRS_PAGE_TITLE = "Adult ADHD Self-Report Scale"
+ASRS_DEFAULT_PAGE = 3  # Page 4 in the current CNS VS layout
+SCALE_MM_TO_PT = 72 / 25.4  # bounding_boxes.csv is in mm
 
-    bounding_boxes_path = os.path.join(os.path.dirname(__file__), "bounding_boxes.csv")
 
-    # Load bounding box data from CSV
-    box_data = []
-    SCALE_MM_TO_PT = 72 / 25.4  # Use this if your CSV is in mm
+def load_asrs_boxes(path=ASRS_BOXES_PATH):
+    """
+    Load the ASRS answer boxes.
+    Returns:
+        tuple: ([(question, part, response)], array of shape (n, 4) with x0, y0, x1, y1 in points)
+    """
+    labels = []
+    rects = []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            labels.append((int(row["Question"]), row["Part"], row["Response"]))
+            rects.append([float(row[key]) for key in ("x0", "y0", "x1", "y1")])
+    return labels, np.array(rects, dtype=float).reshape(-1, 4) * SCALE_MM_TO_PT
+
+
+# Loaded once per process rather than on every report
+try:
+    ASRS_BOX_LABELS, ASRS_BOX_RECTS = load_asrs_boxes()
+except Exception as e:
+    logger.error(f"Error reading bounding boxes file {ASRS_BOXES_PATH}: {e}")
+    ASRS_BOX_LABELS, ASRS_BOX_RECTS = [], np.empty((0, 4))
+
+
+def find_asrs_page(pdf_path):
+    """Index of the page titled with the ASRS checklist (page 4 is checked first), or None."""
+    with open_report(pdf_path) as report:
+        pages, _ = planned_section(report, 'asrs')
+        if pages:
+            return pages[0]
+        candidates = [ASRS_DEFAULT_PAGE] + [i for i in range(report.page_count) if i != ASRS_DEFAULT_PAGE]
+        for page_idx in candidates:
+            if page_idx < report.page_count and \
+                    any(ASRS_PAGE_TITLE in block[4] for block in report.blocks(page_idx)):
+                return page_idx
+    return None
+
+
+def match_marks_to_boxes(points, rects=None):
+    """
+    Index of the first box containing each point, in one vectorized containment pass.
+    Args:
+        points: array of shape (n, 2) of (x, y).
+        rects: array of shape (m, 4); defaults to the ASRS boxes.
+    Returns:
+        array of n box indexes, -1 where no box contains the point.
+    """
+    rects = ASRS_BOX_RECTS if rects is None else rects
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if not len(points) or not len(rects):
+        return np.full(len(points), -1)
+    x = points[:, :1]
+    y = points[:, 1:]
+    inside = (rects[:, 0] <= x) & (x <= rects[:, 2]) & (rects[:, 1] <= y) & (y <= rects[:, 3])
+    return np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
 
-    try:
-        with open(bounding_boxes_path, newline='') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                box_data.append({
-                    "part": row["Part"],
-                    "question": int(row["Question"]),
-                    "response": row["Response"],
-                    "x0": float(row["x0"]) * SCALE_MM_TO_PT,
-                    "y0": float(row["y0"]) * SCALE_MM_TO_PT,
-                    "x1": float(row["x1"]) * SCALE_MM_TO_PT,
-                    "y1": float(row["y1"]) * SCALE_MM_TO_PT,
-                })
-    except FileNotFoundError:
-        logger.error(f"Bounding boxes file not found at: {bounding_boxes_path}")
-        return [] # Cannot proceed without bounding boxes
-    except Exception as e:
-        logger.error(f"Error reading bounding boxes file: {e}")
+
+def parse_asrs_with_bounding_boxes(pdf_path, patient_id):
+    """
+    Read the ASRS answers from the "X" marks on the ASRS page.
+    Returns:
+        list: (patient_id, question, part, response) per marked answer.
+    """
+    if not ASRS_BOX_LABELS:
+        logger.error(f"No ASRS bounding boxes loaded from {ASRS_BOXES_PATH}; cannot parse ASRS.")
         return []
 
-    doc = fitz.open(pdf_path)
     responses = []
 
     try:
-        # Ensure page index 3 exists before trying to access it
-        if len(doc) > 3:
-            page = doc[3]  # only process page 4 (index 3)
-            blocks = page.get_text("dict")["blocks"]
-            for block in blocks:
-                for line in block.get("lines", []):
-                    for span in line.get("spans", []):
-                        if span["text"].strip() == "X":
-                            xmid = (span["bbox"][0] + span["bbox"][2]) / 2
-                            ymid = (span["bbox"][1] + span["bbox"][3]) / 2
-
-                            for box in box_data:
-                                if box["x0"] <= xmid <= box["x1"] and box["y0"] <= ymid <= box["y1"]:
-                                    responses.append((patient_id, box["question"], box["part"], box["response"]))
-                                    break  # only match once
-        else:
-             logger.warning(f"PDF does not have a page 4 (index 3): {pdf_path}. Cannot parse ASRS with bounding boxes.")
+        with open_report(pdf_path) as report:
+            page_idx = find_asrs_page(report)
+            if page_idx is not None:
+                _, clip = planned_section(report, 'asrs')
+                marks = [word[:4] for word in clip_blocks(report.words(page_idx), clip) if word[4] == "X"]
+                if marks:
+                    boxes = np.array(marks, dtype=float)
+                    midpoints = np.column_stack(((boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2))
+                    for box_idx in match_marks_to_boxes(midpoints):
+                        if box_idx >= 0:
+                            question, part, response = ASRS_BOX_LABELS[box_idx]
+                            responses.append((patient_id, question, part, response))
+            else:
+                logger.warning(f"No ASRS page found in {report_path(pdf_path)}. Cannot parse ASRS with bounding boxes.")
 
     except Exception as e:
         logger.error(f"Error processing PDF for ASRS bounding box parsing: {e}")
 
-    logger.info(f"Parsed {len(responses)} ASRS responses using bounding boxes on page 4.")
+    logger.info(f"Parsed {len(responses)} ASRS responses using bounding boxes.")
     return responses
 
 
 def parse_epworth(text, patient_id):
     """
-    Parse Epworth Sleepiness Scale data from text.
+    Parse Epworth Sleepiness Scale data from text (raw text or a ClassifiedText).
     
     Returns:
         dict: {'total_score': int, 'interpretation': str}, responses
@@ -160,14 +234,15 @@ def parse_epworth(text, patient_id):
     """
     responses = []
     try:
-        # Only match lines for questions 1–8
-        pattern = re.findall(r"^\s*([1-8])\s+(.+?)\s+(\d)\s*-\s*(.+)$", text, re.MULTILINE)
+        # Only lines for questions 1–8 are tagged as Epworth rows
+        rows = classified(text).lines('epworth_row')
         # Only process the first 8 Epworth questions
-        for match in pattern[:8]:
-            question_number = int(match[0])
-            situation = match[1].strip()
-            score = int(match[2])
-            description = match[3].strip()
+        for tagged in rows[:8]:
+            match = tagged.match
+            question_number = int(match.group('ep_num'))
+            situation = match.group('ep_situation').strip()
+            score = int(match.group('ep_score'))
+            description = match.group('ep_desc').strip()
             responses.append((patient_id, question_number, situation, score, description))
         final_total = sum([r[3] for r in responses]) if responses else 0
         interpretation = ""
@@ -193,9 +268,12 @@ def find_npq_pages(pdf_path):
     npq_pages = []
     
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for i in range(len(pdf.pages)):
-                text = pdf.pages[i].extract_text()
+        with open_report(pdf_path) as report:
+            pages, _ = planned_section(report, 'npq')
+            if pages is not None:
+                return list(pages)
+            for i in range(report.page_count):
+                text = report.text(i)
                 if text and ("NeuroPsych Questionnaire" in text or "Domain Score Severity" in text):
                     npq_pages.append(i)
                     logger.debug(f"Found NPQ on page {i+1}")
@@ -211,7 +289,7 @@ def extract_npq_questions_pymupdf(pdf_path, npq_pages_indices):
     Handles cases where question number, text, score, and severity are on separate lines.
 
     Args:
-        pdf_path (str): Path to the PDF file.
+        pdf_path (str | ParsedReport): Path to the PDF file, or an already opened report.
         npq_pages_indices (list): List of 0-based page indices containing NPQ content.
 
     Returns:
@@ -221,43 +299,8 @@ def extract_npq_questions_pymupdf(pdf_path, npq_pages_indices):
     logger.info("[DEBUG] FINGERPRINT: Entered extract_npq_questions_pymupdf in cognitive_importer at 2025-04-23T21:57:28+08:00")
     question_data = []
     
-    # Regex patterns
-    question_num_pattern = re.compile(r'^(\d{1,2})$')  # Just the question number
-    severity_pattern = re.compile(r'^\s*(\d)\s*-\s*(.*)$')  # Score and severity description
-    
-    # Markers for different question sections -> Maps Header to Domain Name for DB
-    # **Crucially, ensure these EXACTLY match the headers in your PDF**
-    domain_questions_markers = {
-        "Attention Questions": "Attention",
-        "Impulsive Questions": "Impulsive",
-        "Learning Questions": "Learning",
-        "Memory Questions": "Memory",
-        "Anxiety Questions": "Anxiety",
-        "Panic Questions": "Panic",
-        "Agoraphobia Questions": "Agoraphobia",
-        "Obsessions & Compulsions Questions": "Obsessions & Compulsions", # Check "&" if needed
-        "Social Anxiety Questions": "Social Anxiety",
-        "Depression Questions": "Depression",
-        "Mood Stability Questions": "Mood Stability",
-        "Mania Questions": "Mania",
-        "Aggression Questions": "Aggression",
-        "Psychotic Questions": "Psychotic",
-        "Somatic Questions": "Somatic",
-        "Fatigue Questions": "Fatigue",
-        "Sleep Questions": "Sleep",
-        "Suicide Questions": "Suicide",
-        "Pain Questions": "Pain",
-        "Substance Abuse Questions": "Substance Abuse",
-        "PTSD Questions": "PTSD",
-        "Bipolar Questions": "Bipolar",
-        "Autism Questions": "Autism",
-        "Asperger's Questions": "Asperger's", # Check apostrophe if needed
-        "ADHD Questions": "ADHD",
-        "MCI Questions": "MCI",
-        "Concussion Questions": "Concussion",
-        "Anxiety/Depression Questions": "Anxiety/Depression" # If this header exists
-        # Add any missing ones based on the PDF content if necessary
-    }
+    # Lines are tagged by line_classifier: NPQ domain headers (NPQ_DOMAIN_HEADERS maps each
+    # header to its domain name for the DB), question numbers and "score - severity" lines
     
     current_domain = None  # Track which section we are in
     current_question_num = None  # Track current question number
@@ -268,82 +311,69 @@ def extract_npq_questions_pymupdf(pdf_path, npq_pages_indices):
         return []
     
     try:
-        doc = fitz.open(pdf_path)
-        for page_idx in npq_pages_indices:
-            if page_idx >= len(doc):
-                logger.warning(f"Page index {page_idx} out of range for PDF.")
-                continue
+        with open_report(pdf_path) as report:
+            planned_pages, clip = planned_section(report, 'npq')
+            for page_idx in npq_pages_indices:
+                if page_idx >= report.page_count:
+                    logger.warning(f"Page index {page_idx} out of range for PDF.")
+                    continue
             
-            logger.debug(f"Extracting NPQ questions from page {page_idx+1}")
-            page = doc[page_idx]
-            # Extract text blocks, sorted vertically then horizontally
-            blocks = page.get_text("blocks")
-            blocks.sort(key=lambda b: (b[1], b[0]))  # Sort top-down, left-right
+                logger.debug(f"Extracting NPQ questions from page {page_idx+1}")
+                # Text blocks (only the planned region for a known layout), sorted vertically then horizontally
+                page_clip = clip if planned_pages and page_idx in planned_pages else None
+                blocks = sorted(clip_blocks(report.blocks(page_idx), page_clip), key=lambda b: (b[1], b[0]))  # Sort top-down, left-right
             
-            for block in blocks:
-                # block format: (x0, y0, x1, y1, "text content", block_no, block_type)
-                if len(block) >= 7 and block[6] == 0:  # It's a text block
-                    block_text_lines = block[4].splitlines()
+                for block in blocks:
+                    # block format: (x0, y0, x1, y1, "text content", block_no, block_type)
+                    if len(block) >= 7 and block[6] == 0:  # It's a text block
+                        block_text_lines = block[4].splitlines()
                     
-                    for line in block_text_lines:
-                        line = line.strip()
-                        if not line: continue
+                        for line in block_text_lines:
+                            line = line.strip()
+                            if not line: continue
                         
-                        # Check if line is a domain header first
-                        is_header = False
-                        for header, domain_name in domain_questions_markers.items():
-                            # Use exact match for headers
-                            if line == header:
-                                current_domain = domain_name
+                            kind, match = classify_line(line)
+                            # Check if line is a domain header first
+                            if kind == NPQ_DOMAIN_HEADER:
+                                current_domain = NPQ_DOMAIN_HEADERS[line]
                                 logger.debug(f"Switched to NPQ domain: {current_domain}")
-                                is_header = True
                                 # Reset question tracking when switching domains
                                 current_question_num = None
                                 current_question_text = None
-                                break  # Found header, stop checking headers for this line
+                                continue  # Don't process the header line itself as a question
                         
-                        if is_header:
-                            continue  # Don't process the header line itself as a question
-                        
-                        # If we are within a known domain, try matching the question pattern
-                        if current_domain:
-                            # Check if this line is a question number
-                            num_match = question_num_pattern.match(line)
-                            if num_match:
-                                # Save the previous question if we have all its parts
-                                if current_question_num is not None and current_question_text is not None:
-                                     # Need score/severity which should come *after* the text
-                                     pass # Wait for score/severity line
-                                
-                                # Start a new question
-                                current_question_num = int(num_match.group(1))
-                                current_question_text = "" # Reset text for the new question
-                                continue # Move to the next line for the text
+                            # If we are within a known domain, try matching the question pattern
+                            if current_domain:
+                                # Check if this line is a question number
+                                if kind == 'npq_question_number':
+                                    # Start a new question (score/severity come after its text)
+                                    current_question_num = int(match.group('qnum'))
+                                    current_question_text = "" # Reset text for the new question
+                                    continue # Move to the next line for the text
                             
-                            # Check if this line is the score/severity
-                            sev_match = severity_pattern.match(line)
-                            if sev_match and current_question_num is not None and current_question_text is not None:
-                                score = int(sev_match.group(1))
-                                severity_desc = sev_match.group(2).strip()
+                                # Check if this line is the score/severity
+                                if kind == 'npq_severity' and current_question_num is not None and current_question_text is not None:
+                                    score = int(match.group('sev_score'))
+                                    severity_desc = match.group('sev_text').strip()
                                 
-                                # Now we have all parts, record the question
-                                question_data.append((
-                                    current_question_num,
-                                    current_question_text.strip(), 
-                                    score, 
-                                    severity_desc,
-                                    current_domain
-                                ))
-                                logger.debug(f"  Recorded NPQ Q{current_question_num} in {current_domain}")
+                                    # Now we have all parts, record the question
+                                    question_data.append((
+                                        current_question_num,
+                                        current_question_text.strip(), 
+                                        score, 
+                                        severity_desc,
+                                        current_domain
+                                    ))
+                                    logger.debug(f"  Recorded NPQ Q{current_question_num} in {current_domain}")
                                 
-                                # Reset for the next potential question
-                                current_question_num = None
-                                current_question_text = None
-                                continue # Move to the next line
+                                    # Reset for the next potential question
+                                    current_question_num = None
+                                    current_question_text = None
+                                    continue # Move to the next line
                                 
-                            # Otherwise, assume it's part of the question text
-                            if current_question_num is not None:
-                                current_question_text += " " + line # Append text
+                                # Otherwise, assume it's part of the question text
+                                if current_question_num is not None:
+                                    current_question_text += " " + line # Append text
 
     except Exception as e:
         logger.error(f"Error during NPQ question extraction: {e}")
@@ -354,38 +384,36 @@ def extract_npq_questions_pymupdf(pdf_path, npq_pages_indices):
     logger.info(f"Extracted {len(question_data)} NPQ questions.")
     return question_data
 
-def parse_npq_questions_from_text(npq_section_text: str):
+def parse_npq_questions_from_text(npq_section_text):
     """
     Fallback NPQ question parser: Extracts (question_number, question_text, score, severity) from section text.
     Handles lines like:
     '1. Trouble concentrating 2 Severe'
     '2. Forgetfulness 1 Mild'
+    npq_section_text may be raw text or a ClassifiedText.
     Returns a list of tuples.
     """
     logger.info("UNIQUE FINGERPRINT: fallback parser parse_npq_questions_from_text invoked.")
     logger.info("[DEBUG] Entered parse_npq_questions_from_text for NPQ fallback parsing.")
-    import re
     results = []
-    # Regex: question number, dot, question text, score, severity (score is 0-3, severity is word)
-    pattern = re.compile(r'^(\d{1,2})[\).\s]+(.+?)\s+(\d)\s+(Mild|Moderate|Severe|None)\b', re.IGNORECASE)
-    for line in npq_section_text.splitlines():
-        match = pattern.match(line.strip())
-        if match:
-            qnum = int(match.group(1))
-            qtext = match.group(2).strip()
-            score = int(match.group(3))
-            severity = match.group(4).capitalize()
-            results.append((qnum, qtext, score, severity))
+    # Lines tagged npq_text_question: number, dot, question text, score (0-3), severity word
+    for tagged in classified(npq_section_text).lines('npq_text_question'):
+        match = tagged.match
+        qnum = int(match.group('tq_num'))
+        qtext = match.group('tq_text').strip()
+        score = int(match.group('tq_score'))
+        severity = match.group('tq_severity').capitalize()
+        results.append((qnum, qtext, score, severity))
     return results
 
 def extract_subtest_section(pdf_path):
-    """Extract subtest scores section using pdfplumber"""
+    """Extract subtest scores section from the tables on the first three pages"""
     try:
-        with pdfplumber.open(pdf_path) as pdf:
+        with open_report(pdf_path) as report:
             all_text = []
             logger.debug("\nDEBUG: === Raw PDF Tables by Page ===")
-            for page_num, page in enumerate(pdf.pages[:3], 1):
-                tables = page.extract_tables()
+            for page_num in range(1, min(3, report.page_count) + 1):
+                tables = report.tables(page_num - 1, backend=SECTION_TABLE_BACKENDS['subtests'])
                 for table_num, table in enumerate(tables, 1):
                     logger.debug(f"\n=== Page {page_num}, Table {table_num} ===")
                     for row in table:
@@ -580,13 +608,12 @@ def parse_cognitive_subtests_from_pdf(pdf_path: str, debug: bool = False) -> lis
     """
     lines = []
     try:
-        with pdfplumber.open(pdf_path) as pdf:
+        with open_report(pdf_path) as report:
             # Limit pages similar to original logic (e.g., first 5)
-            num_pages = min(5, len(pdf.pages))
+            num_pages = min(5, report.page_count)
             for i in range(num_pages):
-                page = pdf.pages[i]
                 # Use layout=True for better table/column structure preservation if needed
-                page_text = page.extract_text(x_tolerance=1, y_tolerance=1, layout=False)
+                page_text = report.text(i, x_tolerance=1, y_tolerance=1, layout=False)
                 if page_text:
                     # Add page markers for context if needed during debugging
                     # lines.append(f"\n=== PAGE {i + 1} TEXT CONTENT ===\n")
@@ -663,39 +690,21 @@ def parse_cognitive_subtests_from_pdf(pdf_path: str, debug: bool = False) -> lis
         if debug:
             logger.debug(f"Line {i}: '{line}' (current_test={current_test}, parsing_data={parsing_data}, in_domain_scores={in_domain_scores})")
 
-        # Log detection of test headers
-        match = test_pattern.match(line)
-        if match:
-            test_name = match.group(1).strip()
-            if debug:
-                logger.debug(f"Detected test header at line {i}: '{test_name}'")
-
-        # Log detection of data rows
-        if data_row_pattern.match(line):
-            if debug:
+        # Log line detections (the patterns are only evaluated when debugging)
+        if debug:
+            if test_pattern.match(line):
+                logger.debug(f"Detected test header at line {i}: '{test_pattern.match(line).group(1).strip()}'")
+            if data_row_pattern.match(line):
                 logger.debug(f"Detected data row at line {i}: '{line}' (current_test={current_test})")
-
-        # Log section headers
-        if section_pattern.match(line):
-            if debug:
+            if section_pattern.match(line):
                 logger.debug(f"Detected section header at line {i}: '{line}'")
-
-        # Log when skipping domain scores
-        if domain_scores_pattern.match(line):
-            if debug:
+            if domain_scores_pattern.match(line):
                 logger.debug(f"Detected start of domain scores at line {i}: '{line}'")
-        if domain_end_pattern.match(line):
-            if debug:
+            if domain_end_pattern.match(line):
                 logger.debug(f"Detected end of domain scores at line {i}: '{line}'")
-
-        # Log when skipping description lines
-        if description_pattern.match(line):
-            if debug:
+            if description_pattern.match(line):
                 logger.debug(f"Skipping description line at line {i}: '{line}'")
-
-        # Log when header row detected
-        if header_pattern.match(line):
-            if debug:
+            if header_pattern.match(line):
                 logger.debug(f"Detected table header at line {i}: '{line}'")
 
         # Handle domain scores section skipping
@@ -1064,7 +1073,7 @@ def get_cognitive_subtests(pdf_path, patient_id, debug=False):
 
 def extract_subtest_data(table, debug=False):
     """
-    Extract subtest data from a pdfplumber table.
+    Extract subtest data from a table (rows of cells, as ParsedReport.tables returns).
     Returns a list of (test_name, metric, score, std, perc) tuples.
     Skips header rows, section headers, and rows with missing/non-numeric data.
     """
@@ -1146,10 +1155,10 @@ def parse_all_subtests(pdf_path, patient_id, debug=False):
         "Four Part Continuous Performance Test"
     ]
     all_results = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text() or ""
-            tables = page.extract_tables()
+    with open_report(pdf_path) as report:
+        for page_num in range(report.page_count):
+            text = report.text(page_num)
+            tables = report.tables(page_num, backend=SECTION_TABLE_BACKENDS['subtests'])
             for test_name in known_tests:
                 if test_name in text:
                     for table in tables:
@@ -1186,7 +1195,7 @@ def parse_all_subtests(pdf_path, patient_id, debug=False):
 def parse_cognitive_subtests_from_pdf(pdf_path: str, debug: bool = False) -> list[dict]:
     try:
         import re
-        m = re.search(r"(\d+)", os.path.basename(pdf_path))
+        m = re.search(r"(\d+)", os.path.basename(report_path(pdf_path)))
         patient_id = int(m.group(1)) if m else None
     except Exception:
         patient_id = None
@@ -1198,10 +1207,10 @@ def parse_cognitive_subtests_from_pdf(pdf_path: str, debug: bool = False) -> lis
 def parse_all_cognitive_subtests_from_pdf(pdf_path, patient_id, debug=False):
     """
     Extract all cognitive subtest results from a PDF using table-driven parsing.
+    pdf_path may be a path or a ParsedReport shared with the other parsing stages.
     Returns a list of tuples:
       (patient_id, test_name, metric, score, standard, percentile)
     """
-    import pdfplumber
     import logging
     logger = logging.getLogger(__name__)
     known_tests = [
@@ -1217,10 +1226,16 @@ def parse_all_cognitive_subtests_from_pdf(pdf_path, patient_id, debug=False):
     ]
     all_results = []
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                text = page.extract_text() or ""
-                tables = page.extract_tables()
+        with open_report(pdf_path) as report:
+            planned_pages, _ = planned_section(report, 'subtests')
+            for page_num in (planned_pages or range(report.page_count)):
+                # The page must name the test; a known layout's pages are checked against the
+                # PyMuPDF block text, without running pdfplumber's layout analysis
+                if planned_pages:
+                    text = "\n".join(block[4] for block in report.blocks(page_num))
+                else:
+                    text = report.text(page_num)
+                tables = report.tables(page_num, backend=SECTION_TABLE_BACKENDS['subtests'])
                 if debug:
                     logger.debug(f"Page {page_num+1}: {len(tables)} tables found.")
                 for test_name in known_tests:
@@ -1259,18 +1274,17 @@ def parse_all_cognitive_subtests_from_pdf(pdf_path, patient_id, debug=False):
 
 def extract_npq_domain_scores_from_pdf(pdf_path, npq_pages_indices):
     """
-    Extracts NPQ Domain Scores from tables within a PDF using pdfplumber.
+    Extracts NPQ Domain Scores from tables within a PDF.
     Looks for tables containing 'Domain', 'Score', and 'Severity' headers.
 
     Args:
-        pdf_path (str): Path to the PDF file.
+        pdf_path (str | ParsedReport): Path to the PDF file, or an already opened report.
         npq_pages_indices (List[int]): List of 0-based page indices containing NPQ content.
 
     Returns:
         List[Tuple[str, int, str]]: A list of tuples, where each tuple contains:
                                      (domain_name, score, severity)
     """
-    import pdfplumber
     import logging
     logger = logging.getLogger(__name__)
     domain_data = []
@@ -1278,14 +1292,14 @@ def extract_npq_domain_scores_from_pdf(pdf_path, npq_pages_indices):
         logger.warning("No NPQ page indices provided for domain score extraction.")
         return []
     try:
-        with pdfplumber.open(pdf_path) as pdf:
+        with open_report(pdf_path) as report:
+            planned_pages, _ = planned_section(report, 'npq_domains')
             all_tables = []
-            for page_idx in npq_pages_indices:
-                if page_idx >= len(pdf.pages):
+            for page_idx in (planned_pages or npq_pages_indices):
+                if page_idx >= report.page_count:
                     logger.warning(f"Page index {page_idx} out of range for PDF during domain score extraction.")
                     continue
-                page = pdf.pages[page_idx]
-                tables = page.extract_tables()
+                tables = report.tables(page_idx, backend=SECTION_TABLE_BACKENDS['npq_domains'])
                 if tables:
                     all_tables.extend(tables)
             for table in all_tables:
@@ -5,18 +5,11 @@ import os
 import sys
 from datetime import datetime
 
-def extract_pdf_text(pdf_path, output_dir="parsed"):
+def read_pdf_text(pdf_path):
     """
-    Extract text content from a PDF file and save it to a text file.
-    Returns the path to the saved text file.
+    Extract the text of a cognitive report PDF (up to its first 5 pages) in memory.
+    Returns the text, or None if the PDF could not be read.
     """
-    # Create output directory if it doesn't exist
-    os.makedirs(output_dir, exist_ok=True)
-    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = os.path.join(output_dir, f"{base_name}_{timestamp}_text.txt")
-    
-    # Extract text using PyPDF2
     try:
         with open(pdf_path, 'rb') as file:
             reader = PyPDF2.PdfReader(file)
@@ -27,16 +20,36 @@ def extract_pdf_text(pdf_path, output_dir="parsed"):
                 page = reader.pages[page_num]
                 text_output.append(f"\n=== PAGE {page_num + 1} TEXT CONTENT ===\n")
                 text_output.append(page.extract_text())
-        
+        return '\n'.join(text_output)
+    except Exception as e:
+        print(f"Error extracting text from PDF: {e}")
+        return None
+
+def extract_pdf_text(pdf_path, output_dir="parsed"):
+    """
+    Extract text content from a PDF file and save it to a text file.
+    Returns the path to the saved text file.
+    """
+    text = read_pdf_text(pdf_path)
+    if text is None:
+        return None
+
+    # Create output directory if it doesn't exist
+    os.makedirs(output_dir, exist_ok=True)
+    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = os.path.join(output_dir, f"{base_name}_{timestamp}_text.txt")
+    
+    try:
         # Save raw text content
         with open(output_file, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(text_output))
+            f.write(text)
         
         print(f"Extracted text saved to: {output_file}")
         return output_file
     
     except Exception as e:
-        print(f"Error extracting text from PDF: {e}")
+        print(f"Error saving extracted text: {e}")
         return None
 
 def parse_text_file(file_path):
@@ -45,10 +58,17 @@ def parse_text_file(file_path):
     """
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.read().splitlines()
+            text = f.read()
     except Exception as e:
         print(f"Error reading file {file_path}: {e}")
         return {}
+    return parse_text(text, source=file_path)
+
+def parse_text(text, source="<text>"):
+    """
+    Parse cognitive test data from extracted report text (see parse_text_file).
+    """
+    lines = text.splitlines()
 
     results = {}
     current_test = None
@@ -76,7 +96,7 @@ def parse_text_file(file_path):
         "Four Part Continuous Performance Test (FPCPT)": "Four Part Continuous Performance Test (FPCPT)"
     }
     
-    print(f"\nProcessing file: {file_path}")
+    print(f"\nProcessing file: {source}")
     
     # First scan for test headers and validity information
     test_validity = {}
@@ -440,6 +460,10 @@ def process_pdf(pdf_path):
         print(f"Error saving results to JSON: {e}")
         return results
 
+def _parse_pdf(pdf_path):
+    text = read_pdf_text(pdf_path)
+    return parse_text(text, source=pdf_path) if text is not None else None
+
 def get_cognitive_subtests(pdf_path, patient_id, debug=False):
     """
     Extract cognitive subtests from a PDF file and return them in the format expected by cognitive_importer.py.
@@ -452,15 +476,16 @@ def get_cognitive_subtests(pdf_path, patient_id, debug=False):
     Returns:
         list: List of tuples (patient_id, subtest_name, metric, score, standard_score, percentile, is_valid)
     """
-    # Extract text from PDF
-    text_file = extract_pdf_text(pdf_path)
-    if not text_file:
+    # Parse the PDF text in memory, or load the stored parse of this PDF
+    try:
+        from .parse_artifacts import cached_parse
+    except ImportError:  # Imported as a top-level module from report_refactor
+        from parse_artifacts import cached_parse
+    results = cached_parse(pdf_path, 'pdf_cognitive_parser', _parse_pdf)
+    if results is None:
         print("Failed to extract text from PDF.")
         return []
     
-    # Parse the text file
-    results = parse_text_file(text_file)
-    
     # Convert to the format expected by cognitive_importer.py
     formatted_results = []
     
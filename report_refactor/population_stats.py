@@ -0,0 +1,353 @@
+"""
+Precomputed population statistics for the speed-accuracy charts.
+
+The charts used to reload population CSVs and regression JSON from
+data/analysis_output/cached_data for every chart, and create_sat_speed_accuracy_chart
+re-ran a population-wide self-join on subtest_results whenever the patient was missing
+from that cache. Instead, the statistics live in cognitive_analysis.db:
+
+- population_scores: one (speed, error) pair per patient per test.
+- population_patients: patients already folded into population_scores.
+- population_stats: per test medians, ranges, regression parameters and pre-binned
+  scatter densities, tagged with STATS_VERSION.
+
+refresh_population_stats() only reads subtest_results for patients not yet in the store,
+then re-aggregates the (small) population_scores table. Bumping STATS_VERSION forces a
+full rebuild. Report code calls get_population_stats(), which loads the table once per
+process and never queries the raw population (it only refreshes a store that is still empty).
+
+    python population_stats.py [path/to/cognitive_analysis.db] [--rebuild]
+"""
+import sys
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# Shared SQLite helpers live in the repository root
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from sqlite_profile import connect as connect_db
+from migrations import ANALYSIS_MIGRATIONS, apply_migrations
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = "cognitive_analysis.db"
+
+# Bump when the scoring, cleaning or binning below changes; stored stats with another
+# version are ignored and rebuilt from scratch.
+STATS_VERSION = 1
+
+# Scatter densities are stored as the non-empty cells of a DENSITY_BINS x DENSITY_BINS grid
+DENSITY_BINS = 60
+
+MAX_IN_PARAMS = 500
+
+# Test key -> how a patient's (speed, error) pair is read from subtest_results.
+# Keys match TEST_CONFIG_SPEED_ACCURACY[...]['cache_key'] in report_generator.
+POPULATION_TESTS = {
+    "shifting_attention_test": {
+        "test_name": "Shifting Attention Test",
+        "speed_metric": "Correct Reaction Time",
+        "error_metric": "Errors",
+        "column": "score",
+        "outlier_sd": 3,
+    },
+    "stroop_test": {
+        "test_name": "Stroop Test",
+        "speed_metric": "Reaction Time Correct",
+        "error_metric": "Commission Errors",
+        "column": "score",
+        "outlier_sd": 3,
+    },
+    "reasoning": {
+        "test_name": "Reasoning",
+        "speed_metric": "Average Correct Reaction Time",
+        "error_metric": ["Commission Errors", "Omission Errors"],  # Summed
+        "column": "score",
+        "outlier_sd": 3,
+    },
+    # Standard-score pair used by create_sat_speed_accuracy_chart
+    "sat_rt_errors": {
+        "test_name": "Shifting Attention Test",
+        "speed_metric": "Correct Reaction Time",
+        "error_metric": "Errors",
+        "column": "standard_score",
+        "outlier_sd": None,
+    },
+}
+
+# Loaded statistics, per database path, for the life of the process
+_loaded_stats = {}
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _first_match(rows, test_name, metric):
+    """First row whose subtest and metric contain the given names (SQL LIKE '%x%' semantics)."""
+    test_name, metric = test_name.lower(), metric.lower()
+    for row in rows:
+        if test_name in (row["subtest_name"] or "").lower() and metric in (row["metric"] or "").lower():
+            return row
+    return None
+
+
+def score_pair(rows, spec):
+    """
+    Compute a patient's (speed, error) pair for one test from their subtest_results rows.
+
+    Mirrors report_generator.get_patient_test_scores: the first matching metric is used,
+    and a list of error metrics is summed over the ones present.
+    Returns:
+        tuple: (speed, error); either may be None.
+    """
+    column = spec["column"]
+    speed_row = _first_match(rows, spec["test_name"], spec["speed_metric"])
+    speed = _to_float(speed_row[column]) if speed_row else None
+
+    error_metrics = spec["error_metric"]
+    if isinstance(error_metrics, str):
+        error_row = _first_match(rows, spec["test_name"], error_metrics)
+        error = _to_float(error_row[column]) if error_row else None
+    else:
+        values = [_to_float(row[column]) for row in
+                  (_first_match(rows, spec["test_name"], metric) for metric in error_metrics) if row]
+        values = [value for value in values if value is not None]
+        error = sum(values) if values else None
+    return speed, error
+
+
+def _fetch_subtest_rows(conn, patient_ids):
+    """patient_id (str) -> subtest_results rows, for the given patients, in insertion order."""
+    rows_by_patient = {}
+    for start in range(0, len(patient_ids), MAX_IN_PARAMS):
+        chunk = patient_ids[start:start + MAX_IN_PARAMS]
+        placeholders = ", ".join("?" * len(chunk))
+        query = (f"SELECT patient_id, subtest_name, metric, score, standard_score FROM subtest_results "
+                 f"WHERE patient_id IN ({placeholders}) ORDER BY rowid")
+        for patient_id, subtest_name, metric, score, standard_score in conn.execute(query, chunk):
+            rows_by_patient.setdefault(str(patient_id), []).append({
+                "subtest_name": subtest_name, "metric": metric, "score": score, "standard_score": standard_score,
+            })
+    return rows_by_patient
+
+
+def summarize_population(speeds, errors, outlier_sd=None):
+    """
+    Aggregate one test's population pairs into the stored statistics.
+
+    Medians, ranges and the density grid describe every valid pair (what the chart
+    draws). The regression is fitted after dropping points beyond outlier_sd standard
+    deviations, as speed_accuracy_analysis did for the old regression cache.
+    """
+    from scipy import stats
+
+    speeds, errors = np.asarray(speeds, dtype=float), np.asarray(errors, dtype=float)
+    valid = ~(np.isnan(speeds) | np.isnan(errors))
+    speeds, errors = speeds[valid], errors[valid]
+    if len(speeds) < 3:
+        return None
+
+    fit_speeds, fit_errors = speeds, errors
+    if outlier_sd:
+        keep = np.ones(len(speeds), dtype=bool)
+        for values in (speeds, errors):
+            mean, std = values.mean(), values.std(ddof=1)
+            keep &= (values > mean - outlier_sd * std) & (values < mean + outlier_sd * std)
+        fit_speeds, fit_errors = speeds[keep], errors[keep]
+    if len(fit_speeds) < 3 or np.ptp(fit_speeds) == 0:
+        return None  # No regression possible
+
+    slope, intercept, r_value, p_value, std_err = stats.linregress(fit_speeds, fit_errors)
+    corr, p = stats.spearmanr(fit_speeds, fit_errors)
+
+    # Each non-empty cell is stored at the mean of its points, so sparse cells plot exactly
+    counts, x_edges, y_edges = np.histogram2d(speeds, errors, bins=DENSITY_BINS)
+    x_sums, _, _ = np.histogram2d(speeds, errors, bins=[x_edges, y_edges], weights=speeds)
+    y_sums, _, _ = np.histogram2d(speeds, errors, bins=[x_edges, y_edges], weights=errors)
+    density = [[float(x_sums[i, j] / counts[i, j]), float(y_sums[i, j] / counts[i, j]), int(counts[i, j])]
+               for i, j in zip(*np.nonzero(counts))]
+
+    return {
+        "n": int(len(speeds)),
+        "speed_median": float(np.median(speeds)),
+        "error_median": float(np.median(errors)),
+        "speed_min": float(speeds.min()),
+        "speed_max": float(speeds.max()),
+        "error_min": float(errors.min()),
+        "error_max": float(errors.max()),
+        "regression": {
+            "slope": float(slope),
+            "intercept": float(intercept),
+            "r_value": float(r_value),
+            "p_value": float(p_value),
+            "std_err": float(std_err),
+            "corr": float(corr),
+            "p": float(p),
+            "n": int(len(fit_speeds)),
+        },
+        "density": density,
+    }
+
+
+def refresh_population_stats(db_path=DB_PATH, patient_ids=None, rebuild=False):
+    """
+    Fold new patients into the population store and re-aggregate the statistics.
+
+    Args:
+        db_path (str): cognitive_analysis.db path.
+        patient_ids (list): Patients to (re)score, e.g. just imported ones. By default
+            every patient in subtest_results not yet in the store is scored.
+        rebuild (bool): Drop the store and rescore every patient.
+    Returns:
+        dict: {'patients': number of patients scored, 'tests': test keys re-aggregated}
+    """
+    conn = connect_db(db_path)
+    try:
+        apply_migrations(conn, ANALYSIS_MIGRATIONS)
+        versions = dict(conn.execute("SELECT test_key, stats_version FROM population_stats").fetchall())
+        rebuild = rebuild or any(version != STATS_VERSION for version in versions.values())
+        if rebuild:
+            logger.info("Rebuilding population statistics store")
+            conn.execute("DELETE FROM population_scores")
+            conn.execute("DELETE FROM population_patients")
+            patient_ids = None
+
+        if patient_ids is None:
+            patient_ids = [str(row[0]) for row in conn.execute(
+                "SELECT DISTINCT patient_id FROM subtest_results "
+                "WHERE CAST(patient_id AS TEXT) NOT IN (SELECT patient_id FROM population_patients)"
+            )]
+        else:
+            patient_ids = [str(patient_id) for patient_id in dict.fromkeys(patient_ids)]
+
+        now = datetime.now().isoformat(timespec="seconds")
+        rows_by_patient = _fetch_subtest_rows(conn, patient_ids) if patient_ids else {}
+        for patient_id in patient_ids:
+            rows = rows_by_patient.get(patient_id, [])
+            for test_key, spec in POPULATION_TESTS.items():
+                speed, error = score_pair(rows, spec)
+                if speed is None or error is None:
+                    conn.execute("DELETE FROM population_scores WHERE test_key = ? AND patient_id = ?",
+                                 (test_key, patient_id))
+                    continue
+                conn.execute("INSERT OR REPLACE INTO population_scores (test_key, patient_id, speed_score, error_score) "
+                             "VALUES (?, ?, ?, ?)", (test_key, patient_id, speed, error))
+            conn.execute("INSERT OR REPLACE INTO population_patients (patient_id, refreshed_at) VALUES (?, ?)",
+                         (patient_id, now))
+
+        refreshed = []
+        for test_key, spec in POPULATION_TESTS.items():
+            if not patient_ids and not rebuild:
+                continue
+            pairs = conn.execute("SELECT speed_score, error_score FROM population_scores WHERE test_key = ?",
+                                 (test_key,)).fetchall()
+            summary = summarize_population([p[0] for p in pairs], [p[1] for p in pairs], spec["outlier_sd"])
+            if summary is None:
+                conn.execute("DELETE FROM population_stats WHERE test_key = ?", (test_key,))
+                continue
+            conn.execute(
+                "INSERT OR REPLACE INTO population_stats (test_key, stats_version, n, speed_median, error_median, "
+                "speed_min, speed_max, error_min, error_max, regression, density, refreshed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (test_key, STATS_VERSION, summary["n"], summary["speed_median"], summary["error_median"],
+                 summary["speed_min"], summary["speed_max"], summary["error_min"], summary["error_max"],
+                 json.dumps(summary["regression"]), json.dumps(summary["density"]), now))
+            refreshed.append(test_key)
+        conn.commit()
+    finally:
+        conn.close()
+
+    _loaded_stats.pop(str(Path(db_path).resolve()), None)
+    logger.info(f"Population stats refreshed: {len(patient_ids)} patients scored, tests {refreshed}")
+    return {"patients": len(patient_ids), "tests": refreshed}
+
+
+def load_population_stats(db_path=DB_PATH):
+    """
+    Read every current-version population_stats row.
+    Returns:
+        dict: test_key -> stats dict (see summarize_population); empty if the store is missing.
+    """
+    try:
+        conn = connect_db(db_path, read_only=True)
+    except Exception as e:
+        logger.error(f"Could not open {db_path} for population stats: {e}")
+        return {}
+    try:
+        rows = conn.execute(
+            "SELECT test_key, n, speed_median, error_median, speed_min, speed_max, error_min, error_max, "
+            "regression, density FROM population_stats WHERE stats_version = ?", (STATS_VERSION,)
+        ).fetchall()
+    except Exception as e:
+        logger.error(f"Population stats not available in {db_path} ({e}). Run population_stats.py first.")
+        return {}
+    finally:
+        conn.close()
+
+    loaded = {}
+    for (test_key, n, speed_median, error_median, speed_min, speed_max, error_min, error_max,
+         regression, density) in rows:
+        loaded[test_key] = {
+            "n": n,
+            "speed_median": speed_median,
+            "error_median": error_median,
+            "speed_min": speed_min,
+            "speed_max": speed_max,
+            "error_min": error_min,
+            "error_max": error_max,
+            "regression": json.loads(regression),
+            "density": json.loads(density),
+        }
+    return loaded
+
+
+def get_population_stats(test_key, db_path=DB_PATH):
+    """
+    Statistics for one test, loaded from the database once per process (None if missing).
+
+    A database whose store is empty (patients imported by a path that did not refresh it)
+    is refreshed first, so the charts do not fall back to "insufficient statistics".
+    """
+    key = str(Path(db_path).resolve())
+    if key not in _loaded_stats:
+        loaded = load_population_stats(db_path)
+        if not loaded:
+            try:
+                refresh_population_stats(db_path)
+                loaded = load_population_stats(db_path)
+            except Exception as e:
+                logger.error(f"Could not refresh population stats in {db_path}: {e}")
+        _loaded_stats[key] = loaded
+    return _loaded_stats[key].get(test_key)
+
+
+def get_patient_point(test_key, patient_id, db_path=DB_PATH):
+    """
+    A single patient's (speed, error) pair for a population test, read from the patient's
+    own (indexed) subtest_results rows.
+    """
+    conn = connect_db(db_path, read_only=True)
+    try:
+        rows = _fetch_subtest_rows(conn, [str(patient_id)]).get(str(patient_id), [])
+    finally:
+        conn.close()
+    return score_pair(rows, POPULATION_TESTS[test_key])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = sys.argv[1:]
+    db_path = next((arg for arg in args if not arg.startswith("--")), DB_PATH)
+    result = refresh_population_stats(db_path, rebuild="--rebuild" in args)
+    print(f"Scored {result['patients']} patients; refreshed statistics for {', '.join(result['tests']) or 'no tests'}")
+    for test_key, test_stats in sorted(load_population_stats(db_path).items()):
+        regression = test_stats["regression"]
+        print(f"  {test_key}: N={test_stats['n']}, median speed={test_stats['speed_median']:.1f}, "
+              f"median error={test_stats['error_median']:.1f}, Spearman R={regression['corr']:.2f}")
@@ -7,15 +7,22 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Tabl
 from io import BytesIO
 from asrs_dsm_mapper import create_asrs_dsm_section
 from reportlab.lib.units import mm, inch
-import sqlite3
 import pandas as pd
 import os
+import sys
+from pathlib import Path
 from scipy import stats
 import seaborn as sns
 from collections import defaultdict
 import logging
 import json
 
+# Shared SQLite connection profile lives in the repository root
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from sqlite_profile import connect as connect_db
+from population_stats import get_population_stats, get_patient_point
+from chart_cache import cached_chart, default_cache
+
 # Set up logging
 logging.basicConfig(
     filename='report_generation.log',
@@ -87,14 +94,13 @@ TEST_CONFIG_SPEED_ACCURACY = [
         "chart_title": "Reasoning: Speed vs Accuracy"
     },
 ]
-CACHE_DIR_SPEED_ACCURACY = os.path.join('data', 'analysis_output', 'cached_data')
 # --- End Speed Accuracy Page Configuration ---
 
 def get_patient_test_scores(patient_id, test_config, db_path='cognitive_analysis.db'):
     """Fetches a patient's raw speed and error scores for a specific test."""
     conn = None
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect_db(db_path, read_only=True)
         cursor = conn.cursor()
 
         test_name = test_config['db_test_name']
@@ -154,44 +160,29 @@ def get_patient_test_scores(patient_id, test_config, db_path='cognitive_analysis
         if conn:
             conn.close()
 
-def plot_individual_on_population(patient_speed, patient_error, test_config):
+def _speed_accuracy_chart_spec(patient_speed, patient_error, test_config, db_path='cognitive_analysis.db'):
+    """Cache spec: the patient's point plus the population statistics the chart is drawn from."""
+    return {
+        "patient": [patient_speed, patient_error],
+        "test_config": test_config,
+        "population": get_population_stats(test_config['cache_key'], db_path),
+    }
+
+@cached_chart("speed_accuracy", spec=_speed_accuracy_chart_spec)
+def plot_individual_on_population(patient_speed, patient_error, test_config, db_path='cognitive_analysis.db'):
     """Generates a speed-accuracy plot highlighting the patient's position."""
     cache_key = test_config['cache_key']
-    population_cache_file = os.path.join(CACHE_DIR_SPEED_ACCURACY, f'{cache_key}_population_data.csv')
-    regression_cache_file = os.path.join(CACHE_DIR_SPEED_ACCURACY, f'{cache_key}_regression.json')
-
-    # Load cached data
-    try:
-        population_df = pd.read_csv(population_cache_file)
-        with open(regression_cache_file, 'r') as f:
-            regression_params = json.load(f)
-    except FileNotFoundError:
-        logging.error(f"Cache files not found for {cache_key}. Run speed_accuracy_analysis.py first.")
-        return None
-    except Exception as e:
-        logging.error(f"Error loading cache files for {cache_key}: {e}")
-        return None
 
-    # Clean population data (ensure numeric, handle NaNs)
-    try:
-        population_df['speed_score'] = pd.to_numeric(population_df['speed_score'], errors='coerce')
-        population_df['error_score'] = pd.to_numeric(population_df['error_score'], errors='coerce')
-        population_df = population_df.dropna(subset=['speed_score', 'error_score'])
-        # Optional: Apply outlier removal if consistent with analysis script
-        # ... (add outlier removal logic if needed)
-    except Exception as e:
-        logging.error(f"Error cleaning population data for {cache_key}: {e}")
-        return None
-        
-    if population_df.empty:
-        logging.warning(f"Cleaned population data is empty for {cache_key}.")
+    # Precomputed population statistics, loaded once per process
+    population = get_population_stats(cache_key, db_path)
+    if population is None:
+        logging.error(f"Population statistics not found for {cache_key}. Run population_stats.py first.")
         return None
+    regression_params = population['regression']
 
     # Calculate axis limits with padding
-    x_data = population_df['speed_score']
-    y_data = population_df['error_score']
-    x_min, x_max = x_data.min(), x_data.max()
-    y_min, y_max = y_data.min(), y_data.max()
+    x_min, x_max = population['speed_min'], population['speed_max']
+    y_min, y_max = population['error_min'], population['error_max']
 
     x_range = x_max - x_min
     y_range = y_max - y_min
@@ -209,9 +200,9 @@ def plot_individual_on_population(patient_speed, patient_error, test_config):
     final_y_min = y_min - y_pad
     final_y_max = y_max + y_pad
 
-    # Calculate medians for quadrant lines
-    x_median = x_data.median()
-    y_median = y_data.median()
+    # Population medians for quadrant lines
+    x_median = population['speed_median']
+    y_median = population['error_median']
 
     # Get estimated normative medians (from SS=100)
     speed_metric_key = test_config.get('speed_metric')
@@ -233,8 +224,9 @@ def plot_individual_on_population(patient_speed, patient_error, test_config):
     try:
         plt.figure(figsize=(8, 6)) # Adjusted size for report page
         
-        # Plot population data points
-        plt.scatter(population_df['speed_score'], population_df['error_score'], color='gray', alpha=0.3, s=30, label='Population')
+        # Plot population data points from the pre-binned density grid
+        density = np.array(population['density'], dtype=float).reshape(-1, 3)
+        plt.scatter(density[:, 0], density[:, 1], color='gray', alpha=0.3, s=30 * density[:, 2], label='Population')
         
         # Plot regression line
         slope = regression_params['slope']
@@ -372,233 +364,237 @@ def debug_log(message):
 
 #python generate_report.py 34766-20231015201357.pdf --import
 
-def create_radar_chart(scores, invalid_domains=None):
-    """
-    Create a radar chart of cognitive scores.
+@cached_chart("radar", parts=2)
+def _draw_radar_chart(scores, invalid_domains):
+    """Draw the radar chart and its legend; returns (chart, legend) PNG buffers."""
+    # New domain order with correlations noted in comments
+    labels = [
+        "Executive Function",                # 1
+        "Complex Attention",                 # 2 (Correlation with 1: 0.72)
+        "Simple Attention",                  # 3 (Correlation with 2: 0.61)
+        "Sustained Attention",               # 4 (Correlation with 2: 0.41, with 3: 0.36)
+        "Processing Speed",                  # 5 (Correlation with 1: 0.50, with 4: 0.40)
+        "Reaction Time",                     # 6 (Correlation with 5: 0.66)
+        "Psychomotor Speed",                 # 7 (Correlation with 5: 0.68, with 6: 0.47)
+        "Motor Speed",                       # 8 (Correlation with 7: 0.88)
+        "Visual Memory",                     # 9 (Weak links to neighbours, placed here to group Memory)
+        "Verbal Memory",                     # 10 (Grouped with Visual/Working)
+        "Working Memory",                    # 11 (Correlation with 10: 0.91)
+        "Reasoning",                         # 12 (Low overall correlations, placed near end)
+        "Cognitive Flexibility"              # 13 (Correlation with 1: 0.99 - wrap-around. Correlation with 12: 0.21)
+    ]
     
-    Args:
-        scores: Dict mapping domain names to scores
-        invalid_domains: List of domain names that are invalid
-    """
-    try:
-        if invalid_domains is None:
-            invalid_domains = []
+    # Define domain groups for symptom annotations
+    domain_groups = {
+        "Higher-Order Attention/Executive": [0, 1, 2, 3],  # Indices for Executive Function, Complex Attention, Simple Attention, Sustained Attention
+        "Speed": [4, 5, 6, 7],  # Indices for Processing Speed, Reaction Time, Psychomotor Speed, Motor Speed
+        "Memory": [8, 9, 10],  # Indices for Visual Memory, Verbal Memory, Working Memory
+        "Flexibility/Reasoning": [11, 12]  # Indices for Reasoning, Cognitive Flexibility
+    }
+    
+    # Define symptom annotations for each group
+    symptom_annotations = {
+        "Higher-Order Attention/Executive": "Difficulty Sustaining\nAttention (1b/A2)",
+        "Speed": "Fidgeting (2a/B1)",
+        "Memory": "Difficulty Waiting\nTurn (2h/B8)",
+        "Flexibility/Reasoning": "Distractibility (1h/A8)"
+    }
+    
+    # Log the scores we have
+    logging.debug("\nScores passed to radar chart:")
+    for label in labels:
+        value = scores.get(label, "MISSING")
+        logging.debug(f"  {label}: {value}")
+        print(f"  {label}: {value}")
+    
+    # Check for missing domains and set to 0 with a warning
+    values = []
+    for label in labels:
+        if label in scores:
+            values.append(scores[label])
+        else:
+            logging.warning(f"Missing score for domain: {label} - using 0")
+            print(f"[WARN] Missing score for domain: {label} - using 0")
+            values.append(0)
             
-        # New domain order with correlations noted in comments
-        labels = [
-            "Executive Function",                # 1
-            "Complex Attention",                 # 2 (Correlation with 1: 0.72)
-            "Simple Attention",                  # 3 (Correlation with 2: 0.61)
-            "Sustained Attention",               # 4 (Correlation with 2: 0.41, with 3: 0.36)
-            "Processing Speed",                  # 5 (Correlation with 1: 0.50, with 4: 0.40)
-            "Reaction Time",                     # 6 (Correlation with 5: 0.66)
-            "Psychomotor Speed",                 # 7 (Correlation with 5: 0.68, with 6: 0.47)
-            "Motor Speed",                       # 8 (Correlation with 7: 0.88)
-            "Visual Memory",                     # 9 (Weak links to neighbours, placed here to group Memory)
-            "Verbal Memory",                     # 10 (Grouped with Visual/Working)
-            "Working Memory",                    # 11 (Correlation with 10: 0.91)
-            "Reasoning",                         # 12 (Low overall correlations, placed near end)
-            "Cognitive Flexibility"              # 13 (Correlation with 1: 0.99 - wrap-around. Correlation with 12: 0.21)
-        ]
-        
-        # Define domain groups for symptom annotations
-        domain_groups = {
-            "Higher-Order Attention/Executive": [0, 1, 2, 3],  # Indices for Executive Function, Complex Attention, Simple Attention, Sustained Attention
-            "Speed": [4, 5, 6, 7],  # Indices for Processing Speed, Reaction Time, Psychomotor Speed, Motor Speed
-            "Memory": [8, 9, 10],  # Indices for Visual Memory, Verbal Memory, Working Memory
-            "Flexibility/Reasoning": [11, 12]  # Indices for Reasoning, Cognitive Flexibility
-        }
-        
-        # Define symptom annotations for each group
-        symptom_annotations = {
-            "Higher-Order Attention/Executive": "Difficulty Sustaining\nAttention (1b/A2)",
-            "Speed": "Fidgeting (2a/B1)",
-            "Memory": "Difficulty Waiting\nTurn (2h/B8)",
-            "Flexibility/Reasoning": "Distractibility (1h/A8)"
-        }
-        
-        # Log the scores we have
-        logging.debug("\nScores passed to radar chart:")
-        for label in labels:
-            value = scores.get(label, "MISSING")
-            logging.debug(f"  {label}: {value}")
-            print(f"  {label}: {value}")
-        
-        # Check for missing domains and set to 0 with a warning
-        values = []
-        for label in labels:
-            if label in scores:
-                values.append(scores[label])
-            else:
-                logging.warning(f"Missing score for domain: {label} - using 0")
-                print(f"[WARN] Missing score for domain: {label} - using 0")
-                values.append(0)
-                
-        values += values[:1]  # loop closure
-        
-        # Create a mask for invalid domains
-        invalid_mask = [label in invalid_domains for label in labels]
-        invalid_mask += invalid_mask[:1]  # loop closure
+    values += values[:1]  # loop closure
+    
+    # Create a mask for invalid domains
+    invalid_mask = [label in invalid_domains for label in labels]
+    invalid_mask += invalid_mask[:1]  # loop closure
 
-        # Create figure with larger size to accommodate more domains
-        fig, ax = plt.subplots(figsize=(14, 14), subplot_kw=dict(polar=True))
-        ax.set_theta_offset(np.pi / 2)  # Top = 12 o'clock
-        ax.set_theta_direction(-1)      # Clockwise
+    # Create figure with larger size to accommodate more domains
+    fig, ax = plt.subplots(figsize=(14, 14), subplot_kw=dict(polar=True))
+    ax.set_theta_offset(np.pi / 2)  # Top = 12 o'clock
+    ax.set_theta_direction(-1)      # Clockwise
 
-        # Draw colored background bands for standard deviation bands
-        bands = [2, 9, 25, 75, 101]  # very low, low, low average, average, above average
-        colors_band = ['#ff9999', '#ffcc99', '#ffff99', '#ccffcc', '#b3e6b3']
+    # Draw colored background bands for standard deviation bands
+    bands = [2, 9, 25, 75, 101]  # very low, low, low average, average, above average
+    colors_band = ['#ff9999', '#ffcc99', '#ffff99', '#ccffcc', '#b3e6b3']
 
-        angles = np.linspace(0, 2 * np.pi, len(labels), endpoint=False).tolist()
-        angles += angles[:1]
-        
-        # Set x-ticks to match our angles
-        ax.set_xticks(angles[:-1])
+    angles = np.linspace(0, 2 * np.pi, len(labels), endpoint=False).tolist()
+    angles += angles[:1]
+    
+    # Set x-ticks to match our angles
+    ax.set_xticks(angles[:-1])
 
-        for i in range(len(bands)-1):
-            ax.fill_between(angles, bands[i], bands[i+1], color=colors_band[i], alpha=0.5)
+    for i in range(len(bands)-1):
+        ax.fill_between(angles, bands[i], bands[i+1], color=colors_band[i], alpha=0.5)
 
-        # Plot the data points
-        ax.plot(angles, values, color='black', linewidth=2)
-        ax.fill(angles, values, color='deepskyblue', alpha=0.6)
+    # Plot the data points
+    ax.plot(angles, values, color='black', linewidth=2)
+    ax.fill(angles, values, color='deepskyblue', alpha=0.6)
+    
+    # Mark invalid domains with red X
+    for i, (angle, value, is_invalid) in enumerate(zip(angles[:-1], values[:-1], invalid_mask[:-1])):
+        if is_invalid:
+            # Plot a red X over invalid points
+            marker_size = 200
+            ax.scatter(angle, value, s=marker_size, color='red', marker='x', linewidth=2)
+    
+    # Calculate positions for labels and scores based on the number of domains
+    # We need to distribute labels evenly around the circle
+    num_domains = len(labels)
+    
+    # Add labels and scores outside the plot
+    for i, (angle, value, label, is_invalid) in enumerate(zip(angles[:-1], values[:-1], labels, invalid_mask[:-1])):
+        # Convert angle to degrees for easier handling
+        deg_angle = np.degrees(angle)
         
-        # Mark invalid domains with red X
-        for i, (angle, value, is_invalid) in enumerate(zip(angles[:-1], values[:-1], invalid_mask[:-1])):
-            if is_invalid:
-                # Plot a red X over invalid points
-                marker_size = 200
-                ax.scatter(angle, value, s=marker_size, color='red', marker='x', linewidth=2)
+        # Calculate positions using trigonometry
+        # Note: We need to adjust the angle because 0 is at the right (east) in trig functions
+        # but we want 0 to be at the top (north)
+        adjusted_angle = np.radians(90 - deg_angle)
         
-        # Calculate positions for labels and scores based on the number of domains
-        # We need to distribute labels evenly around the circle
-        num_domains = len(labels)
+        # Use fixed radius for consistent label positioning
+        label_radius = 0.46  # Fixed radius for all labels
+        label_x = 0.5 + label_radius * np.cos(adjusted_angle)
+        label_y = 0.5 + label_radius * np.sin(adjusted_angle)
         
-        # Add labels and scores outside the plot
-        for i, (angle, value, label, is_invalid) in enumerate(zip(angles[:-1], values[:-1], labels, invalid_mask[:-1])):
-            # Convert angle to degrees for easier handling
-            deg_angle = np.degrees(angle)
-            
-            # Calculate positions using trigonometry
-            # Note: We need to adjust the angle because 0 is at the right (east) in trig functions
-            # but we want 0 to be at the top (north)
-            adjusted_angle = np.radians(90 - deg_angle)
-            
-            # Use fixed radius for consistent label positioning
-            label_radius = 0.46  # Fixed radius for all labels
-            label_x = 0.5 + label_radius * np.cos(adjusted_angle)
-            label_y = 0.5 + label_radius * np.sin(adjusted_angle)
-            
-            # Calculate score position - closer to the data point than the label
-            score_radius = 0.38  # Fixed radius for all scores
-            score_x = 0.5 + score_radius * np.cos(adjusted_angle)
-            score_y = 0.5 + score_radius * np.sin(adjusted_angle)
-            
-            # Format the label for better display
-            display_label = label
-            if ' ' in label:
-                # Special handling for Executive Function to ensure it's visible
-                if label == "Executive Function":
-                    display_label = "Executive\nFunction"
-                else:
-                    display_label = label.replace(' ', '\n')
-                
-            # Mark invalid domains in the label with (INVALID)
-            if is_invalid:
-                display_label = display_label + "\n(INVALID)"
-            
-            # Use figure coordinates for precise placement
-            # Increase font size for better readability
-            ax.annotate(display_label, xy=(label_x, label_y), xycoords='figure fraction',
-                       ha='center', va='center', fontsize=12, weight='bold')
-            
-            # Add the score near the data point
-            score_text = f"{value}"
-            
-            ax.annotate(score_text, xy=(score_x, score_y), xycoords='figure fraction',
-                       ha='center', va='center', fontsize=13,
-                       bbox=dict(boxstyle="round,pad=0.2", fc='white', ec="gray", alpha=0.9))
+        # Calculate score position - closer to the data point than the label
+        score_radius = 0.38  # Fixed radius for all scores
+        score_x = 0.5 + score_radius * np.cos(adjusted_angle)
+        score_y = 0.5 + score_radius * np.sin(adjusted_angle)
         
-        # Add symptom annotations for each domain group
-        for group_name, domain_indices in domain_groups.items():
-            # Calculate the average angle for this group
-            group_angles = [angles[i] for i in domain_indices]
-            avg_angle = sum(group_angles) / len(group_angles)
-            
-            # Calculate the position for the symptom annotation
-            # Place it inside the chart but not too close to center
-            annotation_radius = 30  # Place at 30 percentile mark
-            
-            # Convert to figure coordinates
-            adjusted_angle = np.radians(90 - np.degrees(avg_angle))
-            annotation_x = 0.5 + 0.2 * np.cos(adjusted_angle)  # 0.5 is center, 0.2 is radius
-            annotation_y = 0.5 + 0.2 * np.sin(adjusted_angle)
-            
-            # Add the symptom annotation with a colored background
-            symptom_text = symptom_annotations[group_name]
-            
-            # Use different colors for each group
-            group_colors = {
-                "Higher-Order Attention/Executive": "#FFD700",  # Gold
-                "Speed": "#FF6347",                            # Tomato
-                "Memory": "#4682B4",                           # Steel Blue
-                "Flexibility/Reasoning": "#32CD32"             # Lime Green
-            }
+        # Format the label for better display
+        display_label = label
+        if ' ' in label:
+            # Special handling for Executive Function to ensure it's visible
+            if label == "Executive Function":
+                display_label = "Executive\nFunction"
+            else:
+                display_label = label.replace(' ', '\n')
             
-            ax.annotate(symptom_text, xy=(annotation_x, annotation_y), xycoords='figure fraction',
-                       ha='center', va='center', fontsize=12, weight='bold',
-                       bbox=dict(boxstyle="round,pad=0.3", fc=group_colors[group_name], ec="gray", alpha=0.7))
+        # Mark invalid domains in the label with (INVALID)
+        if is_invalid:
+            display_label = display_label + "\n(INVALID)"
         
-        # Set y-limits and grid
-        ax.set_ylim(0, 100)
-        ax.set_yticks([2, 9, 25, 75])
-        ax.set_yticklabels([])  # Hide numeric labels
-        ax.grid(True, alpha=0.3)
+        # Use figure coordinates for precise placement
+        # Increase font size for better readability
+        ax.annotate(display_label, xy=(label_x, label_y), xycoords='figure fraction',
+                   ha='center', va='center', fontsize=12, weight='bold')
         
-        # Remove the axis labels and ticks
-        ax.set_xticklabels([])
+        # Add the score near the data point
+        score_text = f"{value}"
         
-        # Create handles for the legend
-        handles = []
-        for i, (band, color) in enumerate(zip(["Very low (≤ 2%)", "Low (2-9%)", "Low average (9-25%)", "Average (25-75%)", "Above average (> 75%)"], colors_band)):
-            patch = plt.Rectangle((0, 0), 1, 1, color=color, alpha=0.5)
-            handles.append(patch)
-            
-        # Add markers for valid and invalid scores
-        valid_marker = plt.Line2D([0], [0], marker='o', color='w', markerfacecolor='black',
-                                  markersize=10, label='Valid Score', linewidth=0)
-        handles.append(valid_marker)
+        ax.annotate(score_text, xy=(score_x, score_y), xycoords='figure fraction',
+                   ha='center', va='center', fontsize=13,
+                   bbox=dict(boxstyle="round,pad=0.2", fc='white', ec="gray", alpha=0.9))
+    
+    # Add symptom annotations for each domain group
+    for group_name, domain_indices in domain_groups.items():
+        # Calculate the average angle for this group
+        group_angles = [angles[i] for i in domain_indices]
+        avg_angle = sum(group_angles) / len(group_angles)
         
-        if any(invalid_mask):
-            invalid_marker = plt.Line2D([0], [0], marker='x', color='w', markerfacecolor='red',
-                                   markersize=10, label='Invalid Score', linewidth=0)
-            handles.append(invalid_marker)
+        # Calculate the position for the symptom annotation
+        # Place it inside the chart but not too close to center
+        annotation_radius = 30  # Place at 30 percentile mark
         
-        # Create a separate figure for the legend only
-        legend_fig, legend_ax = plt.subplots(figsize=(14, 1.5))
-        legend_ax.axis('off')  # Hide axes
+        # Convert to figure coordinates
+        adjusted_angle = np.radians(90 - np.degrees(avg_angle))
+        annotation_x = 0.5 + 0.2 * np.cos(adjusted_angle)  # 0.5 is center, 0.2 is radius
+        annotation_y = 0.5 + 0.2 * np.sin(adjusted_angle)
         
-        # Add the legend to this figure with clear labels
-        legend_labels = ["Very low (≤ 2%)", "Low (2-9%)", "Low average (9-25%)", "Average (25-75%)", "Above average (> 75%)", "Valid Score"]
-        if any(invalid_mask):
-            legend_labels.append("Invalid Score")
-            
-        legend = legend_ax.legend(handles=handles, loc='center', ncol=len(legend_labels), 
-                                 labels=legend_labels, fontsize=12,
-                                 frameon=True, framealpha=0.8)
+        # Add the symptom annotation with a colored background
+        symptom_text = symptom_annotations[group_name]
         
-        # Save the legend figure to BytesIO
-        legend_buffer = BytesIO()
-        plt.savefig(legend_buffer, format='png', dpi=150, bbox_inches='tight')
-        plt.close(legend_fig)
+        # Use different colors for each group
+        group_colors = {
+            "Higher-Order Attention/Executive": "#FFD700",  # Gold
+            "Speed": "#FF6347",                            # Tomato
+            "Memory": "#4682B4",                           # Steel Blue
+            "Flexibility/Reasoning": "#32CD32"             # Lime Green
+        }
         
-        # Save the main radar chart to BytesIO
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight', pad_inches=0.5)
-        plt.close(fig)
+        ax.annotate(symptom_text, xy=(annotation_x, annotation_y), xycoords='figure fraction',
+                   ha='center', va='center', fontsize=12, weight='bold',
+                   bbox=dict(boxstyle="round,pad=0.3", fc=group_colors[group_name], ec="gray", alpha=0.7))
+    
+    # Set y-limits and grid
+    ax.set_ylim(0, 100)
+    ax.set_yticks([2, 9, 25, 75])
+    ax.set_yticklabels([])  # Hide numeric labels
+    ax.grid(True, alpha=0.3)
+    
+    # Remove the axis labels and ticks
+    ax.set_xticklabels([])
+    
+    # Create handles for the legend
+    handles = []
+    for i, (band, color) in enumerate(zip(["Very low (≤ 2%)", "Low (2-9%)", "Low average (9-25%)", "Average (25-75%)", "Above average (> 75%)"], colors_band)):
+        patch = plt.Rectangle((0, 0), 1, 1, color=color, alpha=0.5)
+        handles.append(patch)
         
-        # Return both the main chart and the legend
-        return buffer, legend_buffer
+    # Add markers for valid and invalid scores
+    valid_marker = plt.Line2D([0], [0], marker='o', color='w', markerfacecolor='black',
+                              markersize=10, label='Valid Score', linewidth=0)
+    handles.append(valid_marker)
+    
+    if any(invalid_mask):
+        invalid_marker = plt.Line2D([0], [0], marker='x', color='w', markerfacecolor='red',
+                               markersize=10, label='Invalid Score', linewidth=0)
+        handles.append(invalid_marker)
+    
+    # Create a separate figure for the legend only
+    legend_fig, legend_ax = plt.subplots(figsize=(14, 1.5))
+    legend_ax.axis('off')  # Hide axes
+    
+    # Add the legend to this figure with clear labels
+    legend_labels = ["Very low (≤ 2%)", "Low (2-9%)", "Low average (9-25%)", "Average (25-75%)", "Above average (> 75%)", "Valid Score"]
+    if any(invalid_mask):
+        legend_labels.append("Invalid Score")
         
+    legend = legend_ax.legend(handles=handles, loc='center', ncol=len(legend_labels), 
+                             labels=legend_labels, fontsize=12,
+                             frameon=True, framealpha=0.8)
+    
+    # Save the legend figure to BytesIO
+    legend_buffer = BytesIO()
+    plt.savefig(legend_buffer, format='png', dpi=150, bbox_inches='tight')
+    plt.close(legend_fig)
+    
+    # Save the main radar chart to BytesIO
+    buffer = BytesIO()
+    plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight', pad_inches=0.5)
+    plt.close(fig)
+    
+    # Return both the main chart and the legend
+    return buffer, legend_buffer
+
+
+def create_radar_chart(scores, invalid_domains=None):
+    """
+    Create a radar chart of cognitive scores.
+    
+    Args:
+        scores: Dict mapping domain names to scores
+        invalid_domains: List of domain names that are invalid
+
+    Identical scores return the cached images (see chart_cache.py).
+    """
+    try:
+        return _draw_radar_chart(scores, invalid_domains or [])
     except Exception as e:
         # Log the error and return a placeholder image
         error_msg = f"Error creating radar chart: {str(e)}"
@@ -1273,7 +1269,64 @@ def create_fancy_report(data, output_path):
     doc.build(elements)
 
     print(f"[INFO] Report saved to {output_path}")
+    logging.info(f"Chart cache: {default_cache().stats()}")
+
 
+@cached_chart("sat_speed_accuracy")
+def _draw_sat_chart(patient_id, patient_rt, patient_err, population):
+    """Draw the SAT chart for one patient point; returns a PNG buffer, or None on error."""
+    regression_params = population['regression']
+    slope = regression_params['slope']
+    intercept = regression_params['intercept']
+    corr = regression_params['corr']
+    p = regression_params['p']
+
+    try:
+        # Generate x values across the range for the line
+        x_min, x_max = population['speed_min'], population['speed_max']
+        x_line = np.linspace(x_min, x_max, 100)
+        y_line = slope * x_line + intercept
+        
+        # Plot regression line
+        plt.plot(x_line, y_line, color='red', linewidth=2)
+        
+        # Add patient's point
+        plt.scatter(patient_rt, patient_err, color='blue', s=100, marker='o', 
+                    label=f'Patient {patient_id}')
+        
+        # Highlight patient position with a vertical and horizontal line to axes
+        plt.axvline(x=patient_rt, color='blue', linestyle='--', alpha=0.5)
+        plt.axhline(y=patient_err, color='blue', linestyle='--', alpha=0.5)
+        
+        # Clean labels and add interpretation notes
+        rt_interp = "(Lower=Faster)"
+        err_interp = "(Higher=More Errors)"
+        
+        plt.title(f"Speed vs. Accuracy: Shifting Attention Test (SAT)\nPopulation Spearman R={corr:.2f}, p={p:.6f}, N={population['n']}")
+        plt.xlabel(f"Reaction Time\n{rt_interp}")
+        plt.ylabel(f"Errors\n{err_interp}")
+        plt.grid(True, alpha=0.3)
+        plt.legend()
+        
+        # Add quadrant labels to help interpretation
+        plt.annotate("Fast & Accurate", xy=(x_min, population['error_min']), 
+                    xytext=(10, 10), textcoords='offset points', color='green')
+        plt.annotate("Slow & Inaccurate", xy=(x_max, population['error_max']), 
+                    xytext=(-10, -10), textcoords='offset points', color='red', ha='right')
+        
+        plt.tight_layout()
+        
+        # Instead of saving to file, save to BytesIO
+        img_data = BytesIO()
+        plt.savefig(img_data, format='png', bbox_inches='tight', pad_inches=0.5)
+        img_data.seek(0)
+        plt.close()
+        
+        return img_data
+    except Exception as e:
+        print(f"Error creating plot: {e}")
+        plt.close()
+        return None
 
 def create_sat_speed_accuracy_chart(patient_id, db_path='cognitive_analysis.db'):
     """
@@ -1288,218 +1341,20 @@ def create_sat_speed_accuracy_chart(patient_id, db_path='cognitive_analysis.db')
         BytesIO: A BytesIO object containing the plot image data
     """
     try:
-        # Define cache directory and file
-        cache_dir = os.path.join('data', 'analysis_output', 'cached_data')
-        os.makedirs(cache_dir, exist_ok=True)
-        population_cache_file = os.path.join(cache_dir, 'sat_rt_errors_population_data.csv')
-        regression_cache_file = os.path.join(cache_dir, 'sat_rt_errors_regression.json')
-        
-        # Try to load population data from cache
-        population_df = None
-        regression_params = None
-        
-        # Load population data if it exists
-        if os.path.exists(population_cache_file):
-            print(f"Loading cached SAT population data from {population_cache_file}")
-            try:
-                population_df = pd.read_csv(population_cache_file)
-                # === ADDED CHECK: Verify if current patient is in the loaded cache ===
-                if population_df is not None and not population_df.empty:
-                    if str(patient_id) not in population_df['patient_id'].astype(str).values:
-                        print(f"Patient {patient_id} not found in cached data. Discarding cache and querying DB.")
-                        population_df = None # Force fallback to DB query
-                    else:
-                        print(f"Patient {patient_id} found in cached data.")
-                # =======================================================================
-            except Exception as e:
-                print(f"Error loading cached population data: {e}")
-                population_df = None # Fallback to DB query on error
-        
-        # If not in cache OR patient wasn't found in cache, query from database
-        if population_df is None:
-            print("SAT population data not cached or incomplete for patient, querying database...")
-            try:
-                # Connect to the database
-                conn = sqlite3.connect(db_path)
-                
-                # First, verify what data exists for this patient
-                debug_query = """
-                SELECT patient_id, subtest_name, metric, score, standard_score, percentile
-                FROM subtest_results 
-                WHERE patient_id = ? 
-                AND subtest_name LIKE '%Shifting Attention Test%'
-                """
-                debug_df = pd.read_sql_query(debug_query, conn, params=(patient_id,))
-                if not debug_df.empty:
-                    print(f"Found SAT data for patient {patient_id}:")
-                    print(debug_df)
-                else:
-                    print(f"No SAT data found for patient {patient_id} in debug query")
-                
-                # Get population data for the regression line - use more flexible matching
-                query = """
-                SELECT sr1.patient_id, sr1.standard_score as rt_score, sr2.standard_score as err_score
-                FROM subtest_results sr1
-                JOIN subtest_results sr2 ON sr1.patient_id = sr2.patient_id
-                WHERE sr1.subtest_name LIKE '%Shifting Attention Test%'
-                AND sr1.metric LIKE '%Correct Reaction Time%' 
-                AND sr2.subtest_name LIKE '%Shifting Attention Test%'
-                AND sr2.metric LIKE '%Errors%' 
-                """
-                population_df = pd.read_sql_query(query, conn)
-                print(f"Found {len(population_df)} patients with SAT data for population analysis")
-                
-                # Check if our patient is in the results
-                if str(patient_id) in population_df['patient_id'].astype(str).values:
-                    print(f"Patient {patient_id} is in the population dataset")
-                else:
-                    print(f"Patient {patient_id} NOT found in population dataset. Available IDs: {population_df['patient_id'].unique()[:5]}...")
-                
-                conn.close()
-                
-                # Save population data to cache
-                if not population_df.empty:
-                    print(f"Saving population data to cache: {population_cache_file}")
-                    try:
-                        population_df.to_csv(population_cache_file, index=False)
-                    except Exception as e:
-                        print(f"Error saving population data to cache: {e}")
-            except Exception as e:
-                print(f"Error querying database for SAT data: {e}")
-                return None
-            
-        if population_df is None or population_df.empty:
-            print(f"No SAT data found in the database or cache")
-            return None
-        
-        # Get the specific patient's data
-        try:
-            # Convert patient_id to string for matching
-            str_patient_id = str(patient_id)
-            # Make matching more robust by comparing string versions
-            patient_data = population_df[population_df['patient_id'].astype(str) == str_patient_id]
-            
-            if patient_data.empty:
-                print(f"No SAT data found for patient ID {patient_id} in the processed dataset")
-                print(f"Available patient IDs: {population_df['patient_id'].unique()[:5]}...")
-                return None
-            else:
-                print(f"Found SAT data for patient {patient_id}: RT={patient_data['rt_score'].values[0]}, Errors={patient_data['err_score'].values[0]}")
-        except Exception as e:
-            print(f"Error filtering data for patient {patient_id}: {e}")
-            return None
-        
-        # Convert to numeric and drop NaNs
-        try:
-            population_df['rt_score'] = pd.to_numeric(population_df['rt_score'], errors='coerce')
-            population_df['err_score'] = pd.to_numeric(population_df['err_score'], errors='coerce')
-            population_df = population_df.dropna(subset=['rt_score', 'err_score'])
-            
-            if len(population_df) < 10:
-                print(f"Insufficient SAT data points after cleaning: {len(population_df)}")
-                return None
-        except Exception as e:
-            print(f"Error converting data types: {e}")
+        # Population trend from the precomputed statistics store (no population query)
+        population = get_population_stats('sat_rt_errors', db_path)
+        if population is None or population['n'] < 10:
+            print("Insufficient SAT population statistics; run population_stats.py to refresh them")
             return None
-        
-        # Try to load regression parameters from cache
-        if os.path.exists(regression_cache_file):
-            print(f"Loading cached regression parameters from {regression_cache_file}")
-            try:
-                import json
-                with open(regression_cache_file, 'r') as f:
-                    regression_params = json.load(f)
-                slope = regression_params['slope']
-                intercept = regression_params['intercept']
-                r_value = regression_params['r_value']
-                p_value = regression_params['p_value']
-                std_err = regression_params['std_err']
-                corr = regression_params['corr']
-                p = regression_params['p']
-            except Exception as e:
-                print(f"Error loading regression parameters: {e}")
-                regression_params = None
-        
-        # Calculate regression if not in cache
-        if regression_params is None:
-            try:
-                # Calculate and plot the regression line for the population
-                slope, intercept, r_value, p_value, std_err = stats.linregress(
-                    population_df['rt_score'], population_df['err_score'])
-                
-                # Calculate Spearman correlation
-                corr, p = stats.spearmanr(population_df['rt_score'], population_df['err_score'])
-                
-                # Save regression parameters to cache
-                regression_params = {
-                    'slope': float(slope),
-                    'intercept': float(intercept),
-                    'r_value': float(r_value),
-                    'p_value': float(p_value),
-                    'std_err': float(std_err),
-                    'corr': float(corr),
-                    'p': float(p)
-                }
-                
-                try:
-                    import json
-                    with open(regression_cache_file, 'w') as f:
-                        json.dump(regression_params, f)
-                    print(f"Saved regression parameters to cache: {regression_cache_file}")
-                except Exception as e:
-                    print(f"Error saving regression parameters: {e}")
-            except Exception as e:
-                print(f"Error calculating regression: {e}")
-                return None
-        
-        try:
-            # Generate x values across the range for the line
-            x_min, x_max = population_df['rt_score'].min(), population_df['rt_score'].max()
-            x_line = np.linspace(x_min, x_max, 100)
-            y_line = slope * x_line + intercept
-            
-            # Plot regression line
-            plt.plot(x_line, y_line, color='red', linewidth=2)
-            
-            # Add patient's point
-            patient_rt = patient_data['rt_score'].values[0]
-            patient_err = patient_data['err_score'].values[0]
-            plt.scatter(patient_rt, patient_err, color='blue', s=100, marker='o', 
-                        label=f'Patient {patient_id}')
-            
-            # Highlight patient position with a vertical and horizontal line to axes
-            plt.axvline(x=patient_rt, color='blue', linestyle='--', alpha=0.5)
-            plt.axhline(y=patient_err, color='blue', linestyle='--', alpha=0.5)
-            
-            # Clean labels and add interpretation notes
-            rt_interp = "(Lower=Faster)"
-            err_interp = "(Higher=More Errors)"
-            
-            plt.title(f"Speed vs. Accuracy: Shifting Attention Test (SAT)\nPopulation Spearman R={corr:.2f}, p={p:.6f}, N={len(population_df)}")
-            plt.xlabel(f"Reaction Time\n{rt_interp}")
-            plt.ylabel(f"Errors\n{err_interp}")
-            plt.grid(True, alpha=0.3)
-            plt.legend()
-            
-            # Add quadrant labels to help interpretation
-            plt.annotate("Fast & Accurate", xy=(x_min, population_df['err_score'].min()), 
-                        xytext=(10, 10), textcoords='offset points', color='green')
-            plt.annotate("Slow & Inaccurate", xy=(x_max, population_df['err_score'].max()), 
-                        xytext=(-10, -10), textcoords='offset points', color='red', ha='right')
-            
-            plt.tight_layout()
-            
-            # Instead of saving to file, save to BytesIO
-            img_data = BytesIO()
-            plt.savefig(img_data, format='png', bbox_inches='tight', pad_inches=0.5)
-            img_data.seek(0)
-            plt.close()
-            
-            return img_data
-        except Exception as e:
-            print(f"Error creating plot: {e}")
-            plt.close()
+
+        # The patient's own point comes from their indexed subtest_results rows
+        patient_rt, patient_err = get_patient_point('sat_rt_errors', patient_id, db_path)
+        if patient_rt is None or patient_err is None:
+            print(f"No SAT data found for patient ID {patient_id}")
             return None
+        print(f"Found SAT data for patient {patient_id}: RT={patient_rt}, Errors={patient_err}")
+
+        return _draw_sat_chart(patient_id, patient_rt, patient_err, population)
     
     except Exception as e:
         print(f"Error creating SAT speed-accuracy chart: {e}")
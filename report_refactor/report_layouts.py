@@ -0,0 +1,113 @@
+"""
+Layout fingerprints and extraction plans for known CNS VS report templates.
+
+CNS VS reports come in a small number of fixed templates. A template is identified by
+its page size and the title of every page (the first line of the topmost text block,
+which the header of each page starts with); both come from the per-page text blocks
+that the importer reads anyway, so fingerprinting costs no extra extraction.
+
+Each known template maps to a LayoutPlan: for every report section, the page indices
+it occupies and, where useful, the clip rectangle its content lies in. The parsers in
+parsing_helpers read only those pages (and only the clipped region) for a known
+layout, and fall back to discovering the structure by scanning the document when
+identify_layout() returns None.
+
+To support a new template, add a LayoutPlan built from one of its reports with
+layout_signature() and confirm that its parse matches the generic discovery.
+"""
+import logging
+from typing import Dict, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Rect = Tuple[float, float, float, float]  # x0, y0, x1, y1 in points
+
+LETTER = (612, 792)
+# Everything below the repeated page header (title, test date, patient ID, ...)
+BODY_CLIP: Rect = (0, 110, 612, 792)
+
+REPORT_TITLE = "CNS Vital Signs Report"
+ASRS_TITLE = "Adult ADHD Self-Report Scale (ASRS-v1.1) Symptom Checklist"
+EPWORTH_TITLE = "Epworth Sleepiness Scale (ESS) SF-8"
+NPQ_LF207_TITLE = "NeuroPsych Questionnaire (NPQ) LF-207"
+
+
+class Section(NamedTuple):
+    pages: Tuple[int, ...]
+    clip: Optional[Rect] = None
+
+
+class LayoutPlan(NamedTuple):
+    name: str
+    page_size: Tuple[int, int]
+    page_titles: Tuple[str, ...]
+    sections: Dict[str, Section]
+
+    @property
+    def signature(self):
+        return (self.page_size, self.page_titles)
+
+    def pages(self, section: str) -> Optional[Tuple[int, ...]]:
+        """Page indices of a section, or None if this layout has no plan for it."""
+        planned = self.sections.get(section)
+        return planned.pages if planned else None
+
+    def clip(self, section: str) -> Optional[Rect]:
+        planned = self.sections.get(section)
+        return planned.clip if planned else None
+
+
+# CNS VS Online 2.0 with ASRS, Epworth and the 207-question NPQ (13 pages)
+CNSVS_2_NPQ_LF207 = LayoutPlan(
+    name='cnsvs-2.0-npq-lf207',
+    page_size=LETTER,
+    page_titles=(REPORT_TITLE,) * 3 + (ASRS_TITLE, EPWORTH_TITLE) + (NPQ_LF207_TITLE,) * 8,
+    sections={
+        'subtests': Section(pages=(0, 1, 2)),
+        'asrs': Section(pages=(3,), clip=BODY_CLIP),
+        'npq': Section(pages=tuple(range(5, 13)), clip=BODY_CLIP),
+        'npq_domains': Section(pages=(5,)),
+    },
+)
+
+KNOWN_LAYOUTS = {plan.signature: plan for plan in (CNSVS_2_NPQ_LF207,)}
+
+
+def page_title(blocks) -> str:
+    """First line of the topmost text block of a page ('' for a page without text)."""
+    text_blocks = [b for b in blocks if len(b) < 7 or b[6] == 0]
+    if not text_blocks:
+        return ""
+    top = min(text_blocks, key=lambda b: (b[1], b[0]))
+    lines = top[4].strip().splitlines()
+    return lines[0].strip() if lines else ""
+
+
+def layout_signature(report):
+    """(page size, page titles) of a ParsedReport; the key of KNOWN_LAYOUTS."""
+    rect = report.doc[0].rect if report.page_count else None
+    page_size = (round(rect.width), round(rect.height)) if rect is not None else (0, 0)
+    return page_size, tuple(page_title(report.blocks(i)) for i in range(report.page_count))
+
+
+def identify_layout(report) -> Optional[LayoutPlan]:
+    """The LayoutPlan of a known template, or None (parse by generic discovery)."""
+    try:
+        signature = layout_signature(report)
+    except Exception as e:
+        logger.warning(f"Could not fingerprint the layout of {report.pdf_path}: {e}")
+        return None
+    plan = KNOWN_LAYOUTS.get(signature)
+    if plan is None:
+        logger.info(f"Unknown report layout for {report.pdf_path} ({len(signature[1])} pages); using generic discovery")
+    else:
+        logger.debug(f"{report.pdf_path} matches layout {plan.name}")
+    return plan
+
+
+def clip_blocks(blocks, clip: Optional[Rect]):
+    """The blocks lying entirely inside clip (all blocks when clip is None)."""
+    if clip is None:
+        return blocks
+    x0, y0, x1, y1 = clip
+    return [b for b in blocks if b[0] >= x0 and b[1] >= y0 and b[2] <= x1 and b[3] <= y1]
@@ -0,0 +1,239 @@
+"""
+Table extraction backends for ParsedReport.tables().
+
+Every backend returns pdfplumber's extract_tables() shape: a list of tables, each a list
+of rows, each a list of cell strings (None where a spanning cell covers the column).
+
+- pdfplumber: pdfplumber's extract_tables(); runs pdfminer's layout analysis of the page.
+- pymupdf: the same "lines" strategy (snap and join the ruling edges, intersect them,
+  build cells, group cells into tables) on PyMuPDF's page.get_drawings(), with cell text
+  taken from page.get_text("words"). No per-character objects are built, so it is many
+  times faster than pdfplumber and than PyMuPDF's own find_tables().
+
+The backend is chosen per deployment with LUCID_TABLE_BACKEND, or per section by the
+callers in parsing_helpers (see SECTION_TABLE_BACKENDS there).
+"""
+import os
+from collections import defaultdict
+from typing import List, Optional
+
+import numpy as np
+
+DEFAULT_TABLE_BACKEND = os.environ.get('LUCID_TABLE_BACKEND', 'pymupdf')
+
+# pdfplumber's default table settings
+SNAP_TOLERANCE = 3
+JOIN_TOLERANCE = 3
+EDGE_MIN_LENGTH = 3
+INTERSECTION_TOLERANCE = 3
+LINE_TOLERANCE = 3  # Words whose tops are this close are on the same line of a cell
+
+
+class PdfplumberTables:
+    name = 'pdfplumber'
+
+    def extract_tables(self, report, page_idx: int) -> List[list]:
+        return report.plumber.pages[page_idx].extract_tables()
+
+
+class PymupdfTables:
+    name = 'pymupdf'
+
+    def extract_tables(self, report, page_idx: int) -> List[list]:
+        page = report.doc[page_idx]
+        h_edges, v_edges = _merge_edges(*_page_edges(page))
+        cells = _intersections_to_cells(h_edges, v_edges)
+        if not cells:
+            return []
+        words = report.words(page_idx)
+        return [_extract_table(table, words) for table in _cells_to_tables(cells)]
+
+
+TABLE_BACKENDS = {backend.name: backend for backend in (PdfplumberTables(), PymupdfTables())}
+
+
+def get_table_backend(name: Optional[str] = None):
+    """Backend by name (None for the deployment default)."""
+    name = name or DEFAULT_TABLE_BACKEND
+    try:
+        return TABLE_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown table backend {name!r}; choose from {', '.join(TABLE_BACKENDS)}")
+
+
+# --- Ruling edges ---
+
+def _page_edges(page):
+    """Horizontal (y, x0, x1) and vertical (x, y0, y1) edges of the page's lines and rectangles."""
+    h_edges, v_edges = [], []
+
+    def add(x0, y0, x1, y1):
+        if y0 == y1:
+            h_edges.append((y0, min(x0, x1), max(x0, x1)))
+        elif x0 == x1:
+            v_edges.append((x0, min(y0, y1), max(y0, y1)))
+
+    for path in page.get_drawings():
+        for item in path['items']:
+            if item[0] == 'l':
+                add(item[1].x, item[1].y, item[2].x, item[2].y)
+            elif item[0] == 're':
+                r = item[1]
+                add(r.x0, r.y0, r.x1, r.y0)
+                add(r.x0, r.y1, r.x1, r.y1)
+                add(r.x0, r.y0, r.x0, r.y1)
+                add(r.x1, r.y0, r.x1, r.y1)
+    return h_edges, v_edges
+
+
+def _snap(edges, tolerance):
+    """Move edges whose positions are within tolerance of each other to their mean position."""
+    if not edges:
+        return []
+    edges = sorted(edges)
+    snapped, cluster = [], [edges[0]]
+    for edge in edges[1:]:
+        if edge[0] <= cluster[-1][0] + tolerance:
+            cluster.append(edge)
+        else:
+            snapped.extend(_to_mean(cluster))
+            cluster = [edge]
+    snapped.extend(_to_mean(cluster))
+    return snapped
+
+
+def _to_mean(cluster):
+    mean = sum(edge[0] for edge in cluster) / len(cluster)
+    return [(mean, start, end) for _, start, end in cluster]
+
+
+def _join(edges, tolerance):
+    """Join collinear edges that overlap or are within tolerance of each other."""
+    by_position = defaultdict(list)
+    for position, start, end in edges:
+        by_position[position].append((start, end))
+    joined = []
+    for position, spans in by_position.items():
+        spans.sort()
+        start, end = spans[0]
+        for next_start, next_end in spans[1:]:
+            if next_start <= end + tolerance:
+                end = max(end, next_end)
+            else:
+                joined.append((position, start, end))
+                start, end = next_start, next_end
+        joined.append((position, start, end))
+    return joined
+
+
+def _merge_edges(h_edges, v_edges):
+    h_edges = [e for e in _join(_snap(h_edges, SNAP_TOLERANCE), JOIN_TOLERANCE) if e[2] - e[1] >= EDGE_MIN_LENGTH]
+    v_edges = [e for e in _join(_snap(v_edges, SNAP_TOLERANCE), JOIN_TOLERANCE) if e[2] - e[1] >= EDGE_MIN_LENGTH]
+    return h_edges, v_edges
+
+
+# --- Cells and tables ---
+
+def _intersections_to_cells(h_edges, v_edges):
+    """Cells (x0, y0, x1, y1) from the edge intersections, as pdfplumber builds them."""
+    tol = INTERSECTION_TOLERANCE
+    intersections = defaultdict(lambda: (set(), set()))  # point -> (h edge ids, v edge ids)
+    for v_id, (x, v_top, v_bottom) in enumerate(sorted(v_edges)):
+        for h_id, (y, h_left, h_right) in enumerate(sorted(h_edges)):
+            if v_top <= y + tol and v_bottom >= y - tol and h_left - tol <= x <= h_right + tol:
+                point = (x, y)
+                intersections[point][0].add(h_id)
+                intersections[point][1].add(v_id)
+    points = sorted(intersections)
+    point_set = set(points)
+
+    def connected(p1, p2):
+        if p1[0] == p2[0]:
+            return bool(intersections[p1][1] & intersections[p2][1])
+        return bool(intersections[p1][0] & intersections[p2][0])
+
+    cells = []
+    for i, pt in enumerate(points):
+        rest = points[i + 1:]
+        below = [p for p in rest if p[0] == pt[0]]
+        right = [p for p in rest if p[1] == pt[1]]
+        cell = None
+        for below_pt in below:
+            if not connected(pt, below_pt):
+                continue
+            for right_pt in right:
+                if not connected(pt, right_pt):
+                    continue
+                bottom_right = (right_pt[0], below_pt[1])
+                if bottom_right in point_set and connected(bottom_right, right_pt) \
+                        and connected(bottom_right, below_pt):
+                    cell = (pt[0], pt[1], bottom_right[0], bottom_right[1])
+                    break
+            if cell:
+                break
+        if cell:
+            cells.append(cell)
+    return cells
+
+
+def _cells_to_tables(cells):
+    """Group cells sharing a corner into tables, top-to-bottom; single cells are not tables."""
+    def corners(cell):
+        x0, y0, x1, y1 = cell
+        return {(x0, y0), (x0, y1), (x1, y0), (x1, y1)}
+
+    remaining = list(cells)
+    tables = []
+    while remaining:
+        table = [remaining.pop(0)]
+        table_corners = corners(table[0])
+        grew = True
+        while grew:
+            grew = False
+            for cell in list(remaining):
+                cell_corners = corners(cell)
+                if table_corners & cell_corners:
+                    table.append(cell)
+                    table_corners |= cell_corners
+                    remaining.remove(cell)
+                    grew = True
+        tables.append(table)
+    tables.sort(key=lambda table: min((cell[1], cell[0]) for cell in table))
+    return [table for table in tables if len(table) > 1]
+
+
+def _extract_table(cells, words):
+    xs = sorted({cell[0] for cell in cells})
+    rows = defaultdict(dict)
+    for cell in cells:
+        rows[cell[1]][cell[0]] = cell
+    texts = _cell_texts(cells, words)
+    return [[texts[rows[top][x]] if x in rows[top] else None for x in xs] for top in sorted(rows)]
+
+
+def _cell_texts(cells, words):
+    """Text of each cell from the words whose centre lies in it (one vectorized pass)."""
+    texts = {cell: '' for cell in cells}
+    if not words:
+        return texts
+    boxes = np.array([word[:4] for word in words], dtype=float)
+    h_mid = ((boxes[:, 0] + boxes[:, 2]) / 2)[:, None]
+    v_mid = ((boxes[:, 1] + boxes[:, 3]) / 2)[:, None]
+    rects = np.array(cells, dtype=float)
+    inside = (rects[:, 0] <= h_mid) & (h_mid < rects[:, 2]) & (rects[:, 1] <= v_mid) & (v_mid < rects[:, 3])
+    for cell_idx, cell in enumerate(cells):
+        members = np.nonzero(inside[:, cell_idx])[0]
+        if len(members):
+            texts[cell] = _join_words([words[i] for i in members])
+    return texts
+
+
+def _join_words(words):
+    """Words to text: lines top to bottom joined with newlines, words left to right with spaces."""
+    lines = []
+    for word in sorted(words, key=lambda w: (w[1], w[0])):
+        if lines and word[1] <= lines[-1][0] + LINE_TOLERANCE:
+            lines[-1][1].append(word)
+        else:
+            lines.append((word[1], [word]))
+    return "\n".join(" ".join(w[4] for w in sorted(line, key=lambda w: w[0])) for _, line in lines)
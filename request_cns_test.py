@@ -1,9 +1,11 @@
+import asyncio
 import logging
 import random
 import time
 import os
 import configparser
 from playwright.sync_api import Playwright, sync_playwright, TimeoutError as PlaywrightTimeoutError
+from cnsvs_session import CnsvsSessionPool, REMOTE_TEST_PORTAL
 
 # Robust logger setup
 log_path = os.path.join(os.path.dirname(__file__), '..', 'lucid_request.log')
@@ -30,77 +32,140 @@ def stealth_delay(min_delay=0.8, max_delay=2.2):
     logger.debug(f"Stealth delay: sleeping for {delay:.2f} seconds.")
     time.sleep(delay)
 
-def request_cns_remote_test(playwright: Playwright, subject: str, dob_year: str, email: str):
-    browser = None
-    context = None
+async def async_stealth_delay(min_delay=0.8, max_delay=2.2):
+    """asyncio version of stealth_delay: paces one patient's flow without blocking the others."""
+    delay = random.uniform(min_delay, max_delay)
+    logger.debug(f"Stealth delay: sleeping for {delay:.2f} seconds.")
+    await asyncio.sleep(delay)
+
+def remote_test_steps(subject: str, dob_year: str, email: str):
+    """
+    UI steps that generate a remote test code on the CNS VS portal and email it, shared by
+    the sync and async runners. Each step is (action, locator, value), where locator is
+    ('css', selector) or ('role', role, name).
+    """
+    return [
+        ("select", ("role", "combobox", None), "english_uk"),
+        ("click", ("role", "button", "Initial ADHD"), None),
+        ("click", ("css", "#input_subject"), None),
+        ("fill", ("css", "#input_subject"), subject),
+        ("click", ("css", "#dob_year"), None),
+        ("fill", ("css", "#dob_year"), dob_year),
+        ("click", ("css", "#dob_month"), None),
+        ("fill", ("css", "#dob_month"), "Jan"),
+        ("click", ("css", "#dob_day"), None),
+        ("fill", ("css", "#dob_day"), "1"),
+        ("click", ("role", "button", "Add New Remote Test Code"), None),
+        ("dismiss_dialog", None, None),
+        ("click", ("css", "button[name=\"SHFNHJWBB\"]"), None),
+        ("dismiss_dialog", None, None),
+        ("goto", None, f"https://sync.cnsvs.com/sync.php?menu=remote_test&email_code=HFNHJWBB&email_to={email}"),
+    ]
+
+def _locate(page, locator):
+    if locator[0] == "css":
+        return page.locator(locator[1])
+    _, role, name = locator
+    return page.get_by_role(role, name=name) if name else page.get_by_role(role)
+
+def _run_steps(page, steps, pace=stealth_delay):
+    for action, locator, value in steps:
+        if action == "click":
+            _locate(page, locator).click()
+        elif action == "fill":
+            _locate(page, locator).fill(value)
+        elif action == "select":
+            _locate(page, locator).select_option(value)
+        elif action == "dismiss_dialog":
+            page.once("dialog", lambda dialog: dialog.dismiss())
+        elif action == "goto":
+            page.goto(value)
+        pace()
+
+async def _run_steps_async(page, steps, pace=async_stealth_delay):
+    for action, locator, value in steps:
+        if action == "click":
+            await _locate(page, locator).click()
+        elif action == "fill":
+            await _locate(page, locator).fill(value)
+        elif action == "select":
+            await _locate(page, locator).select_option(value)
+        elif action == "dismiss_dialog":
+            page.once("dialog", lambda dialog: asyncio.ensure_future(dialog.dismiss()))
+        elif action == "goto":
+            await page.goto(value)
+        await pace()
+
+def request_cns_remote_test(playwright: Playwright, subject: str, dob_year: str, email: str, headless: bool = False, session=None) -> bool:
+    """
+    Generate a CNS VS remote test code for a patient and email it to them.
+    Args:
+        playwright: Playwright instance; used for a one-off browser when no session is given.
+        subject (str): Patient ID to register the test under.
+        dob_year (str): Patient's year of birth.
+        email (str): Address the test link is sent to.
+        headless (bool): Run the one-off browser headless.
+        session (CnsvsSession, optional): Logged-in session from a CnsvsSessionPool, reused across patients.
+    Returns:
+        bool: True if the test request went through.
+    """
+    if session is None:
+        with CnsvsSessionPool(playwright, headless=headless, pace=stealth_delay) as pool:
+            return request_cns_remote_test(playwright, subject, dob_year, email, session=pool.session())
     try:
         logger.info(f"Starting browser automation for subject={subject}, dob_year={dob_year}, email={email}")
-        browser = playwright.chromium.launch(headless=False)
-        context = browser.new_context()
-        page = context.new_page()
-        page.goto("https://www.cnsvs.com/")
-        logger.info("Navigated to CNSVS homepage.")
-        stealth_delay()
-        page.get_by_text("Sign In").click()
-        stealth_delay()
-        page.get_by_text("Generate Remote Test Code").click()
-        stealth_delay()
-        # Use credentials from config file
-        username = config.get('cnsvs', 'username', fallback=None)
-        password = config.get('cnsvs', 'password', fallback=None)
-        page.locator("#input_user").click()
-        stealth_delay()
-        page.locator("#input_user").fill(username)
-        stealth_delay()
-        page.locator("#input_passwd").click()
-        stealth_delay()
-        page.locator("#input_passwd").fill(password)
-        stealth_delay()
-        page.get_by_role("button", name="Login").click()
-        logger.info(f"Logged in as {username}.")
-        stealth_delay()
-        page.get_by_role("combobox").select_option("english_uk")
-        stealth_delay()
-        page.get_by_role("button", name="Initial ADHD").click()
-        stealth_delay()
-        page.locator("#input_subject").click()
-        stealth_delay()
-        page.locator("#input_subject").fill(subject)
-        stealth_delay()
-        page.locator("#dob_year").click()
-        stealth_delay()
-        page.locator("#dob_year").fill(dob_year)
-        stealth_delay()
-        page.locator("#dob_month").click()
-        stealth_delay()
-        page.locator("#dob_month").fill("Jan")
-        stealth_delay()
-        page.locator("#dob_day").click()
-        stealth_delay()
-        page.locator("#dob_day").fill("1")
-        stealth_delay()
-        page.get_by_role("button", name="Add New Remote Test Code").click()
-        logger.info(f"Requested remote test for subject={subject}, dob_year={dob_year}")
-        stealth_delay()
-        page.once("dialog", lambda dialog: dialog.dismiss())
-        logger.info("Dismissed dialog if present.")
-        stealth_delay()
-        page.locator("button[name=\"SHFNHJWBB\"]").click()
-        stealth_delay()
-        page.once("dialog", lambda dialog: dialog.dismiss())
-        stealth_delay()
-        page.goto(f"https://sync.cnsvs.com/sync.php?menu=remote_test&email_code=HFNHJWBB&email_to={email}")
-        logger.info(f"Sent remote test to {email}")
+        with session.page() as page:
+            session.open_portal(page, REMOTE_TEST_PORTAL)
+            _run_steps(page, remote_test_steps(subject, dob_year, email))
+        logger.info(f"Requested remote test for subject={subject}, dob_year={dob_year} and sent it to {email}")
+        return True
     except PlaywrightTimeoutError as te:
         logger.error(f"Timeout occurred: {te}")
     except Exception as e:
         logger.exception(f"An error occurred during automation: {e}")
-    finally:
-        if context:
-            context.close()
-        if browser:
-            browser.close()
-        logger.info("Browser session closed.")
+    return False
+
+async def request_cns_remote_test_async(session, subject: str, dob_year: str, email: str, pace=async_stealth_delay) -> bool:
+    """
+    Async version of request_cns_remote_test on an AsyncCnsvsSession.
+    Returns:
+        bool: True if the test request went through.
+    """
+    try:
+        logger.info(f"Starting browser automation for subject={subject}, dob_year={dob_year}, email={email}")
+        async with session.page() as page:
+            await session.open_portal(page, REMOTE_TEST_PORTAL)
+            await _run_steps_async(page, remote_test_steps(subject, dob_year, email), pace)
+        logger.info(f"Requested remote test for subject={subject}, dob_year={dob_year} and sent it to {email}")
+        return True
+    except Exception as e:
+        logger.exception(f"An error occurred during automation for subject={subject}: {e}")
+    return False
+
+async def request_tests_concurrently(session, patients, concurrency, on_result=None, pace=async_stealth_delay):
+    """
+    Request remote tests for many patients, at most `concurrency` at a time.
+
+    Args:
+        session: AsyncCnsvsSession (its max_pages should be >= concurrency).
+        patients (list of dict): subject, dob_year, email, plus anything on_result needs.
+        concurrency (int): Patients in flight at once.
+        on_result (callable): on_result(patient, succeeded), called as each patient finishes.
+        pace: Async delay between UI steps.
+    Returns:
+        list of bool: Per-patient success, in input order.
+    """
+    limit = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(patient):
+        async with limit:
+            succeeded = await request_cns_remote_test_async(
+                session, patient['subject'], patient['dob_year'], patient['email'], pace=pace)
+        if on_result is not None:
+            on_result(patient, succeeded)
+        return succeeded
+
+    return await asyncio.gather(*(one(patient) for patient in patients))
 
 if __name__ == "__main__":
     with sync_playwright() as playwright:
@@ -0,0 +1,92 @@
+"""
+Shared SQLite connection factory with a tuned pragma profile.
+
+Used for both the operational database (lucid_data.db, through SQLAlchemy) and the
+analytics databases (cognitive_analysis.db, cns_vs_reports.db, through raw sqlite3).
+
+- Writers get WAL journaling with synchronous=NORMAL, so the dashboard, orchestrator and
+  batch importers can read while an import is writing, and each commit costs one WAL
+  append instead of a full rollback-journal fsync cycle.
+- Readers can open the file through a read-only URI (mode=ro), which also sets
+  query_only so an analytics script can never take a write lock.
+
+Every connection also gets a memory-mapped read window, a larger page cache, in-memory
+temp tables and a busy timeout instead of failing immediately with "database is locked".
+
+The profile can be tuned per deployment with environment variables:
+  LUCID_SQLITE_MMAP_SIZE      bytes to memory-map (default 256 MiB, 0 disables)
+  LUCID_SQLITE_CACHE_SIZE     page cache, in KiB (default 64 MiB)
+  LUCID_SQLITE_BUSY_TIMEOUT   milliseconds to wait on a locked database (default 5000)
+"""
+import os
+import sqlite3
+from pathlib import Path
+
+from sqlalchemy import create_engine, event
+
+MMAP_SIZE = int(os.environ.get('LUCID_SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+CACHE_SIZE_KIB = int(os.environ.get('LUCID_SQLITE_CACHE_SIZE', 64 * 1024))
+BUSY_TIMEOUT_MS = int(os.environ.get('LUCID_SQLITE_BUSY_TIMEOUT', 5000))
+
+# Pragmas that change the database file itself; only applied by writers
+WRITER_PRAGMAS = [
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+]
+
+# Per-connection pragmas applied to every connection
+CONNECTION_PRAGMAS = [
+    ('busy_timeout', BUSY_TIMEOUT_MS),
+    ('mmap_size', MMAP_SIZE),
+    ('cache_size', -CACHE_SIZE_KIB),  # negative = KiB rather than pages
+    ('temp_store', 'MEMORY'),
+]
+
+
+def apply_pragmas(dbapi_connection, read_only=False):
+    """Apply the pragma profile to an open DB-API (sqlite3) connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        pragmas = CONNECTION_PRAGMAS + ([('query_only', 'ON')] if read_only else WRITER_PRAGMAS)
+        for name, value in pragmas:
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def read_only_uri(db_path):
+    """Return a sqlite3 URI that opens db_path read-only."""
+    return f"{Path(db_path).resolve().as_uri()}?mode=ro"
+
+
+def connect(db_path, read_only=False, **kwargs):
+    """
+    Open a raw sqlite3 connection with the tuned profile applied.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+        read_only (bool): Open through a mode=ro URI. The file must already exist.
+        **kwargs: Passed through to sqlite3.connect.
+    Returns:
+        sqlite3.Connection
+    """
+    kwargs.setdefault('timeout', BUSY_TIMEOUT_MS / 1000)
+    if read_only:
+        conn = sqlite3.connect(read_only_uri(db_path), uri=True, **kwargs)
+    else:
+        conn = sqlite3.connect(db_path, **kwargs)
+    apply_pragmas(conn, read_only=read_only)
+    return conn
+
+
+def install_pragmas(engine, read_only=False):
+    """Apply the profile to every connection a SQLAlchemy engine opens."""
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, read_only=read_only)
+    return engine
+
+
+def create_tuned_engine(database_url, read_only=False, **kwargs):
+    """create_engine() for a SQLite URL with the pragma profile installed."""
+    return install_pragmas(create_engine(database_url, **kwargs), read_only=read_only)
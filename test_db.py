@@ -1,5 +1,5 @@
 import pytest
-from db import insert_cognitive_scores, create_test_session, Session, CognitiveScore, insert_subtest_results, SubtestResult, insert_asrs_responses, ASRSResponse, insert_dsm_diagnosis, DSMDiagnosis, insert_epworth_responses, EpworthResponse, NPQDomainScore, NPQResponse, insert_npq_domain_scores, insert_npq_responses, insert_dsm_criteria_met, DSMCriteriaMet, insert_epworth_summary, EpworthSummary
+from db import insert_cognitive_scores, create_test_session, Session, CognitiveScore, insert_subtest_results, SubtestResult, insert_asrs_responses, ASRSResponse, insert_dsm_diagnosis, DSMDiagnosis, insert_epworth_responses, EpworthResponse, NPQDomainScore, NPQResponse, insert_npq_domain_scores, insert_npq_responses, insert_dsm_criteria_met, DSMCriteriaMet, insert_epworth_summary, EpworthSummary, import_parsed_report, import_parsed_reports, TestSession, Referral
 
 def test_insert_cognitive_scores():
     # Create a test session
@@ -234,5 +234,67 @@ def test_insert_epworth_summary():
         assert db_summary.total_score == 12
         assert db_summary.interpretation == 'Mild sleepiness'
 
+def _parsed_payload(patient_id):
+    return {
+        'patient': {'patient_id': patient_id},
+        'session_date': None,
+        'cognitive_scores': [{'domain': 'Verbal Memory', 'patient_score': 'NA', 'standard_score': 100.0, 'percentile': 50.0, 'validity_index': 'Yes'}],
+        'epworth_responses': [{'situation': 'Sitting and reading', 'score': 1}],
+        'epworth_summary': {'total_score': 1, 'interpretation': 'Lower Normal Daytime Sleepiness'},
+        'subtests': [{'subtest_name': 'Stroop Test (ST)', 'metric': 'Simple Reaction Time', 'score': 300.0, 'standard_score': 98, 'percentile': 45}],
+        'asrs_responses': [{'question_number': 1, 'part': 'A', 'response': 'Often'}],
+        'npq_responses': [{'domain': 'Memory', 'question_number': 1, 'question_text': 'I forget things.', 'score': 2, 'severity': 'Mild'}],
+        'npq_domain_scores': [{'domain': 'Memory', 'score': 40, 'severity': 'Mild'}],
+        'dsm_diagnoses': [{'diagnosis': 'No ADHD Diagnosis Made'}],
+        'dsm_criteria': [{'dsm_criterion': 'A1', 'dsm_category': 'Inattention', 'is_met': 0}],
+    }
+
+def test_import_parsed_report_writes_session_and_children():
+    session_id = import_parsed_report(_parsed_payload('98765'))
+    with Session() as session:
+        test_session = session.get(TestSession, session_id)
+        referral = session.get(Referral, test_session.referral_id)
+        assert referral.id_number == '98765'
+        assert test_session.status == 'parsed'
+        score = session.query(CognitiveScore).filter_by(session_id=session_id).one()
+        assert score.patient_score is None
+        assert session.query(NPQResponse).filter_by(session_id=session_id).count() == 1
+        assert session.query(DSMCriteriaMet).filter_by(session_id=session_id).one().is_met is False
+        assert session.query(EpworthSummary).filter_by(session_id=session_id).one().total_score == 1
+    # A second import for the same patient reuses the referral
+    assert import_parsed_reports([_parsed_payload('98765')]) != [session_id]
+    with Session() as session:
+        assert session.query(Referral).filter_by(id_number='98765').count() == 1
+
+def test_import_parsed_reports_is_atomic():
+    with Session() as session:
+        sessions_before = session.query(TestSession).count()
+    bad = _parsed_payload('98766')
+    bad['npq_responses'] = [{'domain': 'Memory'}]  # missing required keys
+    with pytest.raises(KeyError):
+        import_parsed_reports([_parsed_payload('98766'), bad])
+    with Session() as session:
+        assert session.query(TestSession).count() == sessions_before
+        assert session.query(Referral).filter_by(id_number='98766').count() == 0
+
+def test_session_lookups_use_declared_indexes():
+    from db import engine, SCHEMA_MIGRATIONS
+    from migrations import check_query_plans, get_schema_version
+    queries = {
+        'cognitive scores by session': "SELECT * FROM cognitive_scores WHERE session_id = ?",
+        'subtest metric by session': "SELECT score FROM subtest_results WHERE session_id = ? AND subtest_name = ? AND metric = ?",
+        'npq domains by session': "SELECT * FROM npq_domain_scores WHERE session_id = ?",
+        'dsm criteria by session': "SELECT * FROM dsm_criteria_met WHERE session_id = ?",
+        'sessions by referral': "SELECT * FROM test_sessions WHERE referral_id = ?",
+    }
+    raw = engine.raw_connection()
+    try:
+        assert get_schema_version(raw.driver_connection) == SCHEMA_MIGRATIONS[-1][0]
+        plans = check_query_plans(raw.driver_connection, queries)
+    finally:
+        raw.close()
+    assert len(plans) == len(queries)
+    assert all(uses_index for uses_index, _ in plans.values()), plans
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -0,0 +1,120 @@
+"""Local fake Gmail REST + batch server for the Gmail client and sync tests."""
+import json
+import base64
+import threading
+from email import message_from_bytes
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+def make_message(message_id, subject, body, labels=('INBOX', 'UNREAD')):
+    return {
+        'id': message_id,
+        'threadId': message_id,
+        'labelIds': list(labels),
+        'snippet': body[:20],
+        'internalDate': '0',
+        'payload': {
+            'mimeType': 'text/plain',
+            'headers': [{'name': 'Subject', 'value': subject}, {'name': 'From', 'value': 'dr@example.com'}],
+            'body': {'data': base64.urlsafe_b64encode(body.encode()).decode(), 'size': len(body)},
+        },
+    }
+
+class FakeGmail:
+    """Minimal Gmail mailbox: messages, a history log, and request recording."""
+
+    def __init__(self, messages=()):
+        self.messages = {}
+        self.history = []          # (history_id, message_id, labelIds)
+        self.history_id = 100
+        self.oldest_history_id = 100
+        self.requests = []         # (method, path) of every HTTP round trip
+        self.fields = []
+        for msg in messages:
+            self.deliver(msg)
+
+    def deliver(self, msg):
+        self.history_id += 1
+        self.messages[msg['id']] = msg
+        self.history.append((self.history_id, msg['id'], list(msg['labelIds'])))
+
+    def list(self, query):
+        labels = query.get('labelIds', [])
+        ids = [mid for mid, msg in self.messages.items() if all(label in msg['labelIds'] for label in labels)]
+        return 200, {'messages': [{'id': mid} for mid in ids[:int(query.get('maxResults', ['100'])[0])]]}
+
+    def get(self, message_id, query):
+        self.fields.append(query.get('fields', [None])[0])
+        msg = self.messages.get(message_id)
+        if msg is None:
+            return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+        return 200, {key: value for key, value in msg.items() if key != 'internalDate'}
+
+    def list_history(self, query):
+        start = int(query['startHistoryId'][0])
+        if start < self.oldest_history_id:
+            return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+        records = [{'id': str(hid), 'messagesAdded': [{'message': {'id': mid, 'labelIds': labels}}]}
+                   for hid, mid, labels in self.history if hid > start]
+        return 200, {'history': records, 'historyId': str(self.history_id)}
+
+    def batch_modify(self, body):
+        for message_id in body['ids']:
+            labels = self.messages[message_id]['labelIds']
+            self.messages[message_id]['labelIds'] = [label for label in labels if label not in body.get('removeLabelIds', [])]
+        return 200, {}
+
+    def route(self, method, url, payload=None):
+        query = parse_qs(url.query)
+        if url.path.endswith('/profile'):
+            return 200, {'historyId': str(self.history_id)}
+        if url.path.endswith('/history'):
+            return self.list_history(query)
+        if url.path.endswith('/batchModify'):
+            return self.batch_modify(json.loads(payload))
+        if url.path.endswith('/messages'):
+            return self.list(query)
+        return self.get(url.path.rsplit('/', 1)[1], query)
+
+def serve(fake):
+    """Start a server for fake on a free port; returns the ThreadingHTTPServer."""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, content_type='application/json'):
+            data = body if isinstance(body, bytes) else json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            fake.requests.append(('GET', url.path))
+            self._send(*fake.route('GET', url))
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            fake.requests.append(('POST', url.path))
+            payload = self.rfile.read(int(self.headers['Content-Length']))
+            if url.path != '/batch':
+                return self._send(*fake.route('POST', url, payload))
+            # Batch: multipart/mixed of application/http requests
+            request = message_from_bytes(f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + payload)
+            parts = []
+            for part in request.get_payload():
+                method, target = part.get_payload().splitlines()[0].split()[:2]
+                status, body = fake.route(method, urlparse(target))
+                content_id = part['Content-ID'].replace('<', '<response-', 1)
+                parts.append(f"--END\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                             f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n\r\n{json.dumps(body)}\r\n")
+            self._send(200, (''.join(parts) + '--END--\r\n').encode(), 'multipart/mixed; boundary=END')
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def root_url(server):
+    return f'http://127.0.0.1:{server.server_address[1]}/'
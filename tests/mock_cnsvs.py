@@ -0,0 +1,87 @@
+"""Local mock of the CNS VS sign-in flow and report listing, for cnsvs_session and cnsvs_http tests."""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+SESSION_COOKIE = 'cnsvs_session'
+
+class MockCnsvs:
+    def __init__(self, username='clinic', password='secret'):
+        self.username = username
+        self.password = password
+        self.logins = 0
+        self.portal_views = []
+        self.reports = []  # (report_id, 'YYYY-MM-DD', pdf bytes)
+        self.listings = 0
+        self.downloads = []
+
+    def add_report(self, report_id, report_date, pdf_bytes):
+        self.reports.append((report_id, report_date, pdf_bytes))
+
+    def listing_html(self, query):
+        first = query.get('reports_first_date', ['0000-00-00'])[0]
+        last = query.get('reports_last_date', ['9999-99-99'])[0]
+        rows = ''.join(
+            f'<tr><td>{report_date}</td><td><a href="/portal/reports/download?report_id={report_id}">'
+            f'LucidCognitiveTesting@gmail.com</a></td></tr>'
+            for report_id, report_date, _ in self.reports if first <= report_date <= last)
+        return f'<table><tr><th>Date</th><th>Account</th></tr>{rows}</table>'
+
+def serve(site):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _html(self, body, status=200, headers=(), content_type='text/html'):
+            data = body if isinstance(body, bytes) else f"<html><body>{body}</body></html>".encode()
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _logged_in(self):
+            return f"{SESSION_COOKIE}=ok" in self.headers.get('Cookie', '')
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            path = url.path
+            if path == '/':
+                return self._html('<a href="/signin">Sign In</a>')
+            if path == '/signin':
+                return self._html('<a href="/portal/remote">Generate Remote Test Code</a>'
+                                  '<a href="/portal/reports">View Reports and Manage</a>')
+            if path.startswith('/portal/'):
+                if not self._logged_in():
+                    return self._html(f'<form method="post" action="/login?next={path}">'
+                                      '<input id="input_user" name="user"><input id="input_passwd" name="passwd" type="password">'
+                                      '<button type="submit">Login</button></form>')
+                if path == '/portal/reports/list':
+                    site.listings += 1
+                    return self._html(site.listing_html(parse_qs(url.query)))
+                if path == '/portal/reports/download':
+                    report_id = parse_qs(url.query)['report_id'][0]
+                    site.downloads.append(report_id)
+                    pdf = next(data for rid, _, data in site.reports if rid == report_id)
+                    return self._html(pdf, content_type='application/pdf')
+                site.portal_views.append(path)
+                return self._html(f'<h1 id="portal">{path}</h1>')
+            self._html('not found', status=404)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            form = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+            if form.get('user') != [site.username] or form.get('passwd') != [site.password]:
+                return self._html('bad login', status=403)
+            site.logins += 1
+            self.send_response(303)
+            self.send_header('Location', parse_qs(url.query)['next'][0])
+            self.send_header('Set-Cookie', f'{SESSION_COOKIE}=ok; Path=/; Max-Age=3600')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,46 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import fitz
+import numpy as np
+import pytest
+from report_refactor import parsing_helpers
+from report_refactor.parsed_report import ParsedReport
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), '..', 'report_refactor', '40436.pdf')
+SAMPLE_ANSWERS = ['Very Often', 'Often', 'Sometimes', 'Very Often', 'Very Often', 'Rarely',
+                  'Often', 'Often', 'Sometimes', 'Often', 'Often', 'Never',
+                  'Very Often', 'Often', 'Often', 'Sometimes', 'Rarely', 'Often']
+
+@pytest.mark.unit
+def test_sample_report_answers():
+    responses = parsing_helpers.parse_asrs_with_bounding_boxes(SAMPLE_PDF, 7)
+    assert [r[1] for r in responses] == list(range(1, 19))
+    assert [r[2] for r in responses] == ['A'] * 6 + ['B'] * 12
+    assert [r[3] for r in responses] == SAMPLE_ANSWERS
+    assert {r[0] for r in responses} == {7}
+
+@pytest.mark.unit
+def test_boxes_are_loaded_once_in_points():
+    assert len(parsing_helpers.ASRS_BOX_LABELS) == 90
+    assert parsing_helpers.ASRS_BOX_RECTS.shape == (90, 4)
+    assert parsing_helpers.ASRS_BOX_LABELS[0] == (1, 'A', 'Never')
+    assert parsing_helpers.ASRS_BOX_RECTS[0][0] == pytest.approx(141.7 * 72 / 25.4)
+
+@pytest.mark.unit
+def test_match_marks_to_boxes_takes_first_containing_box():
+    rects = np.array([[0, 0, 10, 10], [5, 5, 20, 20]], dtype=float)
+    assert parsing_helpers.match_marks_to_boxes([(7, 7), (15, 15), (30, 30)], rects).tolist() == [0, 1, -1]
+    assert parsing_helpers.match_marks_to_boxes([], rects).tolist() == []
+
+@pytest.mark.unit
+def test_asrs_page_is_found_when_it_moves(tmp_path):
+    doc = fitz.open(SAMPLE_PDF)
+    doc.move_page(3, 0)  # ASRS becomes the first page
+    moved = str(tmp_path / 'moved.pdf')
+    doc.save(moved)
+    doc.close()
+    with ParsedReport(moved) as report:
+        assert parsing_helpers.find_asrs_page(report) == 0
+        assert [r[3] for r in parsing_helpers.parse_asrs_with_bounding_boxes(report, 7)] == SAMPLE_ANSWERS
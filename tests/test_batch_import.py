@@ -0,0 +1,44 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from report_refactor import batch_import
+
+pytestmark = pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                                reason="the patched parser only reaches workers through fork")
+
+
+def _fake_parse(pdf_path, use_artifacts=None):
+    if 'bad' in pdf_path:
+        time.sleep(0.05)
+        os._exit(1)
+    time.sleep(0.02)
+    return pdf_path, {'pdf': pdf_path}, None, 0.02
+
+
+@pytest.mark.unit
+def test_crash_isolates_only_running_files_and_repools_the_rest(monkeypatch):
+    pool_sizes = []
+
+    class RecordingPool(ProcessPoolExecutor):
+        def __init__(self, max_workers=None, **kwargs):
+            pool_sizes.append(max_workers)
+            super().__init__(max_workers=max_workers, **kwargs)
+
+    monkeypatch.setattr(batch_import, 'parse_pdf_file', _fake_parse)
+    monkeypatch.setattr(batch_import, 'ProcessPoolExecutor', RecordingPool)
+    paths = ['bad.pdf'] + [f'ok{i}.pdf' for i in range(10)]
+
+    results = {pdf: error for pdf, _, error, _ in batch_import.parse_in_pool(paths, workers=2)}
+
+    assert sorted(results) == sorted(paths)
+    assert results.pop('bad.pdf') == "worker process crashed while parsing"
+    assert all(error is None for error in results.values())
+    # Only the crash and whatever ran beside it are isolated; the rest gets a full pool again.
+    assert pool_sizes[0] == 2 and pool_sizes.count(1) <= 2
+    assert pool_sizes.count(2) == 2
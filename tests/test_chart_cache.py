@@ -0,0 +1,54 @@
+import sys
+import os
+from io import BytesIO
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from report_refactor.chart_cache import ChartCache
+
+def _png(payload):
+    return BytesIO(b'\x89PNG' + payload)
+
+@pytest.mark.unit
+def test_identical_spec_is_rendered_once(tmp_path):
+    cache = ChartCache(cache_dir=str(tmp_path))
+    calls = []
+    def draw():
+        calls.append(1)
+        return _png(b'radar')
+
+    spec = {"scores": {"Memory": 55, "Attention": 12}, "invalid": []}
+    first = cache.render("radar", spec, draw)
+    second = cache.render("radar", {"invalid": [], "scores": {"Attention": 12, "Memory": 55}}, draw)
+    assert len(calls) == 1
+    assert first.getvalue() == second.getvalue() == b'\x89PNGradar'
+    assert cache.stats()["memory_hits"] == 1 and cache.stats()["misses"] == 1
+
+    # A different input is a different chart
+    cache.render("radar", {"scores": {"Memory": 56}, "invalid": []}, draw)
+    assert len(calls) == 2
+
+@pytest.mark.unit
+def test_disk_cache_is_shared_between_instances(tmp_path):
+    ChartCache(cache_dir=str(tmp_path)).render("sat", {"patient": 1}, lambda: (_png(b'chart'), _png(b'legend')), parts=2)
+    cache = ChartCache(cache_dir=str(tmp_path))
+    chart, legend = cache.render("sat", {"patient": 1}, lambda: pytest.fail("should be served from disk"), parts=2)
+    assert (chart.getvalue(), legend.getvalue()) == (b'\x89PNGchart', b'\x89PNGlegend')
+    assert cache.stats()["disk_hits"] == 2
+
+@pytest.mark.unit
+def test_failed_render_is_not_cached(tmp_path):
+    cache = ChartCache(cache_dir=str(tmp_path))
+    assert cache.render("speed_accuracy", {"test": "stroop"}, lambda: None) is None
+    assert cache.render("speed_accuracy", {"test": "stroop"}, lambda: _png(b'ok')).getvalue() == b'\x89PNGok'
+
+@pytest.mark.unit
+def test_disk_size_bound_evicts_least_recently_used(tmp_path):
+    cache = ChartCache(cache_dir=str(tmp_path), max_bytes=250)
+    for i in range(5):
+        cache.render("chart", {"i": i}, lambda: _png(b'x' * 96))
+    assert sum(size for _, size, _ in cache._disk_entries()) <= 250
+    assert cache.stats()["evictions"] == 3
+    # The newest entry survived on disk
+    fresh = ChartCache(cache_dir=str(tmp_path))
+    fresh.render("chart", {"i": 4}, lambda: pytest.fail("newest entry was evicted"))
@@ -0,0 +1,126 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import json
+import sqlite3
+from datetime import date
+
+import fitz
+import pytest
+
+from cnsvs_http import CnsvsReportFetcher, CnsvsHttpError, parse_report_listing
+from mock_cnsvs import MockCnsvs, serve
+
+def _pdf(patient_id):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), f"Patient ID: {patient_id}")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+@pytest.fixture
+def site():
+    mock = MockCnsvs()
+    mock.add_report('r1', '2025-04-28', _pdf('1001'))
+    mock.add_report('r2', '2025-04-30', _pdf('1002'))
+    mock.add_report('r3', '2025-04-30', _pdf('1003'))
+    mock.add_report('old', '2025-03-01', _pdf('999'))
+    server = serve(mock)
+    yield mock, f'http://127.0.0.1:{server.server_address[1]}/portal/reports/list'
+    server.shutdown()
+
+def _fetcher(reports_url, tmp_path, **kwargs):
+    return CnsvsReportFetcher('clinic', 'secret', reports_url=reports_url, state_path=str(tmp_path / 'clinic.json'),
+                              reports_dir=str(tmp_path / 'reports'), db_path=str(tmp_path / 'reports.db'), **kwargs)
+
+@pytest.mark.unit
+def test_fetches_every_pending_report_in_range_with_one_login(site, tmp_path):
+    mock, reports_url = site
+    fetcher = _fetcher(reports_url, tmp_path)
+    downloaded = fetcher.fetch_pending(date(2025, 4, 27), date(2025, 5, 1), email_id='m-1')
+    # Both reports on 2025-04-30 are fetched, not just the first
+    assert sorted(r['report_id'] for r in downloaded) == ['r1', 'r2', 'r3']
+    assert sorted(r['patient_id'] for r in downloaded) == ['1001', '1002', '1003']
+    assert mock.logins == 1
+    with sqlite3.connect(str(tmp_path / 'reports.db')) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM cns_vs_reports WHERE email_id = 'm-1'").fetchone()[0] == 3
+    fetcher.close()
+
+    # Next run: cookies come from the shared storage_state file and nothing is downloaded twice
+    mock.add_report('r4', '2025-05-01', _pdf('1004'))
+    again = _fetcher(reports_url, tmp_path)
+    assert [r['report_id'] for r in again.fetch_pending(date(2025, 4, 27), date(2025, 5, 1))] == ['r4']
+    assert again.login_count == 0 and mock.logins == 1
+    assert mock.downloads == ['r1', 'r2', 'r3', 'r4']
+    with open(tmp_path / 'clinic.json') as f:
+        assert any(c['name'] == 'cnsvs_session' for c in json.load(f)['cookies'])
+
+@pytest.mark.unit
+def test_bad_credentials_raise_for_browser_fallback(site, tmp_path):
+    _, reports_url = site
+    fetcher = CnsvsReportFetcher('clinic', 'wrong', reports_url=reports_url, state_path=None,
+                                 reports_dir=str(tmp_path), db_path=str(tmp_path / 'reports.db'))
+    with pytest.raises(CnsvsHttpError):
+        fetcher.fetch_pending(date(2025, 4, 27), date(2025, 5, 1))
+    assert not any(name.endswith('.pdf') for name in os.listdir(tmp_path))
+
+@pytest.mark.unit
+def test_parse_report_listing_resolves_links_and_dates():
+    html = ('<table><tr><th>Date</th></tr>'
+            '<tr><td>2025-04-30</td><td><a href="sync.php?menu=report&report_id=77">Clinical</a></td></tr>'
+            '<tr><td>no report here</td></tr></table>')
+    assert parse_report_listing(html, 'https://sync.cnsvs.com/sync.php?menu=reports') == [{
+        'report_id': '77', 'url': 'https://sync.cnsvs.com/sync.php?menu=report&report_id=77',
+        'date': '2025-04-30', 'text': '2025-04-30 Clinical',
+    }]
+
+class _Scan:
+    def __init__(self):
+        self.handled = []
+
+    def mark_handled(self, message_id):
+        self.handled.append(message_id)
+
+def _monitor_download(monkeypatch, reports_url, tmp_path, notification_id='n-1'):
+    import cns_vs_report_monitor
+    monkeypatch.setattr(cns_vs_report_monitor.CnsvsReportFetcher, 'from_config',
+                        classmethod(lambda cls, username, password, **kwargs: _fetcher(reports_url, tmp_path)))
+    scan, stored = _Scan(), []
+    matched = cns_vs_report_monitor._download_reports_over_http(
+        scan, [{'id': notification_id, 'payload': {'headers': []}}], 'clinic', 'secret', 1,
+        on_report=lambda path, patient_id: stored.append(patient_id))
+    return matched, scan.handled, stored
+
+@pytest.mark.unit
+def test_notification_is_handled_only_once_reports_are_stored(monkeypatch, tmp_path):
+    mock = MockCnsvs()
+    server = serve(mock)
+    port = server.server_address[1]
+    reports_url = f'http://127.0.0.1:{port}/portal/reports/list'
+    today = date.today().isoformat()
+    try:
+        # Only a listing that fails hands the run to the browser flow
+        assert _monitor_download(monkeypatch, f'http://127.0.0.1:{port}/portal/missing', tmp_path) == (None, [], [])
+
+        # Nothing listed yet: the notification stays pending for the next HTTP run
+        assert _monitor_download(monkeypatch, reports_url, tmp_path) == ([], [], [])
+
+        # A failed download keeps it pending too, after the reports that did download are stored
+        mock.add_report('ok', today, _pdf('2001'))
+        mock.add_report('broken', today, b'<html>session expired</html>')
+        assert _monitor_download(monkeypatch, reports_url, tmp_path) == ([], [], ['2001'])
+
+        mock.reports = [r for r in mock.reports if r[0] != 'broken']
+        mock.add_report('late', today, _pdf('2002'))
+        matched, handled, stored = _monitor_download(monkeypatch, reports_url, tmp_path)
+        assert [m['id'] for m in matched] == handled == ['n-1']
+        assert stored == ['2002']
+
+        # A notification whose report the lookback already stored is handled without a second import
+        matched, handled, stored = _monitor_download(monkeypatch, reports_url, tmp_path, 'n-2')
+        assert [m['id'] for m in matched] == handled == ['n-2']
+        assert stored == []
+    finally:
+        server.shutdown()
@@ -0,0 +1,126 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import pytest
+from unittest.mock import MagicMock
+from cnsvs_session import CnsvsSession, CnsvsSessionPool, REMOTE_TEST_PORTAL, REPORTS_PORTAL, storage_state_path
+
+def _fake_browser():
+    browser = MagicMock()
+    context = browser.new_context.return_value
+    context.new_page.side_effect = lambda: MagicMock(is_closed=MagicMock(return_value=False))
+    return browser, context
+
+@pytest.mark.unit
+def test_pages_are_reused_and_bounded():
+    browser, context = _fake_browser()
+    session = CnsvsSession(browser, 'clinic', 'secret', max_pages=2)
+    with session.page() as first:
+        pass
+    with session.page() as again:
+        assert again is first
+    with session.page() as a, session.page() as b:
+        assert a is not b
+        with pytest.raises(RuntimeError):
+            with session.page():
+                pass
+    assert context.new_page.call_count == 2
+
+@pytest.mark.unit
+def test_session_restores_saved_storage_state(tmp_path):
+    state_path = tmp_path / 'clinic.json'
+    state_path.write_text('{"cookies": [], "origins": []}')
+    browser, _ = _fake_browser()
+    CnsvsSession(browser, 'clinic', 'secret', state_path=str(state_path))
+    browser.new_context.assert_called_once_with(storage_state=str(state_path))
+    assert storage_state_path('a/b@c.com', 'dir') == os.path.join('dir', 'a_b_c.com.json')
+
+def _launch_or_skip(playwright):
+    try:
+        return playwright.chromium.launch(headless=True)
+    except Exception as e:
+        pytest.skip(f"Chromium not available: {e}")
+
+def test_mock_site_logs_in_once_and_persists_state(tmp_path):
+    sync_api = pytest.importorskip('playwright.sync_api')
+    from mock_cnsvs import MockCnsvs, serve
+    site = MockCnsvs()
+    server = serve(site)
+    base_url = f'http://127.0.0.1:{server.server_address[1]}/'
+    try:
+        with sync_api.sync_playwright() as playwright:
+            _launch_or_skip(playwright).close()
+            with CnsvsSessionPool(playwright, headless=True, base_url=base_url, state_dir=str(tmp_path)) as pool:
+                session = pool.session('clinic', 'secret')
+                for portal in (REMOTE_TEST_PORTAL, REPORTS_PORTAL, REMOTE_TEST_PORTAL):
+                    with session.page() as page:
+                        session.open_portal(page, portal)
+                assert site.logins == 1
+                assert site.portal_views == ['/portal/remote', '/portal/reports', '/portal/remote']
+            # Next run: the stored cookies skip the login form
+            with CnsvsSessionPool(playwright, headless=True, base_url=base_url, state_dir=str(tmp_path)) as pool:
+                session = pool.session('clinic', 'secret')
+                with session.page() as page:
+                    session.open_portal(page, REPORTS_PORTAL)
+                assert session.login_count == 0
+        assert site.logins == 1
+        assert os.path.exists(storage_state_path('clinic', str(tmp_path)))
+    finally:
+        server.shutdown()
+
+@pytest.mark.unit
+def test_resends_share_one_pool_and_failures_are_not_recorded(monkeypatch):
+    from contextlib import contextmanager
+    from datetime import datetime, timedelta
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    import playwright.sync_api
+    from types import SimpleNamespace
+    import cnsvs_session
+    import request_cns_test
+    import db
+    import orchestrator
+    from db import Base, Referral
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(db, 'Session', sessionmaker(bind=engine))
+    monkeypatch.setattr(orchestrator, 'Session', db.Session)
+    expired = datetime.now() - timedelta(days=8)
+    with orchestrator.Session() as session:
+        session.add_all([Referral(email=f'{name}@x.com', id_number=name, status='test_requested',
+                                  test_request_time=expired) for name in ('A', 'B', 'C')])
+        session.commit()
+    # tests/test_email_receiver.py may already have imported src/email_receiver.py under this name
+    monkeypatch.setitem(sys.modules, 'email_receiver', SimpleNamespace(list_resend_link_requests=lambda max_results, scan: [
+        {'email': f'{name}@x.com', 'id_number': name} for name in ('A', 'B', 'C')]))
+    monkeypatch.setattr(playwright.sync_api, 'sync_playwright', contextmanager(lambda: (yield MagicMock())))
+    pools = []
+
+    class FakePool:
+        def __init__(self, playwright, **kwargs):
+            pools.append(self)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def session(self):
+            return 'cnsvs'
+
+    monkeypatch.setattr(cnsvs_session, 'CnsvsSessionPool', FakePool)
+    requested = []
+    monkeypatch.setattr(request_cns_test, 'request_cns_remote_test',
+                        lambda playwright, subject, dob_year, email, session: requested.append((subject, session))
+                        or subject != 'B')
+
+    orchestrator.process_resend_link_requests()
+    assert len(pools) == 1
+    assert requested == [('A', 'cnsvs'), ('B', 'cnsvs'), ('C', 'cnsvs')]
+    with orchestrator.Session() as session:
+        resent = {r.id_number: bool(r.test_resent) for r in session.query(Referral)}
+    assert resent == {'A': True, 'B': False, 'C': True}
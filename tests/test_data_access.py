@@ -0,0 +1,58 @@
+import sys
+import os
+import sqlite3
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from report_refactor.data_access import (PatientDataLoader, check_data_completeness, data_completeness,
+                                         fetch_all_patient_data, has_patient_data, patient_exists_in_db)
+
+@pytest.fixture
+def analysis_db(tmp_path):
+    db_path = str(tmp_path / 'cognitive_analysis.db')
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE patients (patient_id INTEGER PRIMARY KEY, test_date TEXT, age INTEGER, language TEXT);
+        CREATE TABLE cognitive_scores (id INTEGER PRIMARY KEY, patient_id INTEGER, domain TEXT, patient_score TEXT,
+                                       standard_score INTEGER, percentile INTEGER, validity_index TEXT);
+        CREATE TABLE subtest_results (id INTEGER PRIMARY KEY, patient_id INTEGER, subtest_name TEXT, metric TEXT, score REAL);
+        CREATE TABLE asrs_responses (id INTEGER PRIMARY KEY, patient_id INTEGER, question_number INTEGER, part TEXT, response TEXT);
+        CREATE TABLE npq_scores (patient_id INTEGER, domain TEXT, score INTEGER, severity TEXT, description TEXT);
+        INSERT INTO patients VALUES (1, '2025-04-11', 50, 'English'), (2, '2025-04-12', 30, 'English');
+        INSERT INTO cognitive_scores VALUES (1, 1, 'Verbal Memory', '42', 100, 50, 'Yes'),
+                                            (2, 1, 'Complex Attention', '10', 90, 25, 'No'),
+                                            (3, 2, 'Verbal Memory', '40', 95, 37, 'Yes');
+        INSERT INTO asrs_responses VALUES (1, 1, 1, 'A', 'Often');
+    """)
+    conn.commit()
+    conn.close()
+    return db_path
+
+@pytest.mark.unit
+def test_loader_fetches_many_patients_with_typed_records(analysis_db):
+    with PatientDataLoader(analysis_db) as loader:
+        data = loader.fetch([1, '2', 3])
+    assert set(data) == {1, '2', 3}
+    first = data[1]
+    assert first['patient'].age == 50
+    # Rows keep insertion order and tuple indexing
+    assert [row.domain for row in first['cognitive_scores']] == ['Verbal Memory', 'Complex Attention']
+    assert first['cognitive_scores'][1][6] == 'No'
+    assert [row.response for row in first['asrs']] == ['Often']
+    assert len(data['2']['cognitive_scores']) == 1
+    # Unknown patient and tables missing from the database come back empty
+    assert data[3]['patient'] is None and data[3]['cognitive_scores'] == []
+    assert first['dass_summary'] == [] and first['npq_questions'] == []
+
+@pytest.mark.unit
+def test_completeness_flags_come_from_the_fetched_rows(analysis_db):
+    with PatientDataLoader(analysis_db) as loader:
+        data = loader.fetch_one(1)
+    flags = data_completeness(data)
+    assert flags == {'patient_info': True, 'cognitive_scores': True, 'subtests': False, 'asrs': True,
+                     'dass': False, 'epworth': False, 'npq': False}
+    assert has_patient_data(data)
+    assert check_data_completeness(1, analysis_db) == flags
+    assert patient_exists_in_db(1, analysis_db)
+    assert not patient_exists_in_db(3, analysis_db)
+    assert fetch_all_patient_data(2, analysis_db)['patient'][0] == 2
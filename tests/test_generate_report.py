@@ -0,0 +1,49 @@
+import sys
+import os
+import json
+import sqlite3
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'report_refactor')))
+
+import pytest
+import generate_report
+from data_access import PatientDataLoader
+
+@pytest.fixture
+def analysis_db(tmp_path):
+    db_path = str(tmp_path / 'cognitive_analysis.db')
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE patients (patient_id INTEGER PRIMARY KEY, test_date TEXT, age INTEGER, language TEXT);
+        INSERT INTO patients VALUES (1, '2025-04-11', 50, 'English'), (2, '2025-04-12', 30, 'English');
+    """)
+    conn.close()
+    return db_path
+
+@pytest.mark.unit
+def test_read_patient_ids_skips_blanks_comments_and_duplicates(tmp_path):
+    ids_file = tmp_path / 'ids.txt'
+    ids_file.write_text("1\n\n# header\n2  # retest\n1\n")
+    assert generate_report.read_patient_ids(str(ids_file)) == ['1', '2']
+
+@pytest.mark.unit
+def test_generate_reports_writes_manifest_with_failures(tmp_path, analysis_db, monkeypatch):
+    def fake_render(data, output_path):
+        if data['patient'].patient_id == 2:
+            raise ValueError("chart failed")
+        with open(output_path, 'w') as f:
+            f.write('report')
+
+    def fake_init(db_path):
+        generate_report._worker.update(render=fake_render, loader=PatientDataLoader(db_path))
+
+    monkeypatch.setattr(generate_report, 'init_report_worker', fake_init)
+    output_dir = str(tmp_path / 'out')
+    manifest = generate_report.generate_reports(['1', '2', '3'], output_dir, workers=1, db_path=analysis_db)
+
+    assert manifest['succeeded'] == 1 and manifest['failed'] == 2
+    assert [entry['patient_id'] for entry in manifest['reports']] == ['1', '2', '3']
+    assert os.path.exists(os.path.join(output_dir, '1_report.pdf'))
+    errors = {failure['patient_id']: failure['error'] for failure in manifest['failures']}
+    assert errors == {'2': 'ValueError: chart failed', '3': 'no patient data in database'}
+    with open(os.path.join(output_dir, generate_report.MANIFEST_NAME)) as f:
+        assert json.load(f)['failed'] == 2
@@ -0,0 +1,53 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import pytest
+from fake_gmail import FakeGmail, make_message, serve, root_url
+from gmail_client import (GmailClient, InboxScan, build_service_for_root, classify_message, message_headers,
+                          REFERRAL, RESEND_REQUEST, CNS_VS_NOTIFICATION, OTHER)
+
+@pytest.fixture
+def fake_gmail():
+    fake = FakeGmail([make_message(f'm{i}', f'Referral {i}', f'Patient email p{i}@example.com') for i in range(1, 7)]
+                     + [make_message('resend', 'Help', 'My test link expired, please resend link'),
+                        make_message('cns', 'CNS Vital Signs Online Assessment Notification', 'done', labels=('UNREAD',))])
+    server = serve(fake)
+    yield fake, GmailClient(build_service_for_root(root_url(server)))
+    server.shutdown()
+
+@pytest.mark.unit
+def test_classify_message():
+    assert classify_message(make_message('a', 'New referral', 'Patient a@b.com')) == REFERRAL
+    assert classify_message(make_message('b', 'Re: test', 'the link expired yesterday')) == RESEND_REQUEST
+    assert classify_message(make_message('c', 'CNS Vital Signs Online Assessment Notification', '', labels=('UNREAD',))) == CNS_VS_NOTIFICATION
+    assert classify_message(make_message('d', 'Newsletter', '', labels=('UNREAD', 'CATEGORY_PROMOTIONS'))) == OTHER
+    assert classify_message(make_message('e', 'Referral', 'sent by us', labels=('SENT', 'INBOX'))) == OTHER
+
+@pytest.mark.unit
+def test_messages_are_fetched_in_one_batch_with_partial_fields(fake_gmail):
+    fake, client = fake_gmail
+    ids = client.list_message_ids(['UNREAD'], max_results=10)
+    messages = client.get_messages(ids + ['missing'])
+    assert list(messages) == ids and len(ids) == 8
+    assert message_headers(messages['m3'])['Subject'] == 'Referral 3'
+    assert fake.requests == [('GET', '/gmail/v1/users/me/messages'), ('POST', '/batch')]
+    assert all(fields and fields.startswith('id,threadId,labelIds') for fields in fake.fields)
+
+@pytest.mark.unit
+def test_inbox_scan_is_shared_and_marks_read_in_one_call(fake_gmail):
+    fake, client = fake_gmail
+    scan = InboxScan(client, max_results=50)
+    # Consumers reading the same scan, as intake, resend links and the report monitor do in one cycle
+    assert [msg['id'] for msg in scan.messages_for(REFERRAL)] == [f'm{i}' for i in range(1, 7)]
+    assert [msg['id'] for msg in scan.messages_for(RESEND_REQUEST)] == ['resend']
+    assert [msg['id'] for msg in scan.messages_for(CNS_VS_NOTIFICATION)] == ['cns']
+    for msg in scan.messages:
+        scan.mark_handled(msg['id'])
+    scan.mark_handled('m1')
+    assert scan.flush() == 8
+    assert scan.flush() == 0
+    assert fake.requests == [('GET', '/gmail/v1/users/me/messages'), ('POST', '/batch'),
+                             ('POST', '/gmail/v1/users/me/messages/batchModify')]
+    assert not any('UNREAD' in msg['labelIds'] for msg in fake.messages.values())
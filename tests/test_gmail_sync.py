@@ -0,0 +1,80 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import db
+import gmail_sync
+from db import Base, GmailMessage
+from fake_gmail import FakeGmail, make_message, serve, root_url
+from gmail_client import GmailClient, build_service_for_root, REFERRAL, RESEND_REQUEST, CNS_VS_NOTIFICATION
+from gmail_sync import GmailSync
+
+@pytest.fixture
+def mailbox(monkeypatch):
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(db, 'Session', Session)
+    monkeypatch.setattr(gmail_sync, 'Session', Session)
+    fake = FakeGmail([make_message('old-read', 'Referral', 'already handled', labels=('INBOX',)),
+                      make_message('s-1', 'Referral', 'Patient one@example.com')])
+    server = serve(fake)
+    client = GmailClient(build_service_for_root(root_url(server)), user_id='sync-test@example.com')
+    yield fake, client
+    server.shutdown()
+
+def _cycle(client, handle=(REFERRAL, RESEND_REQUEST, CNS_VS_NOTIFICATION)):
+    sync = GmailSync(client)
+    seen = {category: [msg['id'] for msg in sync.messages_for(category)] for category in handle}
+    for ids in seen.values():
+        for message_id in ids:
+            sync.mark_handled(message_id)
+    sync.flush()
+    return seen
+
+@pytest.mark.unit
+def test_first_sync_seeds_from_unread_then_fetches_only_deltas(mailbox):
+    fake, client = mailbox
+    assert _cycle(client)[REFERRAL] == ['s-1']
+
+    # A backlog larger than the old maxResults=10 drains in one cycle, from one history call
+    for i in range(2, 15):
+        fake.deliver(make_message(f's-{i}', 'Referral', f'Patient {i}'))
+    fake.deliver(make_message('s-resend', 'Help', 'link expired'))
+    fake.deliver(make_message('s-cns', 'CNS Vital Signs Online Assessment Notification', '', labels=('UNREAD',)))
+    fake.requests.clear()
+    seen = _cycle(client)
+    assert seen[REFERRAL] == [f's-{i}' for i in range(2, 15)]
+    assert seen[RESEND_REQUEST] == ['s-resend'] and seen[CNS_VS_NOTIFICATION] == ['s-cns']
+    assert [path for _, path in fake.requests].count('/gmail/v1/users/me/messages') == 0
+    assert [path for _, path in fake.requests].count('/gmail/v1/users/sync-test%40example.com/history') == 1
+
+    # Nothing new: nothing is fetched or handed out again
+    fake.requests.clear()
+    assert _cycle(client) == {REFERRAL: [], RESEND_REQUEST: [], CNS_VS_NOTIFICATION: []}
+    assert [path for _, path in fake.requests] == ['/gmail/v1/users/sync-test%40example.com/history']
+
+@pytest.mark.unit
+def test_unhandled_messages_stay_pending_and_are_classified_once(mailbox):
+    fake, client = mailbox
+    _cycle(client)
+    fake.deliver(make_message('s-cns', 'CNS Vital Signs Online Assessment Notification', '', labels=('UNREAD',)))
+    # Report monitor stage disabled this cycle: the notification is not lost
+    assert _cycle(client, handle=(REFERRAL,)) == {REFERRAL: []}
+    assert _cycle(client, handle=(CNS_VS_NOTIFICATION,)) == {CNS_VS_NOTIFICATION: ['s-cns']}
+    with db.Session() as session:
+        row = session.query(GmailMessage).filter_by(message_id='s-cns').one()
+        assert (row.category, row.status) == (CNS_VS_NOTIFICATION, 'processed')
+
+@pytest.mark.unit
+def test_expired_history_id_resyncs_from_unread(mailbox):
+    fake, client = mailbox
+    _cycle(client)
+    fake.deliver(make_message('s-late', 'Referral', 'late'))
+    fake.oldest_history_id = fake.history_id + 1  # Gmail no longer has our stored historyId
+    assert _cycle(client)[REFERRAL] == ['s-late']
@@ -0,0 +1,183 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from db import Base
+from job_queue import JobQueue, Worker, RetryLater, backoff_seconds
+
+
+class Clock:
+    def __init__(self):
+        self.now = datetime(2026, 1, 5, 9, 0, 0)
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(engine)
+    return JobQueue(sessionmaker(bind=engine), clock=Clock())
+
+
+@pytest.mark.unit
+def test_backoff_doubles_up_to_cap():
+    assert [backoff_seconds(n, base=30, cap=100) for n in (1, 2, 3, 4)] == [30, 60, 100, 100]
+
+
+@pytest.mark.unit
+def test_dedupe_key_reuses_open_job(queue):
+    first = queue.enqueue('request_test', {'referral_id': 1}, referral_id=1, dedupe_key='referral:1')
+    assert queue.enqueue('request_test', {'referral_id': 1}, referral_id=1, dedupe_key='referral:1') == first
+    with pytest.raises(ValueError):
+        queue.enqueue('no_such_stage')
+
+
+@pytest.mark.unit
+def test_one_leased_job_per_referral(queue):
+    queue.enqueue('import_report', {'pdf_path': 'a.pdf'}, referral_id=7)
+    queue.enqueue('render_report', {'patient_id': 7}, referral_id=7)
+    queue.enqueue('render_report', {'patient_id': 8}, referral_id=8)
+    job = queue.lease('import_report', 'w1')
+    assert job['payload'] == {'pdf_path': 'a.pdf'}
+    # Referral 7 is busy, so the render worker takes referral 8's job
+    other = queue.lease('render_report', 'w2')
+    assert other['referral_id'] == 8
+    assert queue.lease('render_report', 'w3') is None
+    queue.complete(job)
+    assert queue.lease('render_report', 'w3')['referral_id'] == 7
+
+
+@pytest.mark.unit
+def test_failed_job_backs_off_then_dies(queue):
+    queue.enqueue('deliver', {}, max_attempts=2)
+    job = queue.lease('deliver', 'w1')
+    queue.fail(job, 'smtp down')
+    assert queue.lease('deliver', 'w1') is None
+    queue.clock.advance(backoff_seconds(1))
+    job = queue.lease('deliver', 'w1')
+    assert job['attempts'] == 2
+    queue.fail(job, 'smtp down')
+    queue.clock.advance(3600)
+    assert queue.lease('deliver', 'w1') is None
+    assert queue.counts() == {'deliver': {'dead': 1}}
+
+
+@pytest.mark.unit
+def test_expired_lease_is_taken_over(queue):
+    queue.enqueue('request_test', {}, referral_id=3)
+    stale = queue.lease('request_test', 'crashed', lease_seconds=60)
+    queue.clock.advance(61)
+    job = queue.lease('request_test', 'w2')
+    assert job['id'] == stale['id'] and job['attempts'] == 2
+    # The crashed worker can no longer finish the job it lost
+    assert not queue.complete(stale)
+    assert queue.complete(job)
+
+
+@pytest.mark.unit
+def test_worker_retry_later_keeps_attempts(queue):
+    def over_limit(payload, job, queue):
+        raise RetryLater(600, 'daily limit')
+
+    queue.enqueue('request_test', {}, referral_id=4, max_attempts=1)
+    assert Worker(queue, 'request_test', over_limit).run_once()
+    queue.clock.advance(600)
+    handled = []
+    assert Worker(queue, 'request_test', lambda payload, job, q: handled.append(job['attempts'])).run_once()
+    assert handled == [1]
+    assert queue.counts() == {'request_test': {'done': 1}}
+
+
+@pytest.mark.unit
+def test_orchestrator_cycle_leaves_worker_stages_to_the_workers(monkeypatch):
+    import gmail_sync
+    import orchestrator
+
+    class Scan:
+        def __init__(self):
+            pass
+
+        def flush(self):
+            pass
+
+    monkeypatch.setattr(gmail_sync, 'GmailSync', Scan)
+    ran = []
+    for stage in ('process_new_referrals', 'request_tests_for_pending_patients', 'process_new_reports',
+                  'reformat_and_save_reports', 'send_reports_to_referrers', 'send_reminders',
+                  'process_resend_link_requests'):
+        monkeypatch.setattr(orchestrator, stage, lambda *args, stage=stage: ran.append(stage))
+    monkeypatch.setattr(orchestrator, 'enforce_safety_limits', lambda: {'total_limit_reached': False})
+
+    monkeypatch.setenv('LUCID_JOB_WORKERS', '1')
+    orchestrator.main()
+    assert ran == ['send_reminders', 'process_resend_link_requests']
+
+    ran.clear()
+    monkeypatch.delenv('LUCID_JOB_WORKERS')
+    orchestrator.main()
+    assert ran == ['process_new_referrals', 'request_tests_for_pending_patients', 'process_new_reports',
+                   'reformat_and_save_reports', 'send_reports_to_referrers', 'send_reminders',
+                   'process_resend_link_requests']
+
+
+@pytest.mark.unit
+def test_imported_report_is_rendered_from_the_same_database(queue, tmp_path, monkeypatch):
+    import db
+    import pipeline_jobs
+    from report_refactor import cognitive_importer
+    monkeypatch.syspath_prepend(pipeline_jobs.REPORT_REFACTOR_DIR)
+    import generate_report
+    from data_access import PatientDataLoader
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'lucid.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(db, 'engine', engine)
+    monkeypatch.setattr(db, 'Session', sessionmaker(bind=engine))
+    monkeypatch.setattr(pipeline_jobs, 'REPORT_DB', str(tmp_path / 'cognitive_analysis.db'))
+    monkeypatch.setattr(pipeline_jobs, 'REPORT_OUTPUT_DIR', str(tmp_path / 'reports'))
+    parsed = {
+        'pdf_path': '40436.pdf',
+        'patient': {'patient_id': 40436, 'test_date': 'March 4, 2025 10:15:30', 'age': 42, 'language': 'English'},
+        'session_date': datetime(2025, 3, 4, 10, 15, 30),
+        'cognitive_scores': [{'domain': 'Composite Memory', 'patient_score': 102.0, 'standard_score': 110.0,
+                              'percentile': 75.0, 'validity_index': 'Yes'}],
+        'subtests': [{'subtest_name': 'Shifting Attention Test', 'metric': 'Errors', 'score': 3.0,
+                      'standard_score': 101.0, 'percentile': 53.0, 'validity_flag': True}],
+        'epworth_summary': {'total_score': 6, 'interpretation': 'Normal'},
+    }
+    monkeypatch.setattr(cognitive_importer, 'parse_pdf_report', lambda pdf_path: dict(parsed))
+
+    rendered = []
+
+    def fake_render(data, output_path):
+        rendered.append(data)
+        with open(output_path, 'w') as f:
+            f.write('report')
+
+    def fake_init(db_path):
+        generate_report._worker.update(render=fake_render, loader=PatientDataLoader(db_path))
+
+    monkeypatch.setattr(generate_report, 'init_report_worker', fake_init)
+
+    pipeline_jobs.handle_import_report({'pdf_path': '40436.pdf', 'patient_id': 40436}, {'referral_id': None}, queue)
+    render_job = queue.lease('render_report', 'w1')
+    pipeline_jobs.handle_render_report(render_job['payload'], render_job, queue)
+
+    assert rendered[0]['patient'].age == 42
+    conn = sqlite3.connect(pipeline_jobs.REPORT_DB)
+    assert conn.execute("SELECT patient_id FROM population_patients").fetchall() == [('40436',)]
+    conn.close()
+    assert [row.metric for row in rendered[0]['subtests']] == ['Errors']
+    assert queue.lease('deliver', 'w1')['payload']['report_path'].endswith('40436_report.pdf')
@@ -0,0 +1,47 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from report_refactor.line_classifier import ClassifiedText, classify_line, NPQ_DOMAIN_HEADER
+from report_refactor import parsing_helpers
+
+HEADER = "CNS Vital Signs Report\nPatient ID: 40436\nTest Date: March 4, 2025 10:15:30\nAge: 42\nLanguage: English (United States)\n"
+SCORES = "Composite Memory\n102\n110\n75\nYes\nX\nVerbal Memory\nNA\n95\n37\nNo\n"
+EPWORTH = "1\nSitting and reading\n 2 - Moderate chance of dozing\n2\nWatching TV\n 0 - Would never doze\n"
+
+
+@pytest.mark.unit
+def test_one_pass_tags_every_kind():
+    text = ClassifiedText(HEADER + SCORES + EPWORTH)
+    assert text.first('patient_id').match.group('pid') == '40436'
+    assert text.first('test_date').match.group('date') == 'March 4, 2025 10:15:30'
+    assert [t.match.group('sc_domain') for t in text.lines('score_row')] == ['Composite Memory', 'Verbal Memory']
+    assert [t.match.group('ep_num') for t in text.lines('epworth_row')] == ['1', '2']
+    assert text.lines('npq_severity') == []
+
+
+@pytest.mark.unit
+def test_parsers_accept_raw_or_classified_text():
+    raw = HEADER + SCORES + EPWORTH
+    text = ClassifiedText(raw)
+    assert parsing_helpers.parse_basic_info(text) == parsing_helpers.parse_basic_info(raw) == \
+        (40436, 'March 4, 2025 10:15:30', 42, 'English (United States)')
+    assert parsing_helpers.parse_cognitive_scores(text, 1) == parsing_helpers.parse_cognitive_scores(raw, 1)
+    assert parsing_helpers.parse_epworth(text, 1) == parsing_helpers.parse_epworth(raw, 1)
+
+
+@pytest.mark.unit
+def test_test_date_falls_back_to_first_token():
+    info = parsing_helpers.parse_basic_info("Patient ID: 7\nTest Date: 2025-03-04\nAge: 30\nLanguage: English\n")
+    assert info == (7, '2025-03-04', 30, 'English')
+
+
+@pytest.mark.unit
+def test_classify_line():
+    assert classify_line("Social Anxiety Questions") == (NPQ_DOMAIN_HEADER, None)
+    kind, match = classify_line("12")
+    assert kind == 'npq_question_number' and match.group('qnum') == '12'
+    kind, match = classify_line("3 - Severe problem")
+    assert kind == 'npq_severity' and match.group('sev_text') == 'Severe problem'
+    assert classify_line("Difficulty concentrating") == (None, None)
@@ -0,0 +1,49 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from sqlite_profile import connect
+from migrations import (ANALYSIS_HOT_QUERIES, ANALYSIS_MIGRATIONS, apply_migrations,
+                        check_query_plans, get_schema_version, migrate_analysis_db)
+
+@pytest.fixture
+def analysis_db(tmp_path):
+    db_path = str(tmp_path / 'cognitive_analysis.db')
+    conn = connect(db_path)
+    conn.execute("CREATE TABLE cognitive_scores (id INTEGER PRIMARY KEY, patient_id INTEGER, domain TEXT)")
+    conn.execute("CREATE TABLE subtest_results (id INTEGER PRIMARY KEY, patient_id INTEGER, subtest_name TEXT, metric TEXT, score REAL)")
+    conn.execute("CREATE TABLE npq_questions (id INTEGER PRIMARY KEY, patient_id INTEGER, domain TEXT)")
+    conn.commit()
+    conn.close()
+    return db_path
+
+@pytest.mark.unit
+def test_hot_queries_scan_without_indexes(analysis_db):
+    conn = connect(analysis_db, read_only=True)
+    plans = check_query_plans(conn, ANALYSIS_HOT_QUERIES)
+    conn.close()
+    assert not plans['subtest metric lookup'][0]
+
+@pytest.mark.unit
+def test_migration_indexes_hot_queries(analysis_db):
+    assert migrate_analysis_db(analysis_db) == [1, 2]
+    conn = connect(analysis_db, read_only=True)
+    try:
+        assert get_schema_version(conn) == 2
+        plans = check_query_plans(conn, ANALYSIS_HOT_QUERIES)
+    finally:
+        conn.close()
+    # Only the tables present in the file are checked
+    assert set(plans) == {'cognitive_scores by patient', 'subtest_results by patient',
+                          'subtest metric lookup', 'npq_questions by patient'}
+    assert all(uses_index for uses_index, _ in plans.values()), plans
+
+@pytest.mark.unit
+def test_migrations_are_applied_once(analysis_db):
+    conn = connect(analysis_db)
+    try:
+        assert apply_migrations(conn, ANALYSIS_MIGRATIONS) == [1, 2]
+        assert apply_migrations(conn, ANALYSIS_MIGRATIONS) == []
+    finally:
+        conn.close()
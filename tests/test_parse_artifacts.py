@@ -0,0 +1,111 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import hashlib
+import json
+import subprocess
+from datetime import datetime
+
+import pytest
+from report_refactor import parse_artifacts
+from report_refactor.parse_artifacts import ParseArtifactStore, cached_parse
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), '..', 'report_refactor', '40436.pdf')
+SHA = 'ab' + '0' * 62
+
+
+@pytest.mark.unit
+def test_round_trip_keeps_datetimes(tmp_path):
+    store = ParseArtifactStore(str(tmp_path))
+    payload = {'session_date': datetime(2025, 3, 1, 9, 30), 'rows': [{'score': 1.5, 'valid': True}]}
+    path = store.put(SHA, 'report', payload)
+    assert path.startswith(str(tmp_path / 'ab'))
+    assert store.get(SHA, 'report') == payload
+    assert store.get(SHA, 'pdf_cognitive_parser') is None
+
+
+@pytest.mark.unit
+def test_parser_version_bump_ignores_and_prunes_old_artifacts(tmp_path):
+    ParseArtifactStore(str(tmp_path), versions={'report': 1}).put(SHA, 'report', {'a': 1})
+    store = ParseArtifactStore(str(tmp_path), versions={'report': 2})
+    assert store.get(SHA, 'report') is None
+    store.put(SHA, 'report', {'a': 2})
+    assert store.prune() == 1
+    assert store.get(SHA, 'report') == {'a': 2}
+
+
+@pytest.mark.unit
+def test_cached_parse_parses_each_pdf_once(tmp_path):
+    store = ParseArtifactStore(str(tmp_path))
+    calls = []
+
+    def parse(path):
+        calls.append(path)
+        return {'parsed': path}
+
+    first = cached_parse(SAMPLE_PDF, 'report', parse, store=store)
+    second = cached_parse(SAMPLE_PDF, 'report', parse, store=store)
+    assert first == second and len(calls) == 1
+    cached_parse(SAMPLE_PDF, 'report', parse, store=store, use_artifacts=False)
+    assert len(calls) == 2
+
+
+@pytest.mark.unit
+def test_unparseable_results_are_not_stored(tmp_path):
+    store = ParseArtifactStore(str(tmp_path))
+    assert cached_parse(SAMPLE_PDF, 'report', lambda path: None, store=store) is None
+    assert not any(files for _, _, files in os.walk(tmp_path))
+
+
+@pytest.mark.unit
+def test_report_import_loads_stored_parse(tmp_path, monkeypatch):
+    from report_refactor import cognitive_importer
+    monkeypatch.setattr(parse_artifacts, 'DEFAULT_ROOT', str(tmp_path))
+    parsed = cognitive_importer.parse_pdf_report(SAMPLE_PDF)
+
+    def fail(pdf_path):
+        raise AssertionError("PDF was parsed again")
+    monkeypatch.setattr(cognitive_importer, '_parse_pdf', fail)
+    loaded = cognitive_importer.parse_pdf_report(SAMPLE_PDF)
+    assert loaded['session_date'] == parsed['session_date']
+    assert loaded['subtests'] == parsed['subtests']
+    assert loaded['asrs_responses'] == parsed['asrs_responses']
+
+
+# Fingerprint of each parser's output on SAMPLE_PDF, per PARSER_VERSIONS entry. When a parser
+# change alters its output, bump its version in parse_artifacts.PARSER_VERSIONS (so stored
+# artifacts are reparsed) and record the new fingerprint here.
+OUTPUT_FINGERPRINTS = {
+    ('report', 1): 'bf224ea9e73dea80e3ea4c6bbda35732d12420e196b783bcdd083fafe164d434',
+    ('pdf_cognitive_parser', 1): 'e7968a2c857c0b3da294f26868626999b2fde4a3ae37f0d4a42bc18bf188b13d',
+}
+
+
+def _fingerprint(payload):
+    encoded = json.dumps(payload, default=parse_artifacts._encode, sort_keys=True)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+@pytest.mark.unit
+def test_parser_output_change_requires_version_bump():
+    from report_refactor import cognitive_importer, pdf_cognitive_parser
+    report = cognitive_importer._parse_pdf(SAMPLE_PDF)
+    report.pop('pdf_path')
+    outputs = {'report': report, 'pdf_cognitive_parser': pdf_cognitive_parser._parse_pdf(SAMPLE_PDF)}
+    for parser, output in outputs.items():
+        key = (parser, parse_artifacts.PARSER_VERSIONS[parser])
+        assert _fingerprint(output) == OUTPUT_FINGERPRINTS.get(key), \
+            f"{parser} output changed: bump PARSER_VERSIONS[{parser!r}] and record its new fingerprint"
+
+
+@pytest.mark.unit
+def test_flat_import_from_report_refactor():
+    # Scripts in report_refactor import the parsers as top-level modules, without the repository root on sys.path
+    report_dir = os.path.dirname(SAMPLE_PDF)
+    env = {key: value for key, value in os.environ.items() if key != 'PYTHONPATH'}
+    result = subprocess.run([sys.executable, '-c', 'import pdf_cognitive_parser, parse_artifacts; '
+                             'print(parse_artifacts.hash_file("40436.pdf")[0])'],
+                            cwd=report_dir, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert len(result.stdout.split()[-1]) == 64
@@ -0,0 +1,30 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from report_refactor.parsed_report import ParsedReport
+from report_refactor import parsing_helpers
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), '..', 'report_refactor', '40436.pdf')
+
+@pytest.mark.unit
+def test_shared_report_matches_path_results():
+    with ParsedReport(SAMPLE_PDF) as report:
+        npq_pages = parsing_helpers.find_npq_pages(report)
+        assert npq_pages == parsing_helpers.find_npq_pages(SAMPLE_PDF)
+        assert parsing_helpers.extract_text_blocks(report) == parsing_helpers.extract_text_blocks(SAMPLE_PDF)
+        assert parsing_helpers.parse_asrs_with_bounding_boxes(report, 1) == parsing_helpers.parse_asrs_with_bounding_boxes(SAMPLE_PDF, 1)
+        assert parsing_helpers.extract_npq_domain_scores_from_pdf(report, npq_pages) == \
+            parsing_helpers.extract_npq_domain_scores_from_pdf(SAMPLE_PDF, npq_pages)
+
+@pytest.mark.unit
+def test_pages_are_extracted_once():
+    with ParsedReport(SAMPLE_PDF) as report:
+        parsing_helpers.find_npq_pages(report)
+        doc, plumber = report.doc, report.plumber
+        tables = report.tables(0)
+        parsing_helpers.parse_all_cognitive_subtests_from_pdf(report, 1)
+        assert report.doc is doc and report.plumber is plumber
+        assert report.tables(0) is tables
+    assert report._doc is None and report._plumber is None
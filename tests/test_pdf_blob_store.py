@@ -0,0 +1,72 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from sqlite_profile import connect
+from pdf_blob_store import PdfBlobStore, hash_file
+from pdf_report_utils import save_pdf_to_db, open_reports_db, is_pdf_stored, delete_unreferenced_blobs
+
+PDF = b'%PDF-1.4\n' + b'report body ' * 1000
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / 'incoming' / 'report.pdf'
+    path.parent.mkdir()
+    path.write_bytes(PDF)
+    return str(path)
+
+@pytest.mark.unit
+def test_store_is_content_addressed(tmp_path, pdf):
+    store = PdfBlobStore(str(tmp_path / 'store'))
+    sha256, size, created = store.put(pdf)
+    assert (sha256, size) == hash_file(pdf) and created
+    assert store.put_bytes(PDF) == (sha256, size, False)
+    assert store.path_for(sha256).endswith(os.path.join(sha256[:2], sha256 + '.pdf'))
+    assert store.read_bytes(sha256) == PDF
+    # No temporary files are left behind
+    assert os.listdir(store.root) == [sha256[:2]]
+
+@pytest.mark.unit
+def test_zstd_blobs_read_back_uncompressed(tmp_path, pdf):
+    pytest.importorskip('zstandard')
+    store = PdfBlobStore(str(tmp_path / 'store'), compression='zstd')
+    sha256, _, _ = store.put(pdf)
+    assert store.path_for(sha256).endswith('.pdf.zst')
+    assert os.path.getsize(store.path_for(sha256)) < len(PDF)
+    assert PdfBlobStore(store.root).read_bytes(sha256) == PDF
+
+@pytest.mark.unit
+def test_save_pdf_to_db_deduplicates(tmp_path, pdf):
+    db_path = str(tmp_path / 'cns_vs_reports.db')
+    assert not is_pdf_stored(pdf, db_path)
+    assert save_pdf_to_db(pdf, '123', 'email-1', db_path)
+    assert save_pdf_to_db(pdf, '123', 'email-2', db_path)
+    assert is_pdf_stored(pdf, db_path)
+    conn, store = open_reports_db(db_path)
+    rows = conn.execute("SELECT patient_id, email_id, pdf_data, sha256 FROM cns_vs_reports").fetchall()
+    assert rows == [('123', 'email-1', None, hash_file(pdf)[0])]
+    assert conn.execute("SELECT sha256, size FROM report_blobs").fetchall() == [hash_file(pdf)]
+    # Deleting the patient's reports removes the blob too
+    conn.execute("DELETE FROM cns_vs_reports WHERE patient_id = '123'")
+    assert delete_unreferenced_blobs(conn, store) == 1
+    conn.commit()
+    conn.close()
+    assert store.path_for(hash_file(pdf)[0]) is None
+
+@pytest.mark.unit
+def test_legacy_blobs_move_to_store(tmp_path):
+    db_path = str(tmp_path / 'cns_vs_reports.db')
+    conn = connect(db_path)
+    conn.execute("CREATE TABLE cns_vs_reports (id INTEGER PRIMARY KEY AUTOINCREMENT, patient_id TEXT, email_id TEXT,"
+                 " filename TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, pdf_data BLOB)")
+    conn.executemany("INSERT INTO cns_vs_reports (patient_id, filename, pdf_data) VALUES (?, ?, ?)",
+                     [('1', 'a.pdf', PDF), ('1', 'a-again.pdf', PDF), ('2', 'b.pdf', PDF + b'2')])
+    conn.commit()
+    conn.close()
+    conn, store = open_reports_db(db_path)
+    rows = conn.execute("SELECT patient_id, filename, pdf_data FROM cns_vs_reports ORDER BY id").fetchall()
+    assert rows == [('1', 'a.pdf', None), ('2', 'b.pdf', None)]
+    shas = [row[0] for row in conn.execute("SELECT sha256 FROM cns_vs_reports ORDER BY id")]
+    assert [store.read_bytes(sha) for sha in shas] == [PDF, PDF + b'2']
+    conn.close()
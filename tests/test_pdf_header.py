@@ -0,0 +1,44 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import fitz
+import pytest
+import pdf_header
+from pdf_header import read_report_header, parse_header_text
+from pdf_report_utils import extract_patient_id_from_pdf
+from report_refactor import parsing_helpers
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), '..', 'report_refactor', '40436.pdf')
+
+@pytest.mark.unit
+@pytest.mark.parametrize('backend', ['fitz', 'pypdf2'])
+def test_header_matches_full_document_parse(backend):
+    text = "\n".join(parsing_helpers.extract_text_blocks(SAMPLE_PDF))
+    patient_id, test_date, age, language = parsing_helpers.parse_basic_info(text)
+    header = read_report_header(SAMPLE_PDF, backend=backend)
+    assert header.patient_id == str(patient_id) and header.age == age
+    if backend == 'fitz':
+        assert (header.test_date, header.language) == (test_date, language)
+    assert extract_patient_id_from_pdf(SAMPLE_PDF) == str(patient_id)
+
+@pytest.mark.unit
+def test_stops_at_first_page_with_patient_id(tmp_path, monkeypatch):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "CNS Vital Signs")
+    doc.new_page().insert_text((72, 72), "Patient ID: 123\nTest Date: 2025-05-01\nAge: 41\nLanguage: English")
+    for _ in range(5):
+        doc.new_page().insert_text((72, 72), "Patient ID: 999")
+    path = str(tmp_path / 'report.pdf')
+    doc.save(path)
+    doc.close()
+    seen = []
+    original = pdf_header.parse_header_text
+    monkeypatch.setattr(pdf_header, 'parse_header_text', lambda text: seen.append(text) or original(text))
+    assert read_report_header(path) == ('123', '2025-05-01', 41, 'English')
+    assert len(seen) == 2
+
+@pytest.mark.unit
+def test_parse_header_text_without_patient_id():
+    assert parse_header_text("Test Date: 2025-05-01\nAge: 41") is None
+    assert parse_header_text("Patient ID：77") == ('77', None, None, None)
@@ -0,0 +1,65 @@
+import sys
+import os
+import sqlite3
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from report_refactor import population_stats
+
+SAT = "Shifting Attention Test"
+
+def _add_patient(conn, patient_id, rt, errors):
+    conn.executemany(
+        "INSERT INTO subtest_results (patient_id, subtest_name, metric, score, standard_score) VALUES (?, ?, ?, ?, ?)",
+        [(patient_id, SAT, "Correct Reaction Time", rt, 100), (patient_id, SAT, "Errors", errors, 100)])
+
+@pytest.fixture
+def analysis_db(tmp_path):
+    db_path = str(tmp_path / 'cognitive_analysis.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE subtest_results (id INTEGER PRIMARY KEY, patient_id INTEGER, subtest_name TEXT, "
+                 "metric TEXT, score REAL, standard_score INTEGER)")
+    for patient_id in range(1, 21):
+        _add_patient(conn, patient_id, 800 + 10 * patient_id, patient_id % 7)
+    conn.commit()
+    conn.close()
+    return db_path
+
+@pytest.mark.unit
+def test_score_pair_sums_listed_error_metrics():
+    rows = [
+        {"subtest_name": "Reasoning Test", "metric": "Average Correct Reaction Time", "score": 4000, "standard_score": 90},
+        {"subtest_name": "Reasoning Test", "metric": "Commission Errors", "score": 3, "standard_score": 95},
+        {"subtest_name": "Reasoning Test", "metric": "Omission Errors", "score": "2", "standard_score": 97},
+    ]
+    spec = population_stats.POPULATION_TESTS["reasoning"]
+    assert population_stats.score_pair(rows, spec) == (4000.0, 5.0)
+    assert population_stats.score_pair(rows[:1], population_stats.POPULATION_TESTS["stroop_test"]) == (None, None)
+
+@pytest.mark.unit
+def test_refresh_is_incremental_and_loaded_once(analysis_db):
+    first = population_stats.refresh_population_stats(analysis_db)
+    assert first["patients"] == 20
+    stats = population_stats.get_population_stats("shifting_attention_test", analysis_db)
+    assert stats["n"] == 20 and stats["speed_min"] == 810 and stats["speed_max"] == 1000
+    assert sum(cell[2] for cell in stats["density"]) == 20
+    assert population_stats.get_population_stats("shifting_attention_test", analysis_db) is stats
+    assert population_stats.get_population_stats("stroop_test", analysis_db) is None
+
+    # Nothing new: no patients rescored, no statistics rewritten
+    assert population_stats.refresh_population_stats(analysis_db) == {"patients": 0, "tests": []}
+
+    conn = sqlite3.connect(analysis_db)
+    _add_patient(conn, 21, 2000, 30)
+    conn.commit()
+    conn.close()
+    assert population_stats.refresh_population_stats(analysis_db)["patients"] == 1
+    stats = population_stats.get_population_stats("shifting_attention_test", analysis_db)
+    assert stats["n"] == 21 and stats["speed_max"] == 2000
+    assert population_stats.get_patient_point("sat_rt_errors", 21, analysis_db) == (100.0, 100.0)
+
+@pytest.mark.unit
+def test_empty_store_is_refreshed_on_first_use(analysis_db):
+    # Patients imported without a refresh (e.g. by batch_import before it refreshed)
+    stats = population_stats.get_population_stats("shifting_attention_test", analysis_db)
+    assert stats["n"] == 20
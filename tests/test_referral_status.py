@@ -0,0 +1,77 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from db import Base, Referral, SCHEMA_MIGRATIONS
+from migrations import apply_migrations
+from referral_status import (RECEIVED, TEST_REQUESTED, TEST_COMPLETED, REPORT_PROCESSED, REPORT_SENT,
+                             InvalidTransition, transition, next_batch, mark_test_completed)
+
+NOW = datetime(2025, 5, 1, 12, 0)
+
+@pytest.fixture
+def db_session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+
+@pytest.mark.unit
+def test_transitions_follow_the_pipeline_and_update_legacy_columns(db_session):
+    referral = Referral(email='a@x.com', id_number='A')
+    db_session.add(referral)
+    db_session.commit()
+    assert referral.status == RECEIVED
+    with pytest.raises(InvalidTransition):
+        transition(referral, REPORT_SENT, NOW)
+
+    transition(referral, TEST_REQUESTED, NOW)
+    assert referral.test_request_time == NOW and not referral.test_resent
+    transition(referral, TEST_REQUESTED, NOW + timedelta(days=8))
+    assert referral.test_request_time == NOW and referral.test_resent_time == NOW + timedelta(days=8)
+    transition(referral, TEST_COMPLETED, NOW)
+    transition(referral, REPORT_PROCESSED, NOW)
+    transition(referral, REPORT_SENT, NOW)
+    assert referral.test_completed and referral.report_processed and not referral.report_unprocessed
+    assert referral.report_sent_date == NOW
+    with pytest.raises(InvalidTransition):
+        transition(referral, TEST_REQUESTED, NOW)
+
+@pytest.mark.unit
+def test_next_batch_and_mark_test_completed(db_session):
+    referrals = [Referral(email=f'{i}@x.com', id_number=str(i), status_updated_at=NOW - timedelta(hours=i))
+                 for i in range(4)]
+    db_session.add_all(referrals)
+    db_session.commit()
+    assert [r.id_number for r in next_batch(db_session, RECEIVED, limit=2)] == ['3', '2']
+
+    assert mark_test_completed(db_session, '1') is None
+    transition(referrals[1], TEST_REQUESTED, NOW)
+    assert mark_test_completed(db_session, 1) is referrals[1]
+    assert referrals[1].status == TEST_COMPLETED
+    assert next_batch(db_session, TEST_REQUESTED).all() == []
+
+@pytest.mark.unit
+def test_status_migration_backfills_existing_referrals(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'lucid_data.db'))
+    conn.execute("CREATE TABLE referrals (id INTEGER PRIMARY KEY, email VARCHAR, id_number VARCHAR,"
+                 " referral_received_time DATETIME, test_request_time DATETIME, test_completed BOOLEAN,"
+                 " report_processed BOOLEAN, report_sent_date DATETIME, test_resent_time DATETIME)")
+    conn.executemany("INSERT INTO referrals (email, test_request_time, test_completed, report_processed,"
+                     " report_sent_date) VALUES (?, ?, ?, ?, ?)",
+                     [('a', None, 0, 0, None), ('b', '2025-05-01', 0, 0, None),
+                      ('c', '2025-05-01', 1, 0, None), ('d', '2025-05-01', 1, 1, '2025-05-03')])
+    assert apply_migrations(conn, SCHEMA_MIGRATIONS) == [1, 2, 3, 4, 5]
+    assert [row[0] for row in conn.execute("SELECT status FROM referrals ORDER BY id")] == \
+        [RECEIVED, TEST_REQUESTED, TEST_COMPLETED, REPORT_SENT]
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT id FROM referrals WHERE status = 'received'"
+                        " ORDER BY status_updated_at").fetchall()
+    assert 'ix_referrals_status_updated' in str(plan)
+    conn.close()
@@ -0,0 +1,82 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import db
+from db import Base, Referral, Reminder
+from referral_status import TEST_REQUESTED, TEST_COMPLETED, transition
+from reminders import REMINDER_STEPS, send_due_reminders
+
+REQUESTED = datetime(2025, 5, 1, 12, 0)
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(db, 'Session', sessionmaker(bind=engine))
+    return engine
+
+def _request(email):
+    with db.Session() as session:
+        referral = Referral(email=email, id_number=email[0])
+        session.add(referral)
+        session.flush()
+        transition(referral, TEST_REQUESTED, REQUESTED)
+        session.commit()
+        return referral.id
+
+@pytest.mark.unit
+def test_reminders_are_sent_once_when_due(engine):
+    _request('a@x.com')
+    sent = []
+    record = lambda referral, text: sent.append((referral.email, text))
+    assert send_due_reminders(now=REQUESTED, send=record) == 1
+    assert sent == [('a@x.com', REMINDER_STEPS[0][1])]
+    # Nothing new is due: no resend every cycle
+    assert send_due_reminders(now=REQUESTED + timedelta(days=1), send=record) == 0
+    # After downtime only the latest due step goes out
+    assert send_due_reminders(now=REQUESTED + timedelta(days=6, hours=13), send=record) == 1
+    assert sent[-1] == ('a@x.com', REMINDER_STEPS[3][1])
+    with db.Session() as session:
+        assert session.query(Reminder).filter(Reminder.sent_at == None).count() == 2
+
+@pytest.mark.unit
+def test_completed_test_cancels_reminders_and_due_query_uses_index(engine):
+    referral_id = _request('b@x.com')
+    with db.Session() as session:
+        transition(session.get(Referral, referral_id), TEST_COMPLETED, REQUESTED)
+        session.commit()
+        assert session.query(Reminder).count() == 0
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN SELECT id FROM reminders"
+                                    " WHERE sent_at IS NULL AND due_at <= '2025-05-02' ORDER BY due_at").fetchall()
+    assert 'ix_reminders_unsent_due' in str(plan)
+
+@pytest.mark.unit
+def test_batches_cover_every_due_reminder(engine):
+    for i in range(5):
+        _request(f'{i}@x.com')
+    assert send_due_reminders(now=REQUESTED, limit=2, send=lambda referral, text: None) == 5
+
+@pytest.mark.unit
+def test_migration_schedules_remaining_reminders_for_pending_tests(tmp_path):
+    import sqlite3
+    from migrations import apply_migrations
+    conn = sqlite3.connect(str(tmp_path / 'lucid_data.db'))
+    conn.execute("CREATE TABLE referrals (id INTEGER PRIMARY KEY, email VARCHAR, id_number VARCHAR,"
+                 " referral_received_time DATETIME, test_request_time DATETIME, test_completed BOOLEAN,"
+                 " report_processed BOOLEAN, report_sent_date DATETIME, test_resent_time DATETIME)")
+    requested = (datetime.now() - timedelta(days=5)).strftime(db.SQLITE_DATETIME_FORMAT)
+    conn.executemany("INSERT INTO referrals (email, test_request_time, test_completed) VALUES (?, ?, ?)",
+                     [('a', requested, 0), ('b', requested, 1), ('c', None, 0)])
+    apply_migrations(conn, db.SCHEMA_MIGRATIONS)
+    # 5 days in: the 1 day, 12 hour, 1 hour and expiry steps are still to come
+    assert conn.execute("SELECT referral_id, step FROM reminders ORDER BY step").fetchall() == \
+        [(1, 2), (1, 3), (1, 4), (1, 5)]
+    conn.close()
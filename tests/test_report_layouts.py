@@ -0,0 +1,49 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from report_refactor import report_layouts
+from report_refactor.report_layouts import CNSVS_2_NPQ_LF207, clip_blocks, layout_signature
+from report_refactor.parsed_report import ParsedReport
+from report_refactor.cognitive_importer import parse_pdf_report
+from report_refactor import parsing_helpers
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), '..', 'report_refactor', '40436.pdf')
+
+
+@pytest.mark.unit
+def test_sample_report_matches_known_layout():
+    with ParsedReport(SAMPLE_PDF) as report:
+        assert layout_signature(report) == CNSVS_2_NPQ_LF207.signature
+        assert report.layout is CNSVS_2_NPQ_LF207
+        assert parsing_helpers.find_npq_pages(report) == list(range(5, 13))
+        assert parsing_helpers.find_asrs_page(report) == 3
+
+
+@pytest.mark.unit
+def test_unknown_layout_falls_back_to_discovery(monkeypatch):
+    monkeypatch.setattr(report_layouts, 'KNOWN_LAYOUTS', {})
+    with ParsedReport(SAMPLE_PDF) as report:
+        assert report.layout is None
+        assert parsing_helpers.find_npq_pages(report) == list(range(5, 13))
+
+
+@pytest.mark.unit
+def test_planned_parse_matches_discovery():
+    with ParsedReport(SAMPLE_PDF, use_layouts=False) as report:
+        discovered = parse_pdf_report(report)
+    with ParsedReport(SAMPLE_PDF, table_backend='pymupdf') as report:
+        planned = parse_pdf_report(report)
+        # Only PyMuPDF was needed: pdfplumber's layout analysis never ran
+        assert report._plumber is None
+    for key in discovered:
+        if key != 'session_date':
+            assert planned[key] == discovered[key], key
+
+
+@pytest.mark.unit
+def test_clip_blocks_keeps_blocks_inside_the_clip():
+    blocks = [(10, 40, 100, 50, "header"), (10, 120, 100, 130, "body"), (10, 105, 100, 115, "straddles")]
+    assert clip_blocks(blocks, (0, 110, 612, 792)) == [blocks[1]]
+    assert clip_blocks(blocks, None) is blocks
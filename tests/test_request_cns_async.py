@@ -0,0 +1,98 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from request_cns_test import request_tests_concurrently, remote_test_steps
+
+class FakeLocator:
+    async def click(self):
+        pass
+
+    async def fill(self, value):
+        pass
+
+    async def select_option(self, value):
+        pass
+
+class FakePage:
+    def locator(self, selector):
+        return FakeLocator()
+
+    def get_by_role(self, role, name=None):
+        return FakeLocator()
+
+    def once(self, event, handler):
+        pass
+
+    async def goto(self, url):
+        pass
+
+class FakeSession:
+    """Stands in for AsyncCnsvsSession, recording how many pages are in use at once."""
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+        self.portals = []
+
+    @asynccontextmanager
+    async def page(self):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            yield FakePage()
+        finally:
+            self.in_flight -= 1
+
+    async def open_portal(self, page, portal_link):
+        self.portals.append(portal_link)
+
+def _patients(count):
+    return [{'subject': str(1000 + i), 'dob_year': '1990', 'email': f'p{i}@example.com'} for i in range(count)]
+
+def _run(concurrency, count, step_delay=0.002):
+    """Run the requests with a pacing step that records how many patients are pacing at once."""
+    pacing = {'now': 0, 'peak': 0}
+
+    async def pace():
+        pacing['now'] += 1
+        pacing['peak'] = max(pacing['peak'], pacing['now'])
+        try:
+            await asyncio.sleep(step_delay)
+        finally:
+            pacing['now'] -= 1
+    session = FakeSession()
+    finished = []
+    results = asyncio.run(request_tests_concurrently(
+        session, _patients(count), concurrency,
+        on_result=lambda patient, ok: finished.append(patient['subject']), pace=pace))
+    return session, results, finished, pacing['peak']
+
+@pytest.mark.unit
+def test_concurrency_is_bounded_and_throughput_scales():
+    serial_session, results, finished, serial_pacing = _run(concurrency=1, count=8)
+    assert all(results) and len(finished) == 8
+    assert serial_session.peak == 1 and serial_pacing == 1
+    parallel_session, results, finished, parallel_pacing = _run(concurrency=4, count=8)
+    assert all(results) and sorted(finished) == [p['subject'] for p in _patients(8)]
+    assert parallel_session.peak == 4
+    # Each patient keeps its own pacing, so the waits of 4 patients overlap instead of adding up
+    assert parallel_pacing == 4
+
+@pytest.mark.unit
+def test_failed_request_is_reported_without_stopping_others():
+    class FlakySession(FakeSession):
+        async def open_portal(self, page, portal_link):
+            if len(self.portals) == 1:
+                self.portals.append(portal_link)
+                raise RuntimeError("portal unavailable")
+            self.portals.append(portal_link)
+
+    async def pace():
+        pass
+    results = asyncio.run(request_tests_concurrently(FlakySession(), _patients(3), 1, pace=pace))
+    assert results == [True, False, True]
+    assert remote_test_steps('1', '1990', 'a@b.c')[-1][2].endswith('email_to=a@b.c')
@@ -0,0 +1,184 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import orchestrator
+from db import Base, Referral
+
+@pytest.fixture
+def db_session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+
+@pytest.mark.unit
+def test_select_requestable_referrals_respects_daily_limits(db_session, monkeypatch):
+    now = datetime(2025, 5, 1, 12, 0)
+    db_session.add_all([
+        Referral(email='a@x.com', id_number='A', status='test_requested', test_request_time=now - timedelta(hours=1)),
+        Referral(email='a@x.com', id_number='A'),
+        Referral(email='b@x.com', id_number='B'),
+        Referral(email='b@x.com', id_number='B'),
+        Referral(email='c@x.com', id_number='C', status='test_requested', test_request_time=now - timedelta(days=1)),
+        Referral(email='c@x.com', id_number='C'),
+        Referral(email='d@x.com', id_number='D'),
+    ])
+    db_session.commit()
+    selected = orchestrator.select_requestable_referrals(db_session, now=now)
+    # A already had today's request; B only once per day; yesterday's request doesn't count for C
+    assert [r.id_number for r in selected] == ['B', 'C', 'D']
+
+    monkeypatch.setattr(orchestrator, 'MAX_TOTAL_REQUESTS_PER_DAY', 3)
+    assert [r.id_number for r in orchestrator.select_requestable_referrals(db_session, now=now)] == ['B', 'C']
+    monkeypatch.setattr(orchestrator, 'MAX_TOTAL_REQUESTS_PER_DAY', 1)
+    assert orchestrator.select_requestable_referrals(db_session, now=now) == []
+
+@pytest.mark.unit
+def test_enforce_safety_limits_counts_today_in_one_grouped_query(monkeypatch):
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(orchestrator, 'Session', sessionmaker(bind=engine))
+    now = datetime(2025, 5, 1, 12, 0)
+    with orchestrator.Session() as session:
+        session.add_all([
+            Referral(email='a@x.com', id_number='A', test_request_time=now - timedelta(hours=1)),
+            Referral(email='a@x.com', id_number='A', test_request_time=now - timedelta(hours=2)),
+            Referral(email='b@x.com', id_number='B', test_request_time=now - timedelta(hours=1)),
+            Referral(email='b@x.com', id_number='B', test_request_time=now - timedelta(days=1)),
+            Referral(email='c@x.com', id_number='C'),
+        ])
+        session.commit()
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    limits = orchestrator.enforce_safety_limits(now=now)
+    assert limits == {'total': 3, 'over_patient_limit': {'A': 2}, 'total_limit_reached': False}
+    assert len(statements) == 2
+
+    monkeypatch.setattr(orchestrator, 'MAX_TOTAL_REQUESTS_PER_DAY', 3)
+    assert orchestrator.enforce_safety_limits(now=now)['total_limit_reached']
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT count(id) FROM referrals WHERE test_request_time >= '2025-05-01'").fetchall()
+    assert 'ix_referrals_test_request_time' in str(plan)
+
+@pytest.fixture
+def file_db(tmp_path, monkeypatch):
+    from sqlite_profile import create_tuned_engine
+    engine = create_tuned_engine(f"sqlite:///{tmp_path / 'referrals.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(orchestrator, 'Session', sessionmaker(bind=engine))
+    return engine
+
+def _received(*id_numbers):
+    with orchestrator.Session() as session:
+        referrals = [Referral(email=f'{n}@x.com', id_number=n) for n in id_numbers]
+        session.add_all(referrals)
+        session.commit()
+        return [r.id for r in referrals]
+
+@pytest.mark.unit
+def test_reservation_enforces_both_daily_limits(file_db, monkeypatch):
+    now = datetime(2025, 5, 1, 12, 0)
+    a1, a2, b, c = _received('A', 'A', 'B', 'C')
+    assert orchestrator.reserve_test_request(a1, now=now)
+    # A's second referral and a repeat claim of the first are both refused today
+    assert not orchestrator.reserve_test_request(a2, now=now)
+    assert not orchestrator.reserve_test_request(a1, now=now)
+    monkeypatch.setattr(orchestrator, 'MAX_TOTAL_REQUESTS_PER_DAY', 2)
+    assert orchestrator.reserve_test_request(b, now=now)
+    assert not orchestrator.reserve_test_request(c, now=now)
+    # A failed request gives its claim back
+    orchestrator.release_test_request(b)
+    assert orchestrator.reserve_test_request(c, now=now)
+    with orchestrator.Session() as session:
+        assert session.get(Referral, b).test_request_time is None
+        assert session.get(Referral, c).status == 'received'
+
+@pytest.mark.unit
+def test_concurrent_workers_cannot_both_pass_the_limit(file_db):
+    import threading
+    referral_ids = _received(*['A'] * 8)
+    barrier = threading.Barrier(len(referral_ids))
+    claimed = []
+
+    def worker(referral_id):
+        barrier.wait()
+        if orchestrator.reserve_test_request(referral_id):
+            claimed.append(referral_id)
+
+    threads = [threading.Thread(target=worker, args=(referral_id,)) for referral_id in referral_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(claimed) == 1
+
+@pytest.mark.unit
+def test_failed_request_releases_its_reservation(file_db, monkeypatch):
+    import request_cns_test
+    referral_id, = _received('A')
+
+    async def fail_all(session, patients, concurrency, on_result=None):
+        for patient in patients:
+            on_result(patient, False)
+        return [False] * len(patients)
+
+    class Pool:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def session(self):
+            return None
+
+    class Playwright:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+    import cnsvs_session
+    import playwright.async_api
+    monkeypatch.setattr(request_cns_test, 'request_tests_concurrently', fail_all)
+    monkeypatch.setattr(cnsvs_session, 'AsyncCnsvsSessionPool', Pool)
+    monkeypatch.setattr(playwright.async_api, 'async_playwright', Playwright)
+    assert orchestrator.request_test_for_referral(referral_id) is False
+    with orchestrator.Session() as session:
+        referral = session.get(Referral, referral_id)
+        assert (referral.status, referral.test_request_time) == ('received', None)
+
+@pytest.mark.unit
+def test_resends_count_toward_daily_limits(file_db, monkeypatch):
+    now = datetime(2025, 5, 1, 12, 0)
+    with orchestrator.Session() as session:
+        session.add_all([
+            Referral(email='a@x.com', id_number='A', status='test_requested',
+                     test_request_time=now - timedelta(days=8), test_resent=True, test_resent_time=now - timedelta(hours=1)),
+            Referral(email='c@x.com', id_number='C', status='test_requested', test_request_time=now - timedelta(days=8)),
+        ])
+        session.commit()
+    a2, b = _received('A', 'B')
+    assert orchestrator.enforce_safety_limits(now=now)['total'] == 1
+    # A's resend used A's request for today
+    assert not orchestrator.reserve_test_request(a2, now=now)
+
+    # With the global cap at 1, today's resend leaves no room for a request or another resend
+    monkeypatch.setattr(orchestrator, 'MAX_TOTAL_REQUESTS_PER_DAY', 1)
+    assert orchestrator.enforce_safety_limits(now=now)['total_limit_reached']
+    assert not orchestrator.reserve_test_request(b, now=now)
+    with orchestrator.Session() as session:
+        assert orchestrator.select_requestable_referrals(session, now=now) == []
+        assert not orchestrator.within_daily_limits(session, session.query(Referral).filter_by(id_number='C').one(), now=now)
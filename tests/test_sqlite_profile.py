@@ -0,0 +1,44 @@
+import sys
+import os
+import sqlite3
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from sqlalchemy import text
+from sqlite_profile import connect, create_tuned_engine
+
+@pytest.mark.unit
+def test_writer_connection_uses_wal_profile(tmp_path):
+    conn = connect(str(tmp_path / 'profile.db'))
+    try:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] > 0
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] < 0
+    finally:
+        conn.close()
+
+@pytest.mark.unit
+def test_read_only_connection_rejects_writes(tmp_path):
+    db_path = str(tmp_path / 'profile.db')
+    writer = connect(db_path)
+    writer.execute("CREATE TABLE patients (patient_id TEXT)")
+    writer.execute("INSERT INTO patients VALUES ('40436')")
+    writer.commit()
+
+    reader = connect(db_path, read_only=True)
+    try:
+        assert reader.execute("SELECT patient_id FROM patients").fetchall() == [('40436',)]
+        with pytest.raises(sqlite3.OperationalError):
+            reader.execute("INSERT INTO patients VALUES ('1')")
+    finally:
+        reader.close()
+        writer.close()
+
+@pytest.mark.unit
+def test_engine_connections_get_profile(tmp_path):
+    engine = create_tuned_engine(f"sqlite:///{tmp_path / 'profile.db'}")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == 'wal'
+        assert conn.execute(text("PRAGMA temp_store")).scalar() == 2
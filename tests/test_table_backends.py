@@ -0,0 +1,54 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from report_refactor.parsed_report import ParsedReport
+from report_refactor.table_backends import TABLE_BACKENDS, get_table_backend
+from report_refactor import parsing_helpers
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), '..', 'report_refactor', '40436.pdf')
+# pdfplumber interleaves the glyphs of two header words that overlap in this cell
+OVERLAPPING_HEADER = {'pdfplumber': '(SFcPoCrPeT)', 'pymupdf': '(FPCPT) Score'}
+
+def _tables(backend):
+    with ParsedReport(SAMPLE_PDF, table_backend=backend) as report:
+        return [report.tables(page_idx) for page_idx in range(report.page_count)]
+
+def _parsed(backend):
+    with ParsedReport(SAMPLE_PDF, table_backend=backend) as report:
+        npq_pages = parsing_helpers.find_npq_pages(report)
+        return (parsing_helpers.parse_all_cognitive_subtests_from_pdf(report, 1),
+                parsing_helpers.extract_npq_domain_scores_from_pdf(report, npq_pages),
+                parsing_helpers.parse_all_subtests(report, 1))
+
+@pytest.mark.unit
+def test_backends_produce_identical_rows():
+    plumber, pymupdf = _tables('pdfplumber'), _tables('pymupdf')
+    assert [len(tables) for tables in pymupdf] == [len(tables) for tables in plumber]
+    differing = [(page_idx, plumber_row, pymupdf_row)
+                 for page_idx, (plumber_tables, pymupdf_tables) in enumerate(zip(plumber, pymupdf))
+                 for plumber_table, pymupdf_table in zip(plumber_tables, pymupdf_tables)
+                 for plumber_row, pymupdf_row in zip(plumber_table, pymupdf_table)
+                 if plumber_row != pymupdf_row]
+    assert len(differing) == 1
+    _, plumber_row, pymupdf_row = differing[0]
+    assert [cell for cell in plumber_row if cell != OVERLAPPING_HEADER['pdfplumber']] == \
+        [cell for cell in pymupdf_row if cell != OVERLAPPING_HEADER['pymupdf']]
+
+@pytest.mark.unit
+def test_parsed_sections_match_across_backends():
+    plumber = _parsed('pdfplumber')
+    assert _parsed('pymupdf') == plumber
+    assert len(plumber[0]) > 0 and len(plumber[1]) > 0
+
+@pytest.mark.unit
+def test_backend_selection(monkeypatch):
+    assert set(TABLE_BACKENDS) == {'pdfplumber', 'pymupdf'}
+    with pytest.raises(ValueError):
+        get_table_backend('camelot')
+    monkeypatch.setitem(parsing_helpers.SECTION_TABLE_BACKENDS, 'npq_domains', 'pymupdf')
+    with ParsedReport(SAMPLE_PDF, table_backend='pdfplumber') as report:
+        npq_pages = parsing_helpers.find_npq_pages(report)
+        parsing_helpers.extract_npq_domain_scores_from_pdf(report, npq_pages)
+        assert {backend for _, backend in report._tables} == {'pymupdf'}